@@ -6,11 +6,14 @@ NetManagerX - 网络设备配置管理平台
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_migrate import Migrate
 from flask_cors import CORS
-from flask_debugtoolbar import DebugToolbarExtension
 import os
 from dotenv import load_dotenv
+from app.audit import AuditLogWriter
+from app.vault import CredentialVault
+from app.metrics import MetricsExporter
+from app.profiling import ProfileManager
+from app.background import BackgroundExecutor
 
 # 加载环境变量
 load_dotenv()
@@ -18,12 +21,31 @@ load_dotenv()
 # 初始化扩展
 db = SQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
 cors = CORS()
-debug_toolbar = DebugToolbarExtension()
+# 数据库迁移和调试工具栏只用于Web应用，导入较慢（alembic、flask_debugtoolbar），在 create_app 中按需创建
+migrate = None
+debug_toolbar = None
+audit_writer = AuditLogWriter()
+credential_vault = CredentialVault()
+metrics_exporter = MetricsExporter()
+profile_manager = ProfileManager()
+# 未配置Celery broker时在Web进程的线程池中执行任务（见 app.tasks.routing.submit）
+background_executor = BackgroundExecutor()
 
-def create_app(config_name=None):
-    """应用工厂函数"""
+# 应用类型
+APP_PROFILE_WEB = 'web'         # Web应用：全部扩展和蓝图
+APP_PROFILE_WORKER = 'worker'   # Celery worker：只初始化任务需要的扩展，不注册蓝图、登录、CORS、迁移和调试工具栏
+
+def create_app(config_name=None, profile=APP_PROFILE_WEB):
+    """
+    应用工厂函数
+    
+    Args:
+        config_name: 配置名，默认取 FLASK_ENV
+        profile: 应用类型，APP_PROFILE_WEB 或 APP_PROFILE_WORKER
+    """
+    global migrate, debug_toolbar
+    
     app = Flask(__name__)
     
     # 配置选择
@@ -42,12 +64,30 @@ def create_app(config_name=None):
     
     # 初始化扩展
     db.init_app(app)
+    audit_writer.init_app(app)
+    credential_vault.init_app(app)
+    metrics_exporter.init_app(app)
+    profile_manager.init_app(app)
+    
+    if profile == APP_PROFILE_WORKER:
+        return app
+    
     login_manager.init_app(app)
-    migrate.init_app(app, db)
     cors.init_app(app)
+    background_executor.init_app(app)
+    # Celery按Web应用的配置提交任务（worker在加载Celery配置时创建自己的应用，见 app.tasks.celery_app）
+    from app.tasks.celery_app import init_celery
+    init_celery(app)
+    if migrate is None:
+        from flask_migrate import Migrate
+        migrate = Migrate()
+    migrate.init_app(app, db)
     
     # 开发环境启用调试工具栏
     if app.config['DEBUG']:
+        if debug_toolbar is None:
+            from flask_debugtoolbar import DebugToolbarExtension
+            debug_toolbar = DebugToolbarExtension()
         debug_toolbar.init_app(app)
     
     # 配置登录管理器
@@ -0,0 +1,88 @@
+"""
+流式导出工具
+分批读取数据库记录并以生成器方式输出NDJSON或tar.gz，内存占用与导出行数无关
+"""
+
+import io
+import json
+import re
+import tarfile
+from typing import Any, Callable, Dict, Iterator
+
+from flask import Response, stream_with_context
+
+# 每批从数据库读取的行数（Postgres下使用服务端游标）
+EXPORT_BATCH_SIZE = 500
+
+def iter_ndjson(query, serializer: Callable[[Any], Dict[str, Any]],
+                batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """
+    逐行生成NDJSON
+    
+    Args:
+        query: SQLAlchemy查询（只能预加载多对一关系，yield_per不支持集合预加载）
+        serializer: 行序列化函数
+        batch_size: 每批读取行数
+    """
+    for row in query.yield_per(batch_size):
+        yield json.dumps(serializer(row), ensure_ascii=False, default=str) + '\n'
+
+class _StreamBuffer:
+    """tarfile流式写入的缓冲区，写入的数据由生成器取走后清空"""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def backup_archive_name(backup) -> str:
+    """备份在归档中的文件名：<设备名>/<备份ID>_<备份名>.cfg"""
+    device_name = backup.device.name if backup.device else f'device_{backup.device_id}'
+    safe = lambda value: re.sub(r'[^\w.-]+', '_', value).strip('_') or 'unnamed'
+    return f'{safe(device_name)}/{backup.id}_{safe(backup.name)}.cfg'
+
+def iter_config_tar(query, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    """
+    将配置备份流式打包为tar.gz
+    
+    Args:
+        query: ConfigBackup查询（需预加载device以生成文件名）
+        batch_size: 每批读取行数
+    """
+    buffer = _StreamBuffer()
+    with tarfile.open(fileobj=buffer, mode='w|gz') as tar:
+        for backup in query.yield_per(batch_size):
+            data = (backup.config_content or '').encode('utf-8')
+            info = tarfile.TarInfo(name=backup_archive_name(backup))
+            info.size = len(data)
+            if backup.created_at:
+                info.mtime = int(backup.created_at.timestamp())
+            tar.addfile(info, io.BytesIO(data))
+            
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    
+    # 写出gzip尾部
+    tail = buffer.drain()
+    if tail:
+        yield tail
+
+def stream_response(generator: Iterator, filename: str, mimetype: str) -> Response:
+    """将生成器包装为附件下载响应，保持请求上下文直到输出完毕"""
+    return Response(
+        stream_with_context(generator),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def ndjson_response(generator: Iterator[str], filename: str) -> Response:
+    """NDJSON下载响应"""
+    return stream_response(generator, filename, 'application/x-ndjson')
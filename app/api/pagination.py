@@ -0,0 +1,131 @@
+"""
+列表接口分页工具
+基于 (created_at, id) 的游标（keyset）分页、字段投影和索引列过滤
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+# 默认与最大每页条数，超过上限的请求会被截断
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class PaginationError(ValueError):
+    """分页参数错误"""
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """将 (created_at, id) 编码为不透明游标"""
+    raw = f'{created_at.isoformat()}|{row_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解码游标，返回 (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise PaginationError(f'无效的游标: {cursor}')
+
+def get_page_size(value: Optional[str]) -> int:
+    """解析每页条数，限制在 1 到 MAX_PAGE_SIZE 之间"""
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError(f'无效的limit参数: {value}')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """解析 fields= 投影参数，id 字段始终返回"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    return fields
+
+def project(data: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """按投影字段裁剪序列化结果，未知字段忽略"""
+    if not fields:
+        return data
+    return {field: data[field] for field in fields if field in data}
+
+def to_bool(value: str) -> bool:
+    """过滤参数布尔值转换"""
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def apply_filters(query, args, filter_map: Dict[str, Tuple[Any, Callable]]):
+    """
+    将请求参数映射为索引列上的过滤条件
+    
+    Args:
+        query: SQLAlchemy查询
+        args: 请求参数（request.args）
+        filter_map: {参数名: (模型列, 值转换函数)}，只允许白名单内的列
+    
+    Returns:
+        追加过滤条件后的查询
+    """
+    for name, (column, convert) in filter_map.items():
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            query = query.filter(column == convert(value))
+        except (TypeError, ValueError):
+            raise PaginationError(f'无效的过滤参数 {name}: {value}')
+    return query
+
+def keyset_paginate(query, model, cursor: Optional[str] = None,
+                    limit: int = DEFAULT_PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """
+    按 (created_at, id) 倒序进行游标分页
+    
+    Args:
+        query: 已应用过滤条件的查询
+        model: 带有 created_at 和 id 列的模型
+        cursor: 上一页返回的 next_cursor
+        limit: 每页条数
+    
+    Returns:
+        (当前页记录列表, 下一页游标或None)
+    """
+    query = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    
+    # 多取一条用于判断是否还有下一页，避免额外的COUNT查询
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
+def paginate_request(query, model, args, serializer: Callable[[Any], Dict[str, Any]],
+                     filter_map: Optional[Dict[str, Tuple[Any, Callable]]] = None) -> Dict[str, Any]:
+    """
+    根据请求参数（cursor、limit、fields及过滤条件）生成一页列表数据
+    
+    Returns:
+        {'items': [...], 'next_cursor': str|None, 'limit': int}
+    """
+    limit = get_page_size(args.get('limit'))
+    fields = parse_fields(args.get('fields'))
+    if filter_map:
+        query = apply_filters(query, args, filter_map)
+    
+    rows, next_cursor = keyset_paginate(query, model, args.get('cursor'), limit)
+    return {
+        'items': [project(serializer(row), fields) for row in rows],
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
@@ -0,0 +1,170 @@
+"""
+审计日志异步写入
+log_action 将审计事件放入进程内有界队列，由后台线程批量（多行INSERT）写入数据库；
+每条记录携带提交时当前应用的数据库引擎，写入时不依赖某个固定的应用
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Tuple
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_QUEUE_SIZE = 10000      # AUDIT_LOG_QUEUE_SIZE
+DEFAULT_BATCH_SIZE = 500        # AUDIT_LOG_BATCH_SIZE
+DEFAULT_FLUSH_INTERVAL = 1.0    # AUDIT_LOG_FLUSH_INTERVAL（秒）
+
+class AuditLogWriter:
+    """
+    审计日志后台写入器
+    
+    - 队列有界，队列满时调用方同步写入该条记录（背压，不丢弃审计记录）
+    - 后台线程按进程懒启动，兼容gunicorn/Celery的fork模型
+    - 进程退出或Celery worker子进程关闭时写出剩余记录
+    """
+    
+    def __init__(self, app=None):
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """初始化队列和批量参数"""
+        if self._queue is None:
+            atexit.register(self.shutdown)
+        else:
+            # 重新初始化（如测试中多次创建应用）前写出旧队列中的记录
+            self.shutdown()
+        
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        self._queue = queue.Queue(maxsize=app.config.get('AUDIT_LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+        app.extensions['audit_log_writer'] = self
+    
+    @property
+    def enabled(self) -> bool:
+        """当前应用是否异步写入（AUDIT_LOG_ASYNC，测试环境默认同步写入）"""
+        if self._queue is None or not has_app_context():
+            return False
+        return current_app.config.get('AUDIT_LOG_ASYNC', not current_app.testing)
+    
+    def submit(self, row: Dict[str, Any]) -> None:
+        """提交一条审计记录（audit_logs表的列值字典），写入当前应用的数据库"""
+        from app import db
+        
+        item = (db.engine, row)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning('审计日志队列已满，改为同步写入')
+            self._write_batch([item])
+    
+    def flush(self) -> None:
+        """阻塞直到队列中已提交的记录全部写入"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+        else:
+            self._drain()
+    
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """停止后台线程并写出剩余记录"""
+        if self._queue is None:
+            return
+        self._stop.set()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._drain()
+        self._thread = None
+        self._stop.clear()
+    
+    def _ensure_started(self) -> None:
+        """按进程启动后台线程（fork后的子进程需要重新启动）"""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+    
+    def _run(self) -> None:
+        """后台线程：攒批写入，空闲时按间隔唤醒"""
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            
+            batch = [first]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _drain(self) -> None:
+        """在当前线程写出队列中剩余的记录"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write_and_ack(batch)
+                batch = []
+        if batch:
+            self._write_and_ack(batch)
+    
+    def _write_and_ack(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        try:
+            self._write_batch(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+    
+    def _write_batch(self, batch: List[Tuple[Any, Dict[str, Any]]]) -> None:
+        """按数据库引擎分组写入（队列中的记录可能来自不同的应用）"""
+        groups: Dict[Any, List[Dict[str, Any]]] = {}
+        for engine, row in batch:
+            groups.setdefault(engine, []).append(row)
+        for engine, rows in groups.items():
+            self._write(engine, rows)
+    
+    def _write(self, engine, rows: List[Dict[str, Any]]) -> None:
+        """使用独立连接批量插入，失败时逐行插入以隔离错误记录"""
+        from app.models import AuditLog
+        
+        table = AuditLog.__table__
+        try:
+            with engine.begin() as conn:
+                conn.execute(table.insert(), rows)
+            return
+        except Exception as e:
+            logger.warning(f'审计日志批量写入失败，改为逐行写入: {e}')
+        
+        for row in rows:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(table.insert(), [row])
+            except Exception as e:
+                logger.error(f'审计日志写入失败，已丢弃: {row.get("action")} {e}')
@@ -0,0 +1,67 @@
+"""
+进程内后台执行
+没有Celery worker（未配置Redis）时，在线程池中执行耗时操作，使请求立即返回；
+函数在提交时所在应用的新应用上下文中运行，使用独立的数据库会话
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_WORKERS = 4     # BACKGROUND_WORKERS：线程池大小
+
+class BackgroundExecutor:
+    """
+    后台线程池
+    
+    - 线程池按进程懒创建，兼容gunicorn的fork模型
+    - 异常只记录日志，调用方需要自行把失败状态写入数据库
+    """
+    
+    def __init__(self, app=None):
+        self.max_workers = DEFAULT_WORKERS
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.max_workers = app.config.get('BACKGROUND_WORKERS', DEFAULT_WORKERS)
+        app.extensions['background_executor'] = self
+    
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """提交函数到线程池，在当前应用的新应用上下文中执行"""
+        app = current_app._get_current_object()
+        return self._get_pool().submit(self._run, app, fn, args, kwargs)
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭线程池，wait=True时等待已提交的函数执行完毕"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pid == os.getpid():
+            pool.shutdown(wait=wait)
+    
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """按进程创建线程池（fork出的子进程不能使用父进程的线程）"""
+        pid = os.getpid()
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                self._pid = pid
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='background')
+            return self._pool
+    
+    def _run(self, app, fn: Callable, args, kwargs):
+        with app.app_context():
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                logger.exception(f'后台执行失败: {getattr(fn, "__name__", fn)}')
+                raise
@@ -0,0 +1,34 @@
+"""
+默认数据初始化
+run.py 的 init-db 命令和 modern_start.py 等启动脚本共用，可重复执行
+"""
+
+from app import db
+from app.models import User, TemplateCategory
+
+def init_default_data():
+    """
+    创建数据表和默认数据：默认角色、管理员用户、模板分类和内置模板
+    
+    Returns:
+        管理员用户
+    """
+    from app.templates.services import TemplateService
+    
+    db.create_all()
+    User.create_default_roles()
+    admin_user = User.create_admin_user()
+    TemplateCategory.create_default_categories()
+    TemplateService.install_builtin_templates()
+    return admin_user
+
+def run_server(app, port=5000):
+    """开发服务器：初始化默认数据后启动"""
+    with app.app_context():
+        init_default_data()
+    
+    print("NetManagerX服务启动中...")
+    print(f"访问地址: http://localhost:{port}")
+    print("默认管理员账户: admin / admin123")
+    print("按 Ctrl+C 停止服务器")
+    app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,197 @@
+"""
+任务协作式取消与单设备执行期限
+任务取消后，执行循环和连接层在设备之间、命令之间调用 checkpoint() 时抛出异常，停止后续操作；
+取消标记在配置了REDIS_URL时为Redis键，否则读取数据库中的任务状态，检查结果短时缓存。
+每台设备有总执行期限（含排队等待会话），超过后停止该设备的后续命令，连接和读取超时也不超过剩余时间
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_CHECK_INTERVAL = 1.0    # TASK_CANCEL_CHECK_INTERVAL：取消标记的缓存时间（秒）
+DEFAULT_DEVICE_DEADLINE = 600   # DEVICE_DEADLINE：单台设备的总执行期限（秒，含排队等待会话的时间），0表示不限制
+CANCEL_KEY_TTL = 86400          # Redis取消标记的有效期（秒）
+
+KEY_PREFIX = 'netmanagerx:task'
+
+# 连接和读取超时的下限（秒），剩余时间很少时仍给最后一条命令留出完成的机会
+MIN_TIMEOUT = 1.0
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+    
+    def __init__(self, task_id=None):
+        super().__init__('任务已取消')
+        self.task_id = task_id
+
+class DeviceDeadlineExceeded(TimeoutError):
+    """单台设备超过总执行期限"""
+    
+    def __init__(self, deadline: float):
+        super().__init__(f'设备执行超过 {deadline:g} 秒期限，已停止后续操作')
+        self.deadline = deadline
+
+def cancel_key(task_id) -> str:
+    """任务取消标记的Redis键"""
+    return f'{KEY_PREFIX}:{task_id}:cancelled'
+
+_redis_clients: Dict[str, Any] = {}
+
+def _get_redis():
+    """获取Redis客户端，未配置REDIS_URL时返回None"""
+    url = current_app.config.get('REDIS_URL') if has_app_context() else None
+    if not url:
+        return None
+    if url not in _redis_clients:
+        try:
+            import redis
+            _redis_clients[url] = redis.Redis.from_url(url, socket_timeout=0.5)
+        except ImportError:
+            _redis_clients[url] = None
+    return _redis_clients[url]
+
+def request_cancel(task_id) -> None:
+    """设置取消标记（数据库状态由 Task.cancel 写入，未配置Redis时直接读取数据库状态）"""
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.set(cancel_key(task_id), 1, ex=CANCEL_KEY_TTL)
+    except Exception as e:
+        logger.warning(f'写入任务取消标记失败，执行中的任务将在查询数据库时发现取消: task={task_id} {e}')
+
+def clear_cancel(task_id) -> None:
+    """清除取消标记（重置任务后重新执行时使用）"""
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.delete(cancel_key(task_id))
+    except Exception as e:
+        logger.warning(f'清除任务取消标记失败: task={task_id} {e}')
+
+def is_cancel_requested(task_id) -> bool:
+    """任务是否已被取消（不缓存，通常通过 CancellationToken 调用）"""
+    client = _get_redis()
+    if client is not None:
+        try:
+            if client.exists(cancel_key(task_id)):
+                return True
+        except Exception as e:
+            logger.warning(f'读取任务取消标记失败，改为查询数据库: task={task_id} {e}')
+    
+    from app import db
+    from app.models import Task, TaskStatus
+    
+    status = db.session.query(Task.status).filter(Task.id == task_id).scalar()
+    return status == TaskStatus.CANCELLED
+
+class CancellationToken:
+    """
+    任务取消令牌
+    
+    cancelled 的结果缓存 TASK_CANCEL_CHECK_INTERVAL 秒，在循环中频繁检查也只偶尔访问Redis/数据库；
+    一旦发现取消就不再查询
+    """
+    
+    def __init__(self, task_id, check_interval: Optional[float] = None):
+        if check_interval is None:
+            config = current_app.config if has_app_context() else {}
+            check_interval = config.get('TASK_CANCEL_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        self.task_id = task_id
+        self.check_interval = check_interval
+        self._cancelled = False
+        self._checked_at = None
+    
+    @property
+    def cancelled(self) -> bool:
+        if self._cancelled or self.task_id is None:
+            return self._cancelled
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._cancelled = is_cancel_requested(self.task_id)
+        return self._cancelled
+    
+    def check(self) -> None:
+        """已取消时抛出 TaskCancelled"""
+        if self.cancelled:
+            raise TaskCancelled(self.task_id)
+
+# 当前执行范围：(取消令牌, 期限的monotonic时间, 期限秒数)
+_scope: ContextVar = ContextVar('task_execution_scope', default=None)
+
+# 当前上下文登记的续期回调（如设备会话锁的有效期），每次 checkpoint() 时调用
+_keepalives: ContextVar = ContextVar('task_keepalives', default=())
+
+def register_keepalive(callback):
+    """登记续期回调，返回值传给 unregister_keepalive 注销（按登记的相反顺序注销）"""
+    return _keepalives.set(_keepalives.get() + (callback,))
+
+def unregister_keepalive(reset) -> None:
+    """注销 register_keepalive 登记的续期回调"""
+    _keepalives.reset(reset)
+
+@contextmanager
+def device_scope(token: Optional[CancellationToken] = None, deadline: Optional[float] = None):
+    """
+    单台设备的执行范围，范围内的 checkpoint()/bounded_timeout() 使用该令牌和期限；
+    进入时先检查一次取消，已取消的任务不再开始处理新设备
+    
+    Args:
+        token: 任务取消令牌
+        deadline: 总执行期限（秒），默认 DEVICE_DEADLINE；0表示不限制
+    """
+    if deadline is None:
+        config = current_app.config if has_app_context() else {}
+        deadline = config.get('DEVICE_DEADLINE', DEFAULT_DEVICE_DEADLINE)
+    expires_at = time.monotonic() + deadline if deadline else None
+    
+    if token is not None:
+        token.check()
+    
+    reset = _scope.set((token, expires_at, deadline))
+    try:
+        yield
+    finally:
+        _scope.reset(reset)
+
+def checkpoint() -> None:
+    """
+    检查点：任务已取消时抛出 TaskCancelled，超过设备执行期限时抛出 DeviceDeadlineExceeded
+    
+    先调用已登记的续期回调；不在 device_scope 内时不做其他检查
+    """
+    for callback in _keepalives.get():
+        callback()
+    
+    scope = _scope.get()
+    if scope is None:
+        return
+    token, expires_at, deadline = scope
+    if token is not None:
+        token.check()
+    if expires_at is not None and time.monotonic() >= expires_at:
+        raise DeviceDeadlineExceeded(deadline)
+
+def remaining_time() -> Optional[float]:
+    """当前设备的剩余执行时间（秒），没有期限时返回None"""
+    scope = _scope.get()
+    if scope is None or scope[1] is None:
+        return None
+    return max(0.0, scope[1] - time.monotonic())
+
+def bounded_timeout(timeout: float) -> float:
+    """不超过剩余执行时间的超时（不低于 MIN_TIMEOUT）"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    return max(MIN_TIMEOUT, min(timeout, remaining))
@@ -0,0 +1,168 @@
+"""
+设备信息解析
+将 show version / show inventory 输出或RESTCONF清单数据解析为结构化的设备信息：
+hostname、model、serial_number、software_version、uptime、inventory（模块列表）。
+安装了ntc-templates时使用其TextFSM模板解析CLI输出，否则或模板解析失败时使用正则表达式
+"""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional
+
+from app.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+ntc_parse = lazy_import('ntc_templates.parse')
+
+FACT_COMMANDS = ('show version', 'show inventory')
+# RESTCONF设备使用的清单采集项（见 INVENTORY_PATHS）
+RESTCONF_FACT_ITEMS = ('system', 'platform', 'hardware')
+
+# 设备类型 -> ntc-templates平台名（与SSH客户端的Netmiko设备类型一致）
+_PLATFORMS = {
+    'cisco_router': 'cisco_ios',
+    'cisco_switch': 'cisco_ios',
+    'cisco_asa': 'cisco_asa',
+    'cisco_wlc': 'cisco_wlc_ssh',
+    'other': 'cisco_ios'
+}
+
+_HOSTNAME = re.compile(r'^(\S+)\s+uptime is\s+(.+)$', re.M)
+_VERSION = re.compile(r'Version\s+([^\s,]+)')
+_MODEL = re.compile(r'^[Cc]isco\s+(\S+)\s+(?:\(.*?\)\s+)*(?:processor|with)', re.M)
+_MODEL_NUMBER = re.compile(r'^\s*Model [Nn]umber\s*:\s*(\S+)', re.M)
+_SERIAL = re.compile(r'^\s*(?:Processor board ID|System [Ss]erial [Nn]umber\s*:)\s*(\S+)', re.M)
+_IMAGE = re.compile(r'^System image file is "(?:[^":]+:)?/?([^"]+)"', re.M)
+_INVENTORY = re.compile(
+    r'NAME:\s*"(?P<name>[^"]*)"\s*,\s*DESCR:\s*"(?P<descr>[^"]*)"\s*'
+    r'PID:\s*(?P<pid>[^,]*?)\s*,\s*VID:\s*(?P<vid>[^,]*?)\s*,\s*SN:\s*(?P<sn>\S*)'
+)
+
+# show version 输出中的系统标识 -> ntc-templates平台名
+_BANNERS = (
+    ('Adaptive Security Appliance', 'cisco_asa'),
+    ('NX-OS', 'cisco_nxos'),
+    ('Cisco Controller', 'cisco_wlc_ssh')
+)
+
+def platform_for(device_type: Optional[str]) -> str:
+    """设备类型对应的ntc-templates平台名"""
+    return _PLATFORMS.get(device_type or 'other', 'cisco_ios')
+
+def detect_platform(version_output: str) -> str:
+    """由 show version 输出判断ntc-templates平台名"""
+    for banner, platform in _BANNERS:
+        if banner in version_output:
+            return platform
+    return 'cisco_ios'
+
+def _textfsm(platform: str, command: str, output: str) -> Optional[List[Dict[str, Any]]]:
+    """使用ntc-templates解析，未安装或没有对应模板时返回None"""
+    if ntc_parse is None:
+        return None
+    try:
+        rows = ntc_parse.parse_output(platform=platform, command=command, data=output)
+    except Exception as e:
+        logger.debug(f"TextFSM解析失败，改用正则表达式: {platform} {command} {e}")
+        return None
+    # 旧版本模板的字段名为大写
+    return [{key.lower(): value for key, value in row.items()} for row in rows]
+
+def _first(value) -> Optional[str]:
+    if isinstance(value, list):
+        value = value[0] if value else None
+    value = (value or '').strip()
+    return value or None
+
+def parse_show_version(output: str, platform: Optional[str] = None) -> Dict[str, Any]:
+    """解析 show version 输出，未指定平台时按输出内容判断"""
+    rows = _textfsm(platform or detect_platform(output), 'show version', output)
+    if rows:
+        row = rows[0]
+        return {
+            'hostname': _first(row.get('hostname')),
+            'model': _first(row.get('hardware') or row.get('model')),
+            'serial_number': _first(row.get('serial')),
+            'software_version': _first(row.get('version')),
+            'uptime': _first(row.get('uptime')),
+            'image': _first(row.get('running_image'))
+        }
+    
+    hostname = _HOSTNAME.search(output)
+    version = _VERSION.search(output)
+    model = _MODEL_NUMBER.search(output) or _MODEL.search(output)
+    serial = _SERIAL.search(output)
+    image = _IMAGE.search(output)
+    return {
+        'hostname': hostname.group(1) if hostname else None,
+        'model': model.group(1) if model else None,
+        'serial_number': serial.group(1) if serial else None,
+        'software_version': version.group(1) if version else None,
+        'uptime': hostname.group(2).strip() if hostname else None,
+        'image': image.group(1) if image else None
+    }
+
+def parse_show_inventory(output: str, platform: str = 'cisco_ios') -> List[Dict[str, Any]]:
+    """解析 show inventory 输出，返回模块列表（name、descr、pid、vid、sn）"""
+    rows = _textfsm(platform, 'show inventory', output)
+    if rows is None:
+        rows = [match.groupdict() for match in _INVENTORY.finditer(output)]
+    return [{key: (row.get(key) or '').strip() for key in ('name', 'descr', 'pid', 'vid', 'sn')} for row in rows]
+
+def facts_from_cli(version_output: str, inventory_output: Optional[str] = None,
+                   platform: str = 'cisco_ios') -> Dict[str, Any]:
+    """
+    由 show version 和 show inventory 输出生成设备信息
+    
+    show version 中没有型号或序列号时取 show inventory 的第一个模块（机箱）
+    """
+    facts = parse_show_version(version_output, platform)
+    inventory = parse_show_inventory(inventory_output, platform) if inventory_output else []
+    if inventory:
+        chassis = inventory[0]
+        facts['model'] = facts['model'] or chassis['pid'] or None
+        facts['serial_number'] = facts['serial_number'] or chassis['sn'] or None
+    facts['inventory'] = inventory
+    facts['source'] = 'cli'
+    return facts
+
+def _unwrap(data: Dict[str, Any], *keys: str) -> Any:
+    """取RESTCONF响应中的子树（键名可能带或不带模块前缀）"""
+    for key in keys:
+        if isinstance(data, dict) and key in data:
+            return data[key]
+    return {}
+
+def facts_from_restconf(inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    由RESTCONF清单数据生成设备信息
+    
+    Args:
+        inventory: 采集项名称 -> 数据（见 INVENTORY_PATHS 的 system、platform、hardware）
+    """
+    system = _unwrap(inventory.get('system') or {}, 'ietf-system:system', 'system')
+    platform = _unwrap(inventory.get('platform') or {}, 'ietf-system:platform', 'platform')
+    hardware = _unwrap(inventory.get('hardware') or {}, 'ietf-hardware:hardware', 'hardware')
+    components = hardware.get('component', []) if isinstance(hardware, dict) else []
+    
+    modules = [{
+        'name': component.get('name', ''),
+        'descr': component.get('description', ''),
+        'pid': component.get('model-name', ''),
+        'vid': component.get('hardware-rev', ''),
+        'sn': component.get('serial-num', '')
+    } for component in components]
+    chassis = next((component for component in components
+                    if str(component.get('class', '')).endswith('chassis')), {})
+    
+    return {
+        'hostname': system.get('hostname'),
+        'model': chassis.get('model-name') or platform.get('machine'),
+        'serial_number': chassis.get('serial-num'),
+        'software_version': platform.get('os-version') or platform.get('os-release') or chassis.get('software-rev'),
+        'uptime': None,
+        'image': None,
+        'inventory': modules,
+        'source': 'restconf'
+    }
@@ -3,19 +3,187 @@ RESTCONF客户端模块
 基于HTTP/HTTPS的RESTCONF API连接管理
 """
 
-import requests
 import json
 import base64
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 from datetime import datetime
 from urllib.parse import urljoin
 
+from flask import current_app, has_app_context
+from app.lazy import lazy_import
 from app.models import Device, DeviceConnection, DeviceStatus
-from app import db
+from app import db, fastjson
+from app.cancellation import bounded_timeout, checkpoint
+from app.metrics import command_timer, observe_command, observe_connect, session_closed, session_opened
+from app.timing import PHASE_AUTH, PHASE_COMMAND, phase, record_phase
 
 logger = logging.getLogger(__name__)
 
+# requests在首次连接设备时才导入；httpx为可选依赖（HTTP/2还需要h2）
+requests = lazy_import('requests')
+httpx = lazy_import('httpx')
+h2 = lazy_import('h2')
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_POOL_MAXSIZE = 4        # RESTCONF_POOL_MAXSIZE：每台设备保持的keep-alive连接数
+DEFAULT_CONNECT_TIMEOUT = 5     # RESTCONF_CONNECT_TIMEOUT：TCP/TLS连接超时（秒），读取超时为任务指定的超时
+DEFAULT_HEALTH_TTL = 60         # RESTCONF_HEALTH_TTL：设备在此时间内有过成功的请求时，建立连接不再发送探测请求（秒）
+DEFAULT_IDLE_TIMEOUT = 300      # RESTCONF_IDLE_TIMEOUT：空闲超过此时间的设备连接池被关闭（秒）
+DEFAULT_HTTP2 = False           # RESTCONF_HTTP2：安装了httpx和h2时使用HTTP/2
+
+PROBE_PATH = 'data/ietf-system:system-state'
+
+# 清单采集的YANG子树：名称 -> (路径, 查询参数)，用 fields/depth（RFC 8040）只返回需要的内容
+INVENTORY_PATHS = {
+    'system': ('data/ietf-system:system', {'fields': 'hostname;contact;location'}),
+    'platform': ('data/ietf-system:system-state/platform', {'depth': '2'}),
+    'interfaces': ('data/ietf-interfaces:interfaces-state',
+                   {'fields': 'interface(name;type;admin-status;oper-status;speed;phys-address)'}),
+    'hardware': ('data/ietf-hardware:hardware',
+                 {'fields': 'component(name;class;description;model-name;serial-num;software-rev)'})
+}
+
+class _DevicePool:
+    """单台设备的共享连接池"""
+    
+    def __init__(self, transport):
+        # requests.adapters.HTTPAdapter 或 httpx.Client
+        self.transport = transport
+        self.last_ok = 0.0
+        self.last_used = time.monotonic()
+    
+    def close(self) -> None:
+        try:
+            self.transport.close()
+        except Exception as e:
+            logger.warning(f"关闭RESTCONF连接池时出错: {str(e)}")
+
+class RESTCONFSessionPool:
+    """
+    按设备共享的RESTCONF连接池
+    
+    - requests：每台设备共享一个 HTTPAdapter（urllib3连接池线程安全，连接保持keep-alive），
+      每个客户端创建轻量的 Session 并挂载该适配器
+    - 开启 RESTCONF_HTTP2 且安装了httpx和h2时，每台设备共享一个HTTP/2的 httpx.Client
+    - 设备最近有过成功的请求时跳过建立连接时的探测请求
+    """
+    
+    def __init__(self, pool_maxsize: int = DEFAULT_POOL_MAXSIZE, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 health_ttl: float = DEFAULT_HEALTH_TTL, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 http2: bool = DEFAULT_HTTP2):
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.health_ttl = health_ttl
+        self.idle_timeout = idle_timeout
+        if http2 and (httpx is None or h2 is None):
+            logger.warning('未安装httpx或h2，RESTCONF改用HTTP/1.1')
+            http2 = False
+        self.http2 = http2
+        self._pools: Dict[str, _DevicePool] = {}  # 按设备地址（base_url）
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_config(cls, config) -> 'RESTCONFSessionPool':
+        return cls(
+            pool_maxsize=config.get('RESTCONF_POOL_MAXSIZE', DEFAULT_POOL_MAXSIZE),
+            connect_timeout=config.get('RESTCONF_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            health_ttl=config.get('RESTCONF_HEALTH_TTL', DEFAULT_HEALTH_TTL),
+            idle_timeout=config.get('RESTCONF_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT),
+            http2=bool(config.get('RESTCONF_HTTP2', DEFAULT_HTTP2))
+        )
+    
+    def _get(self, base_url: str) -> _DevicePool:
+        """获取设备连接池，顺便关闭空闲过久的连接池"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for url, pool in list(self._pools.items()):
+                if now - pool.last_used > self.idle_timeout:
+                    expired.append(self._pools.pop(url))
+            pool = self._pools.get(base_url)
+            if pool is None:
+                pool = self._pools[base_url] = _DevicePool(self._create_transport())
+            pool.last_used = now
+        for idle in expired:
+            idle.close()
+        return pool
+    
+    def _create_transport(self):
+        if self.http2:
+            return httpx.Client(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.pool_maxsize,
+                                    max_keepalive_connections=self.pool_maxsize,
+                                    keepalive_expiry=self.idle_timeout)
+            )
+        # 每个适配器只连接一台设备，pool_connections为1
+        return requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+    
+    def session(self, base_url: str):
+        """
+        获取发送请求的会话对象（requests.Session 或共享的 httpx.Client），
+        调用方用完后不要关闭，连接留在连接池中复用
+        """
+        pool = self._get(base_url)
+        if self.http2:
+            return pool.transport
+        session = requests.Session()
+        session.mount('http://', pool.transport)
+        session.mount('https://', pool.transport)
+        return session
+    
+    def timeout(self, read_timeout: float):
+        """单次请求的超时：连接超时和读取超时分开设置"""
+        connect_timeout = min(self.connect_timeout, read_timeout)
+        if self.http2:
+            return httpx.Timeout(read_timeout, connect=connect_timeout)
+        return (connect_timeout, read_timeout)
+    
+    def is_healthy(self, base_url: str) -> bool:
+        """设备最近是否有过成功的请求"""
+        pool = self._pools.get(base_url)
+        return pool is not None and time.monotonic() - pool.last_ok < self.health_ttl
+    
+    def mark_ok(self, base_url: str) -> None:
+        pool = self._pools.get(base_url)
+        if pool is not None:
+            pool.last_ok = time.monotonic()
+    
+    def mark_failed(self, base_url: str) -> None:
+        """请求出错（连接断开、超时等）后下次建立连接时重新探测；失效的连接由连接池自行丢弃"""
+        pool = self._pools.get(base_url)
+        if pool is not None:
+            pool.last_ok = 0.0
+    
+    def pool_count(self) -> int:
+        return len(self._pools)
+    
+    def close_all(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+
+_default_pool: Optional[RESTCONFSessionPool] = None
+
+def get_session_pool() -> RESTCONFSessionPool:
+    """当前应用的RESTCONF连接池（按应用配置创建），没有应用上下文时使用默认参数的全局连接池"""
+    global _default_pool
+    if has_app_context():
+        pool = current_app.extensions.get('restconf_pool')
+        if pool is None:
+            pool = current_app.extensions.setdefault('restconf_pool', RESTCONFSessionPool.from_config(current_app.config))
+        return pool
+    if _default_pool is None:
+        _default_pool = RESTCONFSessionPool()
+    return _default_pool
+
 class RESTCONFClient:
     """RESTCONF客户端类"""
     
@@ -29,8 +197,11 @@ class RESTCONFClient:
         """
         self.device = device
         self.timeout = timeout
+        self.pool = get_session_pool()
         self.session = None
+        self.headers = {}
         self.connection_record = None
+        self._session_counted = False
         self.base_url = f"http{'s' if device.port == 443 else ''}://{device.ip_address}:{device.port}/restconf/"
     
     def connect(self) -> Dict[str, Any]:
@@ -40,6 +211,16 @@ class RESTCONFClient:
         Returns:
             连接结果字典
         """
+        start_time = time.time()
+        result = self._connect()
+        observe_connect(self.device, time.time() - start_time, result['success'])
+        if result['success'] and not self._session_counted:
+            self._session_counted = True
+            session_opened(self.device)
+        return result
+    
+    def _connect(self) -> Dict[str, Any]:
+        """建立RESTCONF连接（连接耗时和活动会话数由 connect() 统计）"""
         try:
             # 创建连接记录
             self.connection_record = DeviceConnection(
@@ -49,27 +230,30 @@ class RESTCONFClient:
             db.session.add(self.connection_record)
             db.session.commit()
             
-            # 创建会话
-            self.session = requests.Session()
-            self.session.timeout = self.timeout
+            # 会话使用设备共享的连接池
+            self.session = self.pool.session(self.base_url)
             
-            # 设置认证
+            # 设置认证（共享的httpx.Client不能保存单个客户端的请求头，每次请求时传入）
             username = self.device.username
             password = self.device.get_password()
             if username and password:
                 credentials = f"{username}:{password}"
                 encoded_credentials = base64.b64encode(credentials.encode()).decode()
-                self.session.headers.update({
+                self.headers = {
                     'Authorization': f'Basic {encoded_credentials}',
                     'Accept': 'application/yang-data+json',
                     'Content-Type': 'application/yang-data+json'
-                })
+                }
             
-            # 测试连接
-            test_url = urljoin(self.base_url, 'data/ietf-system:system-state')
-            response = self.session.get(test_url)
+            # 设备最近有过成功的请求时连接池中已有可用连接，跳过探测请求
+            if self.pool.is_healthy(self.base_url):
+                status_code = 200
+            else:
+                # TCP/TLS连接和HTTP认证都在第一个请求中完成
+                with phase(PHASE_AUTH):
+                    status_code = self._request('get', PROBE_PATH).status_code
             
-            if response.status_code in [200, 404]:  # 404也可能表示连接成功但资源不存在
+            if status_code in [200, 404]:  # 404也可能表示连接成功但资源不存在
                 result = {
                     'success': True,
                     'message': 'RESTCONF连接建立成功',
@@ -82,7 +266,7 @@ class RESTCONFClient:
                 logger.info(f"RESTCONF连接成功: {self.device.name} ({self.device.ip_address})")
                 return result
             else:
-                raise Exception(f"RESTCONF连接失败: HTTP {response.status_code}")
+                raise Exception(f"RESTCONF连接失败: HTTP {status_code}")
                 
         except requests.exceptions.ConnectTimeout:
             error_msg = f"RESTCONF连接超时"
@@ -105,19 +289,36 @@ class RESTCONFClient:
             return self._handle_connection_error(error_msg)
     
     def disconnect(self) -> None:
-        """断开RESTCONF连接"""
+        """断开RESTCONF连接（底层连接留在设备连接池中复用，不关闭会话）"""
         try:
             if self.session:
-                self.session.close()
                 logger.info(f"RESTCONF连接已断开: {self.device.name}")
-        except Exception as e:
-            logger.warning(f"断开RESTCONF连接时出错: {str(e)}")
         finally:
             # 更新连接记录
             if self.connection_record:
                 self.connection_record.close_connection()
                 self.connection_record = None
             self.session = None
+            if self._session_counted:
+                self._session_counted = False
+                session_closed(self.device)
+    
+    def _request(self, method: str, path: str, session=None, **kwargs):
+        """
+        发送请求
+        
+        每次请求按设备剩余执行时间计算读取超时；收到响应即标记设备连接可用，
+        连接出错时下次建立连接重新探测
+        """
+        url = urljoin(self.base_url, path)
+        timeout = self.pool.timeout(bounded_timeout(self.timeout))
+        try:
+            response = getattr(session or self.session, method)(url, headers=self.headers, timeout=timeout, **kwargs)
+        except Exception:
+            self.pool.mark_failed(self.base_url)
+            raise
+        self.pool.mark_ok(self.base_url)
+        return response
     
     def get(self, path: str, params: Optional[Dict] = None) -> Dict[str, Any]:
         """
@@ -130,6 +331,9 @@ class RESTCONFClient:
         Returns:
             请求结果字典
         """
+        # 任务已取消或超过设备执行期限时抛出异常，不再发送后续请求
+        checkpoint()
+        
         if not self.session:
             return {
                 'success': False,
@@ -138,8 +342,8 @@ class RESTCONFClient:
             }
         
         try:
-            url = urljoin(self.base_url, path)
-            response = self.session.get(url, params=params)
+            with command_timer(self.device), phase(PHASE_COMMAND):
+                response = self._request('get', path, params=params)
             
             if response.status_code == 200:
                 data = response.json() if response.content else {}
@@ -173,6 +377,59 @@ class RESTCONFClient:
                 'path': path
             }
     
+    def _fetch(self, path: str, params: Optional[Dict]) -> Dict[str, Any]:
+        """get_many 的单个请求（在线程池中执行，不访问数据库和设备对象）"""
+        checkpoint()
+        start = time.perf_counter()
+        try:
+            # requests.Session 不保证线程安全，每个请求使用单独的会话（共用设备连接池）
+            session = self.session if self.pool.http2 else self.pool.session(self.base_url)
+            response = self._request('get', path, session=session, params=params)
+            result = {
+                'success': response.status_code == 200,
+                'status_code': response.status_code,
+                'size': len(response.content or b''),
+                'path': path
+            }
+            if result['success']:
+                result['data'] = fastjson.loads(response.content) if response.content else {}
+            else:
+                result['error'] = f"RESTCONF GET请求失败: HTTP {response.status_code}"
+        except Exception as e:
+            result = {'success': False, 'error': f"RESTCONF GET请求异常: {str(e)}", 'size': 0, 'path': path}
+        result['duration'] = time.perf_counter() - start
+        return result
+    
+    def get_many(self, queries: Dict[str, Tuple[str, Optional[Dict]]],
+                 max_workers: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        并发执行多个GET请求，按完成顺序逐个返回 (名称, 结果)
+        
+        请求共用设备连接池中的keep-alive连接，并发数默认为连接池大小；响应用 app.fastjson 解析
+        
+        Args:
+            queries: 名称 -> (RESTCONF路径, 查询参数)
+            max_workers: 最大并发请求数
+        """
+        if not self.session:
+            for name, (path, _) in queries.items():
+                yield name, {'success': False, 'error': 'RESTCONF连接未建立或已断开', 'size': 0, 'path': path}
+            return
+        
+        start = time.perf_counter()
+        max_workers = max(1, min(len(queries), max_workers or self.pool.pool_maxsize))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='restconf') as executor:
+            # 复制上下文，线程中的请求同样受任务取消和设备执行期限约束
+            futures = {
+                executor.submit(copy_context().run, self._fetch, path, params): name
+                for name, (path, params) in queries.items()
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                observe_command(self.device, result['duration'])
+                yield futures[future], result
+        record_phase(PHASE_COMMAND, time.perf_counter() - start)
+    
     def post(self, path: str, data: Optional[Dict] = None) -> Dict[str, Any]:
         """
         执行POST请求
@@ -184,6 +441,8 @@ class RESTCONFClient:
         Returns:
             请求结果字典
         """
+        checkpoint()
+        
         if not self.session:
             return {
                 'success': False,
@@ -192,8 +451,8 @@ class RESTCONFClient:
             }
         
         try:
-            url = urljoin(self.base_url, path)
-            response = self.session.post(url, json=data)
+            with command_timer(self.device), phase(PHASE_COMMAND):
+                response = self._request('post', path, json=data)
             
             if response.status_code in [200, 201, 204]:
                 response_data = response.json() if response.content else {}
@@ -238,6 +497,8 @@ class RESTCONFClient:
         Returns:
             请求结果字典
         """
+        checkpoint()
+        
         if not self.session:
             return {
                 'success': False,
@@ -246,8 +507,8 @@ class RESTCONFClient:
             }
         
         try:
-            url = urljoin(self.base_url, path)
-            response = self.session.put(url, json=data)
+            with command_timer(self.device), phase(PHASE_COMMAND):
+                response = self._request('put', path, json=data)
             
             if response.status_code in [200, 201, 204]:
                 response_data = response.json() if response.content else {}
@@ -291,6 +552,8 @@ class RESTCONFClient:
         Returns:
             请求结果字典
         """
+        checkpoint()
+        
         if not self.session:
             return {
                 'success': False,
@@ -299,8 +562,8 @@ class RESTCONFClient:
             }
         
         try:
-            url = urljoin(self.base_url, path)
-            response = self.session.delete(url)
+            with command_timer(self.device), phase(PHASE_COMMAND):
+                response = self._request('delete', path)
             
             if response.status_code in [200, 204]:
                 response_data = response.json() if response.content else {}
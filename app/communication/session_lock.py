@@ -0,0 +1,250 @@
+"""
+设备会话并发限制
+同一台设备同时打开的会话数不超过其会话上限（Device.max_sessions，默认 DEVICE_SESSION_LIMIT），
+超出时按先来先得的顺序排队等待，而不是直接连接失败。
+配置了REDIS_URL时使用Redis在多个worker间共享，否则使用进程内队列；
+持有期间每次 checkpoint()（命令之间）按需延长有效期，会话时间超过 lease_ttl 也不会被其他worker抢占
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app, has_app_context
+from app.cancellation import checkpoint, register_keepalive, unregister_keepalive
+from app.timing import PHASE_SESSION_WAIT, phase
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_SESSION_LIMIT = 1       # DEVICE_SESSION_LIMIT：每台设备的并发会话数
+DEFAULT_WAIT_TIMEOUT = 600      # DEVICE_LOCK_WAIT_TIMEOUT：最长等待时间（秒）
+DEFAULT_LEASE_TTL = 900         # DEVICE_LOCK_LEASE_TTL：持有/排队记录的有效期（秒），进程崩溃后自动释放
+DEFAULT_POLL_INTERVAL = 0.2     # DEVICE_LOCK_POLL_INTERVAL：排队时的轮询间隔（秒）
+
+# 等待回调的最短调用间隔（秒），排队位置变化时立即调用
+WAIT_REPORT_INTERVAL = 1.0
+
+# 持有期间延长有效期的间隔（占 lease_ttl 的比例），避免每条命令都访问Redis
+REFRESH_FRACTION = 1 / 3
+
+KEY_PREFIX = 'netmanagerx:device_session'
+
+# 原子操作：清理过期记录、按票号入队（已在队列中则保持原位置）、刷新有效期，返回队列位置
+# KEYS: 队列(zset, score=票号)、有效期(zset, score=过期时间)、票号计数器
+# ARGV: 成员ID、有效期（秒）
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local ttl = tonumber(ARGV[2])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[1], member)
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    redis.call('ZADD', KEYS[1], redis.call('INCR', KEYS[3]), ARGV[1])
+end
+redis.call('ZADD', KEYS[2], now + ttl, ARGV[1])
+for _, key in ipairs(KEYS) do
+    redis.call('EXPIRE', key, math.ceil(ttl))
+end
+return redis.call('ZRANK', KEYS[1], ARGV[1])
+"""
+
+class DeviceBusyError(Exception):
+    """等待设备会话超时"""
+    pass
+
+class _LocalQueue:
+    """进程内的设备会话队列（未配置Redis时使用）"""
+    
+    _queues: Dict[Any, 'OrderedDict[str, None]'] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def position(cls, device_id, member: str, ttl: float) -> int:
+        with cls._lock:
+            queue = cls._queues.setdefault(device_id, OrderedDict())
+            queue.setdefault(member, None)
+            return list(queue).index(member)
+    
+    @classmethod
+    def remove(cls, device_id, member: str) -> None:
+        with cls._lock:
+            queue = cls._queues.get(device_id)
+            if queue is not None:
+                queue.pop(member, None)
+                if not queue:
+                    del cls._queues[device_id]
+
+class _RedisQueue:
+    """Redis中的设备会话队列"""
+    
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(ACQUIRE_SCRIPT)
+    
+    @staticmethod
+    def keys(device_id):
+        base = f'{KEY_PREFIX}:{device_id}'
+        return [f'{base}:queue', f'{base}:expiry', f'{base}:ticket']
+    
+    def position(self, device_id, member: str, ttl: float) -> int:
+        return int(self.script(keys=self.keys(device_id), args=[member, ttl]))
+    
+    def remove(self, device_id, member: str) -> None:
+        queue_key, expiry_key, _ = self.keys(device_id)
+        pipe = self.client.pipeline()
+        pipe.zrem(queue_key, member)
+        pipe.zrem(expiry_key, member)
+        pipe.execute()
+
+_redis_queues: Dict[str, Any] = {}
+
+def _get_backend():
+    """配置了REDIS_URL时返回Redis队列，否则返回进程内队列"""
+    url = current_app.config.get('REDIS_URL') if has_app_context() else None
+    if not url:
+        return _LocalQueue
+    if url not in _redis_queues:
+        try:
+            import redis
+            _redis_queues[url] = _RedisQueue(redis.Redis.from_url(url, socket_timeout=2))
+        except ImportError:
+            _redis_queues[url] = None
+    return _redis_queues[url] or _LocalQueue
+
+class DeviceSessionLock:
+    """
+    设备会话信号量
+    
+    队列中排在前 limit 位的成员持有会话，其余成员按入队顺序等待；
+    用作上下文管理器，退出时释放
+    """
+    
+    def __init__(self, device_id, limit: int = DEFAULT_SESSION_LIMIT,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT, lease_ttl: float = DEFAULT_LEASE_TTL,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 on_wait: Optional[Callable[[float, int], None]] = None, backend=None):
+        self.device_id = device_id
+        self.limit = max(1, limit)
+        self.wait_timeout = wait_timeout
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.on_wait = on_wait
+        self.backend = backend or _get_backend()
+        self.member = uuid.uuid4().hex
+        self.waited = 0.0
+        self.acquired = False
+        self.refreshed_at = None
+        self._keepalive = None
+    
+    def _position(self) -> int:
+        try:
+            return self.backend.position(self.device_id, self.member, self.lease_ttl)
+        except Exception as e:
+            if self.backend is _LocalQueue:
+                raise
+            # Redis不可用时退回进程内队列，不因加锁失败而中断任务
+            logger.warning(f'设备会话锁Redis不可用，改用进程内队列: {e}')
+            self.backend = _LocalQueue
+            return self.backend.position(self.device_id, self.member, self.lease_ttl)
+    
+    def acquire(self) -> float:
+        """
+        排队获取会话，返回等待时间（秒）
+        
+        Raises:
+            DeviceBusyError: 超过 wait_timeout 仍未轮到
+            TaskCancelled / DeviceDeadlineExceeded: 排队期间任务被取消或超过设备执行期限（见 app.cancellation）
+        """
+        start = time.monotonic()
+        last_report = None
+        last_position = None
+        
+        try:
+            while True:
+                position = self._position()
+                self.waited = time.monotonic() - start
+                if position < self.limit:
+                    self.acquired = True
+                    self.refreshed_at = time.monotonic()
+                    return self.waited
+                
+                if self.waited >= self.wait_timeout:
+                    raise DeviceBusyError(
+                        f'设备 {self.device_id} 会话已满，等待 {self.waited:.0f} 秒后超时'
+                    )
+                
+                now = time.monotonic()
+                if self.on_wait and (position != last_position or last_report is None
+                                     or now - last_report >= WAIT_REPORT_INTERVAL):
+                    self.on_wait(self.waited, position - self.limit + 1)
+                    last_report = now
+                    last_position = position
+                
+                checkpoint()
+                time.sleep(self.poll_interval)
+        except BaseException:
+            # 超时、取消或回调异常时退出排队，不占用队列位置直到有效期结束
+            self.release()
+            raise
+    
+    def refresh(self, force: bool = False) -> None:
+        """
+        延长持有记录的有效期；用作上下文管理器时由 checkpoint() 调用
+        
+        Args:
+            force: 为False时距上次延长不足 lease_ttl * REFRESH_FRACTION 则跳过
+        """
+        if not self.acquired:
+            return
+        now = time.monotonic()
+        if not force and now - self.refreshed_at < self.lease_ttl * REFRESH_FRACTION:
+            return
+        self._position()
+        self.refreshed_at = now
+    
+    def release(self) -> None:
+        """释放会话（或退出排队）"""
+        try:
+            self.backend.remove(self.device_id, self.member)
+        except Exception as e:
+            logger.warning(f'释放设备 {self.device_id} 会话锁失败，将在有效期后自动释放: {e}')
+        self.acquired = False
+    
+    def __enter__(self):
+        with phase(PHASE_SESSION_WAIT):
+            self.acquire()
+        self._keepalive = register_keepalive(self.refresh)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self._keepalive is not None:
+            unregister_keepalive(self._keepalive)
+            self._keepalive = None
+        self.release()
+        return False
+
+def device_session(device, on_wait: Optional[Callable[[float, int], None]] = None) -> DeviceSessionLock:
+    """
+    按设备的会话上限和应用配置创建会话锁
+    
+    Args:
+        device: 设备对象
+        on_wait: 排队时的回调，参数为 (已等待秒数, 排队位置)，排队位置为1表示下一个获得会话
+    """
+    config = current_app.config
+    limit = device.max_sessions or config.get('DEVICE_SESSION_LIMIT', DEFAULT_SESSION_LIMIT)
+    return DeviceSessionLock(
+        device.id,
+        limit=limit,
+        wait_timeout=config.get('DEVICE_LOCK_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT),
+        lease_ttl=config.get('DEVICE_LOCK_LEASE_TTL', DEFAULT_LEASE_TTL),
+        poll_interval=config.get('DEVICE_LOCK_POLL_INTERVAL', DEFAULT_POLL_INTERVAL),
+        on_wait=on_wait
+    )
@@ -10,22 +10,42 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime
 from contextlib import contextmanager
 
-try:
-    from netmiko import ConnectHandler, NetMikoTimeoutException, NetMikoAuthenticationException
-    from netmiko.ssh_exception import SSHException
-    import paramiko
-except ImportError:
-    ConnectHandler = None
-    NetMikoTimeoutException = Exception
-    NetMikoAuthenticationException = Exception
-    SSHException = Exception
-    paramiko = None
-
+from app.lazy import lazy_import
+from app.communication.facts import parse_show_version
 from app.models import Device, DeviceConnection, DeviceStatus, AuditLog
 from app import db
+from app.cancellation import bounded_timeout, checkpoint
+from app.metrics import observe_command, observe_connect, session_closed, session_opened
+from app.timing import PHASE_AUTH, PHASE_COMMAND, PHASE_DNS, PHASE_PROMPT, phase
 
 logger = logging.getLogger(__name__)
 
+# 导入netmiko约需0.4秒，首次连接设备时才导入
+netmiko = lazy_import('netmiko')
+paramiko = lazy_import('paramiko')
+
+# 配置命令的读取超时（秒），与netmiko send_config_set默认值一致
+CONFIG_READ_TIMEOUT = 15
+
+if netmiko is not None:
+    def ConnectHandler(**kwargs):
+        """netmiko.ConnectHandler"""
+        return netmiko.ConnectHandler(**kwargs)
+else:
+    ConnectHandler = None
+
+def _lazy_exception(module, name: str) -> type:
+    """延迟导入的库中的异常类（访问时才导入该库），库未安装时为Exception"""
+    return getattr(module, name) if module is not None else Exception
+
+def __getattr__(name: str):
+    """保留 from app.communication.ssh_client import NetMikoAuthenticationException 等导入方式"""
+    if name in ('NetMikoAuthenticationException', 'NetMikoTimeoutException'):
+        return _lazy_exception(netmiko, name)
+    if name == 'SSHException':
+        return _lazy_exception(paramiko, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 class SSHClient:
     """SSH客户端类"""
     
@@ -38,9 +58,10 @@ class SSHClient:
             timeout: 连接超时时间（秒）
         """
         self.device = device
-        self.timeout = timeout
+        self.timeout = bounded_timeout(timeout)
         self.connection = None
         self.connection_record = None
+        self._session_counted = False
     
     def connect(self) -> Dict[str, Any]:
         """
@@ -49,10 +70,22 @@ class SSHClient:
         Returns:
             连接结果字典
         """
+        start_time = time.time()
+        result = self._connect()
+        observe_connect(self.device, time.time() - start_time, result['success'])
+        if result['success'] and not self._session_counted:
+            self._session_counted = True
+            session_opened(self.device)
+        return result
+    
+    def _connect(self) -> Dict[str, Any]:
+        """建立SSH连接（连接耗时和活动会话数由 connect() 统计）"""
+        if not ConnectHandler:
+            error_msg = "SSH连接失败: Netmiko未安装，请安装netmiko包"
+            logger.error(f"{self.device.name}: {error_msg}")
+            return self._handle_connection_error(error_msg)
+        
         try:
-            if not ConnectHandler:
-                raise Exception("Netmiko未安装，请安装netmiko包")
-            
             # 准备连接参数
             connection_params = self._prepare_connection_params()
             
@@ -64,8 +97,15 @@ class SSHClient:
             db.session.add(self.connection_record)
             db.session.commit()
             
-            # 建立连接
-            self.connection = ConnectHandler(**connection_params)
+            # 建立连接，分阶段记录耗时（paramiko在认证阶段内完成TCP连接和握手）
+            with phase(PHASE_DNS):
+                socket.getaddrinfo(self.device.ip_address, self.device.port, type=socket.SOCK_STREAM)
+            self.connection = ConnectHandler(**connection_params, auto_connect=False)
+            with phase(PHASE_AUTH):
+                self.connection._modify_connection_params()
+                self.connection.establish_connection()
+            with phase(PHASE_PROMPT):
+                self.connection._try_session_preparation()
             
             # 测试连接
             if self.connection.is_alive():
@@ -83,17 +123,17 @@ class SSHClient:
             else:
                 raise Exception("连接建立失败")
                 
-        except NetMikoAuthenticationException as e:
+        except _lazy_exception(netmiko, 'NetMikoAuthenticationException') as e:
             error_msg = f"SSH认证失败: {str(e)}"
             logger.error(f"{self.device.name}: {error_msg}")
             return self._handle_connection_error(error_msg)
             
-        except NetMikoTimeoutException as e:
+        except _lazy_exception(netmiko, 'NetMikoTimeoutException') as e:
             error_msg = f"SSH连接超时: {str(e)}"
             logger.error(f"{self.device.name}: {error_msg}")
             return self._handle_connection_error(error_msg)
             
-        except SSHException as e:
+        except _lazy_exception(paramiko, 'SSHException') as e:
             error_msg = f"SSH连接异常: {str(e)}"
             logger.error(f"{self.device.name}: {error_msg}")
             return self._handle_connection_error(error_msg)
@@ -117,6 +157,9 @@ class SSHClient:
                 self.connection_record.close_connection()
                 self.connection_record = None
             self.connection = None
+            if self._session_counted:
+                self._session_counted = False
+                session_closed(self.device)
     
     def execute_command(self, command: str, delay_factor: float = 1.0) -> Dict[str, Any]:
         """
@@ -129,6 +172,9 @@ class SSHClient:
         Returns:
             执行结果字典
         """
+        # 任务已取消或超过设备执行期限时抛出异常，不再发送后续命令
+        checkpoint()
+        
         if not self.connection or not self.connection.is_alive():
             return {
                 'success': False,
@@ -139,10 +185,13 @@ class SSHClient:
         try:
             start_time = time.time()
             
-            # 执行命令
-            output = self.connection.send_command(command, delay_factor=delay_factor)
+            # 执行命令（延迟因子放大单条命令的读取超时，设备执行期限只做上限）
+            read_timeout = bounded_timeout(self.timeout * delay_factor)
+            with phase(PHASE_COMMAND):
+                output = self.connection.send_command(command, read_timeout=read_timeout)
             
             execution_time = time.time() - start_time
+            observe_command(self.device, execution_time)
             
             logger.info(f"命令执行成功: {self.device.name} - {command}")
             
@@ -198,6 +247,8 @@ class SSHClient:
         Returns:
             执行结果字典
         """
+        checkpoint()
+        
         if not self.connection or not self.connection.is_alive():
             return {
                 'success': False,
@@ -208,10 +259,13 @@ class SSHClient:
         try:
             start_time = time.time()
             
-            # 发送配置命令
-            output = self.connection.send_config_set(config_commands, delay_factor=delay_factor)
+            # 发送配置命令（延迟因子放大读取超时，设备执行期限只做上限）
+            read_timeout = bounded_timeout(CONFIG_READ_TIMEOUT * delay_factor)
+            with phase(PHASE_COMMAND):
+                output = self.connection.send_config_set(config_commands, read_timeout=read_timeout)
             
             execution_time = time.time() - start_time
+            observe_command(self.device, execution_time)
             
             logger.info(f"配置命令执行成功: {self.device.name} - {len(config_commands)}条命令")
             
@@ -389,7 +443,9 @@ class SSHService:
                 return {
                     'success': True,
                     'message': 'SSH连接测试成功',
-                    'output': result['output'][:500]  # 只返回前500字符
+                    'output': result['output'][:500],  # 只返回前500字符
+                    # 解析完整输出，调用方可用于更新设备信息缓存
+                    'facts': parse_show_version(result['output'])
                 }
             else:
                 return {
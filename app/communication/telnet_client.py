@@ -3,7 +3,7 @@ Telnet客户端模块
 基于Python telnetlib的网络设备Telnet连接管理
 """
 
-import telnetlib3
+import telnetlib
 import socket
 import time
 import logging
@@ -12,7 +12,11 @@ from datetime import datetime
 from contextlib import contextmanager
 
 from app.models import Device, DeviceConnection, DeviceStatus
+from app.communication.facts import parse_show_version
 from app import db
+from app.cancellation import DeviceDeadlineExceeded, TaskCancelled, bounded_timeout, checkpoint
+from app.metrics import observe_command, observe_connect, session_closed, session_opened
+from app.timing import PHASE_AUTH, PHASE_COMMAND, PHASE_DNS, PHASE_PROMPT, PHASE_TCP_CONNECT, phase, record_phase
 
 logger = logging.getLogger(__name__)
 
@@ -28,9 +32,10 @@ class TelnetClient:
             timeout: 连接超时时间（秒）
         """
         self.device = device
-        self.timeout = timeout
+        self.timeout = bounded_timeout(timeout)
         self.telnet = None
         self.connection_record = None
+        self._session_counted = False
     
     def connect(self) -> Dict[str, Any]:
         """
@@ -39,6 +44,16 @@ class TelnetClient:
         Returns:
             连接结果字典
         """
+        start_time = time.time()
+        result = self._connect()
+        observe_connect(self.device, time.time() - start_time, result['success'])
+        if result['success'] and not self._session_counted:
+            self._session_counted = True
+            session_opened(self.device)
+        return result
+    
+    def _connect(self) -> Dict[str, Any]:
+        """建立Telnet连接（连接耗时和活动会话数由 connect() 统计）"""
         try:
             # 创建连接记录
             self.connection_record = DeviceConnection(
@@ -48,27 +63,32 @@ class TelnetClient:
             db.session.add(self.connection_record)
             db.session.commit()
             
-            # 建立Telnet连接
-            self.telnet = telnetlib.Telnet(self.device.ip_address, self.device.port, timeout=self.timeout)
-            
-            # 等待登录提示
-            self.telnet.read_until(b"Username:", timeout=10)
-            
-            # 发送用户名
-            username = self.device.username.encode('ascii') + b'\n'
-            self.telnet.write(username)
-            
-            # 等待密码提示
-            self.telnet.read_until(b"Password:", timeout=10)
+            # 建立Telnet连接（分阶段记录耗时，见 app.timing）
+            with phase(PHASE_DNS):
+                socket.getaddrinfo(self.device.ip_address, self.device.port, type=socket.SOCK_STREAM)
+            with phase(PHASE_TCP_CONNECT):
+                self.telnet = telnetlib.Telnet(self.device.ip_address, self.device.port, timeout=self.timeout)
             
-            # 发送密码
-            password = self.device.get_password()
-            if password:
-                password_bytes = password.encode('ascii') + b'\n'
-                self.telnet.write(password_bytes)
+            with phase(PHASE_AUTH):
+                # 等待登录提示
+                self.telnet.read_until(b"Username:", timeout=10)
+                
+                # 发送用户名
+                username = self.device.username.encode('ascii') + b'\n'
+                self.telnet.write(username)
+                
+                # 等待密码提示
+                self.telnet.read_until(b"Password:", timeout=10)
+                
+                # 发送密码
+                password = self.device.get_password()
+                if password:
+                    password_bytes = password.encode('ascii') + b'\n'
+                    self.telnet.write(password_bytes)
             
             # 等待登录完成
-            time.sleep(2)
+            with phase(PHASE_PROMPT):
+                time.sleep(2)
             
             # 检查连接是否成功
             if self.telnet.get_socket():
@@ -120,6 +140,9 @@ class TelnetClient:
                 self.connection_record.close_connection()
                 self.connection_record = None
             self.telnet = None
+            if self._session_counted:
+                self._session_counted = False
+                session_closed(self.device)
     
     def execute_command(self, command: str, wait_time: float = 1.0) -> Dict[str, Any]:
         """
@@ -132,6 +155,9 @@ class TelnetClient:
         Returns:
             执行结果字典
         """
+        # 任务已取消或超过设备执行期限时抛出异常，不再发送后续命令
+        checkpoint()
+        
         if not self.telnet:
             return {
                 'success': False,
@@ -154,6 +180,8 @@ class TelnetClient:
             output = output_bytes.decode('ascii', errors='ignore')
             
             execution_time = time.time() - start_time
+            observe_command(self.device, execution_time)
+            record_phase(PHASE_COMMAND, execution_time)
             
             logger.info(f"Telnet命令执行成功: {self.device.name} - {command}")
             
@@ -243,6 +271,8 @@ class TelnetClient:
                 'commands': config_commands
             }
             
+        except (TaskCancelled, DeviceDeadlineExceeded):
+            raise
         except Exception as e:
             error_msg = f"Telnet配置命令执行失败: {str(e)}"
             logger.error(f"{self.device.name}: {error_msg}")
@@ -359,7 +389,9 @@ class TelnetService:
                 return {
                     'success': True,
                     'message': 'Telnet连接测试成功',
-                    'output': result['output'][:500]  # 只返回前500字符
+                    'output': result['output'][:500],  # 只返回前500字符
+                    # 解析完整输出，调用方可用于更新设备信息缓存
+                    'facts': parse_show_version(result['output'])
                 }
             else:
                 return {
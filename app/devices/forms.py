@@ -125,6 +125,10 @@ class DeviceGroupForm(FlaskForm):
     description = TextAreaField('描述', validators=[
         Length(max=500, message='描述长度不能超过500个字符')
     ])
+    color = StringField('颜色', validators=[
+        Optional(),
+        Length(max=20, message='颜色长度不能超过20个字符')
+    ])
     submit = SubmitField('保存')
     
     def __init__(self, group=None, *args, **kwargs):
@@ -133,6 +137,7 @@ class DeviceGroupForm(FlaskForm):
         if group:
             self.name.data = group.name
             self.description.data = group.description
+            self.color.data = group.color
     
     def validate_name(self, name):
         """验证组名称唯一性"""
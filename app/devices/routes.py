@@ -2,14 +2,25 @@
 设备管理模块路由
 """
 
+from datetime import datetime
 from flask import render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
+from sqlalchemy.orm import defer
+from app.api.pagination import paginate_request, PaginationError, apply_filters, to_bool
+from app.api.export import iter_ndjson, iter_config_tar, ndjson_response, stream_response
 from app.devices import bp
 from app.devices.forms import DeviceForm, DeviceGroupForm, DeviceBulkForm, DeviceConnectionTestForm
-from app.devices.services import DeviceManagementService, DeviceStatusService, DeviceGroupService
-from app.models import Device, DeviceGroup, DeviceType, ConnectionType, DeviceStatus, AuditLog
+from app.devices.services import DeviceManagementService, DeviceStatusService, DeviceGroupService, DeviceFactsService
+from app.models import Device, DeviceGroup, DeviceType, ConnectionType, DeviceStatus, DeviceInventory, AuditLog, ConfigBackup
 from app import db
 
+# 配置备份列表与导出共用的过滤参数
+BACKUP_FILTER_MAP = {
+    'device_id': (ConfigBackup.device_id, int),
+    'is_current': (ConfigBackup.is_current, to_bool),
+    'backup_type': (ConfigBackup.backup_type, str)
+}
+
 @bp.route('/')
 @login_required
 def index():
@@ -19,7 +30,7 @@ def index():
     group_id = request.args.get('group_id', type=int)
     status = request.args.get('status')
     
-    query = Device.query
+    query = Device.list_query()
     
     if group_id:
         query = query.filter_by(group_id=group_id)
@@ -47,9 +58,57 @@ def detail(device_id):
 @bp.route('/api/devices')
 @login_required
 def api_devices():
-    """API: 获取设备列表"""
-    devices = Device.query.order_by(Device.name).all()
-    return jsonify([device.to_dict() for device in devices])
+    """API: 获取设备列表（游标分页）"""
+    filter_map = {
+        'group_id': (Device.group_id, int),
+        'status': (Device.status, DeviceStatus),
+        'device_type': (Device.device_type, DeviceType),
+        'connection_type': (Device.connection_type, ConnectionType),
+        'is_active': (Device.is_active, to_bool)
+    }
+    
+    try:
+        page = paginate_request(Device.list_query(), Device, request.args,
+                                lambda device: device.to_dict(), filter_map)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+@bp.route('/api/backups')
+@login_required
+def api_backups():
+    """API: 获取配置备份列表（游标分页，不加载配置内容）"""
+    query = ConfigBackup.list_query().options(defer(ConfigBackup.config_content))
+    
+    try:
+        page = paginate_request(query, ConfigBackup, request.args,
+                                lambda backup: backup.to_dict(), BACKUP_FILTER_MAP)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+@bp.route('/api/backups/export')
+@login_required
+def export_backups():
+    """API: 流式导出配置备份（format=ndjson 元数据，format=tar 配置文件打包为tar.gz）"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'tar'):
+        return jsonify({'error': f'不支持的导出格式: {export_format}'}), 400
+    
+    try:
+        query = apply_filters(ConfigBackup.list_query(), request.args, BACKUP_FILTER_MAP)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    query = query.order_by(ConfigBackup.id)
+    
+    if export_format == 'tar':
+        return stream_response(iter_config_tar(query), 'config_backups.tar.gz', 'application/gzip')
+    
+    # 元数据导出不读取配置内容
+    query = query.options(defer(ConfigBackup.config_content))
+    return ndjson_response(iter_ndjson(query, lambda backup: backup.to_dict()), 'config_backups.ndjson')
 
 @bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -148,7 +207,7 @@ def test_connection(device_id):
     device = Device.query.get_or_404(device_id)
     
     try:
-        result = DeviceStatusService.check_device_status(device)
+        result = DeviceStatusService.check_device_status(device, current_user.id)
         return jsonify({
             'success': True,
             'result': result
@@ -159,6 +218,32 @@ def test_connection(device_id):
             'error': str(e)
         }), 500
 
+@bp.route('/api/devices/status/check-all', methods=['POST'])
+@login_required
+def api_check_all_status():
+    """API: 检查所有启用设备的状态（异步执行，每台设备一个子任务并行检查，结果写入设备状态）"""
+    # 任务模块导入设备服务，在此处导入以避免循环导入
+    from app.tasks.network_tasks import batch_check_status
+    from app.tasks.routing import submit
+    
+    device_ids = [device_id for device_id, in db.session.query(Device.id).filter(Device.is_active.is_(True))]
+    
+    try:
+        # 设备的 last_checked 晚于 submitted_at 时表示已完成本次检查
+        submitted_at = datetime.utcnow()
+        async_task = submit(batch_check_status, (device_ids, current_user.id))
+        return jsonify({
+            'success': True,
+            'celery_task_id': async_task.id,
+            'device_ids': device_ids,
+            'submitted_at': submitted_at.isoformat()
+        }), 202
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/bulk-action', methods=['POST'])
 @login_required
 def bulk_action():
@@ -171,7 +256,7 @@ def bulk_action():
             action = form.action.data
             
             if action == 'test_connection':
-                result = DeviceStatusService.batch_check_status(device_ids)
+                result = DeviceStatusService.batch_check_status(device_ids, current_user.id)
                 return jsonify({
                     'success': True,
                     'result': result
@@ -198,7 +283,7 @@ def bulk_action():
 def groups():
     """设备组管理页面"""
     groups = DeviceGroup.query.order_by(DeviceGroup.name).all()
-    return render_template('devices/groups.html', groups=groups)
+    return render_template('devices/groups.html', groups=groups, device_counts=DeviceGroup.count_devices_by_group())
 
 @bp.route('/groups/add', methods=['GET', 'POST'])
 @login_required
@@ -210,7 +295,8 @@ def add_group():
         try:
             group_data = {
                 'name': form.name.data,
-                'description': form.description.data
+                'description': form.description.data,
+                'color': form.color.data
             }
             
             group = DeviceGroupService.create_group(group_data, current_user.id)
@@ -234,4 +320,138 @@ def api_device_detail(device_id):
 def api_groups():
     """API: 获取设备组列表"""
     groups = DeviceGroup.query.order_by(DeviceGroup.name).all()
-    return jsonify([group.to_dict() for group in groups])
+    device_counts = DeviceGroup.count_devices_by_group()
+    return jsonify([group.to_dict(device_count=device_counts.get(group.id, 0)) for group in groups])
+
+def _group_data(data, group=None):
+    """校验设备组JSON数据，返回 (设备组数据, 错误信息)"""
+    name = (data.get('name') or '').strip()
+    if not 2 <= len(name) <= 100:
+        return None, '组名称长度必须在2-100个字符之间'
+    existing = DeviceGroup.query.filter_by(name=name).first()
+    if existing and (group is None or existing.id != group.id):
+        return None, '设备组名称已存在'
+    return {
+        'name': name,
+        'description': data.get('description'),
+        'color': data.get('color')
+    }, None
+
+@bp.route('/api/groups', methods=['POST'])
+@login_required
+def api_create_group():
+    """API: 创建设备组"""
+    group_data, error = _group_data(request.get_json() or {})
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    group = DeviceGroupService.create_group(group_data, current_user.id)
+    return jsonify({'success': True, 'group': group.to_dict(device_count=0)}), 201
+
+@bp.route('/api/groups/<int:group_id>', methods=['PUT'])
+@login_required
+def api_update_group(group_id):
+    """API: 更新设备组"""
+    group = DeviceGroup.query.get_or_404(group_id)
+    group_data, error = _group_data(request.get_json() or {}, group)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    group = DeviceGroupService.update_group(group, group_data, current_user.id)
+    return jsonify({'success': True, 'group': group.to_dict()})
+
+@bp.route('/api/groups/<int:group_id>', methods=['DELETE'])
+@login_required
+def api_delete_group(group_id):
+    """API: 删除设备组，组内设备变为未分组"""
+    group = DeviceGroup.query.get_or_404(group_id)
+    DeviceGroupService.delete_group(group, current_user.id)
+    return jsonify({'success': True, 'message': '设备组已删除'})
+
+@bp.route('/api/groups/<int:group_id>/devices', methods=['POST'])
+@login_required
+def api_group_add_devices(group_id):
+    """API: 将设备批量移入设备组"""
+    group = DeviceGroup.query.get_or_404(group_id)
+    device_ids = (request.get_json() or {}).get('device_ids')
+    if not isinstance(device_ids, list) or not all(isinstance(device_id, int) for device_id in device_ids):
+        return jsonify({'success': False, 'error': 'device_ids 必须是设备ID列表'}), 400
+    
+    updated = DeviceGroupService.assign_devices(group, device_ids, current_user.id)
+    return jsonify({'success': True, 'updated': updated})
+
+@bp.route('/api/device/<int:device_id>/group', methods=['PUT'])
+@login_required
+def api_device_group(device_id):
+    """API: 修改设备所属设备组，group_id 为空时移出设备组"""
+    device = Device.query.get_or_404(device_id)
+    group_id = (request.get_json() or {}).get('group_id')
+    group = None
+    if group_id:
+        group = DeviceGroup.query.get(group_id)
+        if not group:
+            return jsonify({'success': False, 'error': '设备组不存在'}), 404
+    
+    DeviceGroupService.assign_devices(group, [device.id], current_user.id)
+    return jsonify({'success': True, 'group_name': group.name if group else None})
+
+@bp.route('/api/device/<int:device_id>/inventory')
+@login_required
+def api_device_inventory(device_id):
+    """API: 设备清单，name 指定采集项，data=false 时不返回数据内容"""
+    device = Device.query.get_or_404(device_id)
+    query = device.inventory.order_by(DeviceInventory.name)
+    names = request.args.getlist('name')
+    if names:
+        query = query.filter(DeviceInventory.name.in_(names))
+    include_data = to_bool(request.args.get('data', 'true'))
+    
+    return jsonify({
+        'success': True,
+        'inventory': [item.to_dict(include_data=include_data) for item in query]
+    })
+
+@bp.route('/api/device/<int:device_id>/inventory/collect', methods=['POST'])
+@login_required
+def api_collect_inventory(device_id):
+    """API: 通过RESTCONF采集设备清单（异步执行）"""
+    # 任务模块导入设备服务，在此处导入以避免循环导入
+    from app.tasks.inventory_tasks import collect_device_inventory
+    from app.tasks.routing import submit
+    
+    device = Device.query.get_or_404(device_id)
+    if device.connection_type != ConnectionType.RESTCONF:
+        return jsonify({'success': False, 'error': '设备不是RESTCONF连接'}), 400
+    names = (request.get_json(silent=True) or {}).get('names') or None
+    
+    async_task = submit(collect_device_inventory, (device.id, names))
+    return jsonify({'success': True, 'celery_task_id': async_task.id})
+
+@bp.route('/api/device/<int:device_id>/facts')
+@login_required
+def api_device_facts(device_id):
+    """
+    API: 设备信息
+    
+    只返回缓存的设备信息，不在请求中连接设备；缓存已过期或 refresh=true 时提交刷新任务（经设备会话锁
+    和执行期限控制），返回202和任务ID，任务完成后再次请求获取新的设备信息
+    """
+    # 任务模块导入设备服务，在此处导入以避免循环导入
+    from app.tasks.inventory_tasks import refresh_device_facts
+    from app.tasks.routing import submit
+    
+    device = Device.query.get_or_404(device_id)
+    refresh = to_bool(request.args.get('refresh', 'false'))
+    result = {
+        'success': True,
+        'facts': device.get_facts(),
+        'cached': True,
+        'facts_updated_at': device.facts_updated_at.isoformat() if device.facts_updated_at else None
+    }
+    if not refresh and DeviceFactsService.is_fresh(device):
+        return jsonify(result)
+    
+    # max_age=0 时忽略有效期强制采集
+    async_task = submit(refresh_device_facts, (device.id, 30, 0 if refresh else None))
+    result.update(stale=True, celery_task_id=async_task.id)
+    return jsonify(result), 202
@@ -6,10 +6,19 @@
 import socket
 import subprocess
 import platform
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
+from flask import current_app
+from sqlalchemy import or_
 from app import db
-from app.models import Device, DeviceGroup, DeviceConnection, DeviceStatus, AuditLog
+from app.models import Device, DeviceGroup, DeviceConnection, DeviceStatus, DeviceInventory, ConnectionType, AuditLog, Task
+from app.communication.facts import FACT_COMMANDS, RESTCONF_FACT_ITEMS, facts_from_cli, facts_from_restconf, platform_for
+from app.communication.restconf_client import INVENTORY_PATHS, restconf_manager
+from app.communication.ssh_client import SSHService
+from app.communication.telnet_client import TelnetService
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_FACTS_MAX_AGE = 86400   # DEVICE_FACTS_MAX_AGE：设备信息的有效期（秒），过期后才重新采集
 
 class DeviceConnectionService:
     """设备连接服务"""
@@ -70,15 +79,15 @@ class DeviceStatusService:
     """设备状态服务"""
     
     @staticmethod
-    def update_device_status(device: Device, status: DeviceStatus, message: str = '') -> None:
-        """更新设备状态"""
+    def update_device_status(device: Device, status: DeviceStatus, message: str = '', user_id: int = None) -> None:
+        """更新设备状态，user_id为发起检查的用户"""
         device.status = status
         device.last_checked = datetime.utcnow()
         db.session.add(device)
         
         # 记录状态变更日志
         AuditLog.log_action(
-            user=None,  # 系统自动更新
+            user_id=user_id,
             action='device_status_update',
             resource_type='device',
             resource_id=device.id,
@@ -89,7 +98,7 @@ class DeviceStatusService:
         db.session.commit()
     
     @staticmethod
-    def check_device_status(device: Device) -> Dict[str, Any]:
+    def check_device_status(device: Device, user_id: int = None) -> Dict[str, Any]:
         """检查设备状态"""
         results = {}
         
@@ -113,7 +122,7 @@ class DeviceStatusService:
             message = '设备不可达'
         
         # 更新设备状态
-        DeviceStatusService.update_device_status(device, status, message)
+        DeviceStatusService.update_device_status(device, status, message, user_id)
         
         return {
             'status': status.value,
@@ -122,14 +131,14 @@ class DeviceStatusService:
         }
     
     @staticmethod
-    def batch_check_status(device_ids: List[int]) -> Dict[str, Any]:
+    def batch_check_status(device_ids: List[int], user_id: int = None) -> Dict[str, Any]:
         """批量检查设备状态"""
         devices = Device.query.filter(Device.id.in_(device_ids)).all()
         results = {}
         
         for device in devices:
             try:
-                result = DeviceStatusService.check_device_status(device)
+                result = DeviceStatusService.check_device_status(device, user_id)
                 results[device.id] = {
                     'device_name': device.name,
                     'device_ip': device.ip_address,
@@ -168,6 +177,7 @@ class DeviceManagementService:
             model=device_data.get('model'),
             serial_number=device_data.get('serial_number'),
             software_version=device_data.get('software_version'),
+            max_sessions=device_data.get('max_sessions'),
             group_id=device_data.get('group_id')
         )
         
@@ -221,6 +231,7 @@ class DeviceManagementService:
         device.model = device_data.get('model')
         device.serial_number = device_data.get('serial_number')
         device.software_version = device_data.get('software_version')
+        device.max_sessions = device_data.get('max_sessions')
         device.group_id = device_data.get('group_id')
         
         # 更新密码
@@ -284,7 +295,8 @@ class DeviceGroupService:
         """创建设备组"""
         group = DeviceGroup(
             name=group_data['name'],
-            description=group_data.get('description')
+            description=group_data.get('description'),
+            color=group_data.get('color') or '#007bff'
         )
         
         db.session.add(group)
@@ -309,6 +321,8 @@ class DeviceGroupService:
         
         group.name = group_data['name']
         group.description = group_data.get('description')
+        if group_data.get('color'):
+            group.color = group_data['color']
         
         db.session.add(group)
         db.session.commit()
@@ -328,11 +342,15 @@ class DeviceGroupService:
     
     @staticmethod
     def delete_group(group: DeviceGroup, user_id: int) -> None:
-        """删除设备组"""
+        """删除设备组（组内设备变为未分组，历史任务保留但不再关联设备组）"""
         group_name = group.name
         group_id = group.id
         device_count = group.devices.count()
         
+        # 单条UPDATE解除关联
+        Device.query.filter_by(group_id=group_id).update({'group_id': None}, synchronize_session=False)
+        Task.query.filter_by(group_id=group_id).update({'group_id': None}, synchronize_session=False)
+        
         # 记录删除日志
         AuditLog.log_action(
             user_id=user_id,
@@ -346,3 +364,206 @@ class DeviceGroupService:
         
         db.session.delete(group)
         db.session.commit()
+    
+    @staticmethod
+    def assign_devices(group: Optional[DeviceGroup], device_ids: List[int], user_id: int) -> int:
+        """
+        将设备移入设备组
+        
+        Args:
+            group: 目标设备组，None表示移出设备组
+            device_ids: 设备ID列表
+            user_id: 用户ID
+            
+        Returns:
+            更新的设备数量
+        """
+        if not device_ids:
+            return 0
+        
+        updated = Device.query.filter(Device.id.in_(device_ids)).update(
+            {'group_id': group.id if group else None}, synchronize_session=False
+        )
+        db.session.commit()
+        
+        # 记录分组变更日志
+        AuditLog.log_action(
+            user_id=user_id,
+            action='assign_device_group',
+            resource_type='device_group',
+            resource_id=group.id if group else None,
+            resource_name=group.name if group else None,
+            success=True,
+            details={'device_ids': list(device_ids), 'updated': updated}
+        )
+        
+        return updated
+    
+    @staticmethod
+    def get_active_device_ids(group: DeviceGroup) -> List[int]:
+        """设备组内启用的设备ID（按ID排序）"""
+        rows = db.session.query(Device.id).filter(
+            Device.group_id == group.id,
+            Device.is_active.is_(True)
+        ).order_by(Device.id).all()
+        return [device_id for (device_id,) in rows]
+
+class DeviceInventoryService:
+    """设备清单服务"""
+    
+    @staticmethod
+    def collect_restconf(device: Device, names: Optional[List[str]] = None, timeout: int = 30) -> Dict[str, Any]:
+        """
+        通过RESTCONF并发采集设备清单，每个采集项返回后立即写入 device_inventory 表
+        
+        Args:
+            device: 设备对象
+            names: 采集项名称（见 INVENTORY_PATHS），默认全部
+            timeout: 超时时间
+            
+        Returns:
+            采集结果字典，collected 为 名称 -> 数据大小，errors 为 名称 -> 错误信息
+        """
+        names = list(names or INVENTORY_PATHS)
+        unknown = [name for name in names if name not in INVENTORY_PATHS]
+        if unknown:
+            return {'success': False, 'error': f'未知的采集项: {", ".join(unknown)}'}
+        
+        collected, errors = {}, {}
+        try:
+            client = restconf_manager.get_connection(device, timeout)
+            rows = {row.name: row for row in device.inventory.filter(DeviceInventory.name.in_(names))}
+            
+            for name, result in client.get_many({name: INVENTORY_PATHS[name] for name in names}):
+                if not result['success']:
+                    errors[name] = result['error']
+                    continue
+                row = rows.get(name)
+                if row is None:
+                    row = rows[name] = DeviceInventory(device_id=device.id, name=name)
+                    db.session.add(row)
+                row.path = result['path']
+                row.set_data(result['data'])
+                row.size = result['size']
+                row.duration = result['duration']
+                row.collected_at = datetime.utcnow()
+                # 逐项提交，不在内存中保留全部响应
+                db.session.commit()
+                collected[name] = result['size']
+        except Exception as e:
+            db.session.rollback()
+            return {'success': False, 'error': str(e), 'collected': collected, 'errors': errors}
+        finally:
+            if device.id in restconf_manager.active_connections:
+                restconf_manager.close_connection(device.id)
+        
+        return {'success': not errors, 'collected': collected, 'errors': errors}
+
+class DeviceFactsService:
+    """
+    设备信息服务
+    
+    设备信息（型号、序列号、软件版本、模块列表等）缓存在设备记录上，有效期内直接使用缓存，
+    需要这些信息的任务不必再执行 show version/show inventory
+    """
+    
+    @staticmethod
+    def _max_age(max_age: Optional[int] = None) -> int:
+        if max_age is None:
+            max_age = current_app.config.get('DEVICE_FACTS_MAX_AGE', DEFAULT_FACTS_MAX_AGE)
+        return max_age
+    
+    @staticmethod
+    def is_fresh(device: Device, max_age: Optional[int] = None) -> bool:
+        """设备信息是否在有效期内"""
+        if not device.facts_updated_at:
+            return False
+        age = datetime.utcnow() - device.facts_updated_at
+        return age < timedelta(seconds=DeviceFactsService._max_age(max_age))
+    
+    @staticmethod
+    def get_stale_device_ids(max_age: Optional[int] = None, device_ids: Optional[List[int]] = None) -> List[int]:
+        """设备信息未采集或已过期的启用设备ID（按ID排序）"""
+        cutoff = datetime.utcnow() - timedelta(seconds=DeviceFactsService._max_age(max_age))
+        query = db.session.query(Device.id).filter(
+            Device.is_active.is_(True),
+            or_(Device.facts_updated_at.is_(None), Device.facts_updated_at < cutoff)
+        )
+        if device_ids:
+            query = query.filter(Device.id.in_(device_ids))
+        return [device_id for (device_id,) in query.order_by(Device.id)]
+    
+    @staticmethod
+    def update_facts(device: Device, facts: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        合并新采集的设备信息并刷新采集时间
+        
+        只包含部分信息时（如连接测试中的 show version）保留缓存中的其余信息
+        """
+        merged = device.get_facts()
+        merged.update({key: value for key, value in facts.items() if value})
+        device.set_facts(merged)
+        db.session.commit()
+        return merged
+    
+    @staticmethod
+    def collect(device: Device, timeout: int = 30) -> Dict[str, Any]:
+        """
+        连接设备采集设备信息并缓存
+        
+        SSH/Telnet设备解析 show version 和 show inventory 的输出，RESTCONF设备使用清单采集的
+        system、platform、hardware 数据
+        
+        Args:
+            device: 设备对象
+            timeout: 超时时间
+            
+        Returns:
+            采集结果字典
+        """
+        try:
+            if device.connection_type == ConnectionType.RESTCONF:
+                result = DeviceInventoryService.collect_restconf(device, list(RESTCONF_FACT_ITEMS), timeout)
+                if not result.get('collected'):
+                    return {'success': False, 'error': result.get('error') or '; '.join(result['errors'].values())}
+                rows = device.inventory.filter(DeviceInventory.name.in_(RESTCONF_FACT_ITEMS))
+                facts = facts_from_restconf({row.name: row.get_data() for row in rows})
+            else:
+                if device.connection_type == ConnectionType.SSH:
+                    results = SSHService.execute_commands(device, list(FACT_COMMANDS), timeout)
+                elif device.connection_type == ConnectionType.TELNET:
+                    results = TelnetService.execute_commands(device, list(FACT_COMMANDS), timeout)
+                else:
+                    return {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+                # 命令失败时不再执行后续命令
+                version, inventory = results[0], results[1] if len(results) > 1 else None
+                if not version['success']:
+                    return {'success': False, 'error': version['error']}
+                facts = facts_from_cli(
+                    version['output'],
+                    inventory['output'] if inventory and inventory['success'] else None,
+                    platform_for(device.device_type.value if device.device_type else None)
+                )
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        
+        return {'success': True, 'facts': DeviceFactsService.update_facts(device, facts)}
+    
+    @staticmethod
+    def get_facts(device: Device, timeout: int = 30, max_age: Optional[int] = None,
+                  refresh: bool = False) -> Dict[str, Any]:
+        """
+        获取设备信息，有效期内返回缓存，否则连接设备重新采集
+        
+        Args:
+            device: 设备对象
+            timeout: 超时时间
+            max_age: 有效期（秒），默认 DEVICE_FACTS_MAX_AGE
+            refresh: 忽略缓存重新采集
+            
+        Returns:
+            结果字典，cached 表示是否使用了缓存
+        """
+        if not refresh and DeviceFactsService.is_fresh(device, max_age):
+            return {'success': True, 'facts': device.get_facts(), 'cached': True}
+        return {**DeviceFactsService.collect(device, timeout), 'cached': False}
@@ -0,0 +1,270 @@
+"""
+任务事件推送
+任务进度、设备结果和状态变化发布到每个任务的频道，由SSE接口推送给浏览器，无需轮询数据库。
+配置了REDIS_URL时使用Redis发布/订阅在Web进程和Celery worker间传递，否则使用进程内广播（仅适用于单进程部署）
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_HEARTBEAT = 15          # TASK_EVENTS_HEARTBEAT：无事件时发送心跳注释的间隔（秒）
+DEFAULT_MAX_DURATION = 100      # TASK_EVENTS_MAX_DURATION：单个事件流连接的最长时间（秒），到期关闭后浏览器自动重连；
+                                # 应小于gunicorn的worker超时（见 gunicorn.conf.py），0表示不限制
+LOCAL_QUEUE_SIZE = 1000         # 进程内每个订阅者最多缓存的事件数，超出时丢弃最早的事件
+
+CHANNEL_PREFIX = 'netmanagerx:task'
+
+# 事件类型
+EVENT_PROGRESS = 'progress'     # 进度更新（ProgressReporter发布的进度字典）
+EVENT_DEVICE = 'device'         # 批量任务的单设备结果（见 app.tasks.fanout.device_entry）
+EVENT_RESULT = 'result'         # 新写入的任务结果记录（TaskResult.to_dict()）
+EVENT_STATUS = 'status'         # 任务状态变化（见 task_status）
+
+# 收到以下状态的status事件后结束推送
+TERMINAL_STATUSES = ('success', 'failed', 'cancelled', 'timeout')
+
+def channel(task_id) -> str:
+    """任务的事件频道名称"""
+    return f'{CHANNEL_PREFIX}:{task_id}:events'
+
+def _json_default(value):
+    """JSON序列化时间等类型"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+class _LocalSubscription:
+    """进程内订阅"""
+    
+    def __init__(self, broker, name: str):
+        self.broker = broker
+        self.name = name
+        self.queue = queue.Queue(maxsize=LOCAL_QUEUE_SIZE)
+    
+    def put(self, message: Dict[str, Any]) -> None:
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待下一条事件，超时返回None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+class _LocalBroker:
+    """进程内广播"""
+    
+    _subscriptions: Dict[str, set] = {}
+    _lock = threading.Lock()
+    
+    @classmethod
+    def publish(cls, name: str, message: Dict[str, Any]) -> None:
+        with cls._lock:
+            subscriptions = list(cls._subscriptions.get(name, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+    
+    @classmethod
+    def subscribe(cls, name: str) -> _LocalSubscription:
+        subscription = _LocalSubscription(cls, name)
+        with cls._lock:
+            cls._subscriptions.setdefault(name, set()).add(subscription)
+        return subscription
+    
+    @classmethod
+    def unsubscribe(cls, subscription: _LocalSubscription) -> None:
+        with cls._lock:
+            subscriptions = cls._subscriptions.get(subscription.name)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del cls._subscriptions[subscription.name]
+    
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._subscriptions.clear()
+
+class _RedisSubscription:
+    """Redis频道订阅，每个订阅占用一个Redis连接，关闭时归还"""
+    
+    def __init__(self, client, name: str):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(name)
+    
+    def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """等待下一条事件，超时返回None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            # 订阅确认等控制消息会让 get_message 提前返回None，继续等待到超时
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is not None and message['type'] == 'message':
+                return json.loads(message['data'])
+    
+    def close(self) -> None:
+        self.pubsub.close()
+
+class _RedisBroker:
+    """Redis发布/订阅"""
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def publish(self, name: str, message: Dict[str, Any]) -> None:
+        self.client.publish(name, json.dumps(message, ensure_ascii=False, default=_json_default))
+    
+    def subscribe(self, name: str) -> _RedisSubscription:
+        return _RedisSubscription(self.client, name)
+
+_redis_brokers: Dict[str, Any] = {}
+
+def _get_broker():
+    """配置了REDIS_URL时返回Redis广播，否则返回进程内广播"""
+    url = current_app.config.get('REDIS_URL') if has_app_context() else None
+    if not url:
+        return _LocalBroker
+    if url not in _redis_brokers:
+        try:
+            import redis
+            _redis_brokers[url] = _RedisBroker(redis.Redis.from_url(url, socket_connect_timeout=2))
+        except ImportError:
+            _redis_brokers[url] = None
+    return _redis_brokers[url] or _LocalBroker
+
+def publish(task_id, event_type: str, data: Dict[str, Any]) -> None:
+    """
+    发布任务事件
+    
+    推送只用于界面实时展示，发布失败只记录日志，不影响任务执行
+    """
+    if task_id is None:
+        return
+    try:
+        _get_broker().publish(channel(task_id), {'event': event_type, 'data': data})
+    except Exception as e:
+        logger.warning(f'任务事件发布失败: task={task_id} event={event_type} {e}')
+
+def subscribe(task_id):
+    """
+    订阅任务事件
+    
+    Returns:
+        订阅对象：get(timeout) 等待下一条事件（{'event': 类型, 'data': 数据}），超时返回None；
+        使用完毕后必须调用 close()
+    """
+    return _get_broker().subscribe(channel(task_id))
+
+def task_status(task) -> Dict[str, Any]:
+    """status事件的数据：只包含任务自身的列，不触发关联对象的懒加载"""
+    return {
+        'task_id': task.id,
+        'status': task.status.value if task.status else None,
+        'started_at': task.started_at.isoformat() if task.started_at else None,
+        'completed_at': task.completed_at.isoformat() if task.completed_at else None,
+        'duration': task.duration,
+        'retry_count': task.retry_count,
+        'result_message': task.result_message,
+        'error_message': task.error_message
+    }
+
+def format_sse(event_type: str, data: Dict[str, Any]) -> str:
+    """格式化为一条SSE消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=_json_default)
+    return f'event: {event_type}\ndata: {payload}\n\n'
+
+def iter_sse(subscription, snapshot: Dict[str, Any], heartbeat: float = DEFAULT_HEARTBEAT,
+             max_duration: float = DEFAULT_MAX_DURATION) -> Iterator[str]:
+    """
+    SSE消息流
+    
+    先发送订阅时的任务状态快照，之后逐条转发订阅到的事件，空闲时发送心跳注释
+    （保持代理连接并及时发现客户端断开）；任务结束或连接达到最长时间后关闭，退出时取消订阅。
+    EventSource 在连接关闭后自动重连并重新收到状态快照，不会漏掉状态变化
+    
+    Args:
+        subscription: subscribe() 返回的订阅对象（应在读取快照前订阅，避免漏掉两者之间的事件）
+        snapshot: 任务状态快照（task_status() 的结果，可附加其他字段）
+        heartbeat: 心跳间隔（秒）
+        max_duration: 连接最长时间（秒），0表示不限制
+    """
+    deadline = time.monotonic() + max_duration if max_duration else None
+    try:
+        yield format_sse(EVENT_STATUS, snapshot)
+        if snapshot.get('status') in TERMINAL_STATUSES:
+            return
+        
+        while True:
+            timeout = heartbeat
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                timeout = min(timeout, remaining)
+            
+            message = subscription.get(timeout=timeout)
+            if message is None:
+                yield ': keep-alive\n\n'
+                continue
+            
+            yield format_sse(message['event'], message['data'])
+            if message['event'] == EVENT_STATUS and message['data'].get('status') in TERMINAL_STATUSES:
+                return
+    finally:
+        subscription.close()
+
+def _collect_events(session) -> list:
+    """本次flush产生的事件：新写入的任务结果、新建或状态变化的任务"""
+    from app.models import Task, TaskResult
+    
+    events = []
+    for obj in session.new:
+        if isinstance(obj, TaskResult):
+            events.append((obj.task_id, EVENT_RESULT, dict(obj.to_dict(), device_id=obj.device_id)))
+        elif isinstance(obj, Task):
+            events.append((obj.id, EVENT_STATUS, task_status(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, Task) and inspect(obj).attrs.status.history.has_changes():
+            events.append((obj.id, EVENT_STATUS, task_status(obj)))
+    return events
+
+@event.listens_for(Session, 'after_flush')
+def _queue_task_events(session, flush_context):
+    events = _collect_events(session)
+    if events:
+        session.info.setdefault('task_events', []).extend(events)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_task_events(session):
+    # 提交后再发布，订阅者收到事件时数据已对其他连接可见
+    for task_id, event_type, data in session.info.pop('task_events', ()):
+        publish(task_id, event_type, data)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_task_events(session):
+    session.info.pop('task_events', None)
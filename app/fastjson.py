@@ -0,0 +1,24 @@
+"""
+JSON编解码
+安装了orjson时使用orjson（解析和序列化大的RESTCONF响应快数倍），否则使用标准库json
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data: Union[bytes, str]) -> Any:
+    """解析JSON（bytes或str）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any) -> str:
+    """序列化为紧凑的JSON字符串（不转义中文）"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
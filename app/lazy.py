@@ -0,0 +1,37 @@
+"""
+延迟导入
+netmiko、paramiko、requests 等库导入较慢，Web进程和worker启动时并不需要，
+lazy_import 返回的模块在第一次访问其属性时才真正执行导入
+"""
+
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Optional
+
+_lock = threading.Lock()
+
+def lazy_import(name: str) -> Optional[ModuleType]:
+    """
+    延迟导入模块，未安装时返回None（代替 try/except ImportError）
+    
+    已导入的模块直接返回；模块本身的导入错误在第一次使用时抛出
+    """
+    with _lock:
+        if name in sys.modules:
+            return sys.modules[name]
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            return None
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+
+def is_loaded(name: str) -> bool:
+    """模块是否已真正导入（延迟导入的模块在第一次使用前返回False）"""
+    module = sys.modules.get(name)
+    return module is not None and not isinstance(module, importlib.util._LazyModule)
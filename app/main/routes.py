@@ -2,31 +2,35 @@
 主页面路由
 """
 
-from flask import render_template, request, jsonify, current_app
+from flask import render_template, request, jsonify, current_app, abort, send_file
 from flask_login import login_required, current_user
+from app import profile_manager
 from app.main import bp
-from app.models import Device, Task, AuditLog, ConfigBackup
+from app.main.services import DashboardStatsService
+from app.models import Task, AuditLog
+from app.profiling import cprofile_report
 
 @bp.route('/')
 @bp.route('/index')
 @login_required
 def index():
     """首页/仪表板"""
-    # 获取统计数据
+    # 获取统计数据（缓存的分组聚合结果）
+    summary = DashboardStatsService.get_stats()
     stats = {
-        'total_devices': Device.query.count(),
-        'online_devices': Device.query.filter_by(status='online').count(),
-        'offline_devices': Device.query.filter_by(status='offline').count(),
-        'total_tasks': Task.query.count(),
-        'running_tasks': Task.query.filter_by(status='running').count(),
-        'recent_backups': ConfigBackup.query.order_by(ConfigBackup.created_at.desc()).limit(5).count()
+        'total_devices': summary['devices']['total'],
+        'online_devices': summary['devices']['online'],
+        'offline_devices': summary['devices']['offline'],
+        'total_tasks': summary['tasks']['total'],
+        'running_tasks': summary['tasks']['running'],
+        'recent_backups': min(summary['backups']['total'], 5)
     }
     
     # 获取最近的审计日志
-    recent_logs = AuditLog.query.order_by(AuditLog.created_at.desc()).limit(10).all()
+    recent_logs = AuditLog.list_query().order_by(AuditLog.created_at.desc()).limit(10).all()
     
     # 获取最近的任务
-    recent_tasks = Task.query.order_by(Task.created_at.desc()).limit(5).all()
+    recent_tasks = Task.list_query().order_by(Task.created_at.desc()).limit(5).all()
     
     return render_template('main/index.html', 
                          stats=stats, 
@@ -39,27 +43,110 @@ def dashboard():
     """仪表板页面"""
     return render_template('main/dashboard.html')
 
+@bp.route('/logs')
+@login_required
+def logs():
+    """系统日志页面：当前用户最近的操作记录"""
+    logs = AuditLog.list_query().filter(AuditLog.user_id == current_user.id) \
+        .order_by(AuditLog.created_at.desc()).limit(50).all()
+    return render_template('main/logs.html', logs=logs)
+
 @bp.route('/api/stats')
 @login_required
 def api_stats():
     """API: 获取统计数据"""
+    summary = DashboardStatsService.get_stats()
     stats = {
-        'devices': {
-            'total': Device.query.count(),
-            'online': Device.query.filter_by(status='online').count(),
-            'offline': Device.query.filter_by(status='offline').count(),
-            'unknown': Device.query.filter_by(status='unknown').count()
-        },
-        'tasks': {
-            'total': Task.query.count(),
-            'pending': Task.query.filter_by(status='pending').count(),
-            'running': Task.query.filter_by(status='running').count(),
-            'success': Task.query.filter_by(status='success').count(),
-            'failed': Task.query.filter_by(status='failed').count()
-        },
+        'devices': summary['devices'],
+        'tasks': summary['tasks'],
         'backups': {
-            'total': ConfigBackup.query.count(),
-            'recent': ConfigBackup.query.order_by(ConfigBackup.created_at.desc()).limit(10).count()
+            'total': summary['backups']['total'],
+            'recent': min(summary['backups']['total'], 10)
         }
     }
     return jsonify(stats)
+
+def _require_admin():
+    if not current_user.is_admin:
+        abort(403)
+
+@bp.route('/admin/profiling')
+@login_required
+def profiling():
+    """性能分析页面"""
+    _require_admin()
+    return render_template('main/profiling.html',
+                         settings=profile_manager.settings(),
+                         backend=profile_manager.backend,
+                         profiles=profile_manager.store.list())
+
+@bp.route('/admin/profiling/<profile_id>')
+@login_required
+def profiling_view(profile_id):
+    """查看分析结果：pyinstrument结果直接显示，cProfile结果显示文本报告"""
+    _require_admin()
+    path = profile_manager.store.path(profile_id)
+    if path is None:
+        abort(404)
+    if profile_id.endswith('.html'):
+        return send_file(path, mimetype='text/html')
+    return current_app.response_class(cprofile_report(path), mimetype='text/plain')
+
+@bp.route('/admin/profiling/<profile_id>/download')
+@login_required
+def profiling_download(profile_id):
+    """下载分析结果原始文件"""
+    _require_admin()
+    path = profile_manager.store.path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, as_attachment=True, download_name=profile_id)
+
+@bp.route('/api/admin/profiling', methods=['GET', 'PUT'])
+@login_required
+def api_profiling():
+    """API: 获取/修改性能分析设置（enabled、sample_rate、targets），reset=true 时恢复为配置项"""
+    _require_admin()
+    if request.method == 'GET':
+        return jsonify({
+            'settings': profile_manager.settings(),
+            'backend': profile_manager.backend,
+            'profiles': profile_manager.store.list()
+        })
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('reset'):
+        settings = profile_manager.reset_settings()
+    else:
+        targets = data.get('targets')
+        if isinstance(targets, str):
+            targets = targets.split(',')
+        if targets is not None and not (isinstance(targets, list) and all(isinstance(t, str) for t in targets)):
+            return jsonify({'error': 'targets 必须是列表或逗号分隔的字符串'}), 400
+        try:
+            sample_rate = float(data['sample_rate']) if data.get('sample_rate') is not None else None
+            settings = profile_manager.update_settings(
+                enabled=data.get('enabled'),
+                sample_rate=sample_rate,
+                targets=targets
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'无效的设置: {e}'}), 400
+    
+    AuditLog.log_action(
+        user=current_user,
+        action='update_profiling',
+        resource_type='system',
+        resource_name='profiling',
+        details=settings,
+        ip_address=request.remote_addr,
+        user_agent=request.headers.get('User-Agent')
+    )
+    return jsonify({'settings': settings, 'backend': profile_manager.backend})
+
+@bp.route('/api/admin/profiling/profiles', methods=['DELETE'])
+@login_required
+def api_profiling_clear():
+    """API: 删除全部分析结果"""
+    _require_admin()
+    return jsonify({'deleted': profile_manager.store.clear()})
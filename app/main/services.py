@@ -0,0 +1,157 @@
+"""
+仪表板统计服务
+每张表一条 GROUP BY status 聚合查询，结果短时缓存，任务/设备状态变化时失效
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Device, DeviceStatus, Task, TaskStatus, ConfigBackup
+
+# 默认缓存有效期（秒），可通过 STATS_CACHE_TTL 配置
+DEFAULT_STATS_CACHE_TTL = 5
+
+class StatsCache:
+    """统计结果缓存：配置了REDIS_URL时使用Redis在多进程间共享，否则使用进程内缓存"""
+    
+    KEY = 'netmanagerx:dashboard_stats'
+    
+    _local: Dict[str, Any] = {}
+    _lock = threading.Lock()
+    _redis_clients: Dict[str, Any] = {}
+    
+    @classmethod
+    def _get_redis(cls):
+        """获取Redis客户端，未配置或不可用时返回None"""
+        if not has_app_context():
+            return None
+        url = current_app.config.get('REDIS_URL')
+        if not url:
+            return None
+        if url not in cls._redis_clients:
+            try:
+                import redis
+                cls._redis_clients[url] = redis.Redis.from_url(url, socket_timeout=0.5)
+            except ImportError:
+                cls._redis_clients[url] = None
+        return cls._redis_clients[url]
+    
+    @classmethod
+    def get(cls) -> Optional[Dict[str, Any]]:
+        """读取未过期的缓存"""
+        client = cls._get_redis()
+        if client is not None:
+            try:
+                raw = client.get(cls.KEY)
+                return json.loads(raw) if raw else None
+            except Exception:
+                pass
+        
+        with cls._lock:
+            entry = cls._local.get(cls.KEY)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+        return None
+    
+    @classmethod
+    def set(cls, value: Dict[str, Any], ttl: float) -> None:
+        """写入缓存"""
+        client = cls._get_redis()
+        if client is not None:
+            try:
+                client.setex(cls.KEY, max(1, int(ttl)), json.dumps(value))
+                return
+            except Exception:
+                pass
+        
+        with cls._lock:
+            cls._local[cls.KEY] = (time.monotonic() + ttl, value)
+    
+    @classmethod
+    def clear(cls) -> None:
+        """清除缓存（Redis和进程内缓存都清除）"""
+        with cls._lock:
+            cls._local.pop(cls.KEY, None)
+        
+        client = cls._get_redis()
+        if client is not None:
+            try:
+                client.delete(cls.KEY)
+            except Exception:
+                pass
+
+class DashboardStatsService:
+    """仪表板统计服务"""
+    
+    @staticmethod
+    def count_by_status(model) -> Dict[str, int]:
+        """按状态分组计数（单条GROUP BY查询），返回 {状态值: 数量}，状态为空的记录计入None"""
+        rows = db.session.query(model.status, db.func.count(model.id)).group_by(model.status).all()
+        return {
+            (status.value if hasattr(status, 'value') else status): count
+            for status, count in rows
+        }
+    
+    @staticmethod
+    def compute_stats() -> Dict[str, Any]:
+        """直接查询数据库计算统计数据"""
+        device_counts = DashboardStatsService.count_by_status(Device)
+        task_counts = DashboardStatsService.count_by_status(Task)
+        
+        devices = {status.value: device_counts.get(status.value, 0) for status in DeviceStatus}
+        devices['total'] = sum(device_counts.values())
+        
+        tasks = {status.value: task_counts.get(status.value, 0) for status in TaskStatus}
+        tasks['total'] = sum(task_counts.values())
+        
+        return {
+            'devices': devices,
+            'tasks': tasks,
+            'backups': {
+                'total': db.session.query(db.func.count(ConfigBackup.id)).scalar()
+            }
+        }
+    
+    @staticmethod
+    def get_stats() -> Dict[str, Any]:
+        """获取统计数据（优先读取缓存）"""
+        stats = StatsCache.get()
+        if stats is None:
+            stats = DashboardStatsService.compute_stats()
+            StatsCache.set(stats, current_app.config.get('STATS_CACHE_TTL', DEFAULT_STATS_CACHE_TTL))
+        return stats
+    
+    @staticmethod
+    def invalidate() -> None:
+        """使统计缓存失效"""
+        StatsCache.clear()
+
+def _affects_stats(session) -> bool:
+    """判断本次flush是否改变了统计结果：新增/删除设备、任务、备份，或设备/任务状态变化"""
+    for obj in session.new | session.deleted:
+        if isinstance(obj, (Device, Task, ConfigBackup)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, (Device, Task)) and inspect(obj).attrs.status.history.has_changes():
+            return True
+    return False
+
+@event.listens_for(Session, 'after_flush')
+def _mark_stats_dirty(session, flush_context):
+    if _affects_stats(session):
+        session.info['stats_dirty'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_stats_on_commit(session):
+    if session.info.pop('stats_dirty', False):
+        DashboardStatsService.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stats_mark(session):
+    session.info.pop('stats_dirty', None)
@@ -0,0 +1,241 @@
+"""
+Prometheus指标
+设备连接/命令/模板渲染耗时、活动会话数、任务结果计数、Celery队列深度和数据库查询耗时；
+Web进程通过 /metrics 暴露，Celery worker主进程在 CELERY_METRICS_PORT 端口暴露。
+设置 PROMETHEUS_MULTIPROC_DIR 环境变量后使用多进程模式，gunicorn各worker、Celery各子进程的指标在抓取时汇总
+（该目录在服务启动前需清空，Web和worker使用不同的目录）
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from flask import Response, current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+        generate_latest, multiprocess, start_http_server
+    )
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    CONTENT_TYPE_LATEST = REGISTRY = CollectorRegistry = Counter = Gauge = Histogram = None
+    generate_latest = multiprocess = start_http_server = GaugeMetricFamily = None
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_WORKER_METRICS_PORT = 9808  # CELERY_METRICS_PORT：worker指标端口，0表示不启动
+
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# 设备交互耗时的桶（秒）
+DEVICE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RENDER_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+if Histogram is not None:
+    CONNECT_SECONDS = Histogram(
+        'netmanagerx_device_connect_seconds', '建立设备连接的耗时',
+        ['connection_type', 'device_type', 'result'], buckets=DEVICE_BUCKETS
+    )
+    COMMAND_SECONDS = Histogram(
+        'netmanagerx_device_command_seconds', '设备命令/配置下发/RESTCONF请求的耗时',
+        ['connection_type', 'device_type'], buckets=DEVICE_BUCKETS
+    )
+    RENDER_SECONDS = Histogram(
+        'netmanagerx_template_render_seconds', '配置模板渲染耗时',
+        ['category'], buckets=RENDER_BUCKETS
+    )
+    ACTIVE_SESSIONS = Gauge(
+        'netmanagerx_device_sessions_active', '当前打开的设备连接数',
+        ['connection_type'], multiprocess_mode='livesum'
+    )
+    TASK_OUTCOMES = Counter(
+        'netmanagerx_task_outcomes_total', '结束的任务数', ['task_type', 'status']
+    )
+    DB_QUERY_SECONDS = Histogram(
+        'netmanagerx_db_query_seconds', '数据库语句执行耗时', ['operation'], buckets=DB_BUCKETS
+    )
+
+def _device_labels(device):
+    """设备的 (连接类型, 设备类型) 标签"""
+    connection_type = device.connection_type.value if device.connection_type else 'unknown'
+    device_type = device.device_type.value if device.device_type else 'unknown'
+    return connection_type, device_type
+
+def observe_connect(device, seconds: float, success: bool) -> None:
+    if Histogram is None:
+        return
+    CONNECT_SECONDS.labels(*_device_labels(device), 'success' if success else 'failure').observe(seconds)
+
+def observe_command(device, seconds: Optional[float]) -> None:
+    if Histogram is None or seconds is None:
+        return
+    COMMAND_SECONDS.labels(*_device_labels(device)).observe(seconds)
+
+@contextmanager
+def command_timer(device):
+    """记录范围内的耗时为一次设备命令"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_command(device, time.perf_counter() - start)
+
+def observe_render(category: Optional[str], seconds: float) -> None:
+    if Histogram is None:
+        return
+    RENDER_SECONDS.labels(category or 'unknown').observe(seconds)
+
+def session_opened(device) -> None:
+    if Gauge is None:
+        return
+    ACTIVE_SESSIONS.labels(_device_labels(device)[0]).inc()
+
+def session_closed(device) -> None:
+    if Gauge is None:
+        return
+    ACTIVE_SESSIONS.labels(_device_labels(device)[0]).dec()
+
+def record_task_outcome(task) -> None:
+    """任务结束（成功、失败、取消）时计数"""
+    if Counter is None or task.status is None:
+        return
+    task_type = task.task_type.value if task.task_type else 'unknown'
+    TASK_OUTCOMES.labels(task_type, task.status.value).inc()
+
+def _statement_operation(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ''
+    return keyword if keyword in ('select', 'insert', 'update', 'delete') else 'other'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start_time')
+    if starts:
+        DB_QUERY_SECONDS.labels(_statement_operation(statement)).observe(time.perf_counter() - starts.pop())
+
+def _install_query_hooks() -> None:
+    """在所有数据库引擎上统计语句耗时（只安装一次）"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get(MULTIPROC_DIR_ENV))
+
+def collection_registry():
+    """抓取时使用的注册表：多进程模式下汇总目录中各进程的指标"""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+class QueueDepthCollector:
+    """抓取时读取Redis中各Celery队列的消息数（含各优先级子队列）"""
+    
+    def __init__(self, broker_url: str):
+        self.broker_url = broker_url
+        self._client = None
+    
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.broker_url, socket_timeout=1)
+        return self._client
+    
+    def collect(self):
+        from app.tasks.routing import MAX_PRIORITY, TASK_QUEUES
+        
+        gauge = GaugeMetricFamily('netmanagerx_celery_queue_depth', 'Celery队列中等待执行的消息数', labels=['queue'])
+        try:
+            client = self._redis()
+            for queue in TASK_QUEUES:
+                # kombu的Redis优先级实现：优先级0使用队列名，其他优先级使用 "队列名:优先级"
+                keys = [queue.name] + [f'{queue.name}:{step}' for step in range(1, MAX_PRIORITY + 1)]
+                pipeline = client.pipeline()
+                for key in keys:
+                    pipeline.llen(key)
+                gauge.add_metric([queue.name], sum(pipeline.execute()))
+        except Exception as e:
+            logger.warning(f'读取Celery队列深度失败: {e}')
+            return
+        yield gauge
+
+_queue_collectors: Dict[str, QueueDepthCollector] = {}
+
+def queue_collector(broker_url: Optional[str]) -> Optional[QueueDepthCollector]:
+    """broker为Redis时返回该broker的队列深度收集器（按URL复用），否则返回None"""
+    if not broker_url or not broker_url.startswith(('redis://', 'rediss://')):
+        return None
+    if broker_url not in _queue_collectors:
+        _queue_collectors[broker_url] = QueueDepthCollector(broker_url)
+    return _queue_collectors[broker_url]
+
+class MetricsExporter:
+    """
+    Prometheus指标扩展
+    
+    - 未安装prometheus_client或 METRICS_ENABLED=False 时不注册 /metrics，埋点函数不做任何事
+    - /metrics 不需要登录，部署时应只允许Prometheus所在网段访问
+    - 是否启用按应用记录在 app.extensions 中，队列深度读取当前应用配置的broker
+    """
+    
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        if Histogram is None or not app.config.get('METRICS_ENABLED', True):
+            return
+        
+        _install_query_hooks()
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.extensions['metrics'] = self
+    
+    @property
+    def enabled(self) -> bool:
+        """当前应用是否启用指标"""
+        return has_app_context() and current_app.extensions.get('metrics') is self
+    
+    def metrics_view(self):
+        """Prometheus抓取接口"""
+        output = generate_latest(collection_registry())
+        collector = queue_collector(current_app.config.get('CELERY_BROKER_URL'))
+        if collector is not None:
+            # 队列深度是全局值，不写入多进程文件，每次抓取时单独读取
+            registry = CollectorRegistry()
+            registry.register(collector)
+            output += generate_latest(registry)
+        return Response(output, mimetype=CONTENT_TYPE_LATEST)
+    
+    def start_worker_exporter(self, port: int) -> bool:
+        """Celery worker主进程启动指标HTTP端口，返回是否启动"""
+        if Histogram is None or not port:
+            return False
+        _install_query_hooks()
+        start_http_server(port, registry=collection_registry())
+        logger.info(f'worker指标端口已启动: {port}')
+        return True
+
+def clear_multiproc_dir() -> None:
+    """服务启动前清空多进程指标目录（上次运行遗留的文件会被当作现有进程的指标汇总）"""
+    path = os.environ.get(MULTIPROC_DIR_ENV)
+    if not path:
+        return
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith('.db'):
+            os.remove(os.path.join(path, name))
+
+def mark_process_dead(pid: int) -> None:
+    """多进程模式下清理已退出进程的实时指标（gunicorn child_exit、Celery worker子进程退出时调用）"""
+    if multiprocess is not None and multiprocess_enabled():
+        multiprocess.mark_process_dead(pid)
@@ -4,11 +4,20 @@
 """
 
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from app import db
 
 class ConfigBackup(db.Model):
     """配置备份模型"""
     __tablename__ = 'config_backups'
+    __table_args__ = (
+        # 设备备份历史
+        db.Index('ix_config_backups_device_id_created_at', 'device_id', 'created_at'),
+        # 设备当前配置（部分索引，只包含 is_current 为真的行）
+        db.Index('ix_config_backups_device_id_current', 'device_id',
+                 postgresql_where=db.text('is_current'),
+                 sqlite_where=db.text('is_current = 1')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
@@ -37,6 +46,17 @@ class ConfigBackup(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'))  # 关联的任务
     
+    # 关系
+    user = db.relationship('User')
+    
+    @staticmethod
+    def list_query():
+        """列表查询：预加载设备和用户，避免to_dict逐行懒加载"""
+        return ConfigBackup.query.options(
+            joinedload(ConfigBackup.device),
+            joinedload(ConfigBackup.user)
+        )
+    
     def get_device_info(self):
         """获取设备信息快照"""
         if not self.device_info:
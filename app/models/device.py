@@ -5,6 +5,7 @@
 
 from datetime import datetime
 from enum import Enum
+from sqlalchemy.orm import joinedload
 from app import db
 
 class DeviceType(Enum):
@@ -35,22 +36,39 @@ class DeviceGroup(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.Text)
+    color = db.Column(db.String(20), default='#007bff')  # 页面显示颜色
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 关系
     devices = db.relationship('Device', backref='group', lazy='dynamic')
+    tasks = db.relationship('Task', backref='group', lazy='dynamic')
     
-    def to_dict(self):
-        """转换为字典格式"""
+    def to_dict(self, device_count=None):
+        """
+        转换为字典格式
+        
+        Args:
+            device_count: 预先统计的设备数量，列表接口应通过count_devices_by_group()
+                          一次性统计后传入，避免每个分组单独COUNT
+        """
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'device_count': self.devices.count(),
+            'color': self.color,
+            'device_count': device_count if device_count is not None else self.devices.count(),
             'created_at': self.created_at.isoformat()
         }
     
+    @staticmethod
+    def count_devices_by_group():
+        """按分组统计设备数量（单条GROUP BY查询）"""
+        rows = db.session.query(Device.group_id, db.func.count(Device.id)).filter(
+            Device.group_id.isnot(None)
+        ).group_by(Device.group_id).all()
+        return {group_id: count for group_id, count in rows}
+    
     def __repr__(self):
         return f'<DeviceGroup {self.name}>'
 
@@ -75,68 +93,72 @@ class Device(db.Model):
     model = db.Column(db.String(100))
     serial_number = db.Column(db.String(100))
     software_version = db.Column(db.String(100))
-    status = db.Column(db.Enum(DeviceStatus), default=DeviceStatus.UNKNOWN)
+    facts = db.Column(db.Text)  # JSON格式的设备信息（show version/show inventory 或RESTCONF清单的解析结果）
+    facts_updated_at = db.Column(db.DateTime, index=True)  # 设备信息采集时间，超过 DEVICE_FACTS_MAX_AGE 时重新采集
+    status = db.Column(db.Enum(DeviceStatus), default=DeviceStatus.UNKNOWN, index=True)
     last_checked = db.Column(db.DateTime)
     last_config_backup = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    max_sessions = db.Column(db.Integer)  # 允许的并发会话数，为空时使用 DEVICE_SESSION_LIMIT
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 外键
-    group_id = db.Column(db.Integer, db.ForeignKey('device_groups.id'))
+    group_id = db.Column(db.Integer, db.ForeignKey('device_groups.id'), index=True)
     
     # 关系
     connections = db.relationship('DeviceConnection', backref='device', lazy='dynamic')
     tasks = db.relationship('Task', backref='device', lazy='dynamic')
     config_backups = db.relationship('ConfigBackup', backref='device', lazy='dynamic')
+    inventory = db.relationship('DeviceInventory', backref='device', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
         """设置密码（加密存储）"""
-        from cryptography.fernet import Fernet
-        from app import current_app
+        from app import credential_vault
         
-        key = current_app.config['SECRET_KEY'].encode()[:32].ljust(32, b'0')
-        cipher = Fernet(Fernet.generate_key())
-        self.password_encrypted = cipher.encrypt(password.encode()).decode()
+        self.password_encrypted = credential_vault.encrypt(password)
     
     def get_password(self):
-        """获取密码（解密）"""
-        if not self.password_encrypted:
-            return None
-        
-        from cryptography.fernet import Fernet
-        from app import current_app
+        """获取密码（解密，结果短时缓存）"""
+        from app import credential_vault
         
+        return credential_vault.decrypt(self.password_encrypted, self.id)
+    
+    def get_facts(self):
+        """获取设备信息"""
+        if not self.facts:
+            return {}
+        from app import fastjson
         try:
-            key = current_app.config['SECRET_KEY'].encode()[:32].ljust(32, b'0')
-            cipher = Fernet(Fernet.generate_key())
-            return cipher.decrypt(self.password_encrypted.encode()).decode()
-        except:
-            return None
+            return fastjson.loads(self.facts)
+        except ValueError:
+            return {}
+    
+    def set_facts(self, facts):
+        """设置设备信息（同时更新型号、序列号等字段和采集时间）"""
+        from app import fastjson
+        self.facts = fastjson.dumps(facts)
+        self.facts_updated_at = datetime.utcnow()
+        for field in ('hostname', 'model', 'serial_number', 'software_version'):
+            if facts.get(field):
+                setattr(self, field, facts[field])
     
     def set_enable_password(self, password):
         """设置enable密码（加密存储）"""
-        from cryptography.fernet import Fernet
-        from app import current_app
+        from app import credential_vault
         
-        key = current_app.config['SECRET_KEY'].encode()[:32].ljust(32, b'0')
-        cipher = Fernet(Fernet.generate_key())
-        self.enable_password_encrypted = cipher.encrypt(password.encode()).decode()
+        self.enable_password_encrypted = credential_vault.encrypt(password)
     
     def get_enable_password(self):
-        """获取enable密码（解密）"""
-        if not self.enable_password_encrypted:
-            return None
+        """获取enable密码（解密，结果短时缓存）"""
+        from app import credential_vault
         
-        from cryptography.fernet import Fernet
-        from app import current_app
-        
-        try:
-            key = current_app.config['SECRET_KEY'].encode()[:32].ljust(32, b'0')
-            cipher = Fernet(Fernet.generate_key())
-            return cipher.decrypt(self.enable_password_encrypted.encode()).decode()
-        except:
-            return None
+        return credential_vault.decrypt(self.enable_password_encrypted, self.id)
+    
+    @staticmethod
+    def list_query():
+        """列表查询：预加载设备组，避免to_dict逐行懒加载"""
+        return Device.query.options(joinedload(Device.group))
     
     def update_status(self, status):
         """更新设备状态"""
@@ -162,10 +184,12 @@ class Device(db.Model):
             'model': self.model,
             'serial_number': self.serial_number,
             'software_version': self.software_version,
+            'facts_updated_at': self.facts_updated_at.isoformat() if self.facts_updated_at else None,
             'status': self.status.value if self.status else None,
             'last_checked': self.last_checked.isoformat() if self.last_checked else None,
             'last_config_backup': self.last_config_backup.isoformat() if self.last_config_backup else None,
             'is_active': self.is_active,
+            'max_sessions': self.max_sessions,
             'group_name': self.group.name if self.group else None,
             'created_at': self.created_at.isoformat()
         }
@@ -183,6 +207,9 @@ class Device(db.Model):
 class DeviceConnection(db.Model):
     """设备连接记录模型"""
     __tablename__ = 'device_connections'
+    __table_args__ = (
+        db.Index('ix_device_connections_device_id_status', 'device_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     connected_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -221,3 +248,54 @@ class DeviceConnection(db.Model):
     
     def __repr__(self):
         return f'<DeviceConnection {self.device.name} ({self.status})>'
+
+class DeviceInventory(db.Model):
+    """设备清单数据（RESTCONF采集的YANG子树，每台设备每个采集项一行，重新采集时覆盖）"""
+    __tablename__ = 'device_inventory'
+    __table_args__ = (
+        db.UniqueConstraint('device_id', 'name', name='uq_device_inventory_device_id_name'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # 采集项名称，如 interfaces
+    path = db.Column(db.String(255), nullable=False)  # RESTCONF路径
+    data = db.Column(db.Text)  # JSON格式的采集结果
+    size = db.Column(db.Integer)  # 响应大小（字节）
+    duration = db.Column(db.Float)  # 请求耗时（秒）
+    collected_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    # 外键
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), nullable=False)
+    
+    def get_data(self):
+        """获取采集结果"""
+        if not self.data:
+            return {}
+        from app import fastjson
+        try:
+            return fastjson.loads(self.data)
+        except ValueError:
+            return {}
+    
+    def set_data(self, data):
+        """设置采集结果"""
+        from app import fastjson
+        self.data = fastjson.dumps(data) if data is not None else None
+    
+    def to_dict(self, include_data=True):
+        """转换为字典格式"""
+        data = {
+            'id': self.id,
+            'device_id': self.device_id,
+            'name': self.name,
+            'path': self.path,
+            'size': self.size,
+            'duration': self.duration,
+            'collected_at': self.collected_at.isoformat() if self.collected_at else None
+        }
+        if include_data:
+            data['data'] = self.get_data()
+        return data
+    
+    def __repr__(self):
+        return f'<DeviceInventory {self.device_id} {self.name}>'
@@ -5,7 +5,10 @@
 
 from datetime import datetime
 from enum import Enum
+from sqlalchemy.orm import joinedload
 from app import db
+from app.cancellation import request_cancel, clear_cancel
+from app.metrics import record_task_outcome
 
 class TaskStatus(Enum):
     """任务状态枚举"""
@@ -28,12 +31,16 @@ class TaskType(Enum):
 class Task(db.Model):
     """任务模型"""
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # 按状态过滤并按创建时间排序（列表、统计）
+        db.Index('ix_tasks_status_created_at', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
     description = db.Column(db.Text)
     task_type = db.Column(db.Enum(TaskType), nullable=False, index=True)
-    status = db.Column(db.Enum(TaskStatus), default=TaskStatus.PENDING, index=True)
+    status = db.Column(db.Enum(TaskStatus), default=TaskStatus.PENDING)
     priority = db.Column(db.Integer, default=0)  # 优先级，数字越大优先级越高
     
     # 任务配置
@@ -58,14 +65,25 @@ class Task(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # 外键
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    device_id = db.Column(db.Integer, db.ForeignKey('devices.id'), index=True)
     template_id = db.Column(db.Integer, db.ForeignKey('config_templates.id'))
+    group_id = db.Column(db.Integer, db.ForeignKey('device_groups.id'), index=True)  # 按设备组执行的批量任务
     
     # 关系
     results = db.relationship('TaskResult', backref='task', lazy='dynamic', cascade='all, delete-orphan')
     audit_logs = db.relationship('AuditLog', backref='task', lazy='dynamic')
     
+    @staticmethod
+    def list_query():
+        """列表查询：预加载用户、设备和模板，避免to_dict逐行懒加载"""
+        return Task.query.options(
+            joinedload(Task.user),
+            joinedload(Task.device),
+            joinedload(Task.template),
+            joinedload(Task.group)
+        )
+    
     def start(self):
         """开始执行任务"""
         self.status = TaskStatus.RUNNING
@@ -74,7 +92,10 @@ class Task(db.Model):
         db.session.commit()
     
     def complete(self, success=True, message='', error=''):
-        """完成任务"""
+        """完成任务（执行期间已被取消的任务保持取消状态）"""
+        if self.id is not None and self.is_cancelled():
+            return
+        
         self.status = TaskStatus.SUCCESS if success else TaskStatus.FAILED
         self.completed_at = datetime.utcnow()
         self.result_message = message
@@ -85,6 +106,7 @@ class Task(db.Model):
         
         db.session.add(self)
         db.session.commit()
+        record_task_outcome(self)
     
     def cancel(self, reason=''):
         """取消任务"""
@@ -97,6 +119,15 @@ class Task(db.Model):
         
         db.session.add(self)
         db.session.commit()
+        record_task_outcome(self)
+        
+        # 通知执行中的任务停止（见 app.cancellation）
+        request_cancel(self.id)
+    
+    def is_cancelled(self):
+        """数据库中的任务是否已被取消（执行任务的进程中对象状态可能已过期，只查询状态列）"""
+        status = db.session.query(Task.status).filter(Task.id == self.id).scalar()
+        return status == TaskStatus.CANCELLED
     
     def retry(self):
         """重试任务"""
@@ -112,6 +143,21 @@ class Task(db.Model):
             return True
         return False
     
+    def reset(self):
+        """重置为待执行状态：清空执行时间、结果消息和设备执行结果，不计入重试次数"""
+        self.status = TaskStatus.PENDING
+        self.started_at = None
+        self.completed_at = None
+        self.duration = None
+        self.result_message = None
+        self.error_message = None
+        self.results.delete(synchronize_session=False)
+        db.session.add(self)
+        db.session.commit()
+        
+        # 已取消任务的Redis取消标记会让重新执行的任务立即停止
+        clear_cancel(self.id)
+    
     def get_metadata(self):
         """获取元数据"""
         if not self.task_metadata:
@@ -160,6 +206,7 @@ class Task(db.Model):
             'user_name': self.user.username if self.user else None,
             'device_name': self.device.name if self.device else None,
             'template_name': self.template.name if self.template else None,
+            'group_name': self.group.name if self.group else None,
             'created_at': self.created_at.isoformat()
         }
         
@@ -181,6 +228,9 @@ class Task(db.Model):
 class TaskResult(db.Model):
     """任务结果模型"""
     __tablename__ = 'task_results'
+    __table_args__ = (
+        db.Index('ix_task_results_task_id_created_at', 'task_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     device_name = db.Column(db.String(100), nullable=False, index=True)
@@ -190,16 +240,37 @@ class TaskResult(db.Model):
     error = db.Column(db.Text)   # 错误输出
     exit_code = db.Column(db.Integer, default=0)  # 退出代码
     execution_time = db.Column(db.Float)  # 执行时间（秒）
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    phase_timings = db.Column(db.Text)  # 分阶段耗时（JSON格式，见 app.timing）
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # 分区键
     
     # 外键
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False)
     device_id = db.Column(db.Integer, db.ForeignKey('devices.id'))
     
+    # 关系
+    device = db.relationship('Device')
+    
     def is_success(self):
         """判断是否执行成功"""
         return self.exit_code == 0 and not self.error
     
+    def get_phase_timings(self):
+        """获取分阶段耗时"""
+        if not self.phase_timings:
+            return {}
+        try:
+            import json
+            return json.loads(self.phase_timings)
+        except:
+            return {}
+    
+    def set_phase_timings(self, timings):
+        """设置分阶段耗时（字典或 PhaseTimings）"""
+        import json
+        if hasattr(timings, 'to_dict'):
+            timings = timings.to_dict()
+        self.phase_timings = json.dumps(timings, separators=(',', ':')) if timings else None
+    
     def to_dict(self):
         """转换为字典格式"""
         return {
@@ -211,6 +282,7 @@ class TaskResult(db.Model):
             'error': self.error,
             'exit_code': self.exit_code,
             'execution_time': self.execution_time,
+            'phase_timings': self.get_phase_timings(),
             'success': self.is_success(),
             'created_at': self.created_at.isoformat()
         }
@@ -221,10 +293,16 @@ class TaskResult(db.Model):
 class AuditLog(db.Model):
     """审计日志模型"""
     __tablename__ = 'audit_logs'
+    __table_args__ = (
+        # 按资源查询操作历史
+        db.Index('ix_audit_logs_resource_created_at', 'resource_type', 'resource_id', 'created_at'),
+        # 按任务查询任务日志
+        db.Index('ix_audit_logs_task_id_created_at', 'task_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.String(100), nullable=False, index=True)  # 操作类型
-    resource_type = db.Column(db.String(50), nullable=False, index=True)  # 资源类型
+    resource_type = db.Column(db.String(50), nullable=False)  # 资源类型
     resource_id = db.Column(db.Integer, index=True)  # 资源ID
     resource_name = db.Column(db.String(200), index=True)  # 资源名称
     
@@ -238,12 +316,20 @@ class AuditLog(db.Model):
     error_message = db.Column(db.Text)  # 错误信息
     
     # 时间戳
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # 分区键
     
     # 外键
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'))
     
+    @staticmethod
+    def list_query():
+        """列表查询：预加载用户和任务，避免to_dict逐行懒加载"""
+        return AuditLog.query.options(
+            joinedload(AuditLog.user),
+            joinedload(AuditLog.task)
+        )
+    
     def get_details(self):
         """获取操作详情"""
         if not self.details:
@@ -281,12 +367,37 @@ class AuditLog(db.Model):
         return f'<AuditLog {self.action} by {self.user.username if self.user else "unknown"}>'
 
     @staticmethod
-    def log_action(user, action, resource_type=None, resource_id=None, 
+    def log_action(user=None, action=None, resource_type=None, resource_id=None, 
                    resource_name=None, details=None, ip_address=None, 
-                   user_agent=None, success=True, error_message=None, task=None):
-        """记录审计日志"""
+                   user_agent=None, success=True, error_message=None, task=None,
+                   user_id=None):
+        """
+        记录审计日志
+        
+        启用异步写入（AUDIT_LOG_ASYNC）时，记录放入后台写入队列并返回None，
+        不会提交调用方的会话；否则同步写入并返回AuditLog对象
+        """
+        from app import audit_writer
+        
+        if audit_writer.enabled:
+            import json
+            audit_writer.submit({
+                'action': action,
+                'resource_type': resource_type,
+                'resource_id': resource_id,
+                'resource_name': resource_name,
+                'details': json.dumps(details) if details else None,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                'success': success,
+                'error_message': error_message,
+                'created_at': datetime.utcnow(),
+                'user_id': user.id if user is not None else user_id,
+                'task_id': task.id if task is not None else None
+            })
+            return None
+        
         log = AuditLog(
-            user=user,
             action=action,
             resource_type=resource_type,
             resource_id=resource_id,
@@ -297,6 +408,10 @@ class AuditLog(db.Model):
             error_message=error_message,
             task=task
         )
+        if user is not None:
+            log.user = user
+        else:
+            log.user_id = user_id
         
         if details:
             log.set_details(details)
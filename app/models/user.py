@@ -7,7 +7,7 @@ from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from app import db, login_manager
 
 class Role(db.Model):
     """用户角色模型"""
@@ -189,3 +189,8 @@ class User(UserMixin, db.Model):
             db.session.commit()
         
         return admin_user
+
+@login_manager.user_loader
+def load_user(user_id):
+    """按会话中的用户ID加载当前用户（所有入口共用，导入模型时注册）"""
+    return db.session.get(User, int(user_id))
@@ -0,0 +1,302 @@
+"""
+审计日志与任务结果的按月分区及归档
+PostgreSQL使用按 created_at 的原生RANGE分区（每月一个分区）；
+SQLite等不支持分区的数据库，归档时先将过期月份的数据移入滚动表，再与分区一样归档并删除
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import DateTime, MetaData, Table, bindparam, inspect, text
+from sqlalchemy import types as sqltypes
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# 按月分区的表
+PARTITIONED_TABLES = ('audit_logs', 'task_results')
+
+# 默认参数，可通过配置覆盖
+DEFAULT_RETENTION_MONTHS = 6    # PARTITION_RETENTION_MONTHS：在线保留的月数
+DEFAULT_MONTHS_AHEAD = 2        # PARTITION_MONTHS_AHEAD：提前创建的分区月数
+DEFAULT_ARCHIVE_DIR = 'archive' # ARCHIVE_DIR
+DEFAULT_ARCHIVE_FORMAT = 'jsonl'  # ARCHIVE_FORMAT：jsonl 或 parquet
+ARCHIVE_FORMATS = ('jsonl', 'parquet')
+ARCHIVE_BATCH_SIZE = 5000
+
+PARTITION_PATTERN = re.compile(r'^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$')
+
+def month_start(value: datetime) -> datetime:
+    """所在月份的第一天零点"""
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def add_months(value: datetime, months: int) -> datetime:
+    """月份加减（结果为当月第一天）"""
+    years, month_index = divmod(value.month - 1 + months, 12)
+    return value.replace(year=value.year + years, month=month_index + 1, day=1)
+
+def partition_name(table: str, start: datetime) -> str:
+    """分区（或滚动表）名称，如 audit_logs_y2024m01"""
+    return f'{table}_y{start.year:04d}m{start.month:02d}'
+
+def _range_sql(sql: str):
+    """带 :start/:end 时间参数的SQL（按DateTime类型绑定，与ORM写入的格式一致）"""
+    return text(sql).bindparams(bindparam('start', type_=DateTime), bindparam('end', type_=DateTime))
+
+def parse_partition_name(name: str):
+    """解析分区名称，返回 (表名, 月份起始时间)，不匹配时返回None"""
+    match = PARTITION_PATTERN.match(name)
+    if not match:
+        return None
+    return match.group('table'), datetime(int(match.group('year')), int(match.group('month')), 1)
+
+class PartitionManager:
+    """分区维护与归档服务"""
+    
+    @staticmethod
+    def is_native(conn, table: str) -> bool:
+        """表是否为PostgreSQL原生分区表"""
+        if conn.dialect.name != 'postgresql':
+            return False
+        return conn.execute(text(
+            'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+            'WHERE c.relname = :table'
+        ), {'table': table}).first() is not None
+    
+    @staticmethod
+    def list_partitions(conn, table: str) -> List[str]:
+        """已挂载的按月分区名称（不含默认分区）"""
+        rows = conn.execute(text(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            'WHERE parent.relname = :table'
+        ), {'table': table}).scalars().all()
+        return sorted(name for name in rows if parse_partition_name(name))
+    
+    @staticmethod
+    def default_partition(conn, table: str) -> Optional[str]:
+        """已挂载的默认分区名称，没有时返回None"""
+        return conn.execute(text(
+            'SELECT child.relname FROM pg_inherits i '
+            'JOIN pg_class parent ON parent.oid = i.inhparent '
+            'JOIN pg_class child ON child.oid = i.inhrelid '
+            "WHERE parent.relname = :table AND pg_get_expr(child.relpartbound, child.oid) = 'DEFAULT'"
+        ), {'table': table}).scalar()
+    
+    @staticmethod
+    def create_partition(conn, table: str, start: datetime, default: Optional[str] = None) -> str:
+        """
+        创建 start 所在月份的分区，返回分区名称
+        
+        默认分区中已有该月数据时 CREATE TABLE ... PARTITION OF 会失败：先分离默认分区，
+        创建分区后将该月数据移入，再重新挂载默认分区（同一事务内完成）
+        """
+        name = partition_name(table, start)
+        bounds = {'start': start, 'end': add_months(start, 1)}
+        has_rows = default is not None and conn.execute(
+            _range_sql(f'SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1'),
+            bounds
+        ).first() is not None
+        
+        if has_rows:
+            conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {default}'))
+        conn.execute(text(
+            f"CREATE TABLE {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{add_months(start, 1).isoformat()}')"
+        ))
+        if has_rows:
+            conn.execute(_range_sql(
+                f'INSERT INTO {name} SELECT * FROM {default} WHERE created_at >= :start AND created_at < :end'
+            ), bounds)
+            conn.execute(_range_sql(f'DELETE FROM {default} WHERE created_at >= :start AND created_at < :end'), bounds)
+            conn.execute(text(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT'))
+            logger.info(f'已将默认分区 {default} 中的数据移入 {name}')
+        return name
+    
+    @staticmethod
+    def ensure_partitions(months_ahead: Optional[int] = None, now: Optional[datetime] = None) -> List[str]:
+        """为原生分区表创建当月及之后若干个月的分区，返回新建的分区名称"""
+        if months_ahead is None:
+            months_ahead = current_app.config.get('PARTITION_MONTHS_AHEAD', DEFAULT_MONTHS_AHEAD)
+        current = month_start(now or datetime.utcnow())
+        
+        created = []
+        with db.engine.begin() as conn:
+            for table in PARTITIONED_TABLES:
+                if not PartitionManager.is_native(conn, table):
+                    continue
+                existing = set(PartitionManager.list_partitions(conn, table))
+                default = PartitionManager.default_partition(conn, table)
+                for offset in range(months_ahead + 1):
+                    start = add_months(current, offset)
+                    if partition_name(table, start) in existing:
+                        continue
+                    created.append(PartitionManager.create_partition(conn, table, start, default))
+        return created
+    
+    @staticmethod
+    def expired_partitions(conn, table: str, cutoff: datetime) -> List[str]:
+        """
+        早于 cutoff 的月份对应的分区（或滚动表）名称
+        
+        原生分区表取已挂载的分区；其他数据库按在线表中最早的数据逐月计算
+        """
+        if PartitionManager.is_native(conn, table):
+            return [
+                name for name in PartitionManager.list_partitions(conn, table)
+                if parse_partition_name(name)[1] < cutoff
+            ]
+        
+        oldest = conn.execute(
+            _range_sql(f'SELECT MIN(created_at) FROM {table} WHERE created_at >= :start AND created_at < :end'),
+            {'start': datetime.min, 'end': cutoff}
+        ).scalar()
+        if oldest is None:
+            return []
+        if isinstance(oldest, str):
+            oldest = datetime.fromisoformat(oldest)
+        
+        names = []
+        start = month_start(oldest)
+        while start < cutoff:
+            end = add_months(start, 1)
+            has_rows = conn.execute(
+                _range_sql(f'SELECT 1 FROM {table} WHERE created_at >= :start AND created_at < :end LIMIT 1'),
+                {'start': start, 'end': end}
+            ).first()
+            if has_rows:
+                names.append(partition_name(table, start))
+            start = end
+        return names
+    
+    @staticmethod
+    def detach(conn, table: str, name: str) -> None:
+        """
+        将分区从在线表中分离
+        
+        原生分区表执行 DETACH PARTITION；其他数据库将该月数据移入同名滚动表
+        """
+        if PartitionManager.is_native(conn, table):
+            conn.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+            return
+        
+        start = parse_partition_name(name)[1]
+        bounds = {'start': start, 'end': add_months(start, 1)}
+        if not inspect(conn).has_table(name):
+            conn.execute(text(f'CREATE TABLE {name} AS SELECT * FROM {table} WHERE 1 = 0'))
+        conn.execute(_range_sql(
+            f'INSERT INTO {name} SELECT * FROM {table} WHERE created_at >= :start AND created_at < :end'
+        ), bounds)
+        conn.execute(_range_sql(f'DELETE FROM {table} WHERE created_at >= :start AND created_at < :end'), bounds)
+    
+    @staticmethod
+    def archive_table(conn, name: str, archive_dir: str, fmt: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+        """将分离出的分区/滚动表流式写入压缩归档文件，然后删除该表，返回文件路径"""
+        parsed = parse_partition_name(name)
+        table_dir = os.path.join(archive_dir, parsed[0] if parsed else 'misc')
+        os.makedirs(table_dir, exist_ok=True)
+        
+        columns = Table(name, MetaData(), autoload_with=conn).columns
+        result = conn.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(
+            text(f'SELECT * FROM {name}')
+        )
+        
+        if fmt == 'parquet':
+            path = os.path.join(table_dir, f'{name}.parquet')
+            _write_parquet(result, columns, path + '.tmp')
+        elif fmt == 'jsonl':
+            path = os.path.join(table_dir, f'{name}.jsonl.gz')
+            _write_jsonl(result, path + '.tmp')
+        else:
+            raise ValueError(f'不支持的归档格式: {fmt}')
+        
+        os.replace(path + '.tmp', path)
+        conn.execute(text(f'DROP TABLE {name}'))
+        return path
+    
+    @staticmethod
+    def archive_expired(retention_months: Optional[int] = None, archive_dir: Optional[str] = None,
+                        fmt: Optional[str] = None, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """
+        归档超过保留期的月份
+        
+        每个分区在独立事务中完成分离、写文件和删除，写文件失败时事务回滚，分区保持挂载
+        
+        Returns:
+            {表名: [归档文件路径, ...]}
+        """
+        config = current_app.config
+        if retention_months is None:
+            retention_months = config.get('PARTITION_RETENTION_MONTHS', DEFAULT_RETENTION_MONTHS)
+        archive_dir = archive_dir or config.get('ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+        fmt = fmt or config.get('ARCHIVE_FORMAT', DEFAULT_ARCHIVE_FORMAT)
+        if fmt not in ARCHIVE_FORMATS:
+            # SQLite的DDL不在事务内，需在分离分区前检查
+            raise ValueError(f'不支持的归档格式: {fmt}')
+        cutoff = add_months(month_start(now or datetime.utcnow()), -retention_months)
+        
+        archived = {}
+        for table in PARTITIONED_TABLES:
+            with db.engine.connect() as conn:
+                names = PartitionManager.expired_partitions(conn, table, cutoff)
+            
+            paths = []
+            for name in names:
+                with db.engine.begin() as conn:
+                    PartitionManager.detach(conn, table, name)
+                    paths.append(PartitionManager.archive_table(conn, name, archive_dir, fmt))
+                logger.info(f'已归档 {name} -> {paths[-1]}')
+            archived[table] = paths
+        return archived
+
+def _json_default(value):
+    """JSON序列化时间等类型"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _write_jsonl(result, path: str) -> None:
+    """逐行写入gzip压缩的JSONL"""
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for row in result.mappings():
+            f.write(json.dumps(dict(row), ensure_ascii=False, default=_json_default) + '\n')
+
+def _arrow_type(column):
+    """SQLAlchemy列类型映射为Arrow类型"""
+    import pyarrow as pa
+    
+    if isinstance(column.type, sqltypes.Integer):
+        return pa.int64()
+    if isinstance(column.type, sqltypes.Float):
+        return pa.float64()
+    if isinstance(column.type, sqltypes.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, sqltypes.DateTime):
+        return pa.timestamp('us')
+    return pa.string()
+
+def _write_parquet(result, columns, path: str) -> None:
+    """分批写入zstd压缩的Parquet（需要pyarrow）"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet归档需要安装pyarrow，或将ARCHIVE_FORMAT设置为jsonl')
+    
+    schema = pa.schema([(column.name, _arrow_type(column)) for column in columns])
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for batch in result.mappings().partitions(ARCHIVE_BATCH_SIZE):
+            rows = [dict(row) for row in batch]
+            for row in rows:
+                for key, value in row.items():
+                    # SQLite中时间以字符串返回
+                    if isinstance(value, str) and pa.types.is_timestamp(schema.field(key).type):
+                        row[key] = datetime.fromisoformat(value)
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
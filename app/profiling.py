@@ -0,0 +1,345 @@
+"""
+按需性能分析
+开启后按采样率对匹配的Flask端点和Celery任务运行分析器（安装了pyinstrument时使用pyinstrument，否则使用cProfile），
+结果保存在本地目录中并按数量轮转，在 系统管理 -> 性能分析 页面中查看。
+开关、采样率和目标可在管理页面修改：配置了REDIS_URL时保存在Redis中，所有Web和worker进程在几秒内生效
+"""
+
+import cProfile
+import fnmatch
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, g, has_app_context, request
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_SAMPLE_RATE = 0.01          # PROFILING_SAMPLE_RATE：被分析的请求/任务比例（0~1）
+DEFAULT_TARGETS = ('*',)            # PROFILING_TARGETS：端点名或Celery任务名的通配符，如 'templates.*'、'app.tasks.template_tasks.*'
+DEFAULT_MAX_PROFILES = 200          # PROFILING_MAX_PROFILES：最多保留的分析结果数
+DEFAULT_BACKEND = 'auto'            # PROFILING_BACKEND：auto、pyinstrument、cprofile
+# PROFILING_ENABLED：是否开启，未配置时读取同名环境变量；PROFILING_DIR：保存目录，默认 instance/profiles
+
+SETTINGS_KEY = 'netmanagerx:profiling:settings'
+SETTINGS_CACHE_TTL = 5.0            # 运行时设置的缓存时间（秒）
+
+# 不分析管理页面自身和静态文件
+EXCLUDED_ENDPOINTS = ('static', 'main.profiling*', 'main.api_profiling*', 'metrics')
+
+KIND_REQUEST = 'request'
+KIND_TASK = 'task'
+
+# 文件名：时间-类型-耗时-名称.扩展名
+_FILENAME = re.compile(r'^(?P<stamp>\d{8}T\d{6}\.\d{6})-(?P<kind>request|task)-(?P<duration>\d+)ms-(?P<name>[\w.\-]+)\.(?P<ext>html|prof)$')
+
+class ProfileStore:
+    """分析结果目录，超过 max_profiles 时删除最早的结果"""
+    
+    def __init__(self, directory: str, max_profiles: int = DEFAULT_MAX_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+    
+    def save(self, kind: str, name: str, duration: float, ext: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe_name = re.sub(r'[^\w.\-]', '_', name)[:100] or 'unknown'
+        filename = (f'{datetime.utcnow().strftime("%Y%m%dT%H%M%S.%f")}-{kind}-'
+                    f'{int(duration * 1000)}ms-{safe_name}.{ext}')
+        path = os.path.join(self.directory, filename)
+        # 先写临时文件再改名，列表中不会出现写了一半的文件
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self._rotate()
+        return filename
+    
+    def _rotate(self) -> None:
+        names = self._names()
+        for name in names[:max(0, len(names) - self.max_profiles)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # 其他进程已删除
+                pass
+    
+    def _names(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.directory) if _FILENAME.match(name))
+        except FileNotFoundError:
+            return []
+    
+    def list(self) -> List[Dict[str, Any]]:
+        """全部结果，最新的在前"""
+        profiles = []
+        for name in reversed(self._names()):
+            match = _FILENAME.match(name)
+            profiles.append({
+                'id': name,
+                'created_at': datetime.strptime(match['stamp'], '%Y%m%dT%H%M%S.%f').isoformat(),
+                'kind': match['kind'],
+                'name': match['name'],
+                'duration_ms': int(match['duration']),
+                'format': 'pyinstrument' if match['ext'] == 'html' else 'cprofile'
+            })
+        return profiles
+    
+    def path(self, profile_id: str) -> Optional[str]:
+        """结果文件路径，不是有效的结果名时返回None"""
+        if not _FILENAME.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id)
+        return path if os.path.exists(path) else None
+    
+    def clear(self) -> int:
+        names = self._names()
+        for name in names:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+        return len(names)
+
+def cprofile_report(path: str, limit: int = 80) -> str:
+    """cProfile结果的文本报告（按累计时间排序）"""
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+class _Session:
+    """一次分析：开始时启动分析器，结束时保存结果"""
+    
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.started = time.perf_counter()
+        if backend == 'pyinstrument':
+            self.profiler = pyinstrument.Profiler()
+            self.profiler.start()
+        else:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+    
+    def stop(self):
+        """停止分析，返回 (耗时, 扩展名, 数据)"""
+        duration = time.perf_counter() - self.started
+        if self.backend == 'pyinstrument':
+            self.profiler.stop()
+            return duration, 'html', self.profiler.output_html().encode('utf-8')
+        self.profiler.disable()
+        # 与 pstats.Stats.dump_stats() 写出的格式相同，可用 pstats/snakeviz 打开
+        return duration, 'prof', marshal.dumps(pstats.Stats(self.profiler).stats)
+
+_redis_clients: Dict[str, Any] = {}
+
+def _get_redis(url: Optional[str]):
+    """获取Redis客户端，未配置REDIS_URL时返回None"""
+    if not url:
+        return None
+    if url not in _redis_clients:
+        try:
+            import redis
+            _redis_clients[url] = redis.Redis.from_url(url, socket_timeout=0.5)
+        except ImportError:
+            _redis_clients[url] = None
+    return _redis_clients[url]
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+class _AppProfiling:
+    """单个应用的性能分析设置：配置项中的默认设置、分析器、结果目录和本进程的运行时设置"""
+    
+    def __init__(self, defaults: Dict[str, Any], backend: str, store: 'ProfileStore', redis_url: Optional[str]):
+        self.defaults = defaults
+        self.backend = backend
+        self.store = store
+        self.redis_url = redis_url
+        self.local_settings: Optional[Dict[str, Any]] = None
+        self.cached = None
+        self.cached_at = 0.0
+
+class ProfileManager:
+    """
+    性能分析扩展
+    
+    - 每个线程同时只运行一个分析器（请求中以eager模式执行的任务不再单独分析）
+    - 运行时设置（管理页面修改）优先于配置项，保存在Redis或进程内
+    - 设置、分析器和结果目录按应用保存在 app.extensions 中，使用时从当前应用读取
+    """
+    
+    def __init__(self, app=None):
+        self._active = threading.local()
+        self._tasks: Dict[str, _Session] = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        config = app.config
+        targets = config.get('PROFILING_TARGETS', DEFAULT_TARGETS)
+        if isinstance(targets, str):
+            targets = [target.strip() for target in targets.split(',') if target.strip()]
+        defaults = {
+            'enabled': bool(config.get('PROFILING_ENABLED', _env_flag('PROFILING_ENABLED'))),
+            'sample_rate': float(config.get('PROFILING_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)),
+            'targets': list(targets)
+        }
+        backend = config.get('PROFILING_BACKEND', DEFAULT_BACKEND)
+        if backend == 'auto':
+            backend = 'pyinstrument' if pyinstrument is not None else 'cprofile'
+        elif backend == 'pyinstrument' and pyinstrument is None:
+            logger.warning('未安装pyinstrument，性能分析改用cProfile')
+            backend = 'cprofile'
+        store = ProfileStore(
+            config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles'),
+            config.get('PROFILING_MAX_PROFILES', DEFAULT_MAX_PROFILES)
+        )
+        
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['profile_manager'] = _AppProfiling(defaults, backend, store, config.get('REDIS_URL'))
+    
+    @property
+    def _app_state(self) -> _AppProfiling:
+        return current_app.extensions['profile_manager']
+    
+    @property
+    def defaults(self) -> Dict[str, Any]:
+        """配置项中的设置"""
+        return self._app_state.defaults
+    
+    @property
+    def backend(self) -> str:
+        return self._app_state.backend
+    
+    @property
+    def store(self) -> ProfileStore:
+        return self._app_state.store
+    
+    # 运行时设置
+    
+    def settings(self) -> Dict[str, Any]:
+        """当前生效的设置（短时缓存）"""
+        state = self._app_state
+        now = time.monotonic()
+        if state.cached is not None and now - state.cached_at < SETTINGS_CACHE_TTL:
+            return state.cached
+        settings = dict(state.defaults)
+        overrides = state.local_settings
+        client = _get_redis(state.redis_url)
+        if client is not None:
+            try:
+                raw = client.get(SETTINGS_KEY)
+                overrides = json.loads(raw) if raw else None
+            except Exception as e:
+                logger.warning(f'读取性能分析设置失败，使用本进程的设置: {e}')
+        if overrides:
+            settings.update(overrides)
+        state.cached = settings
+        state.cached_at = now
+        return settings
+    
+    def update_settings(self, enabled: Optional[bool] = None, sample_rate: Optional[float] = None,
+                        targets: Optional[List[str]] = None) -> Dict[str, Any]:
+        """修改运行时设置，返回生效的设置"""
+        if sample_rate is not None and not 0 <= sample_rate <= 1:
+            raise ValueError('采样率必须在 0~1 之间')
+        overrides = dict(self.settings())
+        if enabled is not None:
+            overrides['enabled'] = bool(enabled)
+        if sample_rate is not None:
+            overrides['sample_rate'] = float(sample_rate)
+        if targets is not None:
+            overrides['targets'] = [target.strip() for target in targets if target.strip()]
+        
+        state = self._app_state
+        state.local_settings = overrides
+        client = _get_redis(state.redis_url)
+        if client is not None:
+            try:
+                client.set(SETTINGS_KEY, json.dumps(overrides))
+            except Exception as e:
+                logger.warning(f'保存性能分析设置失败，只对本进程生效: {e}')
+        state.cached = None
+        return self.settings()
+    
+    def reset_settings(self) -> Dict[str, Any]:
+        """恢复为配置项中的设置"""
+        state = self._app_state
+        state.local_settings = None
+        client = _get_redis(state.redis_url)
+        if client is not None:
+            try:
+                client.delete(SETTINGS_KEY)
+            except Exception as e:
+                logger.warning(f'清除性能分析设置失败: {e}')
+        state.cached = None
+        return self.settings()
+    
+    def should_profile(self, name: Optional[str]) -> bool:
+        """按开关、目标和采样率决定是否分析"""
+        if not name or getattr(self._active, 'session', None) is not None:
+            return False
+        settings = self.settings()
+        if not settings['enabled'] or settings['sample_rate'] <= 0:
+            return False
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in EXCLUDED_ENDPOINTS):
+            return False
+        if not any(fnmatch.fnmatchcase(name, pattern) for pattern in settings['targets']):
+            return False
+        return random.random() < settings['sample_rate']
+    
+    # 分析
+    
+    def start(self) -> _Session:
+        session = _Session(self.backend)
+        self._active.session = session
+        return session
+    
+    def finish(self, session: _Session, kind: str, name: str) -> Optional[str]:
+        """停止分析并保存，返回结果名"""
+        self._active.session = None
+        try:
+            duration, ext, data = session.stop()
+            return self.store.save(kind, name, duration, ext, data)
+        except Exception as e:
+            logger.warning(f'保存性能分析结果失败: {kind} {name} {e}')
+            return None
+    
+    def _before_request(self):
+        if self.should_profile(request.endpoint):
+            g._profile_session = self.start()
+    
+    def _teardown_request(self, exc=None):
+        session = g.pop('_profile_session', None)
+        if session is not None:
+            self.finish(session, KIND_REQUEST, request.endpoint)
+    
+    def task_started(self, task_id: str, task_name: str) -> None:
+        """Celery task_prerun 信号（设置从当前应用读取，没有应用上下文时不分析）"""
+        if has_app_context() and self.should_profile(task_name):
+            with self._lock:
+                self._tasks[task_id] = self.start()
+    
+    def task_finished(self, task_id: str, task_name: str) -> None:
+        """Celery task_postrun 信号"""
+        with self._lock:
+            session = self._tasks.pop(task_id, None)
+        if session is not None:
+            self.finish(session, KIND_TASK, task_name)
@@ -0,0 +1,121 @@
+"""
+任务进度上报
+合并高频的进度更新：距上次发布超过 PROGRESS_INTERVAL_MS 毫秒，
+或进度变化达到 PROGRESS_MIN_DELTA 个百分点时才发布，最终进度只写一次
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+from flask import current_app, has_app_context
+from app import events
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_INTERVAL_MS = 500   # PROGRESS_INTERVAL_MS：两次发布的最短间隔（毫秒）
+DEFAULT_MIN_DELTA = 5       # PROGRESS_MIN_DELTA：进度变化达到该百分点数时立即发布
+
+class ProgressReporter:
+    """
+    进度上报器
+    
+    publish 接收进度字典（progress、status及额外字段），可以写Celery结果后端、数据库等；
+    被合并掉的更新保留最后一条，可通过 flush() 发布
+    """
+    
+    def __init__(self, publish: Callable[[Dict[str, Any]], None],
+                 interval_ms: Optional[float] = None, min_delta: Optional[int] = None,
+                 publish_final: Optional[Callable[[Dict[str, Any]], None]] = None):
+        config = current_app.config if has_app_context() else {}
+        if interval_ms is None:
+            interval_ms = config.get('PROGRESS_INTERVAL_MS', DEFAULT_INTERVAL_MS)
+        if min_delta is None:
+            min_delta = config.get('PROGRESS_MIN_DELTA', DEFAULT_MIN_DELTA)
+        
+        self.publish = publish
+        self.publish_final = publish_final or publish
+        self.interval = interval_ms / 1000
+        self.min_delta = min_delta
+        self.progress = 0
+        self.finished = False
+        self._published_at = None
+        self._published_progress = None
+        self._pending = None
+    
+    def update(self, progress: float, status: Optional[str] = None, force: bool = False, **extra) -> bool:
+        """
+        更新进度，返回本次是否实际发布
+        
+        Args:
+            progress: 进度百分比
+            status: 状态描述
+            force: 忽略节流立即发布
+            **extra: 附加字段
+        """
+        if self.finished:
+            return False
+        
+        self.progress = int(max(0, min(100, progress)))
+        meta = dict(extra, progress=self.progress, status=status)
+        
+        now = time.monotonic()
+        if not (force or self._published_at is None
+                or now - self._published_at >= self.interval
+                or abs(self.progress - self._published_progress) >= self.min_delta):
+            self._pending = meta
+            return False
+        
+        self._publish(meta, now)
+        return True
+    
+    def step(self, done: int, total: int, status: Optional[str] = None,
+             start: int = 0, end: int = 100, **extra) -> bool:
+        """按已完成数量/总数换算为 start~end 区间的进度"""
+        progress = start + (end - start) * done // total if total else end
+        return self.update(progress, status, **extra)
+    
+    def on_wait(self, waited: float, position: int) -> None:
+        """设备会话排队回调（见 app.communication.session_lock.device_session）"""
+        self.update(
+            self.progress,
+            f'等待设备空闲会话（排队第 {position} 位，已等待 {waited:.0f} 秒）',
+            wait_time=round(waited, 1),
+            queue_position=position
+        )
+    
+    def flush(self) -> None:
+        """发布被合并掉的最后一条更新"""
+        if self._pending is not None and not self.finished:
+            self._publish(self._pending, time.monotonic())
+    
+    def finish(self, progress: float = 100, status: Optional[str] = None, **extra) -> bool:
+        """写入最终进度，之后的所有更新都被忽略；重复调用不会再次写入"""
+        if self.finished:
+            return False
+        self.finished = True
+        self._pending = None
+        self.progress = int(max(0, min(100, progress)))
+        self.publish_final(dict(extra, progress=self.progress, status=status))
+        return True
+    
+    def _publish(self, meta: Dict[str, Any], now: float) -> None:
+        self._pending = None
+        self._published_at = now
+        self._published_progress = meta['progress']
+        self.publish(meta)
+
+def celery_reporter(task, task_id=None, **kwargs) -> ProgressReporter:
+    """
+    Celery任务的进度上报器，进度以PROGRESS状态写入结果后端，
+    指定 task_id（Task记录ID）时同时发布到该任务的事件频道（见 app.events）
+    
+    任务的最终状态由返回值写入结果后端，finish() 不再写入PROGRESS状态，以免覆盖结果
+    """
+    def publish(meta):
+        task.update_state(state='PROGRESS', meta=meta)
+        events.publish(task_id, events.EVENT_PROGRESS, meta)
+    
+    return ProgressReporter(
+        publish,
+        publish_final=lambda meta: events.publish(task_id, events.EVENT_PROGRESS, meta),
+        **kwargs
+    )
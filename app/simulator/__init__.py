@@ -0,0 +1,8 @@
+"""
+设备模拟器
+在本机模拟Cisco IOS设备的SSH、Telnet和RESTCONF接口，无需真实设备即可测试和压测连接层
+"""
+
+from app.simulator.device import DeviceProfile, CLISession
+from app.simulator.servers import SSHSimulator, TelnetSimulator, RESTCONFSimulator
+from app.simulator.farm import SimulatorFarm, SimulatedDevice
@@ -0,0 +1,3 @@
+from app.simulator.farm import main
+
+main()
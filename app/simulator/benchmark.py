@@ -0,0 +1,366 @@
+"""
+任务流水线端到端基准测试
+使用本机模拟设备驱动真实的任务函数（execute_device_commands、batch_backup_configs、
+batch_render_and_apply_template），记录设备吞吐量、单设备耗时的p50/p95/p99、数据库查询次数和峰值内存，
+结果输出为JSON，便于比较不同提交：
+
+    python -m app.simulator.benchmark --devices 10,100,1000 --output bench.json
+    python -m app.simulator.benchmark --devices 100 --baseline bench.json
+
+任务以Celery eager模式在当前进程内依次执行，测量的是每台设备的处理开销（连接、命令、数据库写入），
+不包含broker和worker并发；每个场景默认在独立的子进程中运行，峰值内存互不影响
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import click
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from app.simulator.farm import SimulatorFarm
+
+# 默认参数
+DEFAULT_DEVICE_COUNTS = (10, 100, 1000)
+DEFAULT_ENDPOINTS = 50          # 模拟设备端点数，设备记录依次分配到各端点（1000台设备不必监听1000个端口）
+DEFAULT_COMMANDS = ('show version', 'show ip interface brief')
+
+PIPELINES = ('commands', 'backup', 'template')
+
+# 各流水线中处理单台设备的Celery任务，用于统计单设备耗时
+DEVICE_TASKS = {
+    'commands': 'app.tasks.network_tasks.execute_device_commands',
+    'backup': 'app.tasks.backup_tasks.backup_config_for_batch',
+    'template': 'app.tasks.template_tasks.apply_config_for_batch',
+}
+
+BENCHMARK_TEMPLATE = '\n'.join([
+    'interface {{ interface }}',
+    ' description {{ description }}',
+    ' switchport access vlan {{ vlan }}',
+])
+BENCHMARK_VARIABLES = {'interface': 'GigabitEthernet1/0/1', 'description': 'benchmark', 'vlan': 100}
+
+def percentile(values: Sequence[float], p: float) -> Optional[float]:
+    """线性插值的百分位数，p取0~100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class QueryCounter:
+    """统计范围内执行的SQL语句数"""
+    
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+    
+    def _count(self, *args, **kwargs):
+        self.count += 1
+    
+    def __enter__(self):
+        from sqlalchemy import event
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        from sqlalchemy import event
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+class TaskTimer:
+    """通过Celery任务信号记录指定任务每次执行的耗时（eager模式下同样触发）"""
+    
+    def __init__(self, task_name: str):
+        self.task_name = task_name
+        self.durations: List[float] = []
+        self._started: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def _prerun(self, sender=None, task_id=None, **kwargs):
+        if sender is not None and sender.name == self.task_name:
+            with self._lock:
+                self._started[task_id] = time.perf_counter()
+    
+    def _postrun(self, sender=None, task_id=None, **kwargs):
+        if sender is not None and sender.name == self.task_name:
+            with self._lock:
+                started = self._started.pop(task_id, None)
+                if started is not None:
+                    self.durations.append(time.perf_counter() - started)
+    
+    def __enter__(self):
+        from celery.signals import task_postrun, task_prerun
+        task_prerun.connect(self._prerun, weak=False)
+        task_postrun.connect(self._postrun, weak=False)
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        from celery.signals import task_postrun, task_prerun
+        task_prerun.disconnect(self._prerun)
+        task_postrun.disconnect(self._postrun)
+
+def _seed(device_count: int, endpoints: List[Dict[str, Any]]):
+    """创建用户、设备和模板，设备依次指向各模拟设备端点"""
+    from app import db
+    from app.models import ConfigTemplate, ConnectionType, Device, DeviceType, Role, User
+    
+    role = Role(name='benchmark', description='基准测试')
+    user = User(username='benchmark', email='benchmark@example.com', role=role)
+    user.password = 'benchmark'
+    template = ConfigTemplate(name='benchmark', category='interface', template_content=BENCHMARK_TEMPLATE)
+    db.session.add_all([role, user, template])
+    
+    devices = []
+    for i in range(device_count):
+        endpoint = endpoints[i % len(endpoints)]
+        device = Device(
+            name=f'bench-{i + 1:05d}',
+            ip_address=endpoint['host'],
+            port=endpoint['port'],
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType(endpoint['protocol']),
+            username=endpoint['username']
+        )
+        device.set_password(endpoint['password'])
+        devices.append(device)
+    db.session.add_all(devices)
+    db.session.commit()
+    return user.id, [device.id for device in devices], template.id
+
+def _run_pipeline(pipeline: str, user_id: int, device_ids: List[int], template_id: int,
+                  commands: Sequence[str]) -> List[int]:
+    """执行流水线，返回创建的任务ID"""
+    from app import db
+    from app.models import Task, TaskType
+    from app.tasks.backup_tasks import batch_backup_configs
+    from app.tasks.network_tasks import execute_device_commands
+    from app.tasks.template_tasks import batch_render_and_apply_template
+    
+    if pipeline == 'commands':
+        tasks = [Task(name=f'benchmark_commands_{device_id}', task_type=TaskType.BATCH_COMMAND,
+                      command='\n'.join(commands), user_id=user_id, device_id=device_id)
+                 for device_id in device_ids]
+        db.session.add_all(tasks)
+        db.session.commit()
+        task_ids = [task.id for task in tasks]
+        for task_id, device_id in zip(task_ids, device_ids):
+            execute_device_commands.apply(args=(task_id, device_id, list(commands)))
+        return task_ids
+    
+    if pipeline == 'backup':
+        task = Task(name='benchmark_backup', task_type=TaskType.BACKUP_CONFIG, user_id=user_id)
+    else:
+        task = Task(name='benchmark_template', task_type=TaskType.CONFIG_TEMPLATE,
+                    user_id=user_id, template_id=template_id)
+    db.session.add(task)
+    db.session.commit()
+    task_id = task.id
+    
+    if pipeline == 'backup':
+        batch_backup_configs.apply(args=(task_id, device_ids, 'benchmark'))
+    else:
+        batch_render_and_apply_template.apply(args=(task_id, template_id, device_ids, BENCHMARK_VARIABLES))
+    return [task_id]
+
+def run_scenario(pipeline: str, device_count: int, endpoints: List[Dict[str, Any]],
+                 config_name: str = 'testing', commands: Sequence[str] = DEFAULT_COMMANDS) -> Dict[str, Any]:
+    """
+    运行一个场景：新建应用和数据库，创建设备后执行流水线
+    
+    Args:
+        pipeline: commands / backup / template
+        device_count: 设备数量
+        endpoints: 模拟设备端点（SimulatedDevice.to_dict() 的结果）
+        config_name: 应用配置名称
+        commands: commands流水线中每台设备执行的命令
+    
+    Returns:
+        场景结果字典
+    """
+    from sqlalchemy import func
+    
+    from app import create_app, db
+    from app.models import TaskResult
+    from app.tasks.celery_app import celery
+    
+    app = create_app(config_name)
+    # 进程内执行，会话锁和取消标记不依赖Redis
+    app.config['REDIS_URL'] = None
+    # 每台设备一个子任务（不分块），以便统计单设备耗时
+    app.config['TASK_FANOUT_CHUNK_THRESHOLD'] = device_count + 1
+    celery.conf.task_always_eager = True
+    
+    with app.app_context():
+        db.create_all()
+        user_id, device_ids, template_id = _seed(device_count, endpoints)
+        
+        with QueryCounter(db.engine) as queries, TaskTimer(DEVICE_TASKS[pipeline]) as timer:
+            start = time.perf_counter()
+            task_ids = _run_pipeline(pipeline, user_id, device_ids, template_id, commands)
+            elapsed = time.perf_counter() - start
+        
+        db.session.remove()
+        failed_devices = db.session.query(func.count(func.distinct(TaskResult.device_id))).filter(
+            TaskResult.task_id.in_(task_ids), TaskResult.exit_code != 0).scalar()
+        db.session.remove()
+        db.drop_all()
+    
+    latencies = timer.durations
+    return {
+        'pipeline': pipeline,
+        'devices': device_count,
+        'endpoints': len(endpoints),
+        'elapsed': round(elapsed, 3),
+        'devices_per_second': round(device_count / elapsed, 2) if elapsed else None,
+        'success_count': device_count - failed_devices,
+        'latency': {
+            'p50': _round(percentile(latencies, 50)),
+            'p95': _round(percentile(latencies, 95)),
+            'p99': _round(percentile(latencies, 99)),
+            'max': _round(max(latencies) if latencies else None),
+        },
+        'queries': queries.count,
+        'queries_per_device': round(queries.count / device_count, 1),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+def run_suite(device_counts: Sequence[int] = DEFAULT_DEVICE_COUNTS, pipelines: Sequence[str] = PIPELINES,
+              endpoints: int = DEFAULT_ENDPOINTS, protocol: str = 'ssh', isolate: bool = True,
+              config_name: str = 'testing', **profile_options) -> Dict[str, Any]:
+    """
+    启动模拟设备集群并依次运行各场景
+    
+    Args:
+        device_counts: 各场景的设备数量
+        pipelines: 要运行的流水线
+        endpoints: 模拟设备端点数（不超过设备数量）
+        protocol: 模拟设备协议（ssh / telnet）
+        isolate: 每个场景在独立子进程中运行（峰值内存只反映该场景）
+        config_name: 应用配置名称
+        profile_options: 传给 DeviceProfile 的参数（latency、jitter、interfaces等）
+    
+    Returns:
+        {'meta': 运行环境, 'results': 各场景结果}
+    """
+    results = []
+    count = min(endpoints, max(device_counts))
+    with SimulatorFarm(**{protocol: count}, **profile_options) as farm:
+        for device_count in device_counts:
+            for pipeline in pipelines:
+                for device in farm.devices:
+                    device.profile.reset()
+                targets = [device.to_dict() for device in farm.devices[:device_count]]
+                if isolate:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                        result = executor.submit(run_scenario, pipeline, device_count, targets, config_name).result()
+                else:
+                    result = run_scenario(pipeline, device_count, targets, config_name)
+                result['protocol'] = protocol
+                results.append(result)
+    
+    return {'meta': _meta(profile_options), 'results': results}
+
+def _meta(profile_options: Dict[str, Any]) -> Dict[str, Any]:
+    """运行环境：提交、Python版本、平台和模拟设备参数"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'simulator': profile_options,
+    }
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[Tuple[str, int, float, float, float]]:
+    """与基线比较吞吐量，返回 (流水线, 设备数, 基线台/秒, 当前台/秒, 变化百分比)"""
+    baseline_index = {(r['pipeline'], r['devices']): r for r in baseline}
+    rows = []
+    for result in results:
+        previous = baseline_index.get((result['pipeline'], result['devices']))
+        if not previous or not previous.get('devices_per_second') or not result.get('devices_per_second'):
+            continue
+        change = (result['devices_per_second'] / previous['devices_per_second'] - 1) * 100
+        rows.append((result['pipeline'], result['devices'], previous['devices_per_second'],
+                     result['devices_per_second'], round(change, 1)))
+    return rows
+
+def _parse_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+@click.command()
+@click.option('--devices', default=','.join(map(str, DEFAULT_DEVICE_COUNTS)), show_default=True,
+              help='各场景的设备数量，逗号分隔')
+@click.option('--pipelines', default=','.join(PIPELINES), show_default=True, help='要运行的流水线，逗号分隔')
+@click.option('--endpoints', default=DEFAULT_ENDPOINTS, show_default=True, help='模拟设备端点数')
+@click.option('--protocol', default='ssh', show_default=True, type=click.Choice(['ssh', 'telnet']))
+@click.option('--latency', default=0.0, show_default=True, help='模拟设备每条命令的响应延迟（秒）')
+@click.option('--jitter', default=0.0, show_default=True, help='延迟随机增加的上限（秒）')
+@click.option('--interfaces', default=24, show_default=True, help='模拟设备接口数量（决定配置长度）')
+@click.option('--config', 'config_name', default='testing', show_default=True, help='应用配置名称')
+@click.option('--no-isolate', is_flag=True, help='所有场景在当前进程中运行')
+@click.option('--output', type=click.Path(dir_okay=False), help='结果JSON文件')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='与之比较的结果JSON文件')
+def main(devices, pipelines, endpoints, protocol, latency, jitter, interfaces, config_name, no_isolate,
+         output, baseline):
+    """运行任务流水线基准测试"""
+    pipelines = _parse_list(pipelines)
+    unknown = set(pipelines) - set(PIPELINES)
+    if unknown:
+        raise click.BadParameter(f'未知的流水线: {", ".join(sorted(unknown))}', param_hint='--pipelines')
+    
+    report = run_suite([int(count) for count in _parse_list(devices)], pipelines, endpoints=endpoints,
+                       protocol=protocol, isolate=not no_isolate, config_name=config_name,
+                       latency=latency, jitter=jitter, interfaces=interfaces)
+    
+    click.echo(f'{"流水线":<10}{"设备":>7}{"台/秒":>10}{"p50":>9}{"p95":>9}{"p99":>9}{"查询/台":>9}{"峰值MB":>9}')
+    for r in report['results']:
+        latency_ms = {k: f'{v * 1000:.0f}ms' if v is not None else '-' for k, v in r['latency'].items()}
+        click.echo(f'{r["pipeline"]:<10}{r["devices"]:>7}{r["devices_per_second"]:>10}{latency_ms["p50"]:>9}'
+                   f'{latency_ms["p95"]:>9}{latency_ms["p99"]:>9}{r["queries_per_device"]:>9}'
+                   f'{r["peak_rss_mb"] or "-":>9}')
+    
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        click.echo(f'结果已写入 {output}')
+    
+    if baseline:
+        with open(baseline, encoding='utf-8') as f:
+            rows = compare(report['results'], json.load(f)['results'])
+        click.echo('\n与基线比较（台/秒）:')
+        for pipeline, count, before, after, change in rows:
+            click.echo(f'{pipeline:<10}{count:>7}{before:>10}{after:>10}{change:>+9.1f}%')
+
+if __name__ == '__main__':
+    main()
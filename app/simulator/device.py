@@ -0,0 +1,290 @@
+"""
+模拟设备的行为
+按配置的提示符、延迟、输出长度、分页和认证失败率模拟Cisco IOS命令行，与传输协议无关；
+SSH和Telnet模拟器把连接交给 serve_cli 处理，RESTCONF模拟器使用同一设备的接口和配置数据
+"""
+
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+# 默认参数
+DEFAULT_USERNAME = 'admin'
+DEFAULT_PASSWORD = 'admin'
+DEFAULT_INTERFACES = 24         # 接口数量，决定 show running-config 等命令的输出长度
+DEFAULT_PAGE_LENGTH = 24        # 默认分页行数（terminal length），0表示不分页
+
+MORE_PROMPT = ' --More-- '
+LOGIN_ATTEMPTS = 3
+
+INVALID_INPUT = "% Invalid input detected at '^' marker."
+CONFIG_BANNER = 'Enter configuration commands, one per line.  End with CNTL/Z.'
+
+class DeviceProfile:
+    """
+    模拟设备的参数和状态
+    
+    同一设备的多个会话共享配置状态（配置模式下输入的命令会出现在 show running-config 中）
+    """
+    
+    def __init__(self, hostname: str = 'SIM-1', username: str = DEFAULT_USERNAME,
+                 password: str = DEFAULT_PASSWORD, latency: float = 0.0, jitter: float = 0.0,
+                 interfaces: int = DEFAULT_INTERFACES, page_length: int = DEFAULT_PAGE_LENGTH,
+                 auth_failure_rate: float = 0.0, responses: Optional[Dict[str, str]] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            hostname: 主机名（提示符）
+            username: 登录用户名
+            password: 登录密码
+            latency: 每条命令（和每次登录、每个RESTCONF请求）的响应延迟（秒）
+            jitter: 在延迟上随机增加 0~jitter 秒
+            interfaces: 接口数量
+            page_length: 默认分页行数，0表示不分页
+            auth_failure_rate: 凭据正确时仍认证失败的概率（模拟AAA服务器故障）
+            responses: 自定义命令输出，命令 -> 输出文本，优先于内置命令
+            seed: 随机数种子，用于复现延迟和认证失败
+        """
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.interfaces = interfaces
+        self.page_length = page_length
+        self.auth_failure_rate = auth_failure_rate
+        self.responses = dict(responses or {})
+        self.config_lines: List[str] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def delay(self) -> None:
+        """模拟设备响应延迟"""
+        with self._lock:
+            extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency + extra > 0:
+            time.sleep(self.latency + extra)
+    
+    def authenticate(self, username: str, password: str) -> bool:
+        """校验凭据，按 auth_failure_rate 随机失败"""
+        self.delay()
+        if username != self.username or password != self.password:
+            return False
+        with self._lock:
+            return self._random.random() >= self.auth_failure_rate
+    
+    def add_config(self, line: str) -> None:
+        with self._lock:
+            self.config_lines.append(line)
+    
+    def reset(self) -> None:
+        """清除会话中写入的配置"""
+        with self._lock:
+            self.config_lines.clear()
+    
+    def interface_names(self) -> List[str]:
+        return [f'GigabitEthernet1/0/{i + 1}' for i in range(self.interfaces)]
+    
+    def show_version(self) -> str:
+        return '\n'.join([
+            'Cisco IOS Software, C3750E Software (C3750E-UNIVERSALK9-M), Version 15.2(4)E10, RELEASE SOFTWARE (fc2)',
+            'Technical Support: http://www.cisco.com/techsupport',
+            'Copyright (c) 1986-2020 by Cisco Systems, Inc.',
+            '',
+            'ROM: Bootstrap program is C3750E boot loader',
+            f'{self.hostname} uptime is 12 weeks, 3 days, 4 hours, 5 minutes',
+            'System returned to ROM by power-on',
+            'System image file is "flash:c3750e-universalk9-mz.152-4.E10.bin"',
+            '',
+            'cisco WS-C3750X-48P (PowerPC405) processor (revision A0) with 262144K bytes of memory.',
+            'Processor board ID FDO1234X5YZ',
+            f'{self.interfaces} Gigabit Ethernet interfaces',
+            'The password-recovery mechanism is enabled.',
+            '',
+            'Base ethernet MAC Address       : 00:1A:2B:3C:4D:5E',
+            'Model number                    : WS-C3750X-48P-S',
+            'System serial number            : FDO1234X5YZ',
+            '',
+            'Configuration register is 0xF',
+        ])
+    
+    def running_config(self) -> str:
+        lines = ['Building configuration...', '', 'Current configuration : 4096 bytes', '!',
+                 'version 15.2', f'hostname {self.hostname}', '!']
+        for i, name in enumerate(self.interface_names()):
+            lines += [f'interface {name}', f' description sim-port-{i + 1}',
+                      ' switchport mode access', f' switchport access vlan {10 + i % 10}', '!']
+        with self._lock:
+            lines += list(self.config_lines)
+        lines += ['!', 'end']
+        return '\n'.join(lines)
+    
+    def ip_interface_brief(self) -> str:
+        lines = ['Interface              IP-Address      OK? Method Status                Protocol']
+        for name in self.interface_names():
+            lines.append(f'{name:<23}unassigned      YES unset  up                    up')
+        return '\n'.join(lines)
+    
+    def output_for(self, command: str) -> str:
+        """特权模式下的命令输出"""
+        if command in self.responses:
+            return self.responses[command]
+        words = command.split()
+        if not words:
+            return ''
+        # 支持常见缩写，如 sh ver、sh run、sh ip int br
+        if _matches(words, ['show', 'version']):
+            return self.show_version()
+        if _matches(words, ['show', 'running-config']):
+            return self.running_config()
+        if _matches(words, ['show', 'ip', 'interface', 'brief']):
+            return self.ip_interface_brief()
+        if _matches(words, ['show', 'clock']):
+            return time.strftime('*%H:%M:%S.000 UTC %a %b %d %Y', time.gmtime())
+        return INVALID_INPUT
+
+def _matches(words: List[str], keywords: List[str]) -> bool:
+    """命令的每个词都是对应关键字的前缀"""
+    return len(words) == len(keywords) and all(k.startswith(w.lower()) for w, k in zip(words, keywords))
+
+class CLISession:
+    """一个命令行会话：提示符、配置模式和分页设置"""
+    
+    def __init__(self, profile: DeviceProfile):
+        self.profile = profile
+        self.mode = ''              # ''、config、config-if 等
+        self.page_length = profile.page_length
+        self.closed = False
+    
+    @property
+    def prompt(self) -> str:
+        if self.mode:
+            return f'{self.profile.hostname}({self.mode})#'
+        return f'{self.profile.hostname}#'
+    
+    def execute(self, line: str) -> str:
+        """执行一行输入，返回输出文本（不含提示符）"""
+        command = line.strip()
+        if not command:
+            return ''
+        self.profile.delay()
+        words = command.split()
+        
+        if self.mode:
+            return self._execute_config(command, words)
+        
+        if _matches(words[:2], ['terminal', 'length']) and len(words) == 3 and words[2].isdigit():
+            self.page_length = int(words[2])
+            return ''
+        if _matches(words[:2], ['terminal', 'width']):
+            return ''
+        if _matches(words[:2], ['configure', 'terminal']):
+            self.mode = 'config'
+            return CONFIG_BANNER
+        if _matches(words, ['exit']) or _matches(words, ['logout']):
+            self.closed = True
+            return ''
+        return self.profile.output_for(command)
+    
+    def _execute_config(self, command: str, words: List[str]) -> str:
+        if _matches(words, ['end']) or command == '\x1a':
+            self.mode = ''
+            return ''
+        if _matches(words, ['exit']):
+            self.mode = 'config' if self.mode != 'config' else ''
+            return ''
+        if words[0].lower() == 'interface' and len(words) > 1:
+            self.mode = 'config-if'
+            self.profile.add_config(command)
+            return ''
+        self.profile.add_config(f' {command}' if self.mode == 'config-if' else command)
+        return ''
+    
+    def pages(self, output: str) -> List[List[str]]:
+        """按当前分页行数切分输出"""
+        lines = output.split('\n')
+        if not self.page_length or len(lines) <= self.page_length:
+            return [lines]
+        return [lines[i:i + self.page_length] for i in range(0, len(lines), self.page_length)]
+
+class LineReader:
+    """
+    从连接中逐字节读取一行，回显输入的字符
+    
+    连接对象需要提供 recv(n)/sendall(data)（socket和paramiko的Channel都满足）；
+    \\r、\\n、\\r\\n、\\r\\0 都作为行结束
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self._last_cr = False
+    
+    def read_char(self) -> Optional[str]:
+        data = self.conn.recv(1)
+        if not data:
+            return None
+        return data.decode('latin-1')
+    
+    def read_line(self, echo: bool = True) -> Optional[str]:
+        """读取一行，连接关闭时返回None"""
+        chars = []
+        while True:
+            char = self.read_char()
+            if char is None:
+                return None
+            if self._last_cr and char in '\n\0':
+                self._last_cr = False
+                continue
+            self._last_cr = char == '\r'
+            if char in '\r\n':
+                if echo:
+                    self.conn.sendall(b'\r\n')
+                return ''.join(chars)
+            if char in '\x08\x7f':
+                if chars:
+                    chars.pop()
+                    if echo:
+                        self.conn.sendall(b'\x08 \x08')
+                continue
+            chars.append(char)
+            if echo:
+                self.conn.sendall(char.encode('latin-1'))
+
+def _send(conn, text: str) -> None:
+    conn.sendall(text.replace('\n', '\r\n').encode('utf-8'))
+
+def send_output(conn, reader: LineReader, session: CLISession, output: str) -> None:
+    """发送命令输出，超过分页行数时显示 --More-- 并等待按键（空格翻页、回车下一行、其他键结束）"""
+    if not output:
+        return
+    pages = session.pages(output)
+    lines = pages[0]
+    remaining = [line for page in pages[1:] for line in page]
+    _send(conn, '\n'.join(lines) + '\n')
+    while remaining:
+        _send(conn, MORE_PROMPT)
+        char = reader.read_char()
+        # 清除 --More-- 提示
+        _send(conn, '\r' + ' ' * len(MORE_PROMPT) + '\r')
+        if char == ' ':
+            count = session.page_length
+        elif char in ('\r', '\n'):
+            reader._last_cr = char == '\r'
+            count = 1
+        else:
+            return
+        _send(conn, '\n'.join(remaining[:count]) + '\n')
+        remaining = remaining[count:]
+
+def serve_cli(conn, session: CLISession) -> None:
+    """登录后的命令行循环，直到客户端退出或断开"""
+    reader = LineReader(conn)
+    _send(conn, '\n' + session.prompt)
+    while not session.closed:
+        line = reader.read_line()
+        if line is None:
+            return
+        send_output(conn, reader, session, session.execute(line))
+        if not session.closed:
+            _send(conn, session.prompt)
@@ -0,0 +1,142 @@
+"""
+模拟设备集群
+在本机启动多台SSH、Telnet、RESTCONF模拟设备，用于离线测试和压测连接层：
+
+    python -m app.simulator --ssh 20 --telnet 5 --restconf 5 --latency 0.05 --jitter 0.02
+"""
+
+import logging
+import time
+from typing import Any, Dict, List
+
+import click
+
+from app.simulator.device import DEFAULT_INTERFACES, DEFAULT_PAGE_LENGTH, DEFAULT_PASSWORD, DEFAULT_USERNAME, DeviceProfile
+from app.simulator.servers import SIMULATORS
+
+logger = logging.getLogger(__name__)
+
+class SimulatedDevice:
+    """集群中的一台模拟设备"""
+    
+    def __init__(self, protocol: str, server):
+        self.protocol = protocol
+        self.server = server
+    
+    @property
+    def profile(self) -> DeviceProfile:
+        return self.server.profile
+    
+    @property
+    def host(self) -> str:
+        return self.server.host
+    
+    @property
+    def port(self) -> int:
+        return self.server.port
+    
+    def to_device(self):
+        """创建指向该模拟设备的 Device 对象（未保存，需要应用上下文以加密凭据）"""
+        from app.models import Device, DeviceType, ConnectionType
+        
+        device = Device(
+            name=self.profile.hostname,
+            ip_address=self.host,
+            port=self.port,
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType(self.protocol),
+            username=self.profile.username
+        )
+        device.set_password(self.profile.password)
+        return device
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hostname': self.profile.hostname,
+            'protocol': self.protocol,
+            'host': self.host,
+            'port': self.port,
+            'username': self.profile.username,
+            'password': self.profile.password
+        }
+
+class SimulatorFarm:
+    """
+    模拟设备集群
+    
+    每台设备独立监听一个端口并有自己的 DeviceProfile；用作上下文管理器时退出即停止全部设备
+    """
+    
+    def __init__(self, ssh: int = 0, telnet: int = 0, restconf: int = 0, host: str = '127.0.0.1',
+                 base_port: int = 0, **profile_options):
+        """
+        Args:
+            ssh / telnet / restconf: 各协议的设备数量
+            host: 监听地址
+            base_port: 起始端口，依次递增；0表示使用系统分配的端口
+            profile_options: 传给 DeviceProfile 的参数（latency、jitter、interfaces、page_length等）
+        """
+        self.counts = {'ssh': ssh, 'telnet': telnet, 'restconf': restconf}
+        self.host = host
+        self.base_port = base_port
+        self.profile_options = profile_options
+        self.devices: List[SimulatedDevice] = []
+    
+    def start(self):
+        index = 0
+        try:
+            for protocol, count in self.counts.items():
+                for _ in range(count):
+                    index += 1
+                    options = dict(self.profile_options)
+                    if options.get('seed') is not None:
+                        options['seed'] += index
+                    profile = DeviceProfile(hostname=f'SIM-{protocol.upper()}-{index}', **options)
+                    port = self.base_port + index - 1 if self.base_port else 0
+                    server = SIMULATORS[protocol](profile, self.host, port).start()
+                    self.devices.append(SimulatedDevice(protocol, server))
+        except Exception:
+            self.stop()
+            raise
+        return self
+    
+    def stop(self) -> None:
+        for device in self.devices:
+            device.server.stop()
+        self.devices = []
+    
+    def by_protocol(self, protocol: str) -> List[SimulatedDevice]:
+        return [device for device in self.devices if device.protocol == protocol]
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+@click.command()
+@click.option('--ssh', default=1, show_default=True, help='SSH设备数量')
+@click.option('--telnet', default=0, show_default=True, help='Telnet设备数量')
+@click.option('--restconf', default=0, show_default=True, help='RESTCONF设备数量')
+@click.option('--host', default='127.0.0.1', show_default=True, help='监听地址')
+@click.option('--base-port', default=0, show_default=True, help='起始端口，0表示系统分配')
+@click.option('--username', default=DEFAULT_USERNAME, show_default=True)
+@click.option('--password', default=DEFAULT_PASSWORD, show_default=True)
+@click.option('--latency', default=0.0, show_default=True, help='每条命令/请求的响应延迟（秒）')
+@click.option('--jitter', default=0.0, show_default=True, help='延迟随机增加的上限（秒）')
+@click.option('--interfaces', default=DEFAULT_INTERFACES, show_default=True, help='接口数量（决定输出长度）')
+@click.option('--page-length', default=DEFAULT_PAGE_LENGTH, show_default=True, help='默认分页行数，0表示不分页')
+@click.option('--auth-failure-rate', default=0.0, show_default=True, help='凭据正确时认证失败的概率')
+@click.option('--seed', default=None, type=int, help='随机数种子')
+def main(ssh, telnet, restconf, host, base_port, **profile_options):
+    """启动模拟设备集群，Ctrl+C 停止"""
+    logging.basicConfig(level=logging.INFO)
+    with SimulatorFarm(ssh, telnet, restconf, host=host, base_port=base_port, **profile_options) as farm:
+        for device in farm.devices:
+            click.echo(f'{device.protocol:<9}{device.profile.hostname:<20}{device.host}:{device.port}')
+        click.echo(f'已启动 {len(farm.devices)} 台模拟设备，按 Ctrl+C 停止')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
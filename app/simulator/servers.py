@@ -0,0 +1,351 @@
+"""
+模拟设备的协议服务端
+SSH（paramiko）、Telnet（socket）和RESTCONF（Flask/werkzeug），每个实例在本机监听一个端口，
+在后台线程中为每个连接单独开一个线程
+"""
+
+import logging
+import socket
+import threading
+from typing import Any, Dict, Optional
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+from app.simulator.device import LOGIN_ATTEMPTS, CLISession, DeviceProfile, LineReader, serve_cli
+
+logger = logging.getLogger(__name__)
+
+LISTEN_BACKLOG = 128
+
+class _TCPSimulator:
+    """基于TCP的命令行模拟器基类：监听端口，每个连接在独立线程中调用 handle()"""
+    
+    protocol = None
+    
+    def __init__(self, profile: DeviceProfile, host: str = '127.0.0.1', port: int = 0):
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.connections_total = 0
+        self._socket = None
+        self._connections = set()
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """开始监听，port=0时使用系统分配的端口"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(LISTEN_BACKLOG)
+        self.port = sock.getsockname()[1]
+        self._socket = sock
+        threading.Thread(target=self._accept_loop, name=f'sim-{self.protocol}-{self.port}', daemon=True).start()
+        return self
+    
+    def stop(self) -> None:
+        """停止监听并断开所有连接"""
+        if self._socket is None:
+            return
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+        self._socket = None
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+    
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except (OSError, AttributeError):
+                return
+            with self._lock:
+                self._connections.add(conn)
+                self.connections_total += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+    
+    def _serve(self, conn) -> None:
+        try:
+            self.handle(conn)
+        except Exception as e:
+            logger.debug(f'{self.protocol}模拟器连接异常: {self.profile.hostname} {e}')
+        finally:
+            with self._lock:
+                self._connections.discard(conn)
+            self._close(conn)
+    
+    @staticmethod
+    def _close(conn) -> None:
+        """正常关闭连接：先读完客户端已发送的数据，避免直接关闭时发出RST使客户端丢失最后的输出"""
+        try:
+            conn.shutdown(socket.SHUT_WR)
+            conn.settimeout(1)
+            while conn.recv(4096):
+                pass
+        except OSError:
+            pass
+        conn.close()
+    
+    def handle(self, conn) -> None:
+        raise NotImplementedError
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+def _get_host_key():
+    """所有SSH模拟器共用的主机密钥（生成RSA密钥较慢，只生成一次）"""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+if paramiko is not None:
+    class _SSHServer(paramiko.ServerInterface):
+        """paramiko服务端回调：密码认证、会话通道和shell请求"""
+        
+        def __init__(self, profile: DeviceProfile):
+            self.profile = profile
+            self.shell_requested = threading.Event()
+        
+        def get_allowed_auths(self, username):
+            return 'password'
+        
+        def check_auth_password(self, username, password):
+            if self.profile.authenticate(username, password):
+                return paramiko.AUTH_SUCCESSFUL
+            return paramiko.AUTH_FAILED
+        
+        def check_channel_request(self, kind, chanid):
+            if kind == 'session':
+                return paramiko.OPEN_SUCCEEDED
+            return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+        
+        def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+            return True
+        
+        def check_channel_shell_request(self, channel):
+            self.shell_requested.set()
+            return True
+
+class SSHSimulator(_TCPSimulator):
+    """SSH模拟器"""
+    
+    protocol = 'ssh'
+    
+    def start(self):
+        if paramiko is None:
+            raise RuntimeError('SSH模拟器需要安装paramiko')
+        _get_host_key()
+        return super().start()
+    
+    def handle(self, conn) -> None:
+        transport = paramiko.Transport(conn)
+        try:
+            transport.add_server_key(_get_host_key())
+            server = _SSHServer(self.profile)
+            transport.start_server(server=server)
+            channel = transport.accept(timeout=30)
+            if channel is None or not server.shell_requested.wait(10):
+                return
+            serve_cli(channel, CLISession(self.profile))
+            channel.close()
+        finally:
+            transport.close()
+
+# Telnet协议命令
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SUPPRESS_GO_AHEAD = 1, 3
+
+class _TelnetConnection:
+    """过滤客户端发来的Telnet协商命令，只向上层返回数据字节"""
+    
+    def __init__(self, sock):
+        self.sock = sock
+    
+    def sendall(self, data: bytes) -> None:
+        self.sock.sendall(data)
+    
+    def recv(self, n: int) -> bytes:
+        while True:
+            byte = self.sock.recv(1)
+            if not byte or byte[0] != IAC:
+                return byte
+            command = self.sock.recv(1)
+            if not command:
+                return b''
+            if command[0] == IAC:
+                return command
+            if command[0] in (WILL, WONT, DO, DONT):
+                self.sock.recv(1)
+            elif command[0] == SB:
+                self._skip_subnegotiation()
+    
+    def _skip_subnegotiation(self) -> None:
+        previous = None
+        while True:
+            byte = self.sock.recv(1)
+            if not byte or (previous == IAC and byte[0] == SE):
+                return
+            previous = byte[0]
+
+class TelnetSimulator(_TCPSimulator):
+    """Telnet模拟器：Username/Password登录，输错凭据最多重试 LOGIN_ATTEMPTS 次"""
+    
+    protocol = 'telnet'
+    
+    def handle(self, conn) -> None:
+        telnet = _TelnetConnection(conn)
+        # 与IOS一样由服务端回显，客户端不再本地回显
+        telnet.sendall(bytes([IAC, WILL, ECHO, IAC, WILL, SUPPRESS_GO_AHEAD]))
+        telnet.sendall(b'\r\nUser Access Verification\r\n\r\n')
+        reader = LineReader(telnet)
+        
+        for _ in range(LOGIN_ATTEMPTS):
+            telnet.sendall(b'Username: ')
+            username = reader.read_line()
+            if username is None:
+                return
+            telnet.sendall(b'Password: ')
+            password = reader.read_line(echo=False)
+            if password is None:
+                return
+            telnet.sendall(b'\r\n')
+            if self.profile.authenticate(username, password):
+                break
+            telnet.sendall(b'% Authentication failed\r\n\r\n')
+        else:
+            return
+        
+        serve_cli(telnet, CLISession(self.profile))
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    """不输出每个请求的访问日志"""
+    
+    def log(self, type, message, *args):
+        pass
+
+def _restconf_error(status: int, tag: str, message: str):
+    """RFC 8040格式的错误响应"""
+    response = jsonify({'ietf-restconf:errors': {'error': [
+        {'error-type': 'application', 'error-tag': tag, 'error-message': message}
+    ]}})
+    response.status_code = status
+    return response
+
+class RESTCONFSimulator:
+    """
+    RESTCONF模拟器
+    
+    内置 ietf-system:system-state、ietf-interfaces:interfaces 和 Cisco-IOS-XE-native:native/hostname，
+    PUT/POST/PATCH写入的数据保存在内存中，之后可以读取和删除
+    """
+    
+    protocol = 'restconf'
+    
+    def __init__(self, profile: DeviceProfile, host: str = '127.0.0.1', port: int = 0):
+        self.profile = profile
+        self.host = host
+        self.port = port
+        self.requests_total = 0
+        self.data: Dict[str, Any] = {}
+        self._server = None
+        self._lock = threading.Lock()
+    
+    def builtin(self, path: str) -> Optional[Dict[str, Any]]:
+        """内置资源的数据，路径不存在时返回None"""
+        profile = self.profile
+        if path == 'ietf-system:system-state':
+            return {'ietf-system:system-state': {
+                'platform': {'os-name': 'IOS-XE', 'os-release': '17.3.4', 'machine': 'C9300-48P'},
+                'clock': {'current-datetime': '2024-01-01T00:00:00+00:00'}
+            }}
+        if path == 'ietf-interfaces:interfaces':
+            return {'ietf-interfaces:interfaces': {'interface': [
+                {'name': name, 'description': f'sim-port-{i + 1}', 'type': 'iana-if-type:ethernetCsmacd',
+                 'enabled': True}
+                for i, name in enumerate(profile.interface_names())
+            ]}}
+        if path == 'Cisco-IOS-XE-native:native/hostname':
+            return {'Cisco-IOS-XE-native:hostname': profile.hostname}
+        return None
+    
+    def create_app(self) -> Flask:
+        app = Flask(f'restconf-simulator-{self.profile.hostname}')
+        
+        @app.before_request
+        def authenticate():
+            # 认证时模拟响应延迟，每个请求一次
+            with self._lock:
+                self.requests_total += 1
+            auth = request.authorization
+            if auth is None or not self.profile.authenticate(auth.username, auth.password):
+                return _restconf_error(401, 'access-denied', 'access denied')
+        
+        @app.route('/.well-known/host-meta')
+        def host_meta():
+            return ('<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">'
+                    '<Link rel="restconf" href="/restconf"/></XRD>', 200, {'Content-Type': 'application/xrd+xml'})
+        
+        @app.route('/restconf/data/<path:path>', methods=['GET', 'PUT', 'POST', 'PATCH', 'DELETE'])
+        def data(path):
+            with self._lock:
+                stored = self.data.get(path)
+            if request.method == 'GET':
+                body = stored if stored is not None else self.builtin(path)
+                if body is None:
+                    return _restconf_error(404, 'invalid-value', 'uri keypath not found')
+                response = jsonify(body)
+                response.mimetype = 'application/yang-data+json'
+                return response
+            if request.method == 'DELETE':
+                with self._lock:
+                    if self.data.pop(path, None) is None:
+                        return _restconf_error(404, 'data-missing', 'uri keypath not found')
+                return '', 204
+            
+            body = request.get_json(force=True, silent=True)
+            if body is None:
+                return _restconf_error(400, 'malformed-message', 'invalid JSON body')
+            with self._lock:
+                created = path not in self.data
+                if request.method == 'PATCH' and isinstance(self.data.get(path), dict):
+                    self.data[path].update(body)
+                else:
+                    self.data[path] = body
+            return '', 201 if created else 204
+        
+        return app
+    
+    def start(self):
+        """开始监听，port=0时使用系统分配的端口"""
+        self._server = make_server(self.host, self.port, self.create_app(), threaded=True,
+                                   request_handler=_QuietRequestHandler)
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, name=f'sim-restconf-{self.port}', daemon=True).start()
+        return self
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+SIMULATORS = {
+    'ssh': SSHSimulator,
+    'telnet': TelnetSimulator,
+    'restconf': RESTCONFSimulator,
+}
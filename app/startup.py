@@ -0,0 +1,110 @@
+"""
+启动耗时基准
+在新的子进程中测量Web应用和Celery worker的冷启动耗时（导入应用、创建应用、导入任务模块），
+并检查启动后是否导入了应当延迟导入的库，用于防止启动变慢：
+
+    python -m app.startup
+    python -m app.startup --profile worker --budget 1.5
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+import click
+
+# 默认参数
+DEFAULT_RUNS = 5
+
+PROFILES = ('web', 'worker')
+
+# 启动时不应导入的模块：设备连接库在首次连接设备时才导入，worker不需要迁移和调试工具栏
+DEFERRED_MODULES = {
+    'web': ('netmiko', 'paramiko', 'requests'),
+    'worker': ('netmiko', 'paramiko', 'requests', 'flask_migrate', 'alembic', 'flask_debugtoolbar')
+}
+
+# 子进程中执行的启动代码
+_STARTUP_CODE = {
+    'web': 'from app import create_app\ncreate_app({config!r})',
+    'worker': ('import importlib\n'
+               'from app.tasks.celery_app import TASK_MODULES, celery, flask_app\n'
+               'flask_app()\n'
+               'for name in TASK_MODULES:\n'
+               '    importlib.import_module(name)')
+}
+
+_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+{startup}
+seconds = time.perf_counter() - start
+from app.lazy import is_loaded
+print(json.dumps({{'seconds': seconds, 'loaded': [name for name in {deferred!r} if is_loaded(name)]}}))
+'''
+
+def _project_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure_once(profile: str, config_name: str = 'testing') -> Dict[str, Any]:
+    """在新的子进程中启动一次，返回 {'seconds', 'loaded'}"""
+    script = _SCRIPT.format(startup=_STARTUP_CODE[profile].format(config=config_name),
+                            deferred=DEFERRED_MODULES[profile])
+    # worker的应用配置取自 FLASK_ENV
+    env = dict(os.environ, FLASK_ENV=config_name)
+    completed = subprocess.run([sys.executable, '-c', script], cwd=_project_root(), env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def measure(profile: str, config_name: str = 'testing', runs: int = DEFAULT_RUNS) -> Dict[str, Any]:
+    """
+    多次测量冷启动耗时
+    
+    Returns:
+        {'profile', 'runs', 'median', 'min', 'max', 'loaded'}，loaded 为任一次启动中导入了的延迟导入模块
+    """
+    if profile not in PROFILES:
+        raise ValueError(f'profile 必须是 {"/".join(PROFILES)}')
+    samples = [measure_once(profile, config_name) for _ in range(runs)]
+    seconds = [sample['seconds'] for sample in samples]
+    loaded: List[str] = sorted({name for sample in samples for name in sample['loaded']})
+    return {
+        'profile': profile,
+        'runs': runs,
+        'median': round(statistics.median(seconds), 4),
+        'min': round(min(seconds), 4),
+        'max': round(max(seconds), 4),
+        'loaded': loaded
+    }
+
+@click.command()
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(PROFILES),
+              help='要测量的启动类型，可重复，默认全部')
+@click.option('--runs', default=DEFAULT_RUNS, show_default=True, help='每种启动类型的测量次数')
+@click.option('--config', 'config_name', default='testing', show_default=True, help='应用配置名称')
+@click.option('--budget', type=float, help='启动耗时中位数上限（秒），超过时返回非0')
+@click.option('--output', type=click.Path(dir_okay=False), help='结果JSON文件')
+def main(profiles, runs, config_name, budget, output):
+    """测量冷启动耗时"""
+    results = [measure(profile, config_name, runs) for profile in profiles or PROFILES]
+    
+    failed = False
+    click.echo(f'{"类型":<8}{"中位数":>10}{"最小":>10}{"最大":>10}  提前导入的模块')
+    for r in results:
+        click.echo(f'{r["profile"]:<8}{r["median"]:>10}{r["min"]:>10}{r["max"]:>10}  {", ".join(r["loaded"]) or "-"}')
+        if r['loaded'] or (budget is not None and r['median'] > budget):
+            failed = True
+    
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        click.echo(f'结果已写入 {output}')
+    
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,11 @@
 import traceback
 from datetime import datetime
 from app.tasks.celery_app import celery
+from app.tasks.fanout import dispatch, device_entry
+from app.progress import celery_reporter
+from app.cancellation import CancellationToken, device_scope
+from app.timing import collect_phases
+from app.communication.session_lock import device_session
 from app.models import Device, Task, TaskResult, TaskStatus, TaskType, ConfigBackup, AuditLog
 from app.communication.ssh_client import SSHService
 from app.communication.telnet_client import TelnetService
@@ -25,11 +30,17 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
     Returns:
         备份结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -42,15 +53,17 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
             return {'success': False, 'error': '设备不存在'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 20, 'status': '连接设备中...'})
+        reporter.update(20, '连接设备中...')
         
         # 根据连接类型获取配置
-        if device.connection_type.value == 'ssh':
-            result = SSHService.execute_command(device, 'show running-config', timeout)
-        elif device.connection_type.value == 'telnet':
-            result = TelnetService.execute_command(device, 'show running-config', timeout)
-        else:
-            result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        with collect_phases() as timings, device_scope(token), device_session(device, on_wait=reporter.on_wait) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.execute_command(device, 'show running-config', timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.execute_command(device, 'show running-config', timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
         
         if not result['success']:
             task.complete(False, error=f'获取配置失败: {result.get("error")}')
@@ -60,7 +73,7 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
         config_content = result['output']
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 60, 'status': '创建备份记录中...'})
+        reporter.update(60, '创建备份记录中...')
         
         # 创建备份记录
         if not backup_name:
@@ -84,6 +97,10 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
         device.last_config_backup = datetime.utcnow()
         db.session.add(device)
         
+        # 写入备份内容的耗时计入 db 阶段
+        with collect_phases(timings):
+            db.session.flush()
+        
         # 创建任务结果记录
         task_result = TaskResult(
             device_name=device.name,
@@ -96,6 +113,7 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
             task=task,
             device=device
         )
+        task_result.set_phase_timings(timings)
         db.session.add(task_result)
         
         # 完成任务
@@ -139,12 +157,18 @@ def backup_device_config(self, task_id, device_id, backup_name=None, timeout=30)
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
 
 @celery.task(bind=True)
 def batch_backup_configs(self, task_id, device_ids, backup_prefix=None, timeout=30):
     """
     批量备份设备配置任务
     
+    为每台设备分发一个 backup_config_for_batch 子任务并行执行，
+    全部完成后由回调汇总结果并完成任务
+    
     Args:
         task_id: 任务ID
         device_ids: 设备ID列表
@@ -152,151 +176,41 @@ def batch_backup_configs(self, task_id, device_ids, backup_prefix=None, timeout=
         timeout: 超时时间
         
     Returns:
-        备份结果字典
+        分发结果字典
     """
     try:
+        reporter = celery_reporter(self, task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
         
-        devices = Device.query.filter(Device.id.in_(device_ids)).all()
-        results = {}
-        total_devices = len(devices)
-        
-        for i, device in enumerate(devices):
-            # 更新任务进度
-            progress = int((i / total_devices) * 80) + 10
-            self.update_state(state='PROGRESS', meta={
-                'progress': progress, 
-                'status': f'备份设备 {i+1}/{total_devices}: {device.name}'
-            })
-            
-            try:
-                # 获取配置
-                if device.connection_type.value == 'ssh':
-                    result = SSHService.execute_command(device, 'show running-config', timeout)
-                elif device.connection_type.value == 'telnet':
-                    result = TelnetService.execute_command(device, 'show running-config', timeout)
-                else:
-                    result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
-                
-                if result['success']:
-                    config_content = result['output']
-                    
-                    # 创建备份记录
-                    backup_name = f'{backup_prefix}_{device.name}_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}' if backup_prefix else f'{device.name}_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
-                    
-                    backup = ConfigBackup(
-                        name=backup_name,
-                        description=f'批量备份 - 设备 {device.name} 的配置',
-                        backup_type='manual',
-                        config_content=config_content,
-                        config_size=len(config_content),
-                        device=device,
-                        user_id=task.user_id
-                    )
-                    backup.calculate_hash()
-                    backup.mark_as_current()
-                    
-                    db.session.add(backup)
-                    
-                    # 更新设备最后备份时间
-                    device.last_config_backup = datetime.utcnow()
-                    db.session.add(device)
-                    
-                    results[device.id] = {
-                        'device_name': device.name,
-                        'device_ip': device.ip_address,
-                        'result': {
-                            'success': True,
-                            'backup_id': backup.id,
-                            'backup_name': backup.name,
-                            'config_size': backup.config_size
-                        }
-                    }
-                else:
-                    results[device.id] = {
-                        'device_name': device.name,
-                        'device_ip': device.ip_address,
-                        'result': {
-                            'success': False,
-                            'error': result.get('error')
-                        }
-                    }
-                
-                # 创建任务结果记录
-                task_result = TaskResult(
-                    device_name=device.name,
-                    device_ip=device.ip_address,
-                    command='show running-config',
-                    output=result.get('output', '')[:500] + '...' if result.get('output') and len(result.get('output')) > 500 else result.get('output'),
-                    error=result.get('error'),
-                    exit_code=0 if result['success'] else 1,
-                    execution_time=result.get('execution_time'),
-                    task=task,
-                    device=device
-                )
-                db.session.add(task_result)
-                
-            except Exception as e:
-                error_msg = f'设备 {device.name} 备份失败: {str(e)}'
-                
-                # 创建失败的任务结果记录
-                task_result = TaskResult(
-                    device_name=device.name,
-                    device_ip=device.ip_address,
-                    command='show running-config',
-                    output=None,
-                    error=error_msg,
-                    exit_code=1,
-                    execution_time=0,
-                    task=task,
-                    device=device
-                )
-                db.session.add(task_result)
-                
-                results[device.id] = {
-                    'device_name': device.name,
-                    'device_ip': device.ip_address,
-                    'result': {
-                        'success': False,
-                        'error': error_msg
-                    }
-                }
-        
-        # 计算总体结果
-        success_count = sum(1 for r in results.values() if r['result']['success'])
-        overall_success = success_count > 0
+        device_ids = [device_id for (device_id,) in
+                      db.session.query(Device.id).filter(Device.id.in_(device_ids)).all()]
+        if not device_ids:
+            task.complete(False, error='没有可备份的设备')
+            db.session.commit()
+            return {'success': False, 'error': '没有可备份的设备'}
         
-        # 完成任务
-        task.complete(overall_success, f'成功备份 {success_count}/{total_devices} 个设备的配置')
-        db.session.commit()
+        reporter.update(10, f'分发 {len(device_ids)} 个设备的备份任务...')
         
-        # 记录审计日志
-        AuditLog.log_action(
-            user_id=task.user_id,
+        result = dispatch(
+            backup_config_for_batch,
+            [(task_id, device_id, backup_prefix, timeout) for device_id in device_ids],
+            task_id,
             action='batch_backup_configs_task',
-            resource_type='device',
-            success=overall_success,
-            task=task,
-            details={
-                'device_count': total_devices,
-                'success_count': success_count,
-                'backup_prefix': backup_prefix,
-                'results': results
-            }
+            summary='成功备份 {success_count}/{total_devices} 个设备的配置',
+            details={'backup_prefix': backup_prefix}
         )
         
-        return {
-            'success': overall_success,
-            'results': results,
-            'total_devices': total_devices,
-            'success_count': success_count
-        }
+        return {'success': True, 'dispatched': len(device_ids), 'callback_id': result.id}
         
     except Exception as e:
         error_msg = f'批量配置备份异常: {str(e)}'
@@ -309,6 +223,117 @@ def batch_backup_configs(self, task_id, device_ids, backup_prefix=None, timeout=
         
         return {'success': False, 'error': error_msg}
 
+@celery.task
+def backup_config_for_batch(task_id, device_id, backup_prefix=None, timeout=30):
+    """
+    批量备份的单设备子任务：获取配置、创建备份记录和任务结果记录
+    
+    Args:
+        task_id: 父任务ID
+        device_id: 设备ID
+        backup_prefix: 备份名称前缀
+        timeout: 超时时间
+        
+    Returns:
+        设备结果字典（见 device_entry）
+    """
+    device = Device.query.get(device_id)
+    if not device:
+        return {'device_id': device_id, 'device_name': None, 'device_ip': None, 'connection_type': None,
+                'result': {'success': False, 'error': '设备不存在'}}
+    
+    task = Task.query.get(task_id)
+    try:
+        # 获取配置
+        with collect_phases() as timings, device_scope(CancellationToken(task_id)), device_session(device) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.execute_command(device, 'show running-config', timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.execute_command(device, 'show running-config', timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
+        
+        if result['success']:
+            config_content = result['output']
+            
+            # 创建备份记录
+            backup_name = f'{backup_prefix}_{device.name}_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}' if backup_prefix else f'{device.name}_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+            
+            backup = ConfigBackup(
+                name=backup_name,
+                description=f'批量备份 - 设备 {device.name} 的配置',
+                backup_type='manual',
+                config_content=config_content,
+                config_size=len(config_content),
+                device=device,
+                user_id=task.user_id if task else None
+            )
+            backup.calculate_hash()
+            backup.mark_as_current()
+            
+            db.session.add(backup)
+            
+            # 更新设备最后备份时间
+            device.last_config_backup = datetime.utcnow()
+            db.session.add(device)
+            with collect_phases(timings):
+                db.session.flush()
+            
+            device_result = {
+                'success': True,
+                'backup_id': backup.id,
+                'backup_name': backup.name,
+                'config_size': backup.config_size
+            }
+        else:
+            device_result = {
+                'success': False,
+                'error': result.get('error')
+            }
+        
+        # 创建任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command='show running-config',
+            output=result.get('output', '')[:500] + '...' if result.get('output') and len(result.get('output')) > 500 else result.get('output'),
+            error=result.get('error'),
+            exit_code=0 if result['success'] else 1,
+            execution_time=result.get('execution_time'),
+            task_id=task_id,
+            device_id=device.id
+        )
+        task_result.set_phase_timings(timings)
+        db.session.add(task_result)
+        db.session.commit()
+        
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f'设备 {device.name} 备份失败: {str(e)}'
+        
+        # 创建失败的任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command='show running-config',
+            output=None,
+            error=error_msg,
+            exit_code=1,
+            execution_time=0,
+            task_id=task_id,
+            device_id=device.id
+        )
+        db.session.add(task_result)
+        db.session.commit()
+        
+        device_result = {
+            'success': False,
+            'error': error_msg
+        }
+    
+    return device_entry(device, device_result, task_id)
+
 @celery.task(bind=True)
 def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
     """
@@ -323,11 +348,17 @@ def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
     Returns:
         恢复结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -352,7 +383,7 @@ def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
             return {'success': False, 'error': '备份与设备不匹配'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 30, 'status': '准备恢复配置中...'})
+        reporter.update(30, '准备恢复配置中...')
         
         # 将配置按行分割为命令
         config_lines = [line.strip() for line in backup.config_content.split('\n') if line.strip()]
@@ -366,18 +397,20 @@ def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
                 config_commands.append(line)
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 50, 'status': '应用配置中...'})
+        reporter.update(50, '应用配置中...')
         
         # 根据连接类型应用配置
-        if device.connection_type.value == 'ssh':
-            result = SSHService.send_config(device, config_commands, timeout)
-        elif device.connection_type.value == 'telnet':
-            result = TelnetService.send_config(device, config_commands, timeout)
-        else:
-            result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        with collect_phases() as timings, device_scope(token), device_session(device, on_wait=reporter.on_wait) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.send_config(device, config_commands, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.send_config(device, config_commands, timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 80, 'status': '更新备份状态中...'})
+        reporter.update(80, '更新备份状态中...')
         
         # 标记备份为已恢复
         backup.restore(task.user)
@@ -394,6 +427,7 @@ def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
             task=task,
             device=device
         )
+        task_result.set_phase_timings(timings)
         db.session.add(task_result)
         
         # 完成任务
@@ -436,3 +470,6 @@ def restore_device_config(self, task_id, device_id, backup_id, timeout=30):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
@@ -1,32 +1,147 @@
 """
 Celery应用配置
-用于异步任务处理
+用于异步任务处理。导入本模块时不创建Flask应用：Web应用在 create_app 中调用 init_celery，
+worker/beat在加载Celery配置时（见 configure_worker_app）创建只初始化任务所需扩展的应用
 """
 
 from celery import Celery
-from app import create_app
+from celery.schedules import crontab
+import os
+from celery.signals import celeryd_init, worker_init, worker_process_shutdown, task_prerun, task_postrun
+from flask import has_app_context
+from app import APP_PROFILE_WORKER, create_app, audit_writer, metrics_exporter, profile_manager
+from app.metrics import DEFAULT_WORKER_METRICS_PORT, clear_multiproc_dir, mark_process_dead
+from app.tasks.routing import (
+    TASK_QUEUES, TASK_ROUTES, QUEUE_INTERACTIVE, MAX_PRIORITY, broker_priority, worker_concurrency
+)
 
-def make_celery(app=None):
-    """创建Celery应用"""
-    app = app or create_app()
+# 任务模块
+TASK_MODULES = [
+    'app.tasks.fanout',
+    'app.tasks.network_tasks',
+    'app.tasks.template_tasks',
+    'app.tasks.backup_tasks',
+    'app.tasks.maintenance_tasks',
+    'app.tasks.inventory_tasks'
+]
+
+# 没有应用上下文时任务使用的Flask应用（init_celery 设置）
+_flask_app = None
+
+def flask_app():
+    """任务使用的Flask应用，尚未设置时创建worker应用（APP_PROFILE_WORKER）"""
+    if _flask_app is None:
+        init_celery(create_app(profile=APP_PROFILE_WORKER))
+    return _flask_app
+
+def in_app_context(fn, *args, **kwargs):
+    """在应用上下文中调用：已有应用上下文时直接调用，否则使用 flask_app() 的上下文"""
+    if has_app_context():
+        return fn(*args, **kwargs)
+    with flask_app().app_context():
+        return fn(*args, **kwargs)
+
+def make_celery():
+    """
+    创建Celery应用
     
-    celery = Celery(
-        app.import_name,
-        backend=app.config['CELERY_RESULT_BACKEND'],
-        broker=app.config['CELERY_BROKER_URL']
-    )
+    只设置与Flask应用无关的配置（队列、路由、优先级、定时任务），broker等配置由 init_celery 按Flask应用设置
+    """
+    # 任务模块由worker启动时导入（include），导入本模块时不加载任务模块及其依赖
+    celery = Celery('app', include=TASK_MODULES)
     
     class ContextTask(celery.Task):
-        """确保任务在Flask应用上下文中运行"""
+        """确保任务在Flask应用上下文中运行（Web进程中eager执行时使用调用方的应用上下文）"""
         def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return self.run(*args, **kwargs)
+            return in_app_context(self.run, *args, **kwargs)
     
     celery.Task = ContextTask
+    
+    # 队列路由与优先级
+    celery.conf.update(
+        task_queues=TASK_QUEUES,
+        task_routes=TASK_ROUTES,
+        task_default_queue=QUEUE_INTERACTIVE,
+        task_inherit_parent_priority=True,
+        task_queue_max_priority=MAX_PRIORITY + 1,
+        broker_transport_options={
+            'priority_steps': list(range(MAX_PRIORITY + 1)),
+            'sep': ':',
+            'queue_order_strategy': 'priority'
+        },
+        # 每个worker进程只预取一条消息，避免低优先级任务占住进程
+        worker_prefetch_multiplier=1
+    )
+    
+    @celeryd_init.connect(weak=False)
+    def configure_worker_concurrency(conf=None, options=None, **kwargs):
+        """worker启动时按消费的队列设置并发数（命令行指定了 --concurrency 时不覆盖）"""
+        options = options or {}
+        if options.get('concurrency'):
+            return
+        concurrency = worker_concurrency(options.get('queues'), flask_app().config)
+        if concurrency:
+            conf.worker_concurrency = concurrency
+    
+    @worker_init.connect(weak=False)
+    def start_metrics_exporter(**kwargs):
+        """worker主进程启动Prometheus指标端口（多进程模式下汇总各子进程的指标）"""
+        clear_multiproc_dir()
+        metrics_exporter.start_worker_exporter(flask_app().config.get('CELERY_METRICS_PORT', DEFAULT_WORKER_METRICS_PORT))
+    
+    # 定时任务
+    celery.conf.beat_schedule = {
+        'maintain-partitions': {
+            'task': 'app.tasks.maintenance_tasks.maintain_partitions',
+            'schedule': crontab(hour=3, minute=0)
+        },
+        'refresh-device-facts': {
+            'task': 'app.tasks.inventory_tasks.batch_refresh_facts',
+            'schedule': crontab(minute=30)
+        }
+    }
     return celery
 
 # 创建Celery实例
 celery = make_celery()
 
-# 导入任务模块
-from app.tasks import network_tasks, template_tasks, backup_tasks
+def init_celery(app):
+    """
+    按Flask应用的配置设置Celery（broker、结果后端、优先级、eager模式），
+    没有应用上下文时（worker中）任务在该应用的上下文中执行
+    """
+    global _flask_app
+    _flask_app = app
+    broker_url = app.config.get('CELERY_BROKER_URL')
+    celery.conf.update(
+        broker_url=broker_url,
+        result_backend=app.config.get('CELERY_RESULT_BACKEND'),
+        task_default_priority=broker_priority(5, broker_url),
+        # 未配置broker时任务在提交的进程内执行（Web请求中由后台线程池提交，见 app.tasks.routing.submit）
+        task_always_eager=not broker_url
+    )
+
+@celery.on_configure.connect
+def configure_worker_app(sender=None, **kwargs):
+    """加载Celery配置时还没有Flask应用（worker、beat进程）则创建worker应用"""
+    flask_app()
+
+@worker_process_shutdown.connect
+def flush_audit_log(**kwargs):
+    """worker子进程退出时写出剩余的审计日志（子进程不会执行atexit）"""
+    audit_writer.shutdown()
+
+@worker_process_shutdown.connect
+def clear_process_metrics(pid=None, **kwargs):
+    """worker子进程退出时清理其实时指标文件"""
+    mark_process_dead(pid or os.getpid())
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    """按性能分析设置对任务采样（信号在任务的应用上下文之外发送）"""
+    in_app_context(profile_manager.task_started, task_id, task.name)
+
+@task_postrun.connect
+def finish_task_profile(task_id=None, task=None, **kwargs):
+    """保存任务的分析结果"""
+    in_app_context(profile_manager.task_finished, task_id, task.name)
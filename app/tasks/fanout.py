@@ -0,0 +1,151 @@
+"""
+批量任务扇出
+父任务为每台设备分发一个子任务（设备较多时用 chunks 分块），
+以 chord 并行执行，回调汇总各设备结果并完成父任务
+"""
+
+from celery import chord, group
+from flask import current_app
+from app.tasks.celery_app import celery
+from app.models import Task, AuditLog
+from app.progress import celery_reporter
+from app import db, events
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_CHUNK_THRESHOLD = 200   # TASK_FANOUT_CHUNK_THRESHOLD：设备数超过此值时改为分块
+DEFAULT_CHUNK_SIZE = 20         # TASK_FANOUT_CHUNK_SIZE：每个分块子任务处理的设备数
+
+def build_header(subtask, args_list):
+    """
+    构建chord的header
+    
+    设备数不超过阈值时每台设备一个子任务；否则用 chunks 分块，减少消息和结果数量。
+    分块以 celery.starmap 任务发送，TASK_ROUTES 匹配不到，需要显式指定子任务所在的队列
+    """
+    threshold = current_app.config.get('TASK_FANOUT_CHUNK_THRESHOLD', DEFAULT_CHUNK_THRESHOLD)
+    if len(args_list) > threshold:
+        chunk_size = current_app.config.get('TASK_FANOUT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        queue = celery.amqp.router.route({}, subtask.name)['queue'].name
+        return group(chunk.set(queue=queue) for chunk in subtask.chunks(args_list, chunk_size).group().tasks)
+    return group(subtask.s(*args) for args in args_list)
+
+def dispatch(subtask, args_list, task_id, action, summary, details=None):
+    """
+    分发子任务，全部完成后由 finalize_batch_task 汇总
+    
+    Args:
+        subtask: 单设备子任务
+        args_list: 每台设备的子任务参数元组列表
+        task_id: 父任务（Task记录）ID
+        action: 审计日志动作名称
+        summary: 结果消息模板，可使用 {success_count} 和 {total_devices}
+        details: 审计日志的额外详情
+    
+    Returns:
+        chord回调的AsyncResult
+    """
+    callback = finalize_batch_task.s(task_id, action, summary, details or {})
+    callback.on_error(fail_batch_task.s(task_id))
+    header = build_header(subtask, args_list)
+    # 预先分配子任务ID并记录到任务元数据，取消任务时撤销尚未执行的子任务
+    subtask_ids = [result.id for result in header.freeze().results]
+    
+    task = Task.query.get(task_id)
+    if task:
+        task.set_metadata(dict(task.get_metadata(), subtask_ids=subtask_ids))
+        db.session.commit()
+    
+    return chord(header)(callback)
+
+def revoke_task(task):
+    """
+    撤销任务在Celery中尚未执行的消息：任务本身和批量任务的子任务
+    
+    不终止正在执行的进程，执行中的任务通过取消令牌在下一个检查点停止（见 app.cancellation），
+    保证设备会话和连接正常释放
+    """
+    metadata = task.get_metadata()
+    task_ids = metadata.get('subtask_ids', [])
+    if metadata.get('celery_task_id'):
+        task_ids = [metadata['celery_task_id']] + task_ids
+    # 未配置broker时任务在后台线程池中执行，没有可撤销的消息
+    if task_ids and current_app.config.get('CELERY_BROKER_URL'):
+        celery.control.revoke(task_ids)
+    return len(task_ids)
+
+def flatten_results(results):
+    """展开分块子任务返回的嵌套列表"""
+    flat = []
+    for item in results:
+        if isinstance(item, list):
+            flat.extend(item)
+        else:
+            flat.append(item)
+    return flat
+
+def device_entry(device, result, task_id=None):
+    """单设备子任务的返回格式，指定 task_id 时同时发布到父任务的事件频道"""
+    entry = {
+        'device_id': device.id,
+        'device_name': device.name,
+        'device_ip': device.ip_address,
+        'connection_type': device.connection_type.value if device.connection_type else None,
+        'result': result
+    }
+    events.publish(task_id, events.EVENT_DEVICE, entry)
+    return entry
+
+@celery.task(bind=True)
+def finalize_batch_task(self, results, task_id, action, summary, details):
+    """
+    chord回调：汇总子任务结果，完成父任务并记录审计日志
+    
+    Args:
+        results: 各子任务的返回值（分块时为嵌套列表）
+        task_id: 父任务ID
+        action: 审计日志动作名称
+        summary: 结果消息模板
+        details: 审计日志的额外详情
+    
+    Returns:
+        汇总结果字典
+    """
+    results = {entry['device_id']: entry for entry in flatten_results(results)}
+    total_devices = len(results)
+    success_count = sum(1 for r in results.values() if r['result']['success'])
+    overall_success = success_count > 0
+    
+    message = summary.format(success_count=success_count, total_devices=total_devices)
+    
+    task = Task.query.get(task_id)
+    if task:
+        task.complete(overall_success, message)
+        db.session.commit()
+        
+        AuditLog.log_action(
+            user_id=task.user_id,
+            action=action,
+            resource_type='device',
+            success=overall_success,
+            task=task,
+            details=dict(details, device_count=total_devices, success_count=success_count, results=results)
+        )
+    
+    celery_reporter(self, task_id).finish(status=message)
+    
+    return {
+        'success': overall_success,
+        'results': results,
+        'total_devices': total_devices,
+        'success_count': success_count
+    }
+
+@celery.task(bind=True)
+def fail_batch_task(self, request, exc, traceback, task_id):
+    """chord执行失败（如子任务进程异常退出）时将父任务标记为失败"""
+    error = f'批量子任务执行失败: {exc}'
+    task = Task.query.get(task_id)
+    if task:
+        task.complete(False, error=error)
+        db.session.commit()
+    celery_reporter(self, task_id).finish(status=error)
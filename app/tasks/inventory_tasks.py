@@ -0,0 +1,138 @@
+"""
+清单采集任务模块
+通过RESTCONF并发采集设备清单并写入 device_inventory 表，按有效期刷新设备信息缓存
+"""
+
+import traceback
+from celery import group
+from app.tasks.celery_app import celery
+from app.cancellation import device_scope
+from app.communication.session_lock import device_session
+from app.devices.services import DeviceInventoryService, DeviceFactsService
+from app.models import Device, ConnectionType
+from app import db
+
+def _collect(device_id, names, timeout):
+    """采集单台设备的清单"""
+    device = Device.query.get(device_id)
+    if not device:
+        return {'success': False, 'device_id': device_id, 'error': '设备不存在'}
+    if device.connection_type != ConnectionType.RESTCONF:
+        return {'success': False, 'device_id': device_id, 'error': '设备不是RESTCONF连接'}
+    
+    try:
+        with device_scope(), device_session(device):
+            result = DeviceInventoryService.collect_restconf(device, names, timeout)
+        return {'device_id': device_id, **result}
+    except Exception as e:
+        return {
+            'success': False,
+            'device_id': device_id,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+
+@celery.task
+def collect_device_inventory(device_id, names=None, timeout=30):
+    """
+    采集设备清单任务
+    
+    Args:
+        device_id: 设备ID
+        names: 采集项名称列表，默认全部
+        timeout: 超时时间
+        
+    Returns:
+        采集结果字典
+    """
+    return _collect(device_id, names, timeout)
+
+@celery.task
+def collect_inventory_for_batch(device_id, names=None, timeout=30):
+    """批量清单采集的单设备子任务（进入批量队列）"""
+    return _collect(device_id, names, timeout)
+
+@celery.task
+def batch_collect_inventory(device_ids=None, names=None, timeout=30):
+    """
+    批量采集设备清单任务
+    
+    Args:
+        device_ids: 设备ID列表，默认全部启用的RESTCONF设备
+        names: 采集项名称列表，默认全部
+        timeout: 超时时间
+        
+    Returns:
+        分发结果字典
+    """
+    query = db.session.query(Device.id).filter(
+        Device.is_active.is_(True),
+        Device.connection_type == ConnectionType.RESTCONF
+    )
+    if device_ids:
+        query = query.filter(Device.id.in_(device_ids))
+    ids = [device_id for (device_id,) in query.order_by(Device.id)]
+    
+    if ids:
+        group(collect_inventory_for_batch.s(device_id, names, timeout) for device_id in ids).apply_async()
+    return {'success': True, 'device_ids': ids}
+
+def _refresh_facts(device_id, timeout, max_age):
+    """设备信息过期时重新采集"""
+    device = Device.query.get(device_id)
+    if not device:
+        return {'success': False, 'device_id': device_id, 'error': '设备不存在'}
+    if DeviceFactsService.is_fresh(device, max_age):
+        return {'success': True, 'device_id': device_id, 'skipped': True}
+    
+    try:
+        with device_scope(), device_session(device):
+            result = DeviceFactsService.collect(device, timeout)
+        return {'device_id': device_id, **result}
+    except Exception as e:
+        return {
+            'success': False,
+            'device_id': device_id,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+
+@celery.task
+def refresh_device_facts(device_id, timeout=30, max_age=None):
+    """
+    刷新设备信息任务（有效期内不连接设备）
+    
+    Args:
+        device_id: 设备ID
+        timeout: 超时时间
+        max_age: 有效期（秒），默认 DEVICE_FACTS_MAX_AGE，0表示强制刷新
+        
+    Returns:
+        刷新结果字典
+    """
+    return _refresh_facts(device_id, timeout, max_age)
+
+@celery.task
+def refresh_facts_for_batch(device_id, timeout=30, max_age=None):
+    """批量刷新设备信息的单设备子任务（进入批量队列）"""
+    return _refresh_facts(device_id, timeout, max_age)
+
+@celery.task
+def batch_refresh_facts(device_ids=None, timeout=30, max_age=None):
+    """
+    批量刷新设备信息任务（定时执行）
+    
+    只为设备信息未采集或已过期的设备分发子任务
+    
+    Args:
+        device_ids: 设备ID列表，默认全部启用的设备
+        timeout: 超时时间
+        max_age: 有效期（秒），默认 DEVICE_FACTS_MAX_AGE
+        
+    Returns:
+        分发结果字典
+    """
+    ids = DeviceFactsService.get_stale_device_ids(max_age, device_ids)
+    if ids:
+        group(refresh_facts_for_batch.s(device_id, timeout, max_age) for device_id in ids).apply_async()
+    return {'success': True, 'device_ids': ids}
@@ -0,0 +1,58 @@
+"""
+维护任务模块
+包含分区维护、过期数据归档、凭据密钥轮换等任务
+"""
+
+import traceback
+from app.tasks.celery_app import celery
+from app.partitions import PartitionManager
+from app import credential_vault
+
+@celery.task
+def maintain_partitions():
+    """
+    分区维护任务（每日执行）
+    
+    为原生分区表提前创建后续月份的分区，并将超过保留期的月份归档到压缩文件
+    
+    Returns:
+        维护结果字典
+    """
+    try:
+        created = PartitionManager.ensure_partitions()
+        archived = PartitionManager.archive_expired()
+        return {
+            'success': True,
+            'created': created,
+            'archived': archived
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+
+@celery.task
+def rotate_credentials(batch_size=None):
+    """
+    凭据密钥轮换任务
+    
+    更换 SECRET_KEY 并将旧密钥加入 CREDENTIAL_PREVIOUS_KEYS 后执行，
+    完成后即可从 CREDENTIAL_PREVIOUS_KEYS 中移除旧密钥
+    
+    Args:
+        batch_size: 每批处理的设备数
+        
+    Returns:
+        轮换结果字典
+    """
+    try:
+        result = credential_vault.rotate_all(batch_size)
+        return {'success': True, **result}
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
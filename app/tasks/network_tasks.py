@@ -6,12 +6,18 @@
 import time
 import traceback
 from datetime import datetime
-from celery import current_task
+from celery import current_task, group
 from app.tasks.celery_app import celery
+from app.tasks.fanout import dispatch, device_entry
+from app.progress import celery_reporter
+from app.cancellation import CancellationToken, device_scope
+from app.timing import collect_phases
+from app.communication.session_lock import device_session
 from app.models import Device, Task, TaskResult, TaskStatus, TaskType, AuditLog
 from app.communication.ssh_client import SSHService
 from app.communication.telnet_client import TelnetService
 from app.communication.restconf_client import RESTCONFService
+from app.devices.services import DeviceFactsService, DeviceStatusService
 from app import db
 
 @celery.task(bind=True)
@@ -28,11 +34,17 @@ def execute_device_command(self, task_id, device_id, command, timeout=30):
     Returns:
         执行结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -45,24 +57,26 @@ def execute_device_command(self, task_id, device_id, command, timeout=30):
             return {'success': False, 'error': '设备不存在'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 10, 'status': '连接设备中...'})
+        reporter.update(10, '连接设备中...')
         
         # 根据连接类型选择相应的服务
-        if device.connection_type.value == 'ssh':
-            result = SSHService.execute_command(device, command, timeout)
-        elif device.connection_type.value == 'telnet':
-            result = TelnetService.execute_command(device, command, timeout)
-        elif device.connection_type.value == 'restconf':
-            # RESTCONF需要根据命令类型处理
-            if command.startswith('GET '):
-                result = RESTCONFService.get_system_info(device, timeout)
+        with collect_phases() as timings, device_scope(token), device_session(device, on_wait=reporter.on_wait) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.execute_command(device, command, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.execute_command(device, command, timeout)
+            elif device.connection_type.value == 'restconf':
+                # RESTCONF需要根据命令类型处理
+                if command.startswith('GET '):
+                    result = RESTCONFService.get_system_info(device, timeout)
+                else:
+                    result = {'success': False, 'error': f'RESTCONF不支持命令: {command}'}
             else:
-                result = {'success': False, 'error': f'RESTCONF不支持命令: {command}'}
-        else:
-            result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 90, 'status': '处理结果中...'})
+        reporter.update(90, '处理结果中...')
         
         # 创建任务结果记录
         task_result = TaskResult(
@@ -76,6 +90,7 @@ def execute_device_command(self, task_id, device_id, command, timeout=30):
             task=task,
             device=device
         )
+        task_result.set_phase_timings(timings)
         db.session.add(task_result)
         
         # 完成任务
@@ -116,6 +131,9 @@ def execute_device_command(self, task_id, device_id, command, timeout=30):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
 
 @celery.task(bind=True)
 def execute_device_commands(self, task_id, device_id, commands, timeout=30):
@@ -131,11 +149,17 @@ def execute_device_commands(self, task_id, device_id, commands, timeout=30):
     Returns:
         执行结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -150,41 +174,42 @@ def execute_device_commands(self, task_id, device_id, commands, timeout=30):
         results = []
         total_commands = len(commands)
         
-        for i, command in enumerate(commands):
-            # 更新任务进度
-            progress = int((i / total_commands) * 80) + 10
-            self.update_state(state='PROGRESS', meta={
-                'progress': progress, 
-                'status': f'执行命令 {i+1}/{total_commands}: {command[:50]}...'
-            })
-            
-            # 执行命令
-            if device.connection_type.value == 'ssh':
-                result = SSHService.execute_command(device, command, timeout)
-            elif device.connection_type.value == 'telnet':
-                result = TelnetService.execute_command(device, command, timeout)
-            else:
-                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
-            
-            results.append(result)
-            
-            # 创建任务结果记录
-            task_result = TaskResult(
-                device_name=device.name,
-                device_ip=device.ip_address,
-                command=command,
-                output=result.get('output'),
-                error=result.get('error'),
-                exit_code=0 if result['success'] else 1,
-                execution_time=result.get('execution_time'),
-                task=task,
-                device=device
-            )
-            db.session.add(task_result)
-            
-            # 如果命令执行失败，可以选择是否继续
-            if not result['success']:
-                break
+        # 所有命令共用一个设备执行期限
+        with device_scope(token):
+            for i, command in enumerate(commands):
+                # 更新任务进度（按时间间隔和进度变化合并）
+                reporter.step(i, total_commands, f'执行命令 {i+1}/{total_commands}: {command[:50]}...', start=10, end=90)
+                
+                # 执行命令
+                with collect_phases() as timings, device_session(device, on_wait=reporter.on_wait) as session:
+                    if device.connection_type.value == 'ssh':
+                        result = SSHService.execute_command(device, command, timeout)
+                    elif device.connection_type.value == 'telnet':
+                        result = TelnetService.execute_command(device, command, timeout)
+                    else:
+                        result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+                result['wait_time'] = session.waited
+                
+                results.append(result)
+                
+                # 创建任务结果记录
+                task_result = TaskResult(
+                    device_name=device.name,
+                    device_ip=device.ip_address,
+                    command=command,
+                    output=result.get('output'),
+                    error=result.get('error'),
+                    exit_code=0 if result['success'] else 1,
+                    execution_time=result.get('execution_time'),
+                    task=task,
+                    device=device
+                )
+                task_result.set_phase_timings(timings)
+                db.session.add(task_result)
+                
+                # 如果命令执行失败，可以选择是否继续
+                if not result['success']:
+                    break
         
         # 计算总体结果
         success_count = sum(1 for r in results if r['success'])
@@ -228,6 +253,9 @@ def execute_device_commands(self, task_id, device_id, commands, timeout=30):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
 
 @celery.task(bind=True)
 def test_device_connection(self, task_id, device_id, timeout=30):
@@ -242,11 +270,17 @@ def test_device_connection(self, task_id, device_id, timeout=30):
     Returns:
         测试结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -259,17 +293,22 @@ def test_device_connection(self, task_id, device_id, timeout=30):
             return {'success': False, 'error': '设备不存在'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 50, 'status': '测试连接中...'})
+        reporter.update(50, '测试连接中...')
         
         # 根据连接类型选择相应的服务
-        if device.connection_type.value == 'ssh':
-            result = SSHService.test_connection(device, timeout)
-        elif device.connection_type.value == 'telnet':
-            result = TelnetService.test_connection(device, timeout)
-        elif device.connection_type.value == 'restconf':
-            result = RESTCONFService.test_connection(device, timeout)
-        else:
-            result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        with device_scope(token), device_session(device, on_wait=reporter.on_wait) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.test_connection(device, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.test_connection(device, timeout)
+            elif device.connection_type.value == 'restconf':
+                result = RESTCONFService.test_connection(device, timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
+        # 连接测试的 show version 输出同时更新设备信息缓存
+        if result.get('facts'):
+            DeviceFactsService.update_facts(device, result['facts'])
         
         # 完成任务
         task.complete(result['success'], result.get('message', ''), result.get('error', ''))
@@ -302,98 +341,58 @@ def test_device_connection(self, task_id, device_id, timeout=30):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
 
 @celery.task(bind=True)
 def batch_test_connections(self, task_id, device_ids, timeout=30):
     """
     批量测试设备连接任务
     
+    为每台设备分发一个 test_connection_for_batch 子任务并行执行，
+    全部完成后由回调汇总结果并完成任务
+    
     Args:
         task_id: 任务ID
         device_ids: 设备ID列表
         timeout: 超时时间
         
     Returns:
-        测试结果字典
+        分发结果字典
     """
     try:
+        reporter = celery_reporter(self, task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
         
-        devices = Device.query.filter(Device.id.in_(device_ids)).all()
-        results = {}
-        total_devices = len(devices)
-        
-        for i, device in enumerate(devices):
-            # 更新任务进度
-            progress = int((i / total_devices) * 80) + 10
-            self.update_state(state='PROGRESS', meta={
-                'progress': progress, 
-                'status': f'测试设备 {i+1}/{total_devices}: {device.name}'
-            })
-            
-            try:
-                # 测试连接
-                if device.connection_type.value == 'ssh':
-                    result = SSHService.test_connection(device, timeout)
-                elif device.connection_type.value == 'telnet':
-                    result = TelnetService.test_connection(device, timeout)
-                elif device.connection_type.value == 'restconf':
-                    result = RESTCONFService.test_connection(device, timeout)
-                else:
-                    result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
-                
-                results[device.id] = {
-                    'device_name': device.name,
-                    'device_ip': device.ip_address,
-                    'connection_type': device.connection_type.value,
-                    'result': result
-                }
-                
-            except Exception as e:
-                results[device.id] = {
-                    'device_name': device.name,
-                    'device_ip': device.ip_address,
-                    'connection_type': device.connection_type.value,
-                    'result': {
-                        'success': False,
-                        'error': str(e)
-                    }
-                }
-        
-        # 计算总体结果
-        success_count = sum(1 for r in results.values() if r['result']['success'])
-        overall_success = success_count > 0
+        device_ids = [device_id for (device_id,) in
+                      db.session.query(Device.id).filter(Device.id.in_(device_ids)).all()]
+        if not device_ids:
+            task.complete(False, error='没有可测试的设备')
+            db.session.commit()
+            return {'success': False, 'error': '没有可测试的设备'}
         
-        # 完成任务
-        task.complete(overall_success, f'成功测试 {success_count}/{total_devices} 个设备')
-        db.session.commit()
+        reporter.update(10, f'分发 {len(device_ids)} 个设备的测试任务...')
         
-        # 记录审计日志
-        AuditLog.log_action(
-            user_id=task.user_id,
+        result = dispatch(
+            test_connection_for_batch,
+            [(device_id, timeout, task_id) for device_id in device_ids],
+            task_id,
             action='batch_test_connections_task',
-            resource_type='device',
-            success=overall_success,
-            task=task,
-            details={
-                'device_count': total_devices,
-                'success_count': success_count,
-                'results': results
-            }
+            summary='成功测试 {success_count}/{total_devices} 个设备'
         )
         
-        return {
-            'success': overall_success,
-            'results': results,
-            'total_devices': total_devices,
-            'success_count': success_count
-        }
+        return {'success': True, 'dispatched': len(device_ids), 'callback_id': result.id}
         
     except Exception as e:
         error_msg = f'批量连接测试异常: {str(e)}'
@@ -405,3 +404,222 @@ def batch_test_connections(self, task_id, device_ids, timeout=30):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+
+@celery.task
+def test_connection_for_batch(device_id, timeout=30, task_id=None):
+    """
+    批量连接测试的单设备子任务
+    
+    Args:
+        device_id: 设备ID
+        timeout: 超时时间
+        task_id: 父任务ID，用于发布单设备结果事件和检查任务是否已取消
+        
+    Returns:
+        设备结果字典（见 device_entry）
+    """
+    device = Device.query.get(device_id)
+    if not device:
+        return {'device_id': device_id, 'device_name': None, 'device_ip': None, 'connection_type': None,
+                'result': {'success': False, 'error': '设备不存在'}}
+    
+    try:
+        # 测试连接
+        with device_scope(CancellationToken(task_id)), device_session(device) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.test_connection(device, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.test_connection(device, timeout)
+            elif device.connection_type.value == 'restconf':
+                result = RESTCONFService.test_connection(device, timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
+        if result.get('facts'):
+            DeviceFactsService.update_facts(device, result['facts'])
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    
+    return device_entry(device, result, task_id)
+
+@celery.task(bind=True)
+def batch_execute_commands(self, task_id, device_ids, commands, timeout=30):
+    """
+    批量设备命令执行任务
+    
+    为每台设备分发一个 execute_commands_for_batch 子任务并行执行，
+    全部完成后由回调汇总结果并完成任务
+    
+    Args:
+        task_id: 任务ID
+        device_ids: 设备ID列表
+        commands: 命令列表
+        timeout: 超时时间
+        
+    Returns:
+        分发结果字典
+    """
+    try:
+        reporter = celery_reporter(self, task_id)
+        
+        # 更新任务状态
+        task = Task.query.get(task_id)
+        if not task:
+            return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
+        
+        task.start()
+        db.session.commit()
+        
+        device_ids = [device_id for (device_id,) in
+                      db.session.query(Device.id).filter(Device.id.in_(device_ids)).all()]
+        if not device_ids:
+            task.complete(False, error='没有可执行命令的设备')
+            db.session.commit()
+            return {'success': False, 'error': '没有可执行命令的设备'}
+        
+        reporter.update(10, f'分发 {len(device_ids)} 个设备的命令任务...')
+        
+        result = dispatch(
+            execute_commands_for_batch,
+            [(task_id, device_id, commands, timeout) for device_id in device_ids],
+            task_id,
+            action='batch_execute_commands_task',
+            summary='成功在 {success_count}/{total_devices} 个设备上执行命令',
+            details={'commands': commands}
+        )
+        
+        return {'success': True, 'dispatched': len(device_ids), 'callback_id': result.id}
+        
+    except Exception as e:
+        error_msg = f'批量命令执行异常: {str(e)}'
+        traceback.print_exc()
+        
+        # 更新任务状态
+        if 'task' in locals():
+            task.complete(False, error=error_msg)
+            db.session.commit()
+        
+        return {'success': False, 'error': error_msg}
+
+@celery.task
+def execute_commands_for_batch(task_id, device_id, commands, timeout=30):
+    """
+    批量命令执行的单设备子任务：在一个连接上依次执行全部命令（遇到失败的命令停止），
+    每台设备创建一条任务结果记录
+    
+    Args:
+        task_id: 父任务ID
+        device_id: 设备ID
+        commands: 命令列表
+        timeout: 超时时间
+        
+    Returns:
+        设备结果字典（见 device_entry）
+    """
+    device = Device.query.get(device_id)
+    if not device:
+        return {'device_id': device_id, 'device_name': None, 'device_ip': None, 'connection_type': None,
+                'result': {'success': False, 'error': '设备不存在'}}
+    
+    try:
+        with collect_phases() as timings, device_scope(CancellationToken(task_id)), device_session(device) as session:
+            if device.connection_type.value == 'ssh':
+                command_results = SSHService.execute_commands(device, commands, timeout)
+            elif device.connection_type.value == 'telnet':
+                command_results = TelnetService.execute_commands(device, commands, timeout)
+            else:
+                command_results = [{'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}]
+        
+        errors = [r['error'] for r in command_results if r.get('error')]
+        result = {
+            'success': len(command_results) == len(commands) and all(r['success'] for r in command_results),
+            'output': '\n'.join(f"{device.name}# {r.get('command', '')}\n{r.get('output') or ''}"
+                                for r in command_results if r['success']),
+            'error': '; '.join(errors) or None,
+            'execution_time': sum(r.get('execution_time') or 0 for r in command_results),
+            'wait_time': session.waited
+        }
+        
+        # 创建任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command='\n'.join(commands),
+            output=result['output'],
+            error=result['error'],
+            exit_code=0 if result['success'] else 1,
+            execution_time=result['execution_time'],
+            task_id=task_id,
+            device_id=device.id
+        )
+        task_result.set_phase_timings(timings)
+        db.session.add(task_result)
+        db.session.commit()
+        
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f'设备 {device.name} 命令执行失败: {str(e)}'
+        
+        # 创建失败的任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command='\n'.join(commands),
+            output=None,
+            error=error_msg,
+            exit_code=1,
+            execution_time=0,
+            task_id=task_id,
+            device_id=device.id
+        )
+        db.session.add(task_result)
+        db.session.commit()
+        
+        result = {
+            'success': False,
+            'error': error_msg
+        }
+    
+    return device_entry(device, result, task_id)
+
+
+@celery.task
+def check_status_for_batch(device_id, user_id=None):
+    """批量状态检查的单设备子任务（进入批量队列）"""
+    device = Device.query.get(device_id)
+    if not device:
+        return {'success': False, 'device_id': device_id, 'error': '设备不存在'}
+    
+    try:
+        return {'success': True, 'device_id': device_id, **DeviceStatusService.check_device_status(device, user_id)}
+    except Exception as e:
+        db.session.rollback()
+        return {
+            'success': False,
+            'device_id': device_id,
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }
+
+@celery.task
+def batch_check_status(device_ids, user_id=None):
+    """
+    批量检查设备状态任务
+    
+    每台设备分发一个 check_status_for_batch 子任务并行执行Ping和端口测试，结果写入设备状态
+    
+    Args:
+        device_ids: 设备ID列表
+        user_id: 发起检查的用户ID
+        
+    Returns:
+        分发结果字典
+    """
+    ids = [device_id for (device_id,) in
+           db.session.query(Device.id).filter(Device.id.in_(device_ids)).order_by(Device.id)]
+    if ids:
+        group(check_status_for_batch.s(device_id, user_id) for device_id in ids).apply_async()
+    return {'success': True, 'device_ids': ids}
@@ -2,14 +2,23 @@
 任务管理模块路由
 """
 
-from flask import render_template, request, jsonify, flash, redirect, url_for
+import json
+from datetime import datetime
+from flask import Response, current_app, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
+from app.api.pagination import paginate_request, PaginationError
+from app.api.export import iter_ndjson, ndjson_response, stream_response, EXPORT_BATCH_SIZE
+from app.main.services import DashboardStatsService
 from app.tasks import bp
-from app.tasks.network_tasks import execute_device_command, execute_device_commands, test_device_connection, batch_test_connections
+from app.tasks.routing import normalize_priority, dispatch_options, submit
+from app.tasks.fanout import revoke_task
+from app.tasks.services import GROUP_BY_CHOICES, TaskTimingService
+from app.tasks.network_tasks import execute_device_command, execute_device_commands, test_device_connection, batch_test_connections, batch_execute_commands
 from app.tasks.template_tasks import render_and_apply_template, batch_render_and_apply_template, render_template_only
 from app.tasks.backup_tasks import backup_device_config, batch_backup_configs, restore_device_config
-from app.models import Task, TaskResult, TaskStatus, TaskType, Device, ConfigTemplate, ConfigBackup, AuditLog
-from app import db
+from app.devices.services import DeviceGroupService
+from app.models import Task, TaskResult, TaskStatus, TaskType, Device, DeviceGroup, ConfigTemplate, ConfigBackup, AuditLog
+from app import db, events
 
 @bp.route('/')
 @login_required
@@ -20,7 +29,7 @@ def index():
     status = request.args.get('status')
     task_type = request.args.get('task_type')
     
-    query = Task.query
+    query = Task.list_query()
     
     if status:
         query = query.filter_by(status=status)
@@ -43,28 +52,80 @@ def detail(task_id):
 @bp.route('/api/tasks')
 @login_required
 def api_tasks():
-    """API: 获取任务列表"""
-    tasks = Task.query.order_by(Task.created_at.desc()).all()
-    return jsonify([task.to_dict() for task in tasks])
+    """API: 获取任务列表（游标分页）"""
+    filter_map = {
+        'status': (Task.status, TaskStatus),
+        'task_type': (Task.task_type, TaskType),
+        'device_id': (Task.device_id, int),
+        'user_id': (Task.user_id, int)
+    }
+    
+    try:
+        page = paginate_request(Task.list_query(), Task, request.args,
+                                lambda task: task.to_dict(), filter_map)
+    except PaginationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(page)
+
+def _dispatch_batch(task, device_ids, options, timeout=30, backup_name=None):
+    """按任务类型分发多设备批量任务（每台设备一个子任务并行执行），参数无效时返回None"""
+    if task.task_type in (TaskType.COMMAND, TaskType.BATCH_COMMAND) and task.command:
+        commands = [line.strip() for line in task.command.splitlines() if line.strip()]
+        return submit(batch_execute_commands, (task.id, device_ids, commands, timeout), options)
+    if task.task_type == TaskType.CONFIG_TEMPLATE and task.template:
+        return submit(
+            batch_render_and_apply_template,
+            (task.id, task.template.id, device_ids, task.get_template_variables(), timeout), options
+        )
+    if task.task_type == TaskType.BACKUP_CONFIG:
+        return submit(batch_backup_configs, (task.id, device_ids, backup_name, timeout), options)
+    return None
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
-    """创建任务"""
+    """
+    创建任务
+    
+    指定 group_id（设备组内启用的设备）或 device_ids 时创建多设备批量任务，否则为 device_id 指定的单设备任务
+    """
     if request.method == 'POST':
         data = request.get_json()
         
         if not data:
             return jsonify({'success': False, 'error': '缺少任务数据'}), 400
         
+        # 批量任务的目标设备
+        group = None
+        device_ids = None
+        if data.get('group_id'):
+            group = DeviceGroup.query.get(data['group_id'])
+            if not group:
+                return jsonify({'success': False, 'error': '设备组不存在'}), 400
+            device_ids = DeviceGroupService.get_active_device_ids(group)
+            if not device_ids:
+                return jsonify({'success': False, 'error': '设备组中没有启用的设备'}), 400
+        elif data.get('device_ids'):
+            device_ids = data['device_ids']
+            if not isinstance(device_ids, list) or not all(isinstance(device_id, int) for device_id in device_ids):
+                return jsonify({'success': False, 'error': 'device_ids 必须是设备ID列表'}), 400
+        
+        try:
+            priority = normalize_priority(data.get('priority'), data.get('task_type', 'command'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         try:
             # 创建任务记录
             task = Task(
                 name=data.get('name', '未命名任务'),
                 description=data.get('description', ''),
                 task_type=TaskType(data.get('task_type', 'command')),
-                command=data.get('command'),
-                user=current_user
+                priority=priority,
+                command=data.get('command') or '\n'.join(data.get('commands') or []) or None,
+                user=current_user,
+                group=group
             )
             
             # 设置设备
@@ -83,37 +144,52 @@ def create():
             if data.get('template_variables'):
                 task.set_template_variables(data['template_variables'])
             
+            if device_ids is not None:
+                # 重试时沿用同一批设备
+                task.set_metadata({'device_ids': device_ids})
+            
+            # 提交前记录预先分配的Celery任务ID（取消时撤销尚未执行的消息），
+            # 提交后不再写元数据，以免覆盖批量任务分发时写入的子任务ID
+            options = dispatch_options(task)
+            task.set_metadata(dict(task.get_metadata(), celery_task_id=options['task_id']))
+            
             db.session.add(task)
             db.session.commit()
             
-            # 根据任务类型启动相应的异步任务
+            # 根据任务类型启动相应的异步任务（队列由任务类型决定，队列内按任务优先级排序）
             task_type = data.get('task_type', 'command')
             
-            if task_type == 'command' and task.device and task.command:
+            if device_ids is not None:
+                # 多设备批量执行
+                async_task = _dispatch_batch(task, device_ids, options, data.get('timeout', 30), data.get('backup_name'))
+                if async_task is None:
+                    return jsonify({'success': False, 'error': '无效的任务参数'}), 400
+            elif task_type == 'command' and task.device and task.command:
                 # 单命令执行
-                async_task = execute_device_command.delay(
-                    task.id, task.device.id, task.command, data.get('timeout', 30)
+                async_task = submit(
+                    execute_device_command, (task.id, task.device.id, task.command, data.get('timeout', 30)), options
                 )
             elif task_type == 'batch_command' and task.device and data.get('commands'):
                 # 批量命令执行
-                async_task = execute_device_commands.delay(
-                    task.id, task.device.id, data['commands'], data.get('timeout', 30)
+                async_task = submit(
+                    execute_device_commands, (task.id, task.device.id, data['commands'], data.get('timeout', 30)), options
                 )
             elif task_type == 'config_template' and task.template and task.device:
                 # 模板应用
-                async_task = render_and_apply_template.delay(
-                    task.id, task.template.id, task.device.id, 
-                    data.get('template_variables', {}), data.get('timeout', 30)
+                async_task = submit(
+                    render_and_apply_template,
+                    (task.id, task.template.id, task.device.id,
+                     data.get('template_variables', {}), data.get('timeout', 30)), options
                 )
             elif task_type == 'backup_config' and task.device:
                 # 配置备份
-                async_task = backup_device_config.delay(
-                    task.id, task.device.id, data.get('backup_name'), data.get('timeout', 30)
+                async_task = submit(
+                    backup_device_config, (task.id, task.device.id, data.get('backup_name'), data.get('timeout', 30)), options
                 )
             elif task_type == 'restore_config' and task.device and data.get('backup_id'):
                 # 配置恢复
-                async_task = restore_device_config.delay(
-                    task.id, task.device.id, data['backup_id'], data.get('timeout', 30)
+                async_task = submit(
+                    restore_device_config, (task.id, task.device.id, data['backup_id'], data.get('timeout', 30)), options
                 )
             else:
                 return jsonify({'success': False, 'error': '无效的任务参数'}), 400
@@ -126,18 +202,22 @@ def create():
                 resource_id=task.id,
                 resource_name=task.name,
                 success=True,
+                task=task,
                 details={
                     'task_type': task.task_type.value,
                     'device_name': task.device.name if task.device else None,
-                    'template_name': task.template.name if task.template else None
+                    'template_name': task.template.name if task.template else None,
+                    'group_name': group.name if group else None,
+                    'device_count': len(device_ids) if device_ids is not None else None
                 }
             )
             
+            # 任务已提交，由worker或后台线程池异步执行
             return jsonify({
                 'success': True,
                 'task_id': task.id,
                 'message': '任务创建成功'
-            })
+            }), 202
             
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
@@ -145,8 +225,9 @@ def create():
     # GET请求：显示任务创建表单
     devices = Device.query.filter_by(is_active=True).order_by(Device.name).all()
     templates = ConfigTemplate.query.filter_by(is_active=True).order_by(ConfigTemplate.name).all()
+    groups = DeviceGroup.query.order_by(DeviceGroup.name).all()
     
-    return render_template('tasks/create.html', devices=devices, templates=templates)
+    return render_template('tasks/create.html', devices=devices, templates=templates, groups=groups)
 
 @bp.route('/<int:task_id>/cancel', methods=['POST'])
 @login_required
@@ -154,18 +235,16 @@ def cancel_task(task_id):
     """取消任务"""
     task = Task.query.get_or_404(task_id)
     
-    if task.status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+    if task.status in [TaskStatus.SUCCESS, TaskStatus.FAILED, TaskStatus.CANCELLED, TaskStatus.TIMEOUT]:
         return jsonify({'success': False, 'error': '任务已完成，无法取消'}), 400
     
     try:
-        # 取消Celery任务（如果正在运行）
-        if hasattr(task, 'celery_task_id') and task.celery_task_id:
-            from app.tasks.celery_app import celery
-            celery.control.revoke(task.celery_task_id, terminate=True)
-        
-        # 更新任务状态
+        # 更新任务状态并设置取消标记，执行中的任务在下一个检查点停止
         task.cancel('用户手动取消')
         
+        # 撤销尚未执行的Celery消息（任务本身和批量任务的子任务）
+        revoke_task(task)
+        
         # 记录取消日志
         AuditLog.log_action(
             user=current_user,
@@ -173,7 +252,8 @@ def cancel_task(task_id):
             resource_type='task',
             resource_id=task.id,
             resource_name=task.name,
-            success=True
+            success=True,
+            task=task
         )
         
         return jsonify({'success': True, 'message': '任务已取消'})
@@ -191,12 +271,19 @@ def retry_task(task_id):
         return jsonify({'success': False, 'error': '任务已达到最大重试次数'}), 400
     
     try:
-        # 重新启动异步任务
-        if task.task_type == TaskType.COMMAND and task.device and task.command:
-            execute_device_command.delay(task.id, task.device.id, task.command, 30)
+        # 重新启动异步任务（沿用原任务的优先级），提交前记录新的Celery任务ID
+        options = dispatch_options(task)
+        task.set_metadata(dict(task.get_metadata(), celery_task_id=options['task_id']))
+        db.session.commit()
+        
+        device_ids = task.get_metadata().get('device_ids')
+        if device_ids:
+            _dispatch_batch(task, device_ids, options)
+        elif task.task_type == TaskType.COMMAND and task.device and task.command:
+            submit(execute_device_command, (task.id, task.device.id, task.command, 30), options)
         elif task.task_type == TaskType.CONFIG_TEMPLATE and task.template and task.device:
             variables = task.get_template_variables()
-            render_and_apply_template.delay(task.id, task.template.id, task.device.id, variables, 30)
+            submit(render_and_apply_template, (task.id, task.template.id, task.device.id, variables, 30), options)
         # 可以添加其他任务类型的重试逻辑
         
         # 记录重试日志
@@ -206,7 +293,8 @@ def retry_task(task_id):
             resource_type='task',
             resource_id=task.id,
             resource_name=task.name,
-            success=True
+            success=True,
+            task=task
         )
         
         return jsonify({'success': True, 'message': '任务已重新启动'})
@@ -214,6 +302,84 @@ def retry_task(task_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/<int:task_id>/reset', methods=['POST'])
+@login_required
+def reset_task(task_id):
+    """重置任务为待执行状态（清空执行结果，不重新执行）"""
+    task = Task.query.get_or_404(task_id)
+    
+    if task.status == TaskStatus.RUNNING:
+        return jsonify({'success': False, 'error': '任务正在执行，请先取消任务'}), 400
+    
+    try:
+        task.reset()
+        
+        AuditLog.log_action(
+            user=current_user,
+            action='reset_task',
+            resource_type='task',
+            resource_id=task.id,
+            resource_name=task.name,
+            success=True,
+            task=task
+        )
+        
+        return jsonify({'success': True, 'message': '任务已重置'})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/api/task/<int:task_id>', methods=['DELETE'])
+@login_required
+def api_delete_task(task_id):
+    """API: 删除任务及其执行结果（任务日志保留，不再关联任务）"""
+    task = Task.query.get_or_404(task_id)
+    
+    if task.status == TaskStatus.RUNNING:
+        return jsonify({'success': False, 'error': '任务正在执行，请先取消任务'}), 400
+    
+    try:
+        task_name = task.name
+        AuditLog.query.filter(AuditLog.task_id == task.id).update({'task_id': None}, synchronize_session=False)
+        db.session.delete(task)
+        db.session.commit()
+        
+        AuditLog.log_action(
+            user=current_user,
+            action='delete_task',
+            resource_type='task',
+            resource_id=task_id,
+            resource_name=task_name,
+            success=True
+        )
+        
+        return jsonify({'success': True, 'message': f'任务 "{task_name}" 已删除'})
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/api/task/<int:task_id>/download')
+@login_required
+def download_task_result(task_id):
+    """API: 下载任务结果（JSON文件，包含任务信息和各设备的执行结果，结果分批读取）"""
+    task = Task.query.get_or_404(task_id)
+    
+    if task.completed_at is None and task.results.count() == 0:
+        return jsonify({'success': False, 'error': '任务暂无执行结果'}), 404
+    
+    task_info = task.to_dict(include_details=True)
+    query = TaskResult.query.filter_by(task_id=task.id).order_by(TaskResult.id)
+    
+    def generate():
+        yield '{"task": ' + json.dumps(task_info, ensure_ascii=False, default=str) + ', "results": ['
+        for index, result in enumerate(query.yield_per(EXPORT_BATCH_SIZE)):
+            yield (',' if index else '') + json.dumps(result.to_dict(), ensure_ascii=False, default=str)
+        yield ']}'
+    
+    filename = f"task_{task.id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+    return stream_response(generate(), filename, 'application/json')
+
 @bp.route('/<int:task_id>/results')
 @login_required
 def task_results(task_id):
@@ -223,6 +389,44 @@ def task_results(task_id):
     
     return render_template('tasks/results.html', task=task, results=results)
 
+@bp.route('/api/task/<int:task_id>/results/export')
+@login_required
+def export_task_results(task_id):
+    """API: 流式导出任务结果（NDJSON，每行一条设备结果）"""
+    task = Task.query.get_or_404(task_id)
+    query = TaskResult.query.filter_by(task_id=task.id).order_by(TaskResult.id)
+    
+    return ndjson_response(iter_ndjson(query, lambda result: result.to_dict()),
+                           f'task_{task.id}_results.ndjson')
+
+@bp.route('/api/results/timings')
+@login_required
+def api_result_timings():
+    """API: 按设备或设备分组汇总任务结果的分阶段耗时"""
+    group_by = request.args.get('group_by', 'device')
+    if group_by not in GROUP_BY_CHOICES:
+        return jsonify({'error': f'group_by 必须是 {"/".join(GROUP_BY_CHOICES)}'}), 400
+    
+    days = request.args.get('days', type=int)
+    limit = request.args.get('limit', 50, type=int)
+    if (days is not None and days <= 0) or limit <= 0:
+        return jsonify({'error': 'days 和 limit 必须是正整数'}), 400
+    
+    task_type = request.args.get('task_type')
+    if task_type:
+        try:
+            task_type = TaskType(task_type)
+        except ValueError:
+            return jsonify({'error': f'无效的任务类型: {task_type}'}), 400
+    
+    return jsonify(TaskTimingService.aggregate(
+        group_by=group_by,
+        days=days,
+        task_type=task_type or None,
+        group_id=request.args.get('group_id', type=int),
+        limit=min(limit, 500)
+    ))
+
 @bp.route('/api/task/<int:task_id>/status')
 @login_required
 def api_task_status(task_id):
@@ -231,14 +435,17 @@ def api_task_status(task_id):
     
     # 如果任务正在运行，尝试获取Celery任务状态
     celery_status = None
-    if task.status == TaskStatus.RUNNING and hasattr(task, 'celery_task_id') and task.celery_task_id:
+    celery_task_id = task.get_metadata().get('celery_task_id')
+    if task.status == TaskStatus.RUNNING and celery_task_id:
         try:
             from app.tasks.celery_app import celery
-            celery_result = celery.AsyncResult(task.celery_task_id)
+            celery_result = celery.AsyncResult(celery_task_id)
+            # PROGRESS状态的info为进度字典（见 app.progress.celery_reporter）
+            info = celery_result.info if isinstance(celery_result.info, dict) else {}
             celery_status = {
                 'state': celery_result.state,
-                'progress': getattr(celery_result.info, 'progress', 0) if celery_result.info else 0,
-                'status': getattr(celery_result.info, 'status', '') if celery_result.info else ''
+                'progress': info.get('progress', 0),
+                'status': info.get('status', '')
             }
         except:
             pass
@@ -254,20 +461,37 @@ def api_task_status(task_id):
         'max_retries': task.max_retries
     })
 
+@bp.route('/api/task/<int:task_id>/events')
+@login_required
+def api_task_events(task_id):
+    """
+    API: 任务事件流（Server-Sent Events）
+    
+    推送进度（progress）、单设备结果（device/result）和状态变化（status），
+    替代轮询 /api/task/<id>/status；只在建立连接时查询一次数据库。
+    长连接需要线程或协程worker（gunicorn.conf.py 使用gthread），连接时长受 TASK_EVENTS_MAX_DURATION 限制
+    """
+    task = Task.query.get_or_404(task_id)
+    
+    # 先订阅再读取快照，避免漏掉两者之间发布的事件
+    subscription = events.subscribe(task.id)
+    snapshot = dict(events.task_status(task), results_count=task.results.count())
+    # 长连接期间不占用数据库连接
+    db.session.close()
+    
+    heartbeat = current_app.config.get('TASK_EVENTS_HEARTBEAT', events.DEFAULT_HEARTBEAT)
+    max_duration = current_app.config.get('TASK_EVENTS_MAX_DURATION', events.DEFAULT_MAX_DURATION)
+    return Response(
+        events.iter_sse(subscription, snapshot, heartbeat, max_duration),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @bp.route('/api/tasks/stats')
 @login_required
 def api_tasks_stats():
     """API: 获取任务统计信息"""
-    stats = {
-        'total': Task.query.count(),
-        'pending': Task.query.filter_by(status=TaskStatus.PENDING).count(),
-        'running': Task.query.filter_by(status=TaskStatus.RUNNING).count(),
-        'success': Task.query.filter_by(status=TaskStatus.SUCCESS).count(),
-        'failed': Task.query.filter_by(status=TaskStatus.FAILED).count(),
-        'cancelled': Task.query.filter_by(status=TaskStatus.CANCELLED).count()
-    }
-    
-    return jsonify(stats)
+    return jsonify(DashboardStatsService.get_stats()['tasks'])
 
 @bp.route('/api/task/<int:task_id>')
 @login_required
@@ -275,3 +499,11 @@ def api_task_detail(task_id):
     """API: 获取任务详情"""
     task = Task.query.get_or_404(task_id)
     return jsonify(task.to_dict(include_details=True))
+
+@bp.route('/api/task/<int:task_id>/logs')
+@login_required
+def api_task_logs(task_id):
+    """API: 获取任务日志（创建、执行、取消、重试等记录，按时间排序）"""
+    task = Task.query.get_or_404(task_id)
+    logs = AuditLog.list_query().filter(AuditLog.task_id == task.id).order_by(AuditLog.created_at, AuditLog.id).all()
+    return jsonify([log.to_dict() for log in logs])
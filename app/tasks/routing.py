@@ -0,0 +1,128 @@
+"""
+Celery任务队列与优先级路由
+交互式单设备任务、批量任务和备份任务分别进入独立队列，由各自的worker消费；
+同一队列内按 Task.priority 排序（Redis通过 priority_steps 模拟优先级）
+"""
+
+from typing import Any, Dict, Optional
+from kombu import Queue
+
+# 队列
+QUEUE_INTERACTIVE = 'interactive'  # 单设备命令、模板下发、配置恢复等需要及时响应的任务
+QUEUE_BULK = 'bulk'                # 批量任务及其子任务、维护任务
+QUEUE_BACKUP = 'backup'            # 配置备份
+
+TASK_QUEUES = (
+    Queue(QUEUE_INTERACTIVE, routing_key=QUEUE_INTERACTIVE),
+    Queue(QUEUE_BULK, routing_key=QUEUE_BULK),
+    Queue(QUEUE_BACKUP, routing_key=QUEUE_BACKUP),
+)
+
+# 按任务名称路由，精确名称优先于通配符；未匹配的任务进入交互队列
+TASK_ROUTES = {
+    'app.tasks.backup_tasks.restore_device_config': {'queue': QUEUE_INTERACTIVE},
+    'app.tasks.backup_tasks.backup_device_config': {'queue': QUEUE_BACKUP},
+    'app.tasks.backup_tasks.batch_backup_configs': {'queue': QUEUE_BACKUP},
+    'app.tasks.backup_tasks.backup_config_for_batch': {'queue': QUEUE_BACKUP},
+    'app.tasks.*.batch_*': {'queue': QUEUE_BULK},
+    'app.tasks.*.*_for_batch': {'queue': QUEUE_BULK},
+    'app.tasks.fanout.*': {'queue': QUEUE_BULK},
+    'app.tasks.maintenance_tasks.*': {'queue': QUEUE_BULK},
+}
+
+# 各队列worker的默认并发数，可通过 CELERY_QUEUE_CONCURRENCY 配置覆盖
+DEFAULT_QUEUE_CONCURRENCY = {
+    QUEUE_INTERACTIVE: 4,
+    QUEUE_BULK: 4,
+    QUEUE_BACKUP: 2,
+}
+
+# Task.priority 取值范围：数字越大优先级越高
+MIN_PRIORITY = 0
+MAX_PRIORITY = 9
+
+# 创建任务时未指定优先级的默认值
+DEFAULT_PRIORITIES = {
+    'command': 6,
+    'batch_command': 6,
+    'config_template': 5,
+    'restore_config': 8,
+    'backup_config': 2,
+    'device_discovery': 3,
+}
+
+def normalize_priority(value: Any, task_type: Optional[str] = None) -> int:
+    """
+    将请求中的优先级转换为 MIN_PRIORITY~MAX_PRIORITY 的整数，未指定时按任务类型取默认值
+    
+    Raises:
+        ValueError: 优先级不是整数
+    """
+    if value is None or value == '':
+        return DEFAULT_PRIORITIES.get(task_type, 5)
+    try:
+        priority = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'无效的优先级: {value}，应为{MIN_PRIORITY}~{MAX_PRIORITY}的整数')
+    return max(MIN_PRIORITY, min(MAX_PRIORITY, priority))
+
+def broker_priority(priority: int, broker_url: Optional[str]) -> int:
+    """
+    Task.priority 转换为消息优先级
+    
+    AMQP中数字越大越优先，与 Task.priority 一致；Redis传输则是数字越小越优先，需要反转
+    """
+    priority = normalize_priority(priority)
+    if broker_url and broker_url.startswith(('redis://', 'rediss://', 'redis+socket://')):
+        return MAX_PRIORITY - priority
+    return priority
+
+def dispatch_options(task) -> Dict[str, Any]:
+    """
+    提交Celery任务时的 apply_async 选项（队列由 TASK_ROUTES 决定）
+    
+    预先分配Celery任务ID，调用方在提交前将其写入任务元数据，避免提交后再写元数据覆盖
+    批量任务分发时写入的子任务ID
+    """
+    from celery import uuid
+    from flask import current_app
+    
+    return {
+        'task_id': uuid(),
+        'priority': broker_priority(task.priority, current_app.config.get('CELERY_BROKER_URL'))
+    }
+
+def submit(celery_task, args, options: Optional[Dict[str, Any]] = None):
+    """
+    提交Celery任务
+    
+    配置了 CELERY_BROKER_URL 时发送到任务队列；未配置时（没有Redis等broker，任务以eager模式执行）
+    在Web进程的后台线程池中执行，请求立即返回
+    
+    Returns:
+        AsyncResult，ID为 options['task_id']（未指定时新分配）
+    """
+    from celery import uuid
+    from flask import current_app
+    from app import background_executor
+    
+    options = dict(options or {})
+    options.setdefault('task_id', uuid())
+    if current_app.config.get('CELERY_BROKER_URL'):
+        return celery_task.apply_async(args, **options)
+    
+    background_executor.submit(celery_task.apply_async, args, **options)
+    return celery_task.AsyncResult(options['task_id'])
+
+def worker_concurrency(queues, config: Dict[str, Any]) -> Optional[int]:
+    """
+    按worker消费的队列计算并发数
+    
+    消费多个队列时取各队列并发数之和；未指定队列（消费全部队列）时返回None，使用Celery默认值
+    """
+    if not queues:
+        return None
+    if isinstance(queues, str):
+        queues = queues.split(',')
+    concurrency = dict(DEFAULT_QUEUE_CONCURRENCY, **(config.get('CELERY_QUEUE_CONCURRENCY') or {}))
+    return sum(concurrency.get(queue.strip(), 1) for queue in queues)
@@ -0,0 +1,116 @@
+"""
+任务结果耗时统计服务
+按设备或设备分组汇总 TaskResult.phase_timings，找出各阶段耗时最长的设备
+"""
+
+import json
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, has_app_context
+from app import db
+from app.models import Device, DeviceGroup, Task, TaskResult, TaskType
+from app.timing import PHASES
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_TIMING_WINDOW_DAYS = 7      # TASK_TIMING_WINDOW_DAYS：统计最近多少天的结果
+DEFAULT_TIMING_MAX_ROWS = 50000     # TASK_TIMING_MAX_ROWS：最多读取的结果行数（取最新的）
+
+GROUP_BY_CHOICES = ('device', 'group')
+
+def _percentile(values: List[float], percent: float) -> float:
+    """最近秩百分位数（values已排序）"""
+    index = max(1, math.ceil(percent / 100 * len(values)))
+    return values[index - 1]
+
+class TaskTimingService:
+    """任务结果分阶段耗时统计"""
+    
+    @staticmethod
+    def aggregate(group_by: str = 'device', days: Optional[int] = None, task_type: Optional[TaskType] = None,
+                  group_id: Optional[int] = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        汇总分阶段耗时
+        
+        phase_timings 以JSON保存（task_results是按时间分区的大表，不适合再建子表），
+        只读取时间窗口内最新的 TASK_TIMING_MAX_ROWS 行的必要列，在内存中汇总
+        
+        Args:
+            group_by: device（按设备）或 group（按设备分组）
+            days: 统计最近多少天，默认 TASK_TIMING_WINDOW_DAYS
+            task_type: 只统计该类型任务的结果
+            group_id: 只统计该分组的设备
+            limit: 返回的条目数，按平均总耗时从高到低
+        
+        Returns:
+            {'group_by', 'since', 'rows', 'items': [{..., 'results', 'avg_total', 'phases': {阶段: {count, avg, p95, max}}}]}
+        """
+        if group_by not in GROUP_BY_CHOICES:
+            raise ValueError(f'group_by 必须是 {"/".join(GROUP_BY_CHOICES)}')
+        
+        config = current_app.config if has_app_context() else {}
+        if days is None:
+            days = config.get('TASK_TIMING_WINDOW_DAYS', DEFAULT_TIMING_WINDOW_DAYS)
+        max_rows = config.get('TASK_TIMING_MAX_ROWS', DEFAULT_TIMING_MAX_ROWS)
+        since = datetime.utcnow() - timedelta(days=days)
+        
+        query = db.session.query(
+            TaskResult.device_id, TaskResult.device_name, TaskResult.phase_timings,
+            Device.group_id, DeviceGroup.name
+        ).outerjoin(Device, TaskResult.device_id == Device.id).outerjoin(
+            DeviceGroup, Device.group_id == DeviceGroup.id
+        ).filter(
+            TaskResult.created_at >= since,
+            TaskResult.phase_timings.isnot(None)
+        )
+        if task_type is not None:
+            query = query.join(Task, TaskResult.task_id == Task.id).filter(Task.task_type == task_type)
+        if group_id is not None:
+            query = query.filter(Device.group_id == group_id)
+        query = query.order_by(TaskResult.created_at.desc()).limit(max_rows)
+        
+        buckets: Dict[Any, Dict[str, Any]] = {}
+        rows = 0
+        for device_id, device_name, raw, row_group_id, group_name in query.yield_per(1000):
+            try:
+                timings = json.loads(raw)
+            except ValueError:
+                continue
+            rows += 1
+            
+            if group_by == 'device':
+                key = device_id or device_name
+                item = {'device_id': device_id, 'device_name': device_name}
+            else:
+                key = row_group_id
+                item = {'group_id': row_group_id, 'group_name': group_name or '未分组'}
+            bucket = buckets.setdefault(key, {'item': item, 'totals': [], 'phases': {}})
+            bucket['totals'].append(sum(timings.values()))
+            for phase, seconds in timings.items():
+                bucket['phases'].setdefault(phase, []).append(seconds)
+        
+        items = []
+        for bucket in buckets.values():
+            totals = bucket['totals']
+            phases = {}
+            ordered = [phase for phase in PHASES if phase in bucket['phases']]
+            ordered += sorted(set(bucket['phases']) - set(PHASES))
+            for phase in ordered:
+                values = sorted(bucket['phases'][phase])
+                phases[phase] = {
+                    'count': len(values),
+                    'avg': round(sum(values) / len(values), 4),
+                    'p95': round(_percentile(values, 95), 4),
+                    'max': round(values[-1], 4)
+                }
+            items.append(dict(bucket['item'], results=len(totals),
+                              avg_total=round(sum(totals) / len(totals), 4), phases=phases))
+        
+        items.sort(key=lambda item: item['avg_total'], reverse=True)
+        return {
+            'group_by': group_by,
+            'since': since.isoformat(),
+            'rows': rows,
+            'items': items[:limit]
+        }
@@ -6,6 +6,11 @@
 import traceback
 from datetime import datetime
 from app.tasks.celery_app import celery
+from app.tasks.fanout import dispatch, device_entry
+from app.progress import celery_reporter
+from app.cancellation import CancellationToken, device_scope
+from app.timing import collect_phases
+from app.communication.session_lock import device_session
 from app.models import Device, Task, TaskResult, TaskStatus, TaskType, ConfigTemplate, AuditLog
 from app.communication.ssh_client import SSHService
 from app.communication.telnet_client import TelnetService
@@ -27,11 +32,17 @@ def render_and_apply_template(self, task_id, template_id, device_id, variables,
     Returns:
         执行结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        token = CancellationToken(task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -51,7 +62,7 @@ def render_and_apply_template(self, task_id, template_id, device_id, variables,
             return {'success': False, 'error': '设备不存在'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 20, 'status': '渲染模板中...'})
+        reporter.update(20, '渲染模板中...')
         
         # 渲染模板
         render_result = TemplateService.render_template(template, variables)
@@ -64,21 +75,23 @@ def render_and_apply_template(self, task_id, template_id, device_id, variables,
         rendered_config = render_result['rendered_content']
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 40, 'status': '应用配置中...'})
+        reporter.update(40, '应用配置中...')
         
         # 将配置按行分割为命令
         config_commands = [line.strip() for line in rendered_config.split('\n') if line.strip()]
         
         # 根据连接类型应用配置
-        if device.connection_type.value == 'ssh':
-            result = SSHService.send_config(device, config_commands, timeout)
-        elif device.connection_type.value == 'telnet':
-            result = TelnetService.send_config(device, config_commands, timeout)
-        else:
-            result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        with collect_phases() as timings, device_scope(token), device_session(device, on_wait=reporter.on_wait) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.send_config(device, config_commands, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.send_config(device, config_commands, timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 90, 'status': '处理结果中...'})
+        reporter.update(90, '处理结果中...')
         
         # 创建任务结果记录
         task_result = TaskResult(
@@ -92,6 +105,7 @@ def render_and_apply_template(self, task_id, template_id, device_id, variables,
             task=task,
             device=device
         )
+        task_result.set_phase_timings(timings)
         db.session.add(task_result)
         
         # 完成任务
@@ -136,12 +150,18 @@ def render_and_apply_template(self, task_id, template_id, device_id, variables,
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
 
 @celery.task(bind=True)
 def batch_render_and_apply_template(self, task_id, template_id, device_ids, variables, timeout=30):
     """
     批量渲染并应用配置模板任务
     
+    模板只渲染一次，然后为每台设备分发一个 apply_config_for_batch 子任务并行执行，
+    全部完成后由回调汇总结果并完成任务
+    
     Args:
         task_id: 任务ID
         template_id: 模板ID
@@ -150,13 +170,18 @@ def batch_render_and_apply_template(self, task_id, template_id, device_ids, vari
         timeout: 超时时间
         
     Returns:
-        执行结果字典
+        分发结果字典
     """
     try:
+        reporter = celery_reporter(self, task_id)
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -168,12 +193,15 @@ def batch_render_and_apply_template(self, task_id, template_id, device_ids, vari
             db.session.commit()
             return {'success': False, 'error': '模板不存在'}
         
-        devices = Device.query.filter(Device.id.in_(device_ids)).all()
-        results = {}
-        total_devices = len(devices)
+        device_ids = [device_id for (device_id,) in
+                      db.session.query(Device.id).filter(Device.id.in_(device_ids)).all()]
+        if not device_ids:
+            task.complete(False, error='没有可应用配置的设备')
+            db.session.commit()
+            return {'success': False, 'error': '没有可应用配置的设备'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 10, 'status': '渲染模板中...'})
+        reporter.update(10, '渲染模板中...')
         
         # 渲染模板
         render_result = TemplateService.render_template(template, variables)
@@ -186,101 +214,25 @@ def batch_render_and_apply_template(self, task_id, template_id, device_ids, vari
         rendered_config = render_result['rendered_content']
         config_commands = [line.strip() for line in rendered_config.split('\n') if line.strip()]
         
-        for i, device in enumerate(devices):
-            # 更新任务进度
-            progress = int((i / total_devices) * 70) + 20
-            self.update_state(state='PROGRESS', meta={
-                'progress': progress, 
-                'status': f'应用配置到设备 {i+1}/{total_devices}: {device.name}'
-            })
-            
-            try:
-                # 应用配置
-                if device.connection_type.value == 'ssh':
-                    result = SSHService.send_config(device, config_commands, timeout)
-                elif device.connection_type.value == 'telnet':
-                    result = TelnetService.send_config(device, config_commands, timeout)
-                else:
-                    result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
-                
-                # 创建任务结果记录
-                task_result = TaskResult(
-                    device_name=device.name,
-                    device_ip=device.ip_address,
-                    command=f"批量应用模板: {template.name}",
-                    output=result.get('output'),
-                    error=result.get('error'),
-                    exit_code=0 if result['success'] else 1,
-                    execution_time=result.get('execution_time'),
-                    task=task,
-                    device=device
-                )
-                db.session.add(task_result)
-                
-                results[device.id] = {
-                    'device_name': device.name,
-                    'device_ip': device.ip_address,
-                    'connection_type': device.connection_type.value,
-                    'result': result
-                }
-                
-            except Exception as e:
-                error_msg = f'设备 {device.name} 配置应用失败: {str(e)}'
-                
-                # 创建失败的任务结果记录
-                task_result = TaskResult(
-                    device_name=device.name,
-                    device_ip=device.ip_address,
-                    command=f"批量应用模板: {template.name}",
-                    output=None,
-                    error=error_msg,
-                    exit_code=1,
-                    execution_time=0,
-                    task=task,
-                    device=device
-                )
-                db.session.add(task_result)
-                
-                results[device.id] = {
-                    'device_name': device.name,
-                    'device_ip': device.ip_address,
-                    'connection_type': device.connection_type.value,
-                    'result': {
-                        'success': False,
-                        'error': error_msg
-                    }
-                }
-        
-        # 计算总体结果
-        success_count = sum(1 for r in results.values() if r['result']['success'])
-        overall_success = success_count > 0
+        reporter.update(20, f'分发 {len(device_ids)} 个设备的配置任务...')
         
-        # 完成任务
-        task.complete(overall_success, f'成功应用模板到 {success_count}/{total_devices} 个设备')
-        db.session.commit()
-        
-        # 记录审计日志
-        AuditLog.log_action(
-            user_id=task.user_id,
+        result = dispatch(
+            apply_config_for_batch,
+            [(task_id, device_id, template.name, config_commands, timeout) for device_id in device_ids],
+            task_id,
             action='batch_apply_config_template_task',
-            resource_type='device',
-            success=overall_success,
-            task=task,
+            summary='成功应用模板到 {success_count}/{total_devices} 个设备',
             details={
                 'template_name': template.name,
                 'template_id': template.id,
-                'variables': variables,
-                'device_count': total_devices,
-                'success_count': success_count,
-                'results': results
+                'variables': variables
             }
         )
         
         return {
-            'success': overall_success,
-            'results': results,
-            'total_devices': total_devices,
-            'success_count': success_count,
+            'success': True,
+            'dispatched': len(device_ids),
+            'callback_id': result.id,
             'rendered_config': rendered_config
         }
         
@@ -295,6 +247,79 @@ def batch_render_and_apply_template(self, task_id, template_id, device_ids, vari
         
         return {'success': False, 'error': error_msg}
 
+@celery.task
+def apply_config_for_batch(task_id, device_id, template_name, config_commands, timeout=30):
+    """
+    批量模板应用的单设备子任务：下发已渲染的配置并创建任务结果记录
+    
+    Args:
+        task_id: 父任务ID
+        device_id: 设备ID
+        template_name: 模板名称
+        config_commands: 已渲染的配置命令列表
+        timeout: 超时时间
+        
+    Returns:
+        设备结果字典（见 device_entry）
+    """
+    device = Device.query.get(device_id)
+    if not device:
+        return {'device_id': device_id, 'device_name': None, 'device_ip': None, 'connection_type': None,
+                'result': {'success': False, 'error': '设备不存在'}}
+    
+    try:
+        # 应用配置
+        with collect_phases() as timings, device_scope(CancellationToken(task_id)), device_session(device) as session:
+            if device.connection_type.value == 'ssh':
+                result = SSHService.send_config(device, config_commands, timeout)
+            elif device.connection_type.value == 'telnet':
+                result = TelnetService.send_config(device, config_commands, timeout)
+            else:
+                result = {'success': False, 'error': f'不支持的连接类型: {device.connection_type.value}'}
+        result['wait_time'] = session.waited
+        
+        # 创建任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command=f"批量应用模板: {template_name}",
+            output=result.get('output'),
+            error=result.get('error'),
+            exit_code=0 if result['success'] else 1,
+            execution_time=result.get('execution_time'),
+            task_id=task_id,
+            device_id=device.id
+        )
+        task_result.set_phase_timings(timings)
+        db.session.add(task_result)
+        db.session.commit()
+        
+    except Exception as e:
+        db.session.rollback()
+        error_msg = f'设备 {device.name} 配置应用失败: {str(e)}'
+        
+        # 创建失败的任务结果记录
+        task_result = TaskResult(
+            device_name=device.name,
+            device_ip=device.ip_address,
+            command=f"批量应用模板: {template_name}",
+            output=None,
+            error=error_msg,
+            exit_code=1,
+            execution_time=0,
+            task_id=task_id,
+            device_id=device.id
+        )
+        db.session.add(task_result)
+        db.session.commit()
+        
+        result = {
+            'success': False,
+            'error': error_msg
+        }
+    
+    return device_entry(device, result, task_id)
+
 @celery.task(bind=True)
 def render_template_only(self, task_id, template_id, variables):
     """
@@ -308,11 +333,16 @@ def render_template_only(self, task_id, template_id, variables):
     Returns:
         渲染结果字典
     """
+    reporter = celery_reporter(self, task_id)
     try:
+        
         # 更新任务状态
         task = Task.query.get(task_id)
         if not task:
             return {'success': False, 'error': '任务不存在'}
+        if task.status == TaskStatus.CANCELLED:
+            # 排队期间已被取消
+            return {'success': False, 'error': '任务已取消'}
         
         task.start()
         db.session.commit()
@@ -325,7 +355,7 @@ def render_template_only(self, task_id, template_id, variables):
             return {'success': False, 'error': '模板不存在'}
         
         # 更新任务进度
-        self.update_state(state='PROGRESS', meta={'progress': 50, 'status': '渲染模板中...'})
+        reporter.update(50, '渲染模板中...')
         
         # 渲染模板
         result = TemplateService.render_template(template, variables)
@@ -362,3 +392,6 @@ def render_template_only(self, task_id, template_id, variables):
             db.session.commit()
         
         return {'success': False, 'error': error_msg}
+    finally:
+        # 写入最终进度（任务结果由返回值写入结果后端）
+        reporter.finish()
@@ -0,0 +1,49 @@
+"""
+内置配置模板
+初始化数据库时安装（见 TemplateService.install_builtin_templates），已存在的同名模板更新为最新内容
+"""
+
+# 批量添加VLAN：每行一个 "VLAN_ID" 或 "VLAN_ID:名称"，可选将这些VLAN加入Trunk接口的允许列表
+BULK_VLAN_CONTENT = '''{% for line in vlans.strip().splitlines() %}
+{% set parts = line.strip().split(":", 1) %}
+{% if parts[0].strip() %}
+vlan {{ parts[0].strip() }}
+ name {{ parts[1].strip() if parts|length == 2 and parts[1].strip() else "VLAN_" ~ parts[0].strip() }}
+{% endif %}
+{% endfor %}
+{% if trunk_interface %}
+interface range {{ trunk_interface }}
+{% for line in vlans.strip().splitlines() %}
+{% set vlan_id = line.strip().split(":", 1)[0].strip() %}
+{% if vlan_id %}
+ switchport trunk allowed vlan add {{ vlan_id }}
+{% endif %}
+{% endfor %}
+{% endif %}'''
+
+BUILTIN_TEMPLATES = [
+    {
+        'name': '批量添加VLAN模板',
+        'description': '批量添加多个VLAN到网络设备，支持自定义VLAN名称',
+        'category': 'vlan',
+        'template_content': BULK_VLAN_CONTENT,
+        'variables': [
+            {
+                'name': 'vlans',
+                'var_type': 'textarea',
+                'description': '每行一个VLAN，格式为 VLAN_ID（自动命名为 VLAN_<ID>）或 VLAN_ID:名称',
+                'default_value': '100:Sales\n200:Engineering\n300:Guest',
+                'required': True,
+                'order': 0
+            },
+            {
+                'name': 'trunk_interface',
+                'var_type': 'string',
+                'description': '允许这些VLAN通过的Trunk接口（如 G3/1），留空则不修改接口',
+                'default_value': 'G3/1',
+                'required': False,
+                'order': 1
+            }
+        ]
+    }
+]
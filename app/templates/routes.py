@@ -136,10 +136,10 @@ def delete(template_id):
         flash(f'模板删除失败: {str(e)}', 'error')
         return redirect(url_for('templates.detail', template_id=template.id))
 
-@bp.route('/<int:template_id>/render', methods=['GET', 'POST'])
+@bp.route('/<int:template_id>/render', methods=['GET', 'POST'], endpoint='render_template')
 @login_required
-def render_template(template_id):
-    """渲染模板"""
+def render(template_id):
+    """渲染模板（视图函数不能命名为render_template，否则会覆盖flask.render_template）"""
     template = ConfigTemplate.query.get_or_404(template_id)
     form = TemplateRenderForm()
     
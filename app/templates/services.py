@@ -5,12 +5,14 @@
 
 import json
 import re
+import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from jinja2 import Template, Environment, BaseLoader, TemplateSyntaxError, UndefinedError
 
 from app.models import ConfigTemplate, TemplateVariable, TemplateCategory, AuditLog
 from app import db
+from app.metrics import observe_render
 
 class TemplateService:
     """模板服务类"""
@@ -153,8 +155,10 @@ class TemplateService:
                 }
             
             # 渲染模板
+            start_time = time.perf_counter()
             jinja_template = Template(template.template_content)
             rendered_content = jinja_template.render(**variables)
+            observe_render(template.category, time.perf_counter() - start_time)
             
             return {
                 'success': True,
@@ -379,6 +383,37 @@ class TemplateService:
         }
         
         return TemplateService.create_template(template_data, user_id)
+    
+    @staticmethod
+    def install_builtin_templates() -> List[ConfigTemplate]:
+        """
+        安装内置模板（见 app.templates.builtin），可重复执行
+        
+        已存在的同名模板更新为最新内容，已有的同名变量保留用户修改过的默认值
+        
+        Returns:
+            内置模板列表
+        """
+        from app.templates.builtin import BUILTIN_TEMPLATES
+        
+        templates = []
+        for template_data in BUILTIN_TEMPLATES:
+            template = ConfigTemplate.query.filter_by(name=template_data['name']).first()
+            if not template:
+                template = ConfigTemplate(name=template_data['name'])
+                db.session.add(template)
+            template.description = template_data['description']
+            template.category = template_data['category']
+            template.template_content = template_data['template_content']
+            
+            existing = {var.name for var in template.variables} if template.id else set()
+            for variable_data in template_data['variables']:
+                if variable_data['name'] not in existing:
+                    db.session.add(TemplateVariable(template=template, **variable_data))
+            templates.append(template)
+        
+        db.session.commit()
+        return templates
 
 class TemplateVariableService:
     """模板变量服务类"""
@@ -0,0 +1,101 @@
+"""
+设备操作分阶段耗时
+任务在 collect_phases() 范围内处理一台设备，连接层和任务用 phase() 标记各阶段，
+范围内执行的数据库语句自动计入 db 阶段；结果以JSON保存在 TaskResult.phase_timings 中
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 阶段（按发生顺序）
+PHASE_SESSION_WAIT = 'session_wait'   # 排队等待设备会话
+PHASE_DNS = 'dns'                     # 解析设备地址
+PHASE_TCP_CONNECT = 'tcp_connect'     # 建立TCP连接
+PHASE_AUTH = 'auth'                   # 协议握手和认证（SSH由paramiko一次完成TCP连接、握手和认证，计入此阶段）
+PHASE_PROMPT = 'prompt'               # 识别提示符、关闭分页等会话准备
+PHASE_COMMAND = 'command'             # 执行命令/下发配置/RESTCONF请求
+PHASE_DB = 'db'                       # 数据库语句（不含其他阶段内执行的语句）
+
+PHASES = (PHASE_SESSION_WAIT, PHASE_DNS, PHASE_TCP_CONNECT, PHASE_AUTH, PHASE_PROMPT, PHASE_COMMAND, PHASE_DB)
+
+# 保存的精度（秒）
+PRECISION = 4
+
+class PhaseTimings:
+    """一台设备的分阶段耗时（秒），同一阶段多次出现时累加"""
+    
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+        self._depth = 0
+    
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+    
+    @property
+    def in_phase(self) -> bool:
+        return self._depth > 0
+    
+    def to_dict(self) -> Dict[str, float]:
+        """按阶段顺序输出，未出现的阶段省略"""
+        ordered = [phase for phase in PHASES if phase in self.durations]
+        ordered += sorted(set(self.durations) - set(PHASES))
+        return {phase: round(self.durations[phase], PRECISION) for phase in ordered}
+
+_current: ContextVar = ContextVar('phase_timings', default=None)
+
+@contextmanager
+def collect_phases(timings: Optional[PhaseTimings] = None):
+    """收集范围内各阶段的耗时，返回 PhaseTimings；传入已有的 PhaseTimings 时继续累加"""
+    timings = timings if timings is not None else PhaseTimings()
+    reset = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(reset)
+
+def current_timings() -> Optional[PhaseTimings]:
+    return _current.get()
+
+@contextmanager
+def phase(name: str):
+    """记录范围内的耗时为一个阶段（异常时也记录）；不在 collect_phases() 内时不做任何事"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    timings._depth += 1
+    try:
+        yield
+    finally:
+        timings._depth -= 1
+        timings.add(name, time.perf_counter() - start)
+
+def record_phase(name: str, seconds: Optional[float]) -> None:
+    """直接记录一个阶段的耗时"""
+    timings = _current.get()
+    if timings is not None and seconds is not None:
+        timings.add(name, seconds)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('phase_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('phase_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    timings = _current.get()
+    # 其他阶段内的语句（如排队时检查取消）已计入该阶段
+    if timings is not None and not timings.in_phase:
+        timings.add(PHASE_DB, elapsed)
+
+if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
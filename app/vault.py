@@ -0,0 +1,200 @@
+"""
+设备凭据加解密
+由 SECRET_KEY 经PBKDF2派生Fernet密钥，加密器按密钥配置缓存，每个进程只构建一次；
+解密结果按（设备ID, 密文摘要）短时缓存，支持MultiFernet密钥轮换
+"""
+
+import base64
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# 默认参数，可通过同名配置项覆盖
+DEFAULT_KDF_SALT = 'netmanagerx-credential-vault'  # CREDENTIAL_KDF_SALT
+DEFAULT_KDF_ITERATIONS = 390000                    # CREDENTIAL_KDF_ITERATIONS
+DEFAULT_CACHE_TTL = 300                            # CREDENTIAL_CACHE_TTL（秒）
+DEFAULT_CACHE_SIZE = 1024                          # CREDENTIAL_CACHE_SIZE
+DEFAULT_ROTATE_BATCH_SIZE = 500                    # CREDENTIAL_ROTATE_BATCH_SIZE
+
+# 加密存储的凭据列
+CREDENTIAL_COLUMNS = ('password_encrypted', 'enable_password_encrypted')
+
+@lru_cache(maxsize=8)
+def derive_key(secret: str, salt: str, iterations: int) -> bytes:
+    """由密钥字符串派生Fernet密钥（结果按参数缓存，同一进程只计算一次）"""
+    kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt.encode(), iterations=iterations)
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+@lru_cache(maxsize=8)
+def build_cipher(secrets: Tuple[str, ...], salt: str, iterations: int) -> MultiFernet:
+    """MultiFernet加密器：第一个密钥用于加密，全部密钥用于解密（按参数缓存）"""
+    return MultiFernet([Fernet(derive_key(secret, salt, iterations)) for secret in secrets])
+
+class DecryptedCache:
+    """有大小上限的TTL缓存（LRU淘汰），线程安全"""
+    
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL, max_size: int = DEFAULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data: 'OrderedDict[Tuple, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Tuple, value: str) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def invalidate(self, device_id: Any) -> None:
+        """删除某台设备的全部缓存项"""
+        with self._lock:
+            for key in [key for key in self._data if key[0] == device_id]:
+                del self._data[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+class CredentialVault:
+    """
+    凭据加解密扩展
+    
+    - 当前密钥由 SECRET_KEY 派生，CREDENTIAL_PREVIOUS_KEYS 中的旧密钥仅用于解密
+    - 密钥配置在使用时从当前应用读取，加密器在首次使用时构建，之后复用
+    - 解密结果缓存键包含密文摘要，密码更新或轮换后旧缓存项自然失效
+    """
+    
+    def __init__(self, app=None):
+        self.cache = DecryptedCache()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.cache = DecryptedCache(
+            ttl=app.config.get('CREDENTIAL_CACHE_TTL', DEFAULT_CACHE_TTL),
+            max_size=app.config.get('CREDENTIAL_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        )
+        app.extensions['credential_vault'] = self
+    
+    @property
+    def cipher(self) -> MultiFernet:
+        """当前应用密钥配置的MultiFernet加密器"""
+        config = current_app.config
+        secrets = (config['SECRET_KEY'],) + tuple(config.get('CREDENTIAL_PREVIOUS_KEYS') or ())
+        return build_cipher(
+            secrets,
+            config.get('CREDENTIAL_KDF_SALT', DEFAULT_KDF_SALT),
+            config.get('CREDENTIAL_KDF_ITERATIONS', DEFAULT_KDF_ITERATIONS)
+        )
+    
+    def encrypt(self, plaintext: str) -> str:
+        """使用当前密钥加密"""
+        return self.cipher.encrypt(plaintext.encode()).decode()
+    
+    def decrypt(self, token: Optional[str], device_id: Any = None) -> Optional[str]:
+        """解密（带缓存），密文为空或无法解密时返回None"""
+        if not token:
+            return None
+        
+        key = (device_id, hashlib.sha256(token.encode()).digest())
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+        
+        try:
+            value = self.cipher.decrypt(token.encode()).decode()
+        except InvalidToken:
+            logger.warning(f'设备 {device_id} 的凭据无法解密')
+            return None
+        self.cache.set(key, value)
+        return value
+    
+    def rotate_token(self, token: Optional[str]) -> Optional[str]:
+        """使用当前密钥重新加密，已是当前密钥加密的密文也会重新生成"""
+        if not token:
+            return token
+        return self.cipher.rotate(token.encode()).decode()
+    
+    def rotate_all(self, batch_size: Optional[int] = None) -> Dict[str, int]:
+        """
+        批量将所有设备凭据重新加密为当前密钥
+        
+        按主键分批读取和更新，每批一个事务；无法解密的密文保持不变
+        
+        Returns:
+            {'rotated': 已轮换设备数, 'failed': 无法解密的设备数}
+        """
+        from sqlalchemy import bindparam, select
+        from app import db
+        from app.models import Device
+        
+        if batch_size is None:
+            batch_size = current_app.config.get('CREDENTIAL_ROTATE_BATCH_SIZE', DEFAULT_ROTATE_BATCH_SIZE)
+        
+        table = Device.__table__
+        columns = [table.c[name] for name in CREDENTIAL_COLUMNS]
+        update = table.update().where(table.c.id == bindparam('device_id')).values(
+            {name: bindparam(name) for name in CREDENTIAL_COLUMNS}
+        )
+        
+        rotated = failed = 0
+        last_id = 0
+        while True:
+            with db.engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, *columns)
+                    .where(table.c.id > last_id)
+                    .order_by(table.c.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                
+                params = []
+                for row in rows:
+                    if not any(getattr(row, name) for name in CREDENTIAL_COLUMNS):
+                        continue
+                    try:
+                        values = {name: self.rotate_token(getattr(row, name)) for name in CREDENTIAL_COLUMNS}
+                    except InvalidToken:
+                        logger.warning(f'设备 {row.id} 的凭据无法解密，跳过轮换')
+                        failed += 1
+                        continue
+                    params.append({'device_id': row.id, **values})
+                
+                if params:
+                    conn.execute(update, params)
+                rotated += len(params)
+        
+        self.cache.clear()
+        return {'rotated': rotated, 'failed': failed}
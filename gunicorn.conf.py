@@ -0,0 +1,27 @@
+"""
+gunicorn配置
+在项目根目录启动gunicorn时自动加载（Docker镜像的启动命令也显式指定本文件）；
+设置 PROMETHEUS_MULTIPROC_DIR 时 /metrics 汇总所有worker进程的指标
+"""
+
+import os
+
+from app.metrics import clear_multiproc_dir, mark_process_dead
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 4))
+
+# 任务事件流（SSE）是长连接：同步worker在一个连接期间不能处理其他请求，且连接超过timeout会被杀掉，
+# 因此使用gthread，每个连接占用一个线程，worker心跳不受长连接影响。
+# 事件流连接时长另由 TASK_EVENTS_MAX_DURATION 限制（小于timeout），到期后浏览器自动重连
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+def on_starting(server):
+    """master启动时清空多进程指标目录"""
+    clear_multiproc_dir()
+
+def child_exit(server, worker):
+    """worker退出时清理其实时指标（活动会话数等）"""
+    mark_process_dead(worker.pid)
@@ -0,0 +1,62 @@
+"""热点过滤条件的组合索引与部分索引
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列, 额外参数)
+COMPOSITE_INDEXES = [
+    ('ix_tasks_status_created_at', 'tasks', ['status', 'created_at'], {}),
+    ('ix_task_results_task_id_created_at', 'task_results', ['task_id', 'created_at'], {}),
+    ('ix_config_backups_device_id_created_at', 'config_backups', ['device_id', 'created_at'], {}),
+    ('ix_config_backups_device_id_current', 'config_backups', ['device_id'], {
+        'postgresql_where': sa.text('is_current'),
+        'sqlite_where': sa.text('is_current = 1'),
+    }),
+    ('ix_audit_logs_resource_created_at', 'audit_logs', ['resource_type', 'resource_id', 'created_at'], {}),
+    ('ix_device_connections_device_id_status', 'device_connections', ['device_id', 'status'], {}),
+]
+
+# 被组合索引的前导列覆盖的单列索引
+REDUNDANT_INDEXES = [
+    ('ix_tasks_status', 'tasks', ['status']),
+    ('ix_config_backups_device_id', 'config_backups', ['device_id']),
+    ('ix_audit_logs_resource_type', 'audit_logs', ['resource_type']),
+]
+
+
+def _existing_indexes(table):
+    """数据库中已存在的索引名（表由 db.create_all() 创建时索引可能已存在）"""
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns, kwargs in COMPOSITE_INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns, **kwargs)
+    
+    for name, table, _ in REDUNDANT_INDEXES:
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    for name, table, columns in REDUNDANT_INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+    
+    for name, table, _, _ in reversed(COMPOSITE_INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
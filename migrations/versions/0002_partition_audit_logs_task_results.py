@@ -0,0 +1,107 @@
+"""audit_logs、task_results 按 created_at 月度分区（仅PostgreSQL）
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# {表名: [(外键列, 引用表.列), ...]}
+PARTITIONED_TABLES = {
+    'audit_logs': [('user_id', 'users.id'), ('task_id', 'tasks.id')],
+    'task_results': [('task_id', 'tasks.id'), ('device_id', 'devices.id')],
+}
+
+# 提前创建的月份数，之后由定时任务 maintain_partitions 继续创建
+MONTHS_AHEAD = 2
+
+
+def _month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add_months(value, months):
+    years, month_index = divmod(value.month - 1 + months, 12)
+    return value.replace(year=value.year + years, month=month_index + 1, day=1)
+
+
+def _is_partitioned(bind, table):
+    return bind.execute(sa.text(
+        'SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid '
+        'WHERE c.relname = :table'
+    ), {'table': table}).first() is not None
+
+
+def _rebuild(bind, table, foreign_keys, partitioned):
+    """将表重建为分区表（partitioned=True）或普通表，保留数据、序列和索引"""
+    legacy = f'{table}_legacy'
+    indexes = sa.inspect(bind).get_indexes(table)
+    
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    op.execute(f"UPDATE {legacy} SET created_at = timezone('utc', now()) WHERE created_at IS NULL")
+    
+    if partitioned:
+        op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+        op.execute(f'ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL')
+        
+        oldest = bind.execute(sa.text(f'SELECT MIN(created_at) FROM {legacy}')).scalar()
+        current = _month_start(datetime.utcnow())
+        start = _month_start(oldest) if oldest and oldest < current else current
+        end = _add_months(current, MONTHS_AHEAD + 1)
+        while start < end:
+            name = f'{table}_y{start.year:04d}m{start.month:02d}'
+            op.execute(
+                f"CREATE TABLE {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+            )
+            start = _add_months(start, 1)
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+    else:
+        op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS)')
+    
+    op.execute(f'INSERT INTO {table} SELECT * FROM {legacy}')
+    # id序列随旧表一起删除，先转移所有权
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    op.execute(f'DROP TABLE {legacy} CASCADE')
+    
+    # 旧表删除后再创建约束和索引，避免名称冲突，也避免逐行维护索引
+    # 分区表的主键必须包含分区键
+    primary_key = 'id, created_at' if partitioned else 'id'
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})')
+    for column, target in foreign_keys:
+        target_table, target_column = target.split('.')
+        op.execute(f'ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {target_table} ({target_column})')
+    for index in indexes:
+        op.create_index(index['name'], table, index['column_names'], unique=index['unique'])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # 其他数据库不支持原生分区，由归档任务使用滚动表
+        return
+    
+    for table, foreign_keys in PARTITIONED_TABLES.items():
+        if not _is_partitioned(bind, table):
+            _rebuild(bind, table, foreign_keys, partitioned=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    
+    for table, foreign_keys in PARTITIONED_TABLES.items():
+        if _is_partitioned(bind, table):
+            _rebuild(bind, table, foreign_keys, partitioned=False)
@@ -0,0 +1,33 @@
+"""设备并发会话上限
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    """表由 db.create_all() 创建时列可能已存在"""
+    inspector = sa.inspect(op.get_bind())
+    return column in {col['name'] for col in inspector.get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('devices', 'max_sessions'):
+        op.add_column('devices', sa.Column('max_sessions', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    if _has_column('devices', 'max_sessions'):
+        with op.batch_alter_table('devices') as batch_op:
+            batch_op.drop_column('max_sessions')
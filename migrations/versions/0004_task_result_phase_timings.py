@@ -0,0 +1,34 @@
+"""任务结果分阶段耗时
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    """表由 db.create_all() 创建时列可能已存在"""
+    inspector = sa.inspect(op.get_bind())
+    return column in {col['name'] for col in inspector.get_columns(table)}
+
+
+def upgrade():
+    # PostgreSQL分区表上新增的列会加到所有分区
+    if not _has_column('task_results', 'phase_timings'):
+        op.add_column('task_results', sa.Column('phase_timings', sa.Text(), nullable=True))
+
+
+def downgrade():
+    if _has_column('task_results', 'phase_timings'):
+        with op.batch_alter_table('task_results') as batch_op:
+            batch_op.drop_column('phase_timings')
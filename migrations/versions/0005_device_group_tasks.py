@@ -0,0 +1,52 @@
+"""设备组颜色和按设备组执行的任务
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    """表由 db.create_all() 创建时列可能已存在"""
+    inspector = sa.inspect(op.get_bind())
+    return column in {col['name'] for col in inspector.get_columns(table)}
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    if not _has_column('device_groups', 'color'):
+        op.add_column('device_groups', sa.Column('color', sa.String(length=20), nullable=True))
+    if not _has_column('tasks', 'group_id'):
+        op.add_column('tasks', sa.Column('group_id', sa.Integer(), sa.ForeignKey('device_groups.id'), nullable=True))
+    if 'ix_tasks_group_id' not in _existing_indexes('tasks'):
+        op.create_index('ix_tasks_group_id', 'tasks', ['group_id'])
+    # PostgreSQL分区表上创建的索引会建到所有分区
+    if 'ix_audit_logs_task_id_created_at' not in _existing_indexes('audit_logs'):
+        op.create_index('ix_audit_logs_task_id_created_at', 'audit_logs', ['task_id', 'created_at'])
+
+
+def downgrade():
+    if 'ix_audit_logs_task_id_created_at' in _existing_indexes('audit_logs'):
+        op.drop_index('ix_audit_logs_task_id_created_at', table_name='audit_logs')
+    if 'ix_tasks_group_id' in _existing_indexes('tasks'):
+        op.drop_index('ix_tasks_group_id', table_name='tasks')
+    if _has_column('tasks', 'group_id'):
+        with op.batch_alter_table('tasks') as batch_op:
+            batch_op.drop_column('group_id')
+    if _has_column('device_groups', 'color'):
+        with op.batch_alter_table('device_groups') as batch_op:
+            batch_op.drop_column('color')
@@ -0,0 +1,47 @@
+"""设备清单表
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table):
+    """表由 db.create_all() 创建时可能已存在"""
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    if _has_table('device_inventory'):
+        return
+    op.create_table(
+        'device_inventory',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('path', sa.String(length=255), nullable=False),
+        sa.Column('data', sa.Text(), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('duration', sa.Float(), nullable=True),
+        sa.Column('collected_at', sa.DateTime(), nullable=True),
+        sa.Column('device_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['device_id'], ['devices.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('device_id', 'name', name='uq_device_inventory_device_id_name')
+    )
+    op.create_index('ix_device_inventory_collected_at', 'device_inventory', ['collected_at'])
+
+
+def downgrade():
+    if _has_table('device_inventory'):
+        op.drop_index('ix_device_inventory_collected_at', table_name='device_inventory')
+        op.drop_table('device_inventory')
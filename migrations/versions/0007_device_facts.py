@@ -0,0 +1,46 @@
+"""设备信息缓存
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    """表由 db.create_all() 创建时列可能已存在"""
+    inspector = sa.inspect(op.get_bind())
+    return column in {col['name'] for col in inspector.get_columns(table)}
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    if not _has_column('devices', 'facts'):
+        op.add_column('devices', sa.Column('facts', sa.Text(), nullable=True))
+    if not _has_column('devices', 'facts_updated_at'):
+        op.add_column('devices', sa.Column('facts_updated_at', sa.DateTime(), nullable=True))
+    if 'ix_devices_facts_updated_at' not in _existing_indexes('devices'):
+        op.create_index('ix_devices_facts_updated_at', 'devices', ['facts_updated_at'])
+
+
+def downgrade():
+    if 'ix_devices_facts_updated_at' in _existing_indexes('devices'):
+        op.drop_index('ix_devices_facts_updated_at', table_name='devices')
+    with op.batch_alter_table('devices') as batch_op:
+        if _has_column('devices', 'facts_updated_at'):
+            batch_op.drop_column('facts_updated_at')
+        if _has_column('devices', 'facts'):
+            batch_op.drop_column('facts')
@@ -0,0 +1,43 @@
+"""设备与任务常用过滤列的单列索引
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# (索引名, 表名, 列)，与模型中 index=True 的列一致
+INDEXES = [
+    ('ix_devices_status', 'devices', ['status']),
+    ('ix_devices_group_id', 'devices', ['group_id']),
+    ('ix_devices_created_at', 'devices', ['created_at']),
+    ('ix_tasks_user_id', 'tasks', ['user_id']),
+    ('ix_tasks_device_id', 'tasks', ['device_id']),
+]
+
+
+def _existing_indexes(table):
+    """数据库中已存在的索引名（表由 db.create_all() 创建时索引可能已存在）"""
+    inspector = sa.inspect(op.get_bind())
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        if name in _existing_indexes(table):
+            op.drop_index(name, table_name=table)
@@ -23,22 +23,12 @@ def make_shell_context():
 def init_db():
     """初始化数据库"""
     print("正在初始化数据库...")
-    db.create_all()
     
-    # 创建默认角色
-    print("创建默认角色...")
-    User.create_default_roles()
-    
-    # 创建默认管理员用户
-    print("创建默认管理员用户...")
-    admin_user = User.create_admin_user()
+    # 创建默认角色、管理员用户、模板分类和内置模板
+    from app.bootstrap import init_default_data
+    admin_user = init_default_data()
     print(f"管理员用户已创建: {admin_user.username}")
-    
-    # 创建默认模板分类
-    print("创建默认模板分类...")
-    from app.models.template import TemplateCategory
-    TemplateCategory.create_default_categories()
-    print("默认模板分类创建完成")
+    print("默认模板分类和内置模板创建完成")
     
     print("数据库初始化完成！")
 
@@ -71,6 +61,25 @@ def create_admin():
     
     print(f"管理员用户 {username} 创建成功！")
 
+@app.cli.command()
+def archive_partitions():
+    """创建后续月份分区并归档过期的审计日志和任务结果"""
+    from app.partitions import PartitionManager
+    
+    for name in PartitionManager.ensure_partitions():
+        print(f"已创建分区 {name}")
+    for table, paths in PartitionManager.archive_expired().items():
+        for path in paths:
+            print(f"{table} 已归档: {path}")
+
+@app.cli.command()
+def rotate_credentials():
+    """使用当前SECRET_KEY重新加密所有设备凭据"""
+    from app import credential_vault
+    
+    result = credential_vault.rotate_all()
+    print(f"已轮换 {result['rotated']} 台设备的凭据，{result['failed']} 台无法解密")
+
 if __name__ == '__main__':
     # 开发环境启动
     app.run(
@@ -4,23 +4,23 @@
 """
 
 import pytest
-import os
-import tempfile
 from flask import Flask
 from app import create_app, db
 from app.models import User, Role, Device, DeviceGroup, ConfigTemplate, Task, AuditLog
+from app.tasks.celery_app import celery
 
-@pytest.fixture(scope='session')
+@pytest.fixture
 def app():
-    """创建测试应用实例"""
-    # 创建临时数据库文件
-    db_fd, db_path = tempfile.mkstemp()
-    
-    # 配置测试环境
-    os.environ['TESTING'] = 'true'
-    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    """
+    创建测试应用实例，每个测试使用新建的数据库和默认角色
     
+    配置了broker时任务在请求中直接提交，Celery以eager模式同步执行，
+    测试结束时任务已完成（未配置时任务交给后台线程池，与请求并发执行）
+    """
     app = create_app('testing')
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['CELERY_BROKER_URL'] = 'memory://'
+    celery.conf.task_always_eager = True
     
     with app.app_context():
         db.create_all()
@@ -41,34 +41,45 @@ def app():
         # 清理
         db.session.remove()
         db.drop_all()
-    
-    os.close(db_fd)
-    os.unlink(db_path)
 
-@pytest.fixture(scope='session')
+@pytest.fixture
 def client(app):
     """创建测试客户端"""
     return app.test_client()
 
-@pytest.fixture(scope='session')
+@pytest.fixture
 def runner(app):
     """创建测试运行器"""
     return app.test_cli_runner()
 
 @pytest.fixture
 def admin_user(app):
-    """创建管理员用户"""
-    with app.app_context():
-        role = Role.query.filter_by(name='admin').first()
-        user = User(
-            username='admin',
-            email='admin@example.com',
-            role=role
-        )
-        user.password = 'admin123'
-        db.session.add(user)
-        db.session.commit()
-        return user
+    """创建管理员用户（admin/admin123）"""
+    role = Role.query.filter_by(name='admin').first()
+    user = User(
+        username='admin',
+        email='admin@example.com',
+        role=role,
+        is_admin=True
+    )
+    user.password = 'admin123'
+    db.session.add(user)
+    db.session.commit()
+    # 测试常在新的应用上下文（即新的会话）中使用返回的对象：加载属性和角色后从当前会话分离
+    db.session.refresh(user)
+    db.session.expunge(user.role)
+    db.session.expunge(user)
+    return user
+
+@pytest.fixture
+def login(client, admin_user):
+    """登录测试客户端，默认使用管理员账号"""
+    def _login(username='admin', password='admin123'):
+        return client.post('/auth/login', data={
+            'username': username,
+            'password': password
+        })
+    return _login
 
 @pytest.fixture
 def normal_user(app):
@@ -241,6 +252,29 @@ def mock_celery():
          patch('app.tasks.backup_tasks.backup_device_config', mock_task):
         yield mock_task
 
+@pytest.fixture
+def query_counter(app):
+    """统计代码块内执行的SQL语句数量，用于断言列表接口不存在N+1查询"""
+    from contextlib import contextmanager
+    from sqlalchemy import event
+    
+    @contextmanager
+    def _count():
+        statements = []
+        
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    
+    return _count
+
 @pytest.fixture
 def sample_config_backup(app, admin_user, sample_device):
     """创建示例配置备份"""
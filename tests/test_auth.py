@@ -304,6 +304,21 @@ class TestProtectedRoutes:
         # 访问受保护路由
         response = client.get('/auth/profile')
         assert response.status_code == 200
+    
+    def test_user_loader_registered(self, app, sample_user):
+        """测试应用包注册了用户加载函数（不依赖启动脚本）"""
+        from app import login_manager
+        
+        with app.app_context():
+            user_id = User.query.filter_by(username='testuser').first().id
+            user = login_manager._user_callback(str(user_id))
+            assert user.username == 'testuser'
+    
+    def test_error_page_renders(self, client):
+        """测试错误页面模板存在且无需登录即可渲染"""
+        response = client.get('/no-such-page')
+        assert response.status_code == 404
+        assert '页面未找到' in response.get_data(as_text=True)
 
 class TestUserProfile:
     """用户资料测试"""
@@ -0,0 +1,135 @@
+"""
+进程内后台执行测试
+"""
+
+import threading
+import pytest
+from unittest.mock import patch
+from flask import current_app
+from app import create_app, db, background_executor
+from app.background import BackgroundExecutor
+from app.models import User, Role, Device, DeviceType, ConnectionType, Task, TaskStatus
+from app.tasks.celery_app import celery
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    app.config['BACKGROUND_WORKERS'] = 2
+    return app
+
+@pytest.fixture
+def executor(app):
+    """后台线程池（在应用上下文中提交），测试结束时关闭"""
+    executor = BackgroundExecutor(app)
+    with app.app_context():
+        yield executor
+    executor.shutdown()
+
+class TestBackgroundExecutor:
+    """后台线程池测试"""
+    
+    def test_runs_in_app_context_off_caller_thread(self, app, executor):
+        """测试函数在其他线程的应用上下文中执行"""
+        def work(value):
+            return current_app.name, threading.current_thread().name, value
+        
+        name, thread_name, value = executor.submit(work, 42).result(timeout=5)
+        
+        assert name == app.name
+        assert thread_name.startswith('background')
+        assert value == 42
+        assert executor.max_workers == 2
+    
+    def test_runs_in_submitting_app(self, app, executor):
+        """测试之后初始化的应用（如worker应用）不改变函数执行所在的应用"""
+        other = create_app('testing')
+        executor.init_app(other)
+        
+        assert executor.submit(current_app._get_current_object).result(timeout=5) is app
+    
+    def test_submit_returns_before_completion(self, executor):
+        """测试提交后立即返回，不等待函数执行完毕"""
+        started = threading.Event()
+        release = threading.Event()
+        
+        def work():
+            started.set()
+            release.wait(5)
+            return 'done'
+        
+        future = executor.submit(work)
+        assert started.wait(5)
+        assert not future.done()
+        
+        release.set()
+        assert future.result(timeout=5) == 'done'
+    
+    def test_exception_is_reported_on_future(self, executor):
+        """测试函数异常记录日志并通过Future返回"""
+        def work():
+            raise RuntimeError('设备不可达')
+        
+        with pytest.raises(RuntimeError, match='设备不可达'):
+            executor.submit(work).result(timeout=5)
+    
+    def test_shutdown_waits_for_submitted_work(self, executor):
+        """测试关闭时等待已提交的函数执行完毕，之后可以重新提交"""
+        results = []
+        for i in range(5):
+            executor.submit(results.append, i)
+        
+        executor.shutdown()
+        
+        assert sorted(results) == [0, 1, 2, 3, 4]
+        assert executor.submit(lambda: 'again').result(timeout=5) == 'again'
+
+class TestDispatchWithoutBroker:
+    """未配置broker时任务在后台线程池中执行测试"""
+    
+    @pytest.fixture
+    def client(self, app):
+        """未配置broker的测试客户端（任务以eager模式在后台线程中执行）"""
+        app.config['CELERY_BROKER_URL'] = None
+        celery.conf.task_always_eager = True
+        with app.app_context():
+            db.create_all()
+            role = Role(name='admin', description='管理员')
+            user = User(username='admin', email='admin@example.com', role=role, is_admin=True)
+            user.password = 'admin123'
+            device = Device(name='router', ip_address='10.8.0.1', device_type=DeviceType.CISCO_ROUTER,
+                            connection_type=ConnectionType.SSH, username='admin')
+            db.session.add_all([role, user, device])
+            db.session.commit()
+            yield app.test_client()
+            background_executor.shutdown()
+            db.session.remove()
+            db.drop_all()
+    
+    def test_create_returns_before_task_runs(self, app, client):
+        """测试创建任务立即返回202，任务在后台线程中执行并把状态写入数据库"""
+        # 内存SQLite只有一个连接，请求返回后再把任务交给线程池，避免两个线程同时使用连接
+        pending = []
+        submit = background_executor.submit
+        result = {'success': True, 'output': 'ok', 'execution_time': 0.1}
+        
+        client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+        with patch('app.tasks.network_tasks.SSHService.execute_command', return_value=result), \
+             patch.object(background_executor, 'submit', side_effect=lambda *args, **kwargs: pending.append((args, kwargs))):
+            response = client.post('/tasks/create', json={
+                'name': 'show clock',
+                'task_type': 'command',
+                'command': 'show clock',
+                'device_id': Device.query.first().id
+            })
+            
+            assert response.status_code == 202
+            task_id = response.get_json()['task_id']
+            assert db.session.get(Task, task_id).status == TaskStatus.PENDING
+            assert len(pending) == 1
+            
+            args, kwargs = pending[0]
+            submit(*args, **kwargs).result(timeout=5)
+        
+        db.session.expire_all()
+        assert db.session.get(Task, task_id).status == TaskStatus.SUCCESS
@@ -0,0 +1,221 @@
+"""
+任务协作式取消与设备执行期限测试
+未配置REDIS_URL，取消标记读取数据库中的任务状态
+"""
+
+import json
+import time
+import pytest
+from unittest.mock import patch, Mock
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db, cancellation
+from app.models import Device, DeviceType, ConnectionType, Task, TaskStatus, TaskType
+from app.cancellation import (
+    CancellationToken, TaskCancelled, DeviceDeadlineExceeded,
+    device_scope, checkpoint, remaining_time, bounded_timeout
+)
+from app.communication.session_lock import DeviceSessionLock, _LocalQueue
+from app.tasks.celery_app import celery
+from app.tasks.fanout import revoke_task
+from app.tasks import network_tasks
+
+@pytest.fixture
+def app(app):
+    """测试应用（不使用Redis）"""
+    app.config['REDIS_URL'] = None
+    return app
+
+@pytest.fixture
+def sample_data(app, admin_user):
+    """创建两台SSH设备和管理员的一个执行中的任务"""
+    with app.app_context():
+        user = db.session.merge(admin_user)
+        devices = [
+            Device(
+                name=f'cancel_device_{i}',
+                ip_address=f'10.7.0.{i + 1}',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin'
+            )
+            for i in range(2)
+        ]
+        task = Task(name='cancel_task', task_type=TaskType.BATCH_COMMAND,
+                    status=TaskStatus.RUNNING, user=user)
+        db.session.add_all([task] + devices)
+        db.session.commit()
+        return {'task_id': task.id, 'device_ids': [device.id for device in devices]}
+
+class TestCancellationToken:
+    """取消令牌测试"""
+    
+    def test_detects_cancelled_status(self, app, sample_data):
+        """测试未配置Redis时读取数据库中的任务状态"""
+        with app.app_context():
+            token = CancellationToken(sample_data['task_id'], check_interval=0)
+            assert token.cancelled is False
+            
+            Task.query.get(sample_data['task_id']).cancel('用户手动取消')
+            
+            assert token.cancelled is True
+            with pytest.raises(TaskCancelled):
+                token.check()
+    
+    def test_result_is_cached(self, app, sample_data):
+        """测试检查间隔内不重复查询"""
+        with app.app_context():
+            token = CancellationToken(sample_data['task_id'], check_interval=60)
+            assert token.cancelled is False
+            
+            Task.query.get(sample_data['task_id']).cancel('用户手动取消')
+            
+            assert token.cancelled is False
+            token._checked_at -= 60
+            assert token.cancelled is True
+    
+    def test_without_task_id_never_cancelled(self, app):
+        """测试没有任务ID的令牌不查询取消标记"""
+        with app.app_context():
+            assert CancellationToken(None).cancelled is False
+
+class TestDeviceScope:
+    """设备执行范围测试"""
+    
+    def test_checkpoint_outside_scope_is_noop(self):
+        """测试不在执行范围内时检查点不做任何事"""
+        checkpoint()
+        assert remaining_time() is None
+        assert bounded_timeout(30) == 30
+    
+    def test_cancelled_task_does_not_enter(self, app, sample_data):
+        """测试已取消的任务不再开始处理新设备"""
+        with app.app_context():
+            Task.query.get(sample_data['task_id']).cancel('用户手动取消')
+            token = CancellationToken(sample_data['task_id'])
+            
+            entered = False
+            with pytest.raises(TaskCancelled):
+                with device_scope(token):
+                    entered = True
+            assert entered is False
+    
+    def test_deadline_stops_checkpoint(self):
+        """测试超过设备执行期限后检查点抛出异常"""
+        with device_scope(deadline=0.05):
+            checkpoint()
+            time.sleep(0.06)
+            with pytest.raises(DeviceDeadlineExceeded):
+                checkpoint()
+        checkpoint()
+    
+    def test_timeouts_bounded_by_remaining_time(self):
+        """测试连接和读取超时不超过剩余时间，且不低于下限"""
+        with device_scope(deadline=10):
+            assert 9 < remaining_time() <= 10
+            assert bounded_timeout(30) <= 10
+            assert bounded_timeout(5) == 5
+        with device_scope(deadline=0.001):
+            time.sleep(0.01)
+            assert bounded_timeout(30) == cancellation.MIN_TIMEOUT
+    
+    def test_zero_deadline_is_unlimited(self):
+        """测试期限为0时不限制"""
+        with device_scope(deadline=0):
+            assert remaining_time() is None
+            assert bounded_timeout(30) == 30
+
+class TestCancelledWhileWaiting:
+    """排队等待会话时取消测试"""
+    
+    def test_waiter_leaves_queue(self, app, sample_data):
+        """测试排队期间任务被取消时退出排队，不占用队列位置"""
+        with app.app_context():
+            holder = DeviceSessionLock('cancel-queue')
+            holder.acquire()
+            waiter = DeviceSessionLock('cancel-queue', poll_interval=0.01, wait_timeout=5)
+            Task.query.get(sample_data['task_id']).cancel('用户手动取消')
+            
+            # 进入范围时任务尚未取消，排队期间才发现
+            token = CancellationToken(sample_data['task_id'], check_interval=0)
+            token._checked_at = time.monotonic() + 60
+            with device_scope(token):
+                token._checked_at = None
+                with pytest.raises(TaskCancelled):
+                    waiter.acquire()
+            
+            assert waiter.member not in _LocalQueue._queues.get('cancel-queue', {})
+            holder.release()
+
+class TestTaskCancel:
+    """任务取消测试"""
+    
+    def test_complete_keeps_cancelled_status(self, app, sample_data):
+        """测试执行中的任务结束时不覆盖取消状态"""
+        with app.app_context():
+            task = Task.query.get(sample_data['task_id'])
+            Task.query.filter_by(id=task.id).update({'status': TaskStatus.CANCELLED})
+            db.session.commit()
+            # 模拟执行任务的进程中对象状态已过期
+            set_committed_value(task, 'status', TaskStatus.RUNNING)
+            
+            task.complete(True, '执行成功')
+            
+            db.session.expire_all()
+            assert Task.query.get(task.id).status == TaskStatus.CANCELLED
+    
+    @patch('app.tasks.network_tasks.SSHService.test_connection')
+    def test_subtasks_skip_devices_after_cancel(self, mock_test, app, sample_data):
+        """测试任务取消后子任务不再连接设备"""
+        with app.app_context():
+            Task.query.get(sample_data['task_id']).cancel('用户手动取消')
+            
+            entry = network_tasks.test_connection_for_batch(sample_data['device_ids'][0], 30, sample_data['task_id'])
+            
+            assert entry['result'] == {'success': False, 'error': '任务已取消'}
+            mock_test.assert_not_called()
+    
+    @patch('app.tasks.network_tasks.SSHService.test_connection', return_value={'success': True})
+    def test_dispatch_records_subtask_ids(self, mock_test, app, sample_data):
+        """测试分发时记录子任务ID，取消时一并撤销"""
+        with app.app_context():
+            task_id = sample_data['task_id']
+            network_tasks.batch_test_connections.apply(args=(task_id, sample_data['device_ids'])).get()
+            
+            task = Task.query.get(task_id)
+            subtask_ids = task.get_metadata()['subtask_ids']
+            assert len(subtask_ids) == 2
+            
+            task.set_metadata(dict(task.get_metadata(), celery_task_id='parent-id'))
+            with patch.object(celery.control, 'revoke') as mock_revoke:
+                assert revoke_task(task) == 3
+            mock_revoke.assert_called_once_with(['parent-id'] + subtask_ids)
+    
+    @patch('app.tasks.routes.batch_execute_commands')
+    def test_create_keeps_subtask_ids(self, mock_batch, app, client, login, sample_data):
+        """测试worker先写入子任务ID时，创建接口不会用过期的元数据覆盖"""
+        app.config['CELERY_BROKER_URL'] = 'redis://localhost:6379/0'
+        
+        def dispatch(args, **options):
+            # 模拟worker在另一个连接上分发子任务并写入子任务ID
+            metadata = json.dumps({'device_ids': args[1], 'celery_task_id': options['task_id'],
+                                   'subtask_ids': ['sub-1', 'sub-2']})
+            with db.engine.begin() as conn:
+                conn.execute(Task.__table__.update().where(Task.id == args[0]).values(task_metadata=metadata))
+            return Mock(id=options['task_id'])
+        
+        mock_batch.apply_async.side_effect = dispatch
+        login()
+        
+        response = client.post('/tasks/create', json={
+            'name': 'fanout_task',
+            'task_type': 'batch_command',
+            'command': 'show version',
+            'device_ids': sample_data['device_ids']
+        })
+        assert response.status_code == 202
+        
+        with app.app_context():
+            task = Task.query.get(response.get_json()['task_id'])
+            metadata = task.get_metadata()
+            assert metadata['subtask_ids'] == ['sub-1', 'sub-2']
+            assert metadata['celery_task_id'] == mock_batch.apply_async.call_args.kwargs['task_id']
@@ -98,6 +98,15 @@ class TestSSHClient:
             assert 'SSH连接建立成功' in result['message']
             assert result['connection_id'] is not None
     
+    def test_exception_reexports(self):
+        """测试仍可从ssh_client导入netmiko/paramiko异常类"""
+        from app.communication.ssh_client import (
+            NetMikoAuthenticationException, NetMikoTimeoutException, SSHException
+        )
+        
+        for exception in (NetMikoAuthenticationException, NetMikoTimeoutException, SSHException):
+            assert issubclass(exception, Exception)
+    
     @patch('app.communication.ssh_client.ConnectHandler')
     def test_ssh_connection_failure(self, mock_connect, app, ssh_device):
         """测试SSH连接失败"""
@@ -156,6 +165,45 @@ class TestSSHClient:
             assert result['success'] == True
             assert result['output'] == "配置已应用"
             assert result['commands'] == config_commands
+    
+    @patch('app.communication.ssh_client.observe_command')
+    def test_ssh_read_timeout_capped_by_deadline(self, mock_observe, app):
+        """测试设备执行期限只限制单条命令的读取超时"""
+        with app.app_context():
+            from app.cancellation import device_scope
+            from app.communication.ssh_client import SSHClient, CONFIG_READ_TIMEOUT
+            
+            # 直接注入已建立的连接，只验证传给netmiko的读取超时
+            mock_connection = Mock()
+            mock_connection.is_alive.return_value = True
+            mock_connection.send_command.return_value = "ok"
+            mock_connection.send_config_set.return_value = "ok"
+            
+            client = SSHClient(Mock(name='device'), timeout=30)
+            client.connection = mock_connection
+            
+            # 无执行期限：使用单条命令超时，延迟因子按比例放大
+            client.execute_command("show version")
+            assert mock_connection.send_command.call_args.kwargs['read_timeout'] == 30
+            client.execute_command("show version", delay_factor=2)
+            assert mock_connection.send_command.call_args.kwargs['read_timeout'] == 60
+            assert 'delay_factor' not in mock_connection.send_command.call_args.kwargs
+            client.send_config_commands(["hostname R1"])
+            assert mock_connection.send_config_set.call_args.kwargs['read_timeout'] == CONFIG_READ_TIMEOUT
+            
+            # 剩余时间充足：不会放大为整个执行期限
+            with device_scope(deadline=1000):
+                client.execute_command("show version")
+                assert mock_connection.send_command.call_args.kwargs['read_timeout'] == 30
+                client.send_config_commands(["hostname R1"])
+                assert mock_connection.send_config_set.call_args.kwargs['read_timeout'] == CONFIG_READ_TIMEOUT
+            
+            # 剩余时间不足：读取超时不超过剩余时间
+            with device_scope(deadline=5):
+                client.execute_command("show version")
+                assert mock_connection.send_command.call_args.kwargs['read_timeout'] <= 5
+                client.send_config_commands(["hostname R1"])
+                assert mock_connection.send_config_set.call_args.kwargs['read_timeout'] <= 5
 
 class TestTelnetClient:
     """Telnet客户端测试"""
@@ -296,6 +344,166 @@ class TestRESTCONFClient:
             assert result['data'] == {"interfaces": []}
             assert result['path'] == 'data/ietf-interfaces:interfaces'
 
+class TestRESTCONFSessionPool:
+    """RESTCONF连接池测试"""
+    
+    def _create_device(self):
+        device = Device(
+            name='restconf_device',
+            ip_address='192.168.1.3',
+            device_type=DeviceType.CISCO_ROUTER,
+            connection_type=ConnectionType.RESTCONF,
+            port=443,
+            username='admin'
+        )
+        device.set_password('admin123')
+        db.session.add(device)
+        db.session.commit()
+        return device
+    
+    def test_adapter_shared_per_device(self, app):
+        """测试同一设备的会话共享一个HTTPAdapter，不同设备各自一个"""
+        from app.communication.restconf_client import RESTCONFSessionPool
+        
+        pool = RESTCONFSessionPool(pool_maxsize=8)
+        first = pool.session('https://192.168.1.3:443/restconf/')
+        second = pool.session('https://192.168.1.3:443/restconf/')
+        other = pool.session('https://192.168.1.4:443/restconf/')
+        
+        adapter = first.get_adapter('https://192.168.1.3/')
+        assert second.get_adapter('https://192.168.1.3/') is adapter
+        assert other.get_adapter('https://192.168.1.4/') is not adapter
+        assert adapter._pool_maxsize == 8
+        assert pool.pool_count() == 2
+        pool.close_all()
+        assert pool.pool_count() == 0
+    
+    @patch('app.communication.restconf_client.requests.Session')
+    def test_probe_skipped_when_healthy(self, mock_session, app):
+        """测试设备最近请求成功时建立连接不再发送探测请求，请求出错后重新探测"""
+        with app.app_context():
+            from app.communication.restconf_client import RESTCONFClient
+            
+            restconf_device = self._create_device()
+            mock_response = Mock(status_code=200, content=b'{}')
+            mock_response.json.return_value = {}
+            mock_session.return_value.get.return_value = mock_response
+            
+            for _ in range(3):
+                with RESTCONFClient(restconf_device) as client:
+                    assert client.get('data/ietf-interfaces:interfaces')['success'] is True
+            # 1次探测 + 3次请求
+            assert mock_session.return_value.get.call_count == 4
+            
+            mock_session.return_value.get.side_effect = [ConnectionError('reset'), mock_response, mock_response]
+            with RESTCONFClient(restconf_device) as client:
+                assert client.get('data/ietf-interfaces:interfaces')['success'] is False
+            with RESTCONFClient(restconf_device) as client:
+                client.get('data/ietf-interfaces:interfaces')
+            # 出错后再次探测
+            assert mock_session.return_value.get.call_count == 7
+    
+    @patch('app.communication.restconf_client.requests.Session')
+    def test_per_request_timeout(self, mock_session, app):
+        """测试每次请求分别设置连接和读取超时，读取超时不超过设备剩余执行时间"""
+        with app.app_context():
+            from app.cancellation import device_scope
+            from app.communication.restconf_client import RESTCONFClient
+            
+            restconf_device = self._create_device()
+            app.config['RESTCONF_CONNECT_TIMEOUT'] = 3
+            mock_session.return_value.get.return_value = Mock(status_code=200, content=b'')
+            
+            with RESTCONFClient(restconf_device, timeout=30) as client:
+                client.get('data/ietf-interfaces:interfaces')
+                assert mock_session.return_value.get.call_args.kwargs['timeout'] == (3, 30)
+                
+                with device_scope(deadline=10):
+                    client.get('data/ietf-interfaces:interfaces')
+                connect_timeout, read_timeout = mock_session.return_value.get.call_args.kwargs['timeout']
+                assert connect_timeout == 3
+                assert read_timeout <= 10
+    
+    def test_http2_requires_httpx(self, app):
+        from app.communication import restconf_client
+        
+        with patch.object(restconf_client, 'httpx', None):
+            assert restconf_client.RESTCONFSessionPool(http2=True).http2 is False
+
+class TestRESTCONFInventory:
+    """RESTCONF清单采集测试"""
+    
+    def _create_device(self):
+        device = Device(
+            name='restconf_device',
+            ip_address='192.168.1.3',
+            device_type=DeviceType.CISCO_ROUTER,
+            connection_type=ConnectionType.RESTCONF,
+            port=443,
+            username='admin'
+        )
+        device.set_password('admin123')
+        db.session.add(device)
+        db.session.commit()
+        return device
+    
+    def _respond(self, url, **kwargs):
+        """按路径返回模拟响应，硬件子树不存在"""
+        if 'ietf-hardware' in url:
+            return Mock(status_code=404, content=b'')
+        if 'ietf-system:system?' in url or url.endswith('ietf-system:system'):
+            return Mock(status_code=200, content=b'{"ietf-system:system": {"hostname": "R1"}}')
+        return Mock(status_code=200, content=b'{"items": [1, 2, 3]}')
+    
+    @patch('app.communication.restconf_client.requests.Session')
+    def test_get_many(self, mock_session, app):
+        """测试并发获取多个子树，使用fields参数，失败的项单独返回错误"""
+        with app.app_context():
+            from app.communication.restconf_client import INVENTORY_PATHS, RESTCONFClient
+            
+            mock_session.return_value.get.side_effect = self._respond
+            with RESTCONFClient(self._create_device()) as client:
+                results = dict(client.get_many(INVENTORY_PATHS))
+            
+            assert set(results) == set(INVENTORY_PATHS)
+            assert results['system']['data'] == {'ietf-system:system': {'hostname': 'R1'}}
+            assert results['interfaces']['size'] == len(b'{"items": [1, 2, 3]}')
+            assert results['hardware']['success'] is False
+            assert 'HTTP 404' in results['hardware']['error']
+            params = [call.kwargs.get('params') for call in mock_session.return_value.get.call_args_list]
+            assert {'fields': 'hostname;contact;location'} in params
+    
+    @patch('app.communication.restconf_client.requests.Session')
+    def test_collect_upserts_inventory(self, mock_session, app):
+        """测试采集结果写入清单表，重新采集时覆盖原有记录"""
+        with app.app_context():
+            from app.devices.services import DeviceInventoryService
+            from app.models import DeviceInventory
+            
+            mock_session.return_value.get.side_effect = self._respond
+            device = self._create_device()
+            
+            result = DeviceInventoryService.collect_restconf(device)
+            assert result['success'] is False
+            assert set(result['collected']) == {'system', 'platform', 'interfaces'}
+            assert 'hardware' in result['errors']
+            
+            result = DeviceInventoryService.collect_restconf(device, ['system'])
+            assert result == {'success': True, 'collected': {'system': result['collected']['system']}, 'errors': {}}
+            assert DeviceInventory.query.filter_by(device_id=device.id).count() == 3
+            
+            system = device.inventory.filter_by(name='system').one()
+            assert system.get_data() == {'ietf-system:system': {'hostname': 'R1'}}
+            assert system.to_dict(include_data=False).get('data') is None
+    
+    def test_collect_rejects_unknown_name(self, app):
+        with app.app_context():
+            from app.devices.services import DeviceInventoryService
+            
+            result = DeviceInventoryService.collect_restconf(self._create_device(), ['nope'])
+            assert result['success'] is False
+            assert 'nope' in result['error']
+
 class TestCommunicationRoutes:
     """通信路由测试"""
     
@@ -0,0 +1,213 @@
+"""
+设备信息缓存测试
+Celery以eager模式运行，设备命令输出使用模拟数据
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app import db
+from app.communication import facts as facts_module
+from app.communication.facts import facts_from_cli, facts_from_restconf, parse_show_inventory
+from app.devices.services import DeviceFactsService
+from app.models import Device, DeviceType, ConnectionType
+
+SHOW_VERSION = """Router1 uptime is 1 week, 2 days, 3 hours, 4 minutes
+Cisco IOS Software, C2900 Software (C2900-UNIVERSALK9-M), Version 15.2(4)M6, RELEASE SOFTWARE (fc2)
+ROM: System Bootstrap, Version 15.0(1r)M15, RELEASE SOFTWARE (fc1)
+System image file is "flash:c2900-universalk9-mz.SPA.152-4.M6.bin"
+
+Cisco CISCO2911/K9 (revision 1.0) with 487424K/36864K bytes of memory.
+Processor board ID FTX1234ABCD
+Configuration register is 0x2102
+"""
+
+SHOW_INVENTORY = """NAME: "CISCO2911/K9 chassis", DESCR: "CISCO2911/K9 chassis, Hw Serial#: FTX1234ABCD, Hw Revision: 1.0"
+PID: CISCO2911/K9      , VID: V05 , SN: FTX1234ABCD
+
+NAME: "C2911 Mother board 3GE, integrated VPN and 4W", DESCR: "C2911 Mother board 3GE, integrated VPN and 4W"
+PID: CISCO2911/K9      , VID: V05 , SN: FOC12345678
+"""
+
+@pytest.fixture
+def sample_data(app, admin_user):
+    """创建两台SSH设备"""
+    with app.app_context():
+        devices = [
+            Device(
+                name=f'router_{i}',
+                ip_address=f'10.7.0.{i + 1}',
+                device_type=DeviceType.CISCO_ROUTER,
+                connection_type=ConnectionType.SSH,
+                username='admin'
+            )
+            for i in range(2)
+        ]
+        db.session.add_all(devices)
+        db.session.commit()
+        return {'device_ids': [device.id for device in devices]}
+
+def fake_execute_commands(device, commands, timeout=30):
+    outputs = {'show version': SHOW_VERSION, 'show inventory': SHOW_INVENTORY}
+    return [{'success': True, 'output': outputs[command], 'command': command} for command in commands]
+
+class TestFactsParsing:
+    """设备信息解析测试"""
+    
+    @pytest.mark.parametrize('textfsm', [True, False])
+    def test_facts_from_cli(self, textfsm):
+        with patch.object(facts_module, 'ntc_parse', facts_module.ntc_parse if textfsm else None):
+            facts = facts_from_cli(SHOW_VERSION, SHOW_INVENTORY)
+        
+        assert facts['hostname'] == 'Router1'
+        assert facts['model'] == 'CISCO2911/K9'
+        assert facts['serial_number'] == 'FTX1234ABCD'
+        assert facts['software_version'] == '15.2(4)M6'
+        assert facts['uptime'] == '1 week, 2 days, 3 hours, 4 minutes'
+        assert [module['sn'] for module in facts['inventory']] == ['FTX1234ABCD', 'FOC12345678']
+    
+    def test_inventory_fills_missing_serial(self):
+        with patch.object(facts_module, 'ntc_parse', None):
+            facts = facts_from_cli('Cisco IOS Software, Version 17.3.1\n', SHOW_INVENTORY)
+        
+        assert facts['software_version'] == '17.3.1'
+        assert facts['model'] == 'CISCO2911/K9'
+        assert facts['serial_number'] == 'FTX1234ABCD'
+    
+    def test_parse_show_inventory_regex(self):
+        with patch.object(facts_module, 'ntc_parse', None):
+            modules = parse_show_inventory(SHOW_INVENTORY)
+        assert modules[1] == {'name': 'C2911 Mother board 3GE, integrated VPN and 4W',
+                              'descr': 'C2911 Mother board 3GE, integrated VPN and 4W',
+                              'pid': 'CISCO2911/K9', 'vid': 'V05', 'sn': 'FOC12345678'}
+    
+    def test_facts_from_restconf(self):
+        facts = facts_from_restconf({
+            'system': {'ietf-system:system': {'hostname': 'csr1'}},
+            'platform': {'ietf-system:platform': {'os-name': 'IOS-XE', 'os-version': '17.3.1', 'machine': 'CSR1000V'}},
+            'hardware': {'ietf-hardware:hardware': {'component': [
+                {'name': 'Chassis', 'class': 'iana-hardware:chassis', 'model-name': 'CSR1000V', 'serial-num': '9ABCDEF'},
+                {'name': 'module 0', 'class': 'iana-hardware:module', 'model-name': 'CSR1000V', 'serial-num': ''}
+            ]}}
+        })
+        
+        assert facts['hostname'] == 'csr1'
+        assert facts['model'] == 'CSR1000V'
+        assert facts['serial_number'] == '9ABCDEF'
+        assert facts['software_version'] == '17.3.1'
+        assert len(facts['inventory']) == 2
+
+class TestDeviceFactsService:
+    """设备信息缓存测试"""
+    
+    @patch('app.devices.services.SSHService.execute_commands', side_effect=fake_execute_commands)
+    def test_collect_fills_device(self, mock_execute, app, sample_data):
+        device = db.session.get(Device, sample_data['device_ids'][0])
+        result = DeviceFactsService.collect(device)
+        
+        assert result['success'] is True
+        assert mock_execute.call_args.args[1] == ['show version', 'show inventory']
+        device = db.session.get(Device, device.id)
+        assert device.model == 'CISCO2911/K9'
+        assert device.serial_number == 'FTX1234ABCD'
+        assert device.software_version == '15.2(4)M6'
+        assert device.hostname == 'Router1'
+        assert device.get_facts()['source'] == 'cli'
+        assert DeviceFactsService.is_fresh(device)
+    
+    @patch('app.devices.services.SSHService.execute_commands', side_effect=fake_execute_commands)
+    def test_cached_facts_skip_commands(self, mock_execute, app, sample_data):
+        device = db.session.get(Device, sample_data['device_ids'][0])
+        assert DeviceFactsService.get_facts(device)['cached'] is False
+        
+        result = DeviceFactsService.get_facts(device)
+        assert result['cached'] is True
+        assert result['facts']['model'] == 'CISCO2911/K9'
+        assert mock_execute.call_count == 1
+        
+        assert DeviceFactsService.get_facts(device, refresh=True)['cached'] is False
+        assert mock_execute.call_count == 2
+    
+    def test_partial_update_keeps_inventory(self, app, sample_data):
+        device = db.session.get(Device, sample_data['device_ids'][0])
+        DeviceFactsService.update_facts(device, facts_from_cli(SHOW_VERSION, SHOW_INVENTORY))
+        DeviceFactsService.update_facts(device, {'software_version': '15.2(4)M7', 'model': None})
+        
+        facts = device.get_facts()
+        assert facts['software_version'] == '15.2(4)M7'
+        assert facts['model'] == 'CISCO2911/K9'
+        assert len(facts['inventory']) == 2
+    
+    @patch('app.devices.services.SSHService.execute_commands', side_effect=fake_execute_commands)
+    def test_batch_refresh_only_stale(self, mock_execute, app, sample_data):
+        from app.tasks.inventory_tasks import batch_refresh_facts
+        
+        fresh_id, stale_id = sample_data['device_ids']
+        fresh = db.session.get(Device, fresh_id)
+        fresh.set_facts({'model': 'C9300'})
+        stale = db.session.get(Device, stale_id)
+        stale.set_facts({'model': 'C3850'})
+        stale.facts_updated_at = datetime.utcnow() - timedelta(days=2)
+        db.session.commit()
+        
+        assert DeviceFactsService.get_stale_device_ids() == [stale_id]
+        result = batch_refresh_facts.delay().get()
+        
+        assert result['device_ids'] == [stale_id]
+        assert mock_execute.call_count == 1
+        assert db.session.get(Device, stale_id).model == 'CISCO2911/K9'
+        assert db.session.get(Device, fresh_id).model == 'C9300'
+        assert DeviceFactsService.get_stale_device_ids() == []
+    
+    @patch('app.communication.ssh_client.ssh_manager.get_connection')
+    def test_connection_test_updates_facts(self, mock_connection, app, sample_data):
+        from app.tasks.network_tasks import test_connection_for_batch
+        
+        client = mock_connection.return_value.__enter__.return_value
+        client.execute_command.return_value = {'success': True, 'output': SHOW_VERSION}
+        device_id = sample_data['device_ids'][0]
+        
+        entry = test_connection_for_batch.delay(device_id).get()
+        
+        assert entry['result']['success'] is True
+        device = db.session.get(Device, device_id)
+        assert device.serial_number == 'FTX1234ABCD'
+        assert device.facts_updated_at is not None
+    
+    def test_facts_api_returns_cache(self, client, login, sample_data):
+        login()
+        device_id = sample_data['device_ids'][0]
+        DeviceFactsService.update_facts(db.session.get(Device, device_id), {'model': 'C9300'})
+        
+        response = client.get(f'/devices/api/device/{device_id}/facts')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['cached'] is True
+        assert data['facts'] == {'model': 'C9300'}
+        assert data['facts_updated_at'] is not None
+    
+    @patch('app.tasks.inventory_tasks.refresh_device_facts')
+    @patch('app.devices.services.SSHService.execute_commands')
+    def test_facts_api_submits_refresh(self, mock_execute, mock_task, app, client, login, sample_data):
+        """测试缓存过期时接口不连接设备，提交刷新任务后返回202"""
+        app.config['CELERY_BROKER_URL'] = 'redis://localhost:6379/0'
+        mock_task.apply_async.return_value.id = 'refresh-task-id'
+        login()
+        device_id = sample_data['device_ids'][0]
+        device = db.session.get(Device, device_id)
+        device.set_facts({'model': 'C9300'})
+        device.facts_updated_at = datetime.utcnow() - timedelta(days=2)
+        db.session.commit()
+        
+        response = client.get(f'/devices/api/device/{device_id}/facts')
+        assert response.status_code == 202
+        data = response.get_json()
+        assert data['stale'] is True
+        assert data['facts'] == {'model': 'C9300'}
+        assert data['celery_task_id'] == 'refresh-task-id'
+        assert mock_task.apply_async.call_args.args[0] == (device_id, 30, None)
+        
+        response = client.get(f'/devices/api/device/{device_id}/facts?refresh=true')
+        assert response.status_code == 202
+        assert mock_task.apply_async.call_args.args[0] == (device_id, 30, 0)
+        mock_execute.assert_not_called()
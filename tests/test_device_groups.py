@@ -0,0 +1,187 @@
+"""
+设备组与按设备组执行的任务测试
+Celery以eager模式运行，chord的子任务和回调在当前进程内依次执行
+"""
+
+import pytest
+from unittest.mock import patch
+from app import db
+from app.bootstrap import init_default_data
+from app.models import (
+    User, Device, DeviceGroup, DeviceType, ConnectionType,
+    ConfigTemplate, Task, TaskResult, TaskStatus
+)
+from app.templates.services import TemplateService
+
+@pytest.fixture
+def sample_data(app, admin_user):
+    """创建一个设备组（2台启用、1台停用的设备）和一台未分组设备"""
+    with app.app_context():
+        group = DeviceGroup(name='core', description='核心交换机')
+        devices = [
+            Device(
+                name=f'core_switch_{i}',
+                ip_address=f'10.6.0.{i + 1}',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin',
+                group=group,
+                is_active=i < 2
+            )
+            for i in range(3)
+        ]
+        standalone = Device(
+            name='access_switch',
+            ip_address='10.6.1.1',
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType.SSH,
+            username='admin'
+        )
+        db.session.add_all([group, standalone] + devices)
+        db.session.commit()
+        return {
+            'group_id': group.id,
+            'device_ids': [device.id for device in devices],
+            'standalone_id': standalone.id
+        }
+
+def fake_execute_commands(device, commands, timeout=30):
+    """ip以.2结尾的设备第二条命令失败"""
+    results = []
+    for i, command in enumerate(commands):
+        if device.ip_address.endswith('.2') and i == 1:
+            results.append({'success': False, 'error': '命令执行失败', 'output': None, 'command': command})
+            break
+        results.append({'success': True, 'output': f'{command} ok', 'execution_time': 0.1, 'command': command})
+    return results
+
+class TestDeviceGroupApi:
+    """设备组API测试"""
+    
+    def test_create_and_update_group(self, client, login, sample_data):
+        login()
+        
+        response = client.post('/devices/api/groups', json={'name': 'edge', 'color': '#28a745'})
+        assert response.status_code == 201
+        group = response.get_json()['group']
+        assert group['color'] == '#28a745'
+        assert group['device_count'] == 0
+        
+        response = client.put(f'/devices/api/groups/{group["id"]}', json={'name': 'edge-routers', 'description': '出口'})
+        assert response.status_code == 200
+        assert response.get_json()['group']['name'] == 'edge-routers'
+        assert response.get_json()['group']['color'] == '#28a745'
+    
+    def test_rejects_duplicate_name(self, client, login, sample_data):
+        login()
+        
+        assert client.post('/devices/api/groups', json={'name': 'core'}).status_code == 400
+        assert client.post('/devices/api/groups', json={'name': ''}).status_code == 400
+    
+    def test_assign_devices(self, client, login, sample_data):
+        login()
+        group_id = sample_data['group_id']
+        
+        response = client.post(f'/devices/api/groups/{group_id}/devices', json={'device_ids': [sample_data['standalone_id']]})
+        assert response.get_json()['updated'] == 1
+        assert Device.query.get(sample_data['standalone_id']).group_id == group_id
+        
+        response = client.put(f'/devices/api/device/{sample_data["standalone_id"]}/group', json={'group_id': None})
+        assert response.status_code == 200
+        assert Device.query.get(sample_data['standalone_id']).group_id is None
+        
+        assert client.put(f'/devices/api/device/{sample_data["standalone_id"]}/group',
+                          json={'group_id': 9999}).status_code == 404
+    
+    def test_delete_group_unassigns_devices(self, client, login, sample_data):
+        login()
+        
+        response = client.delete(f'/devices/api/groups/{sample_data["group_id"]}')
+        assert response.status_code == 200
+        assert DeviceGroup.query.get(sample_data['group_id']) is None
+        assert Device.query.filter(Device.group_id.isnot(None)).count() == 0
+        assert Device.query.count() == 4
+
+class TestGroupTasks:
+    """按设备组执行任务测试"""
+    
+    @patch('app.tasks.network_tasks.SSHService.execute_commands', side_effect=fake_execute_commands)
+    def test_group_command_task(self, mock_execute, client, login, sample_data):
+        """测试命令任务只在设备组内启用的设备上并行执行，每台设备一条结果"""
+        login()
+        
+        response = client.post('/tasks/create', json={
+            'name': 'show version',
+            'task_type': 'command',
+            'commands': ['show version', 'show clock'],
+            'group_id': sample_data['group_id']
+        })
+        assert response.status_code == 202
+        task_id = response.get_json()['task_id']
+        
+        assert mock_execute.call_count == 2
+        task = Task.query.get(task_id)
+        assert task.status == TaskStatus.SUCCESS
+        assert task.result_message == '成功在 1/2 个设备上执行命令'
+        assert task.to_dict()['group_name'] == 'core'
+        
+        results = {result.device_name: result for result in TaskResult.query.filter_by(task_id=task_id)}
+        assert set(results) == {'core_switch_0', 'core_switch_1'}
+        assert results['core_switch_0'].exit_code == 0
+        assert 'show clock ok' in results['core_switch_0'].output
+        assert results['core_switch_1'].error == '命令执行失败'
+    
+    @patch('app.tasks.network_tasks.SSHService.execute_commands', side_effect=fake_execute_commands)
+    def test_task_logs(self, mock_execute, client, login, sample_data):
+        login()
+        task_id = client.post('/tasks/create', json={
+            'name': 'show clock',
+            'task_type': 'command',
+            'command': 'show clock',
+            'group_id': sample_data['group_id']
+        }).get_json()['task_id']
+        
+        response = client.get(f'/tasks/api/task/{task_id}/logs')
+        assert response.status_code == 200
+        # eager模式下任务在创建日志写入前已执行完
+        assert sorted(log['action'] for log in response.get_json()) == ['batch_execute_commands_task', 'create_task']
+    
+    def test_empty_group_is_rejected(self, client, login, sample_data):
+        login()
+        group_id = client.post('/devices/api/groups', json={'name': 'empty'}).get_json()['group']['id']
+        
+        response = client.post('/tasks/create', json={
+            'name': 'noop',
+            'task_type': 'command',
+            'command': 'show clock',
+            'group_id': group_id
+        })
+        assert response.status_code == 400
+        assert Task.query.count() == 0
+
+class TestDefaultData:
+    """默认数据和内置模板测试"""
+    
+    def test_init_default_data_is_idempotent(self, app):
+        init_default_data()
+        init_default_data()
+        
+        assert User.query.filter_by(username='admin').count() == 1
+        template = ConfigTemplate.query.filter_by(name='批量添加VLAN模板').one()
+        assert sorted(var.name for var in template.variables) == ['trunk_interface', 'vlans']
+    
+    def test_bulk_vlan_template(self, app):
+        template = TemplateService.install_builtin_templates()[0]
+        
+        result = TemplateService.render_template(template, {'vlans': '100:Sales\r\n200\r\n', 'trunk_interface': 'G3/1'})
+        lines = [line.strip() for line in result['rendered_content'].splitlines() if line.strip()]
+        assert lines == [
+            'vlan 100', 'name Sales',
+            'vlan 200', 'name VLAN_200',
+            'interface range G3/1',
+            'switchport trunk allowed vlan add 100',
+            'switchport trunk allowed vlan add 200'
+        ]
+        
+        result = TemplateService.render_template(template, {'vlans': '300:Guest'})
+        assert 'interface range' not in result['rendered_content']
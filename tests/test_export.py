@@ -0,0 +1,125 @@
+"""
+流式导出测试用例
+测试任务结果NDJSON导出和配置备份tar.gz导出
+"""
+
+import io
+import json
+import tarfile
+import pytest
+from app import create_app, db
+from app.models import User, Role, Device, DeviceType, ConnectionType, Task, TaskType, TaskResult, ConfigBackup
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_data(app):
+    """创建测试用户、设备、任务结果和配置备份"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        role.add_permission(Role.PERMISSION_VIEW | Role.PERMISSION_EXECUTE | Role.PERMISSION_CONFIGURE | Role.PERMISSION_ADMIN)
+        db.session.add(role)
+        
+        user = User(
+            username='admin',
+            email='admin@example.com',
+            role=role
+        )
+        user.password = 'admin123'
+        db.session.add(user)
+        
+        device = Device(
+            name='export-switch',
+            ip_address='192.168.1.10',
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType.SSH,
+            username='admin'
+        )
+        db.session.add(device)
+        
+        task = Task(name='export_task', task_type=TaskType.COMMAND, command='show version', user=user)
+        db.session.add(task)
+        db.session.flush()
+        
+        for i in range(25):
+            db.session.add(TaskResult(
+                task_id=task.id,
+                device_id=device.id,
+                device_name=device.name,
+                device_ip=device.ip_address,
+                command='show version',
+                output=f'output {i}'
+            ))
+            db.session.add(ConfigBackup(
+                name=f'backup {i}',
+                config_content=f'hostname export-switch\n! revision {i}\n',
+                device_id=device.id,
+                user_id=user.id
+            ))
+        db.session.commit()
+        return {'task_id': task.id, 'device_id': device.id}
+
+class TestStreamingExport:
+    """流式导出接口测试"""
+    
+    def _login(self, client):
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+    
+    def test_export_task_results_ndjson(self, client, sample_data):
+        """测试任务结果按行导出"""
+        self._login(client)
+        
+        response = client.get(f"/tasks/api/task/{sample_data['task_id']}/results/export")
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 25
+        assert json.loads(lines[0])['output'] == 'output 0'
+    
+    def test_export_backups_ndjson(self, client, sample_data):
+        """测试备份元数据导出不包含配置内容"""
+        self._login(client)
+        
+        response = client.get('/devices/api/backups/export')
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert len(rows) == 25
+        assert all('config_content' not in row for row in rows)
+        assert rows[0]['device_name'] == 'export-switch'
+    
+    def test_export_backups_tar(self, client, sample_data):
+        """测试配置备份打包为tar.gz"""
+        self._login(client)
+        
+        response = client.get(f"/devices/api/backups/export?format=tar&device_id={sample_data['device_id']}")
+        assert response.status_code == 200
+        
+        archive = tarfile.open(fileobj=io.BytesIO(response.get_data()), mode='r:gz')
+        names = archive.getnames()
+        assert len(names) == 25
+        assert all(name.startswith('export-switch/') for name in names)
+        assert archive.extractfile(names[0]).read().decode() == 'hostname export-switch\n! revision 0\n'
+    
+    def test_export_invalid_format(self, client, sample_data):
+        """测试不支持的导出格式返回400"""
+        self._login(client)
+        
+        response = client.get('/devices/api/backups/export?format=zip')
+        assert response.status_code == 400
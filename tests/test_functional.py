@@ -7,45 +7,11 @@ import pytest
 import json
 from unittest.mock import Mock, patch, MagicMock
 from flask import url_for
-from app import create_app, db
+from app import create_app, db, audit_writer
 from app.models import User, Role, Device, DeviceGroup, ConfigTemplate, Task, AuditLog
 from app.templates.services import TemplateService
 from app.devices.services import DeviceManagementService, DeviceStatusService
 
-@pytest.fixture
-def app():
-    """创建测试应用"""
-    app = create_app('testing')
-    
-    with app.app_context():
-        db.create_all()
-        yield app
-        db.session.remove()
-        db.drop_all()
-
-@pytest.fixture
-def client(app):
-    """创建测试客户端"""
-    return app.test_client()
-
-@pytest.fixture
-def sample_user(app):
-    """创建测试用户"""
-    with app.app_context():
-        role = Role(name='admin', description='管理员')
-        role.add_permission(Role.PERMISSION_VIEW | Role.PERMISSION_EXECUTE | Role.PERMISSION_CONFIGURE | Role.PERMISSION_ADMIN)
-        db.session.add(role)
-        
-        user = User(
-            username='admin',
-            email='admin@example.com',
-            role=role
-        )
-        user.password = 'admin123'
-        db.session.add(user)
-        db.session.commit()
-        return user
-
 class TestTemplateFunctionality:
     """模板功能测试"""
     
@@ -154,7 +120,7 @@ class TestTemplateFunctionality:
 class TestDeviceFunctionality:
     """设备功能测试"""
     
-    def test_device_management_functionality(self, app, sample_user):
+    def test_device_management_functionality(self, app, admin_user):
         """测试设备管理功能"""
         with app.app_context():
             # 测试设备创建
@@ -170,7 +136,7 @@ class TestDeviceFunctionality:
                 'description': '测试设备'
             }
             
-            device = DeviceManagementService.create_device(device_data, sample_user.id)
+            device = DeviceManagementService.create_device(device_data, admin_user.id)
             
             assert device.name == 'test_device'
             assert device.ip_address == '192.168.1.1'
@@ -189,13 +155,13 @@ class TestDeviceFunctionality:
                 'description': '更新后的设备'
             }
             
-            updated_device = DeviceManagementService.update_device(device, update_data, sample_user.id)
+            updated_device = DeviceManagementService.update_device(device, update_data, admin_user.id)
             
             assert updated_device.name == 'updated_device'
             assert updated_device.ip_address == '192.168.1.2'
             assert updated_device.get_password() == 'newpassword'
     
-    def test_device_status_functionality(self, app, sample_user):
+    def test_device_status_functionality(self, app, admin_user):
         """测试设备状态功能"""
         with app.app_context():
             # 创建设备
@@ -229,7 +195,7 @@ class TestDeviceFunctionality:
                 assert 'ping' in result['details']
                 assert 'port' in result['details']
     
-    def test_device_group_functionality(self, app, sample_user):
+    def test_device_group_functionality(self, app, admin_user):
         """测试设备组功能"""
         with app.app_context():
             # 测试设备组创建
@@ -238,7 +204,7 @@ class TestDeviceFunctionality:
                 'description': '测试设备组'
             }
             
-            group = DeviceManagementService.create_group(group_data, sample_user.id)
+            group = DeviceManagementService.create_group(group_data, admin_user.id)
             
             assert group.name == 'test_group'
             assert group.description == '测试设备组'
@@ -263,7 +229,7 @@ class TestDeviceFunctionality:
 class TestTaskFunctionality:
     """任务功能测试"""
     
-    def test_task_creation_functionality(self, app, sample_user):
+    def test_task_creation_functionality(self, app, admin_user):
         """测试任务创建功能"""
         with app.app_context():
             # 创建设备
@@ -284,7 +250,7 @@ class TestTaskFunctionality:
                 description='测试任务',
                 task_type='command',
                 command='show version',
-                user=sample_user,
+                user=admin_user,
                 device=device
             )
             db.session.add(task)
@@ -292,10 +258,10 @@ class TestTaskFunctionality:
             
             assert task.name == 'test_task'
             assert task.device == device
-            assert task.user == sample_user
+            assert task.user == admin_user
             assert task.status.value == 'pending'
     
-    def test_task_status_management_functionality(self, app, sample_user):
+    def test_task_status_management_functionality(self, app, admin_user):
         """测试任务状态管理功能"""
         with app.app_context():
             # 创建任务
@@ -303,7 +269,7 @@ class TestTaskFunctionality:
                 name='status_test_task',
                 task_type='command',
                 command='show version',
-                user=sample_user
+                user=admin_user
             )
             db.session.add(task)
             db.session.commit()
@@ -326,7 +292,7 @@ class TestTaskFunctionality:
             assert task.status.value == 'pending'
             assert task.retry_count == 1
     
-    def test_task_result_functionality(self, app, sample_user):
+    def test_task_result_functionality(self, app, admin_user):
         """测试任务结果功能"""
         with app.app_context():
             # 创建设备和任务
@@ -344,7 +310,7 @@ class TestTaskFunctionality:
                 name='result_test_task',
                 task_type='command',
                 command='show version',
-                user=sample_user,
+                user=admin_user,
                 device=device
             )
             db.session.add(task)
@@ -373,12 +339,12 @@ class TestTaskFunctionality:
 class TestAuditLogFunctionality:
     """审计日志功能测试"""
     
-    def test_audit_log_creation_functionality(self, app, sample_user):
+    def test_audit_log_creation_functionality(self, app, admin_user):
         """测试审计日志创建功能"""
         with app.app_context():
             # 测试审计日志创建
             AuditLog.log_action(
-                user=sample_user,
+                user=admin_user,
                 action='test_action',
                 resource_type='device',
                 resource_id=1,
@@ -388,7 +354,7 @@ class TestAuditLogFunctionality:
             )
             
             # 验证日志已创建
-            logs = AuditLog.query.filter_by(user=sample_user).all()
+            logs = AuditLog.query.filter_by(user=admin_user).all()
             assert len(logs) > 0
             
             latest_log = logs[-1]
@@ -400,7 +366,7 @@ class TestAuditLogFunctionality:
             details = latest_log.get_details()
             assert details['test'] == 'data'
     
-    def test_audit_log_query_functionality(self, app, sample_user):
+    def test_audit_log_query_functionality(self, app, admin_user):
         """测试审计日志查询功能"""
         with app.app_context():
             # 创建多个审计日志
@@ -408,7 +374,7 @@ class TestAuditLogFunctionality:
             
             for action in actions:
                 AuditLog.log_action(
-                    user=sample_user,
+                    user=admin_user,
                     action=action,
                     resource_type='device',
                     resource_id=1,
@@ -422,24 +388,94 @@ class TestAuditLogFunctionality:
             assert logs[0].action == 'create_device'
             
             # 测试按用户查询
-            logs = AuditLog.query.filter_by(user=sample_user).all()
+            logs = AuditLog.query.filter_by(user=admin_user).all()
             assert len(logs) == 3
             
             # 测试按成功状态查询
             logs = AuditLog.query.filter_by(success=True).all()
             assert len(logs) == 3
 
+class TestAsyncAuditLogFunctionality:
+    """审计日志异步批量写入测试"""
+    
+    @pytest.fixture
+    def async_writer(self, app):
+        """启用异步写入，测试结束后恢复同步模式"""
+        app.config.update(AUDIT_LOG_ASYNC=True, AUDIT_LOG_BATCH_SIZE=20, AUDIT_LOG_QUEUE_SIZE=100)
+        audit_writer.init_app(app)
+        yield audit_writer
+        app.config['AUDIT_LOG_ASYNC'] = False
+        audit_writer.init_app(app)
+    
+    def test_batched_write(self, app, admin_user, async_writer, query_counter):
+        """测试审计日志批量写入，不提交调用方会话"""
+        with app.app_context():
+            user = User.query.filter_by(username='admin').first()
+            with query_counter() as statements:
+                for i in range(50):
+                    result = AuditLog.log_action(
+                        user=user,
+                        action='async_action',
+                        resource_type='device',
+                        resource_id=i,
+                        details={'index': i}
+                    )
+                    assert result is None
+                async_writer.flush()
+            
+            inserts = [sql for sql in statements if sql.startswith('INSERT INTO audit_logs')]
+            assert 0 < len(inserts) < 50
+            
+            logs = AuditLog.query.filter_by(action='async_action').all()
+            assert len(logs) == 50
+            assert all(log.user_id == user.id for log in logs)
+            assert sorted(log.get_details()['index'] for log in logs) == list(range(50))
+    
+    def test_invalid_row_isolated(self, app, admin_user, async_writer):
+        """测试批次中的无效记录不影响其他记录写入"""
+        with app.app_context():
+            user = User.query.filter_by(username='admin').first()
+            AuditLog.log_action(user=user, action='valid_before', resource_type='device')
+            AuditLog.log_action(user=None, action='missing_user', resource_type='device')
+            AuditLog.log_action(user=None, user_id=user.id, action='valid_after', resource_type='device')
+            async_writer.flush()
+            
+            actions = {log.action for log in AuditLog.query.all()}
+            assert actions == {'valid_before', 'valid_after'}
+    
+    def test_shutdown_flushes_queue(self, app, admin_user, async_writer):
+        """测试关闭时写出队列中剩余的记录"""
+        with app.app_context():
+            user = User.query.filter_by(username='admin').first()
+            for _ in range(10):
+                AuditLog.log_action(user=user, action='before_shutdown', resource_type='user')
+            async_writer.shutdown()
+            
+            assert AuditLog.query.filter_by(action='before_shutdown').count() == 10
+    
+    def test_rows_written_to_submitting_app(self, app, admin_user, async_writer):
+        """测试之后创建的应用（如worker应用）不改变已提交记录的写入目标"""
+        with app.app_context():
+            user = User.query.filter_by(username='admin').first()
+            AuditLog.log_action(user=user, action='before_other_app', resource_type='user')
+            create_app('testing')
+            AuditLog.log_action(user=user, action='after_other_app', resource_type='user')
+            async_writer.flush()
+            
+            actions = {log.action for log in AuditLog.query.filter_by(resource_type='user')}
+            assert actions == {'before_other_app', 'after_other_app'}
+
 class TestSecurityFunctionality:
     """安全功能测试"""
     
-    def test_password_encryption_functionality(self, app, sample_user):
+    def test_password_encryption_functionality(self, app, admin_user):
         """测试密码加密功能"""
         with app.app_context():
             # 测试用户密码加密
             user = User(
                 username='security_test_user',
                 email='security@example.com',
-                role=sample_user.role
+                role=admin_user.role
             )
             user.password = 'testpassword123'
             
@@ -509,7 +545,7 @@ class TestSecurityFunctionality:
 class TestDataValidationFunctionality:
     """数据验证功能测试"""
     
-    def test_device_validation_functionality(self, app, sample_user):
+    def test_device_validation_functionality(self, app, admin_user):
         """测试设备数据验证功能"""
         with app.app_context():
             # 测试IP地址验证
@@ -539,7 +575,7 @@ class TestDataValidationFunctionality:
             except Exception:
                 assert True  # 预期的语法错误
     
-    def test_task_validation_functionality(self, app, sample_user):
+    def test_task_validation_functionality(self, app, admin_user):
         """测试任务数据验证功能"""
         with app.app_context():
             # 测试任务数据验证
@@ -547,7 +583,7 @@ class TestDataValidationFunctionality:
                 name='',  # 空名称
                 task_type='command',
                 command='show version',
-                user=sample_user
+                user=admin_user
             )
             
             # 这里应该验证失败，但由于我们直接创建对象，需要手动验证
@@ -256,7 +256,7 @@ class TestTaskExecutionWorkflow:
         }
         
         response = client.post('/tasks/create', json=task_data)
-        assert response.status_code == 200
+        assert response.status_code == 202
         
         data = response.get_json()
         assert data['success'] == True
@@ -529,7 +529,7 @@ class TestEndToEndWorkflow:
         }
         
         response = client.post('/tasks/create', json=task_data)
-        assert response.status_code == 200
+        assert response.status_code == 202
         
         data = response.get_json()
         assert data['success'] == True
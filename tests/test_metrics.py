@@ -0,0 +1,168 @@
+"""
+Prometheus指标测试
+未设置 PROMETHEUS_MULTIPROC_DIR，指标保存在当前进程的默认注册表中；
+计数类指标在多个测试间累加，断言只比较操作前后的差值
+"""
+
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from app import create_app, db, metrics_exporter
+from app.models import User, Role, Device, ConfigTemplate, Task, TaskStatus, TaskType
+from app.communication.restconf_client import RESTCONFClient
+from app.templates.services import TemplateService
+from app.metrics import MetricsExporter, QueueDepthCollector, clear_multiproc_dir, command_timer, queue_collector
+from app.simulator import SimulatorFarm
+
+def sample(name, **labels):
+    """读取指标当前值，未出现过的标签组合视为0"""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_user(app):
+    """创建用户"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        db.session.add_all([role, user])
+        db.session.commit()
+        return user.id
+
+class TestMetricsEndpoint:
+    """/metrics 接口测试"""
+    
+    def test_exposes_text_format(self, client):
+        response = client.get('/metrics')
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        body = response.get_data(as_text=True)
+        assert 'netmanagerx_db_query_seconds' in body
+        assert 'netmanagerx_task_outcomes_total' in body
+    
+    def test_disabled_by_config(self):
+        app = Flask(__name__)
+        app.config['METRICS_ENABLED'] = False
+        exporter = MetricsExporter(app)
+        
+        with app.app_context():
+            assert exporter.enabled is False
+        assert app.test_client().get('/metrics').status_code == 404
+    
+    def test_enabled_per_app(self, app):
+        """测试之后初始化的应用不改变已初始化应用的设置"""
+        disabled = Flask(__name__)
+        disabled.config['METRICS_ENABLED'] = False
+        metrics_exporter.init_app(disabled)
+        
+        with app.app_context():
+            assert metrics_exporter.enabled is True
+        with disabled.app_context():
+            assert metrics_exporter.enabled is False
+
+class TestCollectors:
+    """埋点测试"""
+    
+    def test_db_query_timing(self, app, sample_user):
+        with app.app_context():
+            before = sample('netmanagerx_db_query_seconds_count', operation='select')
+            User.query.all()
+            
+            assert sample('netmanagerx_db_query_seconds_count', operation='select') == before + 1
+    
+    def test_task_outcomes(self, app, sample_user):
+        with app.app_context():
+            labels = {'task_type': 'command'}
+            success_before = sample('netmanagerx_task_outcomes_total', status='success', **labels)
+            cancelled_before = sample('netmanagerx_task_outcomes_total', status='cancelled', **labels)
+            
+            done = Task(name='done', task_type=TaskType.COMMAND, status=TaskStatus.RUNNING, user_id=sample_user)
+            stopped = Task(name='stopped', task_type=TaskType.COMMAND, status=TaskStatus.RUNNING, user_id=sample_user)
+            db.session.add_all([done, stopped])
+            db.session.commit()
+            done.complete(True, 'ok')
+            stopped.cancel('测试')
+            
+            assert sample('netmanagerx_task_outcomes_total', status='success', **labels) == success_before + 1
+            assert sample('netmanagerx_task_outcomes_total', status='cancelled', **labels) == cancelled_before + 1
+    
+    def test_template_render_timing(self, app):
+        with app.app_context():
+            template = ConfigTemplate(name='vlan', category='metrics_test', template_content='vlan {{ vlan_id }}')
+            db.session.add(template)
+            db.session.commit()
+            
+            result = TemplateService.render_template(template, {'vlan_id': 10})
+            
+            assert result['rendered_content'] == 'vlan 10'
+            assert sample('netmanagerx_template_render_seconds_count', category='metrics_test') == 1
+    
+    def test_command_timer_records_failures(self, app):
+        device = Device(name='r1', ip_address='10.9.0.1')
+        before = sample('netmanagerx_device_command_seconds_count', connection_type='unknown', device_type='unknown')
+        
+        with pytest.raises(RuntimeError):
+            with command_timer(device):
+                raise RuntimeError('boom')
+        
+        assert sample('netmanagerx_device_command_seconds_count',
+                      connection_type='unknown', device_type='unknown') == before + 1
+    
+    def test_restconf_session_metrics(self, app):
+        labels = {'connection_type': 'restconf', 'device_type': 'cisco_switch'}
+        with SimulatorFarm(restconf=1) as farm, app.app_context():
+            device = farm.devices[0].to_device()
+            db.session.add(device)
+            db.session.commit()
+            connects_before = sample('netmanagerx_device_connect_seconds_count', result='success', **labels)
+            commands_before = sample('netmanagerx_device_command_seconds_count', **labels)
+            sessions_before = sample('netmanagerx_device_sessions_active', connection_type='restconf')
+            
+            with RESTCONFClient(device, timeout=10) as restconf:
+                assert restconf.get('data/ietf-system:system-state')['success'] is True
+                assert sample('netmanagerx_device_sessions_active', connection_type='restconf') == sessions_before + 1
+            
+            assert sample('netmanagerx_device_connect_seconds_count', result='success', **labels) == connects_before + 1
+            assert sample('netmanagerx_device_command_seconds_count', **labels) == commands_before + 1
+            assert sample('netmanagerx_device_sessions_active', connection_type='restconf') == sessions_before
+
+class TestMultiprocess:
+    """队列深度和多进程辅助函数测试"""
+    
+    def test_queue_collector_per_broker(self):
+        assert queue_collector(None) is None
+        assert queue_collector('memory://') is None
+        collector = queue_collector('redis://127.0.0.1:1/0')
+        assert collector.broker_url == 'redis://127.0.0.1:1/0'
+        assert queue_collector('redis://127.0.0.1:1/0') is collector
+    
+    def test_queue_depth_skipped_when_redis_unreachable(self):
+        collector = QueueDepthCollector('redis://127.0.0.1:1/0')
+        
+        assert list(collector.collect()) == []
+    
+    def test_clear_multiproc_dir(self, tmp_path, monkeypatch):
+        (tmp_path / 'counter_123.db').write_bytes(b'')
+        (tmp_path / 'keep.txt').write_text('x')
+        monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+        
+        clear_multiproc_dir()
+        
+        assert sorted(p.name for p in tmp_path.iterdir()) == ['keep.txt']
@@ -0,0 +1,151 @@
+"""
+列表接口分页测试用例
+测试游标分页、字段投影、过滤参数和每页条数上限
+"""
+
+import pytest
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Role, Task, TaskStatus, TaskType
+from app.api.pagination import (
+    encode_cursor, decode_cursor, get_page_size, parse_fields,
+    PaginationError, MAX_PAGE_SIZE, DEFAULT_PAGE_SIZE
+)
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_user(app):
+    """创建测试用户"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        role.add_permission(Role.PERMISSION_VIEW | Role.PERMISSION_EXECUTE | Role.PERMISSION_CONFIGURE | Role.PERMISSION_ADMIN)
+        db.session.add(role)
+        
+        user = User(
+            username='admin',
+            email='admin@example.com',
+            role=role
+        )
+        user.password = 'admin123'
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+@pytest.fixture
+def sample_tasks(app, sample_user):
+    """创建部分创建时间相同的测试任务"""
+    with app.app_context():
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        tasks = []
+        for i in range(7):
+            task = Task(
+                name=f'page_task_{i}',
+                task_type=TaskType.COMMAND,
+                command='show version',
+                user=sample_user,
+                status=TaskStatus.FAILED if i % 2 else TaskStatus.PENDING
+            )
+            if i < 4:
+                task.created_at = same_time
+            tasks.append(task)
+        db.session.add_all(tasks)
+        db.session.commit()
+        return tasks
+
+class TestPaginationHelpers:
+    """分页工具函数测试"""
+    
+    def test_cursor_roundtrip(self):
+        """测试游标编码和解码"""
+        created_at = datetime(2024, 5, 1, 8, 30, 15, 123456)
+        cursor = encode_cursor(created_at, 42)
+        assert decode_cursor(cursor) == (created_at, 42)
+    
+    def test_invalid_cursor(self):
+        """测试无效游标"""
+        with pytest.raises(PaginationError):
+            decode_cursor('not-a-cursor')
+    
+    def test_page_size_cap(self):
+        """测试每页条数上限"""
+        assert get_page_size(None) == DEFAULT_PAGE_SIZE
+        assert get_page_size('10') == 10
+        assert get_page_size('100000') == MAX_PAGE_SIZE
+        assert get_page_size('0') == 1
+        with pytest.raises(PaginationError):
+            get_page_size('abc')
+    
+    def test_parse_fields(self):
+        """测试字段投影参数"""
+        assert parse_fields(None) is None
+        assert parse_fields('name, status') == ['id', 'name', 'status']
+
+class TestKeysetPagination:
+    """游标分页接口测试"""
+    
+    def _login(self, client):
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+    
+    def test_walk_all_pages(self, client, sample_tasks):
+        """测试逐页遍历不重复、不遗漏（含相同创建时间）"""
+        self._login(client)
+        
+        seen = []
+        cursor = None
+        while True:
+            url = '/tasks/api/tasks?limit=3'
+            if cursor:
+                url += f'&cursor={cursor}'
+            data = client.get(url).get_json()
+            assert len(data['items']) <= 3
+            seen.extend(item['id'] for item in data['items'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        
+        assert len(seen) == len(set(seen)) == 7
+    
+    def test_fields_projection(self, client, sample_tasks):
+        """测试fields参数只返回指定字段"""
+        self._login(client)
+        
+        data = client.get('/tasks/api/tasks?fields=name,status').get_json()
+        assert data['items']
+        for item in data['items']:
+            assert set(item.keys()) == {'id', 'name', 'status'}
+    
+    def test_status_filter(self, client, sample_tasks):
+        """测试状态过滤"""
+        self._login(client)
+        
+        data = client.get('/tasks/api/tasks?status=failed').get_json()
+        assert len(data['items']) == 3
+        assert all(item['status'] == 'failed' for item in data['items'])
+    
+    def test_invalid_filter(self, client, sample_tasks):
+        """测试无效过滤参数返回400"""
+        self._login(client)
+        
+        response = client.get('/tasks/api/tasks?status=unknown_status')
+        assert response.status_code == 400
+        
+        response = client.get('/devices/api/devices?cursor=broken')
+        assert response.status_code == 400
@@ -0,0 +1,171 @@
+"""
+分区维护与归档测试
+SQLite不支持原生分区，归档走滚动表路径
+"""
+
+import gzip
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import Mock
+from app import create_app, db
+from app.models import (
+    User, Role, Device, DeviceType, ConnectionType,
+    Task, TaskResult, TaskType, AuditLog
+)
+from app.partitions import PartitionManager, add_months, month_start, partition_name, parse_partition_name
+
+NOW = datetime(2024, 9, 15, 12, 0)
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def seeded(app):
+    """在2024年1月至9月每月各写入一条审计日志和任务结果"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        device = Device(
+            name='archive_device', ip_address='10.3.0.1',
+            device_type=DeviceType.CISCO_SWITCH, connection_type=ConnectionType.SSH, username='admin'
+        )
+        task = Task(name='archive_task', task_type=TaskType.COMMAND, user=user, device=device)
+        db.session.add_all([role, user, device, task])
+        db.session.flush()
+        
+        for month in range(1, 10):
+            created_at = datetime(2024, month, 10)
+            db.session.add(AuditLog(
+                action='update', resource_type='device', resource_id=device.id,
+                user_id=user.id, details=f'month {month}', created_at=created_at
+            ))
+            db.session.add(TaskResult(
+                task_id=task.id, device_id=device.id, device_name=device.name,
+                device_ip=device.ip_address, command=f'show month {month}', created_at=created_at
+            ))
+        db.session.commit()
+        yield
+
+def read_archive(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+class RecordingConnection:
+    """记录执行的SQL，模拟PostgreSQL默认分区中是否有数据"""
+    
+    def __init__(self, default_has_rows):
+        self.default_has_rows = default_has_rows
+        self.statements = []
+    
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.statements.append(sql.split(' WHERE ')[0])
+        return Mock(first=Mock(return_value=(1,) if self.default_has_rows and sql.startswith('SELECT 1') else None))
+
+class TestPartitionNaming:
+    """分区命名与月份计算测试"""
+    
+    def test_month_arithmetic(self):
+        assert month_start(NOW) == datetime(2024, 9, 1)
+        assert add_months(datetime(2024, 11, 1), 2) == datetime(2025, 1, 1)
+        assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+    
+    def test_partition_name_round_trip(self):
+        name = partition_name('audit_logs', datetime(2024, 3, 1))
+        assert name == 'audit_logs_y2024m03'
+        assert parse_partition_name(name) == ('audit_logs', datetime(2024, 3, 1))
+        assert parse_partition_name('audit_logs_default') is None
+
+class TestArchiveExpired:
+    """过期月份归档测试"""
+    
+    def test_archives_months_beyond_retention(self, app, seeded, tmp_path):
+        """测试超过保留期的月份写入归档文件并从在线表删除"""
+        with app.app_context():
+            archived = PartitionManager.archive_expired(
+                retention_months=3, archive_dir=str(tmp_path), fmt='jsonl', now=NOW
+            )
+            
+            # 保留6、7、8、9月，1至5月归档
+            assert len(archived['audit_logs']) == 5
+            assert len(archived['task_results']) == 5
+            
+            path = tmp_path / 'audit_logs' / 'audit_logs_y2024m01.jsonl.gz'
+            assert str(path) in archived['audit_logs']
+            rows = read_archive(path)
+            assert len(rows) == 1
+            assert rows[0]['details'] == 'month 1'
+            
+            rows = read_archive(tmp_path / 'task_results' / 'task_results_y2024m05.jsonl.gz')
+            assert rows[0]['command'] == 'show month 5'
+            
+            assert AuditLog.query.count() == 4
+            assert TaskResult.query.count() == 4
+            assert AuditLog.query.filter(AuditLog.created_at < datetime(2024, 6, 1)).count() == 0
+            
+            # 滚动表归档后被删除
+            assert not db.inspect(db.engine).has_table('audit_logs_y2024m01')
+    
+    def test_archive_is_idempotent(self, app, seeded, tmp_path):
+        """测试重复执行不会重复归档"""
+        with app.app_context():
+            PartitionManager.archive_expired(retention_months=3, archive_dir=str(tmp_path), now=NOW)
+            archived = PartitionManager.archive_expired(retention_months=3, archive_dir=str(tmp_path), now=NOW)
+            assert archived == {'audit_logs': [], 'task_results': []}
+    
+    def test_unknown_format_keeps_rows(self, app, seeded, tmp_path):
+        """测试不支持的归档格式在分离前报错，数据保留在在线表中"""
+        with app.app_context():
+            with pytest.raises(ValueError):
+                PartitionManager.archive_expired(
+                    retention_months=3, archive_dir=str(tmp_path), fmt='csv', now=NOW
+                )
+            assert AuditLog.query.count() == 9
+            assert not db.inspect(db.engine).has_table('audit_logs_y2024m01')
+    
+    def test_ensure_partitions_skips_non_native(self, app):
+        """测试非原生分区数据库不创建分区"""
+        with app.app_context():
+            assert PartitionManager.ensure_partitions(now=NOW) == []
+
+class TestCreatePartition:
+    """PostgreSQL按月分区创建测试（记录执行的SQL）"""
+    
+    def test_moves_rows_out_of_default_partition(self):
+        """测试默认分区中已有该月数据时，分离默认分区、创建分区并移入数据后重新挂载"""
+        conn = RecordingConnection(default_has_rows=True)
+        
+        name = PartitionManager.create_partition(conn, 'audit_logs', datetime(2024, 9, 1), 'audit_logs_default')
+        
+        assert name == 'audit_logs_y2024m09'
+        assert conn.statements == [
+            'SELECT 1 FROM audit_logs_default',
+            'ALTER TABLE audit_logs DETACH PARTITION audit_logs_default',
+            "CREATE TABLE audit_logs_y2024m09 PARTITION OF audit_logs "
+            "FOR VALUES FROM ('2024-09-01T00:00:00') TO ('2024-10-01T00:00:00')",
+            'INSERT INTO audit_logs_y2024m09 SELECT * FROM audit_logs_default',
+            'DELETE FROM audit_logs_default',
+            'ALTER TABLE audit_logs ATTACH PARTITION audit_logs_default DEFAULT',
+        ]
+    
+    def test_empty_default_partition_is_kept_attached(self):
+        """测试默认分区中没有该月数据时直接创建分区"""
+        conn = RecordingConnection(default_has_rows=False)
+        
+        PartitionManager.create_partition(conn, 'task_results', datetime(2024, 10, 1), 'task_results_default')
+        
+        assert conn.statements == [
+            'SELECT 1 FROM task_results_default',
+            "CREATE TABLE task_results_y2024m10 PARTITION OF task_results "
+            "FOR VALUES FROM ('2024-10-01T00:00:00') TO ('2024-11-01T00:00:00')",
+        ]
@@ -4,12 +4,17 @@
 """
 
 import pytest
+import sys
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import url_for
 from app import create_app, db
-from app.models import User, Role, Device, DeviceGroup, ConfigTemplate, Task, AuditLog
+from app.models import User, Role, Device, DeviceGroup, ConfigTemplate, Task, AuditLog, TaskStatus, DeviceType, ConnectionType, TaskType
+from app.main.services import DashboardStatsService
+from app.simulator.benchmark import PIPELINES, compare, percentile, run_suite
+from app import startup
+from app.lazy import is_loaded, lazy_import
 
 @pytest.fixture
 def app():
@@ -156,6 +161,111 @@ class TestDatabasePerformance:
             assert query_time < 0.1
             assert len(logs) == 100
 
+class TestQueryCountPerformance:
+    """列表接口查询次数测试（N+1检测）"""
+    
+    def _seed(self, app, user, count, offset=0):
+        """创建带分组的设备和关联任务"""
+        with app.app_context():
+            group = DeviceGroup(name=f'query_count_group_{offset}', description='查询次数测试')
+            db.session.add(group)
+            for i in range(count):
+                device = Device(
+                    name=f'query_count_device_{offset + i}',
+                    ip_address=f'10.0.{offset // 250}.{offset % 250 + i + 1}',
+                    device_type=DeviceType.CISCO_SWITCH,
+                    connection_type=ConnectionType.SSH,
+                    username='admin',
+                    group=group
+                )
+                db.session.add(device)
+                db.session.add(Task(
+                    name=f'query_count_task_{offset + i}',
+                    task_type=TaskType.COMMAND,
+                    command='show version',
+                    user=user,
+                    device=device
+                ))
+            db.session.commit()
+    
+    def _count_request(self, client, query_counter, url):
+        """统计单次请求执行的SQL数量"""
+        with query_counter() as statements:
+            response = client.get(url)
+        assert response.status_code == 200
+        return len(statements)
+    
+    def test_list_endpoints_constant_queries(self, app, client, sample_user, query_counter):
+        """测试列表接口的查询次数与行数无关"""
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+        
+        endpoints = ['/devices/api/devices', '/tasks/api/tasks', '/devices/api/groups']
+        
+        self._seed(app, sample_user, 5)
+        small = {url: self._count_request(client, query_counter, url) for url in endpoints}
+        
+        self._seed(app, sample_user, 50, offset=100)
+        large = {url: self._count_request(client, query_counter, url) for url in endpoints}
+        
+        # 数据量增加10倍，查询次数应保持不变
+        assert small == large
+
+class TestDashboardStatsPerformance:
+    """仪表板统计查询测试"""
+    
+    def _seed(self, user, count):
+        """创建设备和任务"""
+        for i in range(count):
+            device = Device(
+                name=f'stats_device_{i}',
+                ip_address=f'10.1.0.{i + 1}',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin'
+            )
+            db.session.add(device)
+            db.session.add(Task(
+                name=f'stats_task_{i}',
+                task_type=TaskType.COMMAND,
+                command='show version',
+                user=user,
+                device=device
+            ))
+        db.session.commit()
+    
+    def test_stats_grouped_and_cached(self, app, sample_user, query_counter):
+        """测试统计数据每表一条聚合查询，且在有效期内命中缓存"""
+        with app.app_context():
+            self._seed(sample_user, 20)
+            DashboardStatsService.invalidate()
+            
+            with query_counter() as statements:
+                stats = DashboardStatsService.get_stats()
+            assert len(statements) == 3
+            assert stats['devices']['total'] == 20
+            assert stats['tasks']['pending'] == 20
+            
+            with query_counter() as statements:
+                DashboardStatsService.get_stats()
+            assert len(statements) == 0
+    
+    def test_stats_invalidated_on_status_change(self, app, sample_user):
+        """测试任务状态变化后缓存失效"""
+        with app.app_context():
+            self._seed(sample_user, 3)
+            DashboardStatsService.invalidate()
+            assert DashboardStatsService.get_stats()['tasks']['running'] == 0
+            
+            task = Task.query.first()
+            task.start()
+            
+            stats = DashboardStatsService.get_stats()
+            assert stats['tasks']['running'] == 1
+            assert stats['tasks'][TaskStatus.PENDING.value] == 2
+
 class TestConcurrentPerformance:
     """并发性能测试"""
     
@@ -163,16 +273,17 @@ class TestConcurrentPerformance:
         """测试并发设备创建性能"""
         with app.app_context():
             def create_device(device_id):
-                """创建单个设备的函数"""
-                device = Device(
-                    name=f'concurrent_device_{device_id}',
-                    ip_address=f'192.168.1.{device_id+1}',
-                    device_type='cisco_switch',
-                    connection_type='ssh',
-                    username='admin'
-                )
-                device.set_password('admin123')
-                return device
+                """创建单个设备的函数（凭据密钥从线程中的应用上下文读取）"""
+                with app.app_context():
+                    device = Device(
+                        name=f'concurrent_device_{device_id}',
+                        ip_address=f'192.168.1.{device_id+1}',
+                        device_type='cisco_switch',
+                        connection_type='ssh',
+                        username='admin'
+                    )
+                    device.set_password('admin123')
+                    return device
             
             start_time = time.time()
             
@@ -502,3 +613,58 @@ class TestStressPerformance:
             # 验证连续操作性能：1000个操作应在30秒内完成
             assert execution_time < 30.0
             assert Device.query.count() == 1000
+
+class TestPipelineBenchmark:
+    """任务流水线基准测试（模拟设备，小规模运行以保证基准测试代码可用）"""
+    
+    def test_percentile(self):
+        """测试线性插值百分位数"""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 50) == 50.5
+        assert percentile(values, 99) == pytest.approx(99.01)
+        assert percentile([3.0], 95) == 3.0
+        assert percentile([], 50) is None
+    
+    def test_compare_with_baseline(self):
+        """测试与基线比较吞吐量"""
+        baseline = [{'pipeline': 'backup', 'devices': 10, 'devices_per_second': 4.0}]
+        results = [{'pipeline': 'backup', 'devices': 10, 'devices_per_second': 5.0},
+                   {'pipeline': 'template', 'devices': 10, 'devices_per_second': 3.0}]
+        assert compare(results, baseline) == [('backup', 10, 4.0, 5.0, 25.0)]
+    
+    def test_pipelines_against_simulator(self):
+        """测试三条流水线驱动模拟设备全部成功，并记录吞吐量、延迟分位数、查询数和内存"""
+        report = run_suite([2], isolate=False, endpoints=1)
+        
+        assert report['meta']['python']
+        assert [r['pipeline'] for r in report['results']] == list(PIPELINES)
+        for result in report['results']:
+            assert result['success_count'] == 2
+            assert result['devices_per_second'] > 0
+            assert result['latency']['p50'] <= result['latency']['p95'] <= result['latency']['p99']
+            assert result['queries'] > 0
+
+class TestStartupPerformance:
+    """冷启动测试（新的子进程中测量，防止启动时重新导入设备连接库等较慢的模块）"""
+    
+    # 启动耗时上限（秒），只用于发现明显的退化，已导入模块的检查更可靠
+    STARTUP_BUDGET = 5.0
+    
+    @pytest.mark.parametrize('profile', startup.PROFILES)
+    def test_startup_defers_heavy_imports(self, profile):
+        """测试Web和worker启动时不导入延迟导入的模块"""
+        result = startup.measure(profile, runs=1)
+        
+        assert result['loaded'] == []
+        assert result['median'] < self.STARTUP_BUDGET
+    
+    def test_lazy_import(self):
+        """测试延迟导入的模块在第一次访问属性时才导入"""
+        assert lazy_import('netmanagerx_missing_module') is None
+        
+        sys.modules.pop('colorsys', None)
+        module = lazy_import('colorsys')
+        assert not is_loaded('colorsys')
+        assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+        assert is_loaded('colorsys')
+        assert lazy_import('colorsys') is module
@@ -0,0 +1,159 @@
+"""
+性能分析测试
+"""
+
+import os
+import pytest
+from app import create_app, db, profile_manager
+from app.models import User, Role
+from app.profiling import ProfileStore
+from app.tasks.celery_app import celery
+
+@pytest.fixture
+def app(tmp_path):
+    """创建测试应用（全部请求都分析，不使用Redis）"""
+    app = create_app('testing')
+    app.config['REDIS_URL'] = None
+    celery.conf.task_always_eager = True
+    
+    with app.app_context():
+        profile_manager.store.directory = str(tmp_path / 'profiles')
+        profile_manager.update_settings(enabled=True, sample_rate=1.0,
+                                        targets=['main.*', 'app.tasks.maintenance_tasks.*'])
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_data(app):
+    """创建管理员和普通用户"""
+    with app.app_context():
+        role = Role(name='operator', description='操作员')
+        admin = User(username='admin', email='admin@example.com', role=role, is_admin=True)
+        admin.password = 'admin123'
+        user = User(username='user', email='user@example.com', role=role)
+        user.password = 'user123'
+        db.session.add_all([role, admin, user])
+        db.session.commit()
+
+class TestProfileStore:
+    """分析结果目录测试"""
+    
+    def test_rotation_keeps_newest(self, tmp_path):
+        store = ProfileStore(str(tmp_path), max_profiles=3)
+        names = [store.save('request', f'main.page{i}', 0.01 * i, 'prof', b'data') for i in range(5)]
+        
+        assert [profile['id'] for profile in store.list()] == names[:1:-1]
+        assert store.list()[0]['name'] == 'main.page4'
+        assert store.list()[0]['duration_ms'] == 40
+    
+    def test_path_rejects_invalid_names(self, tmp_path):
+        store = ProfileStore(str(tmp_path))
+        name = store.save('task', 'a/../b', 0.1, 'prof', b'data')
+        
+        assert '/' not in name
+        assert store.path(name) == os.path.join(str(tmp_path), name)
+        assert store.path('../secret.prof') is None
+        assert store.path('nope.html') is None
+
+class TestRequestProfiling:
+    """请求和任务分析测试"""
+    
+    def _login(self, client, username='admin', password='admin123'):
+        client.post('/auth/login', data={
+            'username': username,
+            'password': password
+        })
+    
+    def test_matching_request_is_profiled(self, client, sample_data):
+        self._login(client)
+        client.get('/api/stats')
+        client.get('/tasks/api/results/timings')
+        
+        names = [profile['name'] for profile in profile_manager.store.list()]
+        assert names == ['main.api_stats']
+    
+    def test_zero_sample_rate_skips(self, client, sample_data):
+        profile_manager.update_settings(sample_rate=0)
+        self._login(client)
+        client.get('/api/stats')
+        
+        assert profile_manager.store.list() == []
+    
+    def test_admin_api_is_not_profiled(self, client, sample_data):
+        self._login(client)
+        assert client.get('/api/admin/profiling').status_code == 200
+        
+        assert profile_manager.store.list() == []
+    
+    def test_task_is_profiled(self, app):
+        # 与Celery的 task_prerun/task_postrun 信号处理相同
+        name = 'app.tasks.maintenance_tasks.maintain_partitions'
+        profile_manager.task_started('task-1', name)
+        profile_manager.task_started('task-2', 'app.tasks.network_tasks.execute_device_command')
+        sum(range(1000))
+        profile_manager.task_finished('task-2', 'app.tasks.network_tasks.execute_device_command')
+        profile_manager.task_finished('task-1', name)
+        
+        profiles = profile_manager.store.list()
+        assert [profile['kind'] for profile in profiles] == ['task']
+        assert profiles[0]['name'] == 'app.tasks.maintenance_tasks.maintain_partitions'
+    
+    def test_settings_per_app(self, app, tmp_path):
+        """测试之后创建的应用（如worker应用）不改变当前应用的设置和结果目录"""
+        create_app('testing')
+        
+        assert profile_manager.store.directory == str(tmp_path / 'profiles')
+        assert profile_manager.settings()['sample_rate'] == 1.0
+    
+    def test_view_profile(self, client, sample_data):
+        self._login(client)
+        client.get('/api/stats')
+        profile_id = profile_manager.store.list()[0]['id']
+        
+        response = client.get(f'/admin/profiling/{profile_id}')
+        assert response.status_code == 200
+        assert b'api_stats' in response.data
+        assert client.get(f'/admin/profiling/{profile_id}/download').status_code == 200
+
+class TestProfilingAdmin:
+    """性能分析设置API测试"""
+    
+    def _login(self, client, username='admin', password='admin123'):
+        client.post('/auth/login', data={
+            'username': username,
+            'password': password
+        })
+    
+    def test_update_and_reset_settings(self, client, sample_data):
+        self._login(client)
+        
+        response = client.put('/api/admin/profiling', json={'enabled': False, 'targets': 'templates.*, tasks.*'})
+        assert response.status_code == 200
+        assert response.get_json()['settings'] == {'enabled': False, 'sample_rate': 1.0,
+                                                   'targets': ['templates.*', 'tasks.*']}
+        client.get('/api/stats')
+        assert profile_manager.store.list() == []
+        
+        response = client.put('/api/admin/profiling', json={'reset': True})
+        assert response.get_json()['settings']['enabled'] is False
+        assert response.get_json()['settings']['sample_rate'] == 0.01
+    
+    def test_rejects_invalid_settings(self, client, sample_data):
+        self._login(client)
+        
+        assert client.put('/api/admin/profiling', json={'sample_rate': 2}).status_code == 400
+        assert client.put('/api/admin/profiling', json={'sample_rate': 'x'}).status_code == 400
+        assert client.put('/api/admin/profiling', json={'targets': [1]}).status_code == 400
+    
+    def test_requires_admin(self, client, sample_data):
+        self._login(client, 'user', 'user123')
+        
+        assert client.get('/api/admin/profiling').status_code == 403
+        assert client.put('/api/admin/profiling', json={'enabled': False}).status_code == 403
@@ -0,0 +1,78 @@
+"""
+进度上报器测试
+"""
+
+import pytest
+from unittest.mock import Mock
+from app.progress import ProgressReporter, celery_reporter
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可手动推进的时钟"""
+    now = [1000.0]
+    monkeypatch.setattr('app.progress.time.monotonic', lambda: now[0])
+    return now
+
+def make_reporter(**kwargs):
+    published = []
+    kwargs.setdefault('interval_ms', 500)
+    kwargs.setdefault('min_delta', 5)
+    return ProgressReporter(published.append, **kwargs), published
+
+class TestProgressReporter:
+    """进度合并测试"""
+    
+    def test_coalesces_small_fast_updates(self, clock):
+        """测试间隔内的小幅更新被合并"""
+        reporter, published = make_reporter()
+        for i in range(5000):
+            reporter.step(i, 5000, f'设备 {i}')
+        # 时间未推进，只有首次和每5个百分点的更新被发布
+        assert len(published) == 20
+        assert [meta['progress'] for meta in published[:3]] == [0, 5, 10]
+    
+    def test_interval_publishes_small_change(self, clock):
+        """测试超过间隔后即使进度变化很小也会发布"""
+        reporter, published = make_reporter()
+        reporter.update(10, 'a')
+        assert reporter.update(11, 'b') is False
+        clock[0] += 0.6
+        assert reporter.update(12, 'c') is True
+        assert published[-1]['status'] == 'c'
+    
+    def test_flush_publishes_pending(self, clock):
+        reporter, published = make_reporter()
+        reporter.update(10)
+        reporter.update(11, '最后一条')
+        reporter.flush()
+        assert published[-1] == {'progress': 11, 'status': '最后一条'}
+        reporter.flush()
+        assert len(published) == 2
+    
+    def test_finish_writes_once(self, clock):
+        """测试最终进度只写一次，之后的更新被忽略"""
+        reporter, published = make_reporter()
+        reporter.update(50)
+        assert reporter.finish(status='完成') is True
+        assert reporter.finish() is False
+        assert reporter.update(60, force=True) is False
+        assert published == [{'progress': 50, 'status': None}, {'progress': 100, 'status': '完成'}]
+    
+    def test_on_wait_keeps_progress(self, clock):
+        reporter, published = make_reporter()
+        reporter.update(40)
+        clock[0] += 1
+        reporter.on_wait(3.2, 2)
+        assert published[-1]['progress'] == 40
+        assert published[-1]['queue_position'] == 2
+        assert published[-1]['wait_time'] == 3.2
+    
+    def test_celery_reporter(self, clock):
+        """测试Celery上报器写PROGRESS状态，且finish不覆盖任务结果"""
+        task = Mock()
+        reporter = celery_reporter(task, interval_ms=500, min_delta=5)
+        reporter.update(10, '连接设备中...')
+        reporter.finish()
+        task.update_state.assert_called_once_with(
+            state='PROGRESS', meta={'progress': 10, 'status': '连接设备中...'}
+        )
@@ -0,0 +1,129 @@
+"""
+热点查询执行计划测试
+在种子数据上对登记的热点查询执行EXPLAIN，出现全表扫描即失败
+"""
+
+import json
+import pytest
+from datetime import datetime, timedelta
+from app import db
+from app.models import (
+    Device, DeviceConnection, DeviceType, ConnectionType,
+    Task, TaskResult, TaskStatus, TaskType, AuditLog, ConfigBackup
+)
+
+# 热点查询登记表：{名称: 构造查询的函数}，新增热点过滤条件时在此登记
+HOT_QUERIES = {
+    'tasks_by_status': lambda: Task.query.filter(
+        Task.status == TaskStatus.PENDING
+    ).order_by(Task.created_at.desc()).limit(50),
+    'task_results_by_task': lambda: TaskResult.query.filter(
+        TaskResult.task_id == 1
+    ).order_by(TaskResult.created_at),
+    'current_backup_of_device': lambda: ConfigBackup.query.filter(
+        ConfigBackup.device_id == 1, ConfigBackup.is_current == True
+    ),
+    'backups_of_device': lambda: ConfigBackup.query.filter(
+        ConfigBackup.device_id == 1
+    ).order_by(ConfigBackup.created_at.desc()).limit(20),
+    'audit_logs_of_resource': lambda: AuditLog.query.filter(
+        AuditLog.resource_type == 'device', AuditLog.resource_id == 1
+    ).order_by(AuditLog.created_at.desc()).limit(50),
+    'active_connections_of_device': lambda: DeviceConnection.query.filter(
+        DeviceConnection.device_id == 1, DeviceConnection.status == 'active'
+    ),
+}
+
+def explain(query):
+    """
+    返回查询的执行计划中发生全表扫描的表名列表
+    
+    SQLite使用 EXPLAIN QUERY PLAN；PostgreSQL使用 EXPLAIN (FORMAT JSON)，
+    并关闭 enable_seqscan，使小数据量下只有在没有可用索引时才会选择顺序扫描
+    """
+    dialect = db.engine.dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    
+    if dialect.name == 'sqlite':
+        rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')).all()
+        return [row[-1] for row in rows if row[-1].startswith('SCAN') and 'USING' not in row[-1]]
+    
+    if dialect.name == 'postgresql':
+        db.session.execute(db.text('SET LOCAL enable_seqscan = off'))
+        plan = db.session.execute(db.text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        
+        scans = []
+        nodes = [plan[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return scans
+    
+    pytest.skip(f'不支持的数据库: {dialect.name}')
+
+@pytest.fixture
+def seeded(app, admin_user):
+    """为各热点表创建种子数据"""
+    with app.app_context():
+        user = db.session.merge(admin_user)
+        
+        base_time = datetime(2024, 1, 1)
+        devices = []
+        for i in range(20):
+            device = Device(
+                name=f'plan_device_{i}',
+                ip_address=f'10.2.0.{i + 1}',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin'
+            )
+            devices.append(device)
+        db.session.add_all(devices)
+        db.session.flush()
+        
+        statuses = list(TaskStatus)
+        for i in range(200):
+            device = devices[i % len(devices)]
+            created_at = base_time + timedelta(minutes=i)
+            task = Task(
+                name=f'plan_task_{i}',
+                task_type=TaskType.COMMAND,
+                status=statuses[i % len(statuses)],
+                user=user,
+                device=device,
+                created_at=created_at
+            )
+            db.session.add(task)
+            db.session.flush()
+            db.session.add(TaskResult(
+                task_id=task.id, device_id=device.id, device_name=device.name,
+                device_ip=device.ip_address, command='show version', created_at=created_at
+            ))
+            db.session.add(ConfigBackup(
+                name=f'plan_backup_{i}', config_content='hostname plan', device_id=device.id,
+                user_id=user.id, is_current=i >= 180, created_at=created_at
+            ))
+            db.session.add(AuditLog(
+                action='update', resource_type='device', resource_id=device.id,
+                user_id=user.id, created_at=created_at
+            ))
+            db.session.add(DeviceConnection(
+                device_id=device.id, status='active' if i % 10 == 0 else 'closed'
+            ))
+        db.session.commit()
+        yield
+        db.session.rollback()
+
+class TestHotQueryPlans:
+    """热点查询索引覆盖测试"""
+    
+    @pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+    def test_no_sequential_scan(self, app, seeded, name):
+        """测试登记的热点查询不会退化为全表扫描"""
+        with app.app_context():
+            scans = explain(HOT_QUERIES[name]())
+            assert scans == [], f'{name} 发生全表扫描: {scans}'
@@ -0,0 +1,147 @@
+"""
+设备会话并发限制测试
+未配置REDIS_URL，使用进程内队列
+"""
+
+import threading
+import time
+import pytest
+from app import create_app, db
+from app.models import Device, DeviceType, ConnectionType
+from app.cancellation import checkpoint
+from app.communication.session_lock import DeviceSessionLock, DeviceBusyError, _LocalQueue, device_session
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    app.config['REDIS_URL'] = None
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def make_lock(device_id, **kwargs):
+    kwargs.setdefault('poll_interval', 0.01)
+    return DeviceSessionLock(device_id, **kwargs)
+
+class TestDeviceSessionLock:
+    """设备会话信号量测试"""
+    
+    def test_limit_one_serializes(self, app):
+        """测试会话上限为1时第二个会话需要等待"""
+        with app.app_context():
+            first = make_lock('serial')
+            first.acquire()
+            
+            second = make_lock('serial', wait_timeout=0.05)
+            with pytest.raises(DeviceBusyError):
+                second.acquire()
+            
+            first.release()
+            assert second.acquire() < 0.05
+            second.release()
+    
+    def test_limit_allows_concurrent_sessions(self, app):
+        """测试会话上限内的会话可以同时持有"""
+        with app.app_context():
+            locks = [make_lock('vty', limit=3) for _ in range(3)]
+            for lock in locks:
+                assert lock.acquire() < 0.05
+            
+            with pytest.raises(DeviceBusyError):
+                make_lock('vty', limit=3, wait_timeout=0.05).acquire()
+            
+            for lock in locks:
+                lock.release()
+    
+    def test_waiters_are_served_in_order(self, app):
+        """测试等待者按排队顺序获得会话"""
+        order = []
+        holder = make_lock('fair')
+        holder.acquire()
+        
+        def worker(name):
+            with app.app_context():
+                with make_lock('fair'):
+                    order.append(name)
+                    time.sleep(0.01)
+        
+        threads = []
+        for name in ['a', 'b', 'c']:
+            thread = threading.Thread(target=worker, args=(name,))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)
+        
+        holder.release()
+        for thread in threads:
+            thread.join(2)
+        assert order == ['a', 'b', 'c']
+    
+    def test_wait_is_reported(self, app):
+        """测试排队期间回调等待时间和排队位置"""
+        reports = []
+        with app.app_context():
+            holder = make_lock('report')
+            holder.acquire()
+            
+            def release_later():
+                time.sleep(0.1)
+                holder.release()
+            
+            threading.Thread(target=release_later).start()
+            waiter = make_lock('report', on_wait=lambda waited, position: reports.append(position))
+            waited = waiter.acquire()
+            waiter.release()
+        
+        assert waited >= 0.05
+        assert reports[0] == 1
+    
+    def test_device_session_uses_max_sessions(self, app):
+        """测试设备的会话上限优先于全局配置"""
+        with app.app_context():
+            device = Device(
+                name='limited-switch',
+                ip_address='192.168.1.30',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin',
+                max_sessions=2
+            )
+            db.session.add(device)
+            db.session.commit()
+            assert device_session(device).limit == 2
+            
+            device.max_sessions = None
+            app.config['DEVICE_SESSION_LIMIT'] = 4
+            assert device_session(device).limit == 4
+    
+    def test_checkpoint_refreshes_held_lease(self, app):
+        """测试持有会话期间 checkpoint() 延长有效期，释放后不再延长"""
+        
+        class CountingQueue(_LocalQueue):
+            calls = 0
+            
+            @classmethod
+            def position(cls, device_id, member, ttl):
+                cls.calls += 1
+                return super().position(device_id, member, ttl)
+        
+        with app.app_context():
+            with make_lock('lease', lease_ttl=0.15, backend=CountingQueue):
+                assert CountingQueue.calls == 1
+                
+                # 距上次延长不足 lease_ttl 的1/3时不访问队列
+                checkpoint()
+                assert CountingQueue.calls == 1
+                
+                time.sleep(0.06)
+                checkpoint()
+                assert CountingQueue.calls == 2
+            
+            time.sleep(0.06)
+            checkpoint()
+            assert CountingQueue.calls == 2
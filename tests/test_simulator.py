@@ -0,0 +1,201 @@
+"""
+设备模拟器测试
+使用本机模拟设备测试真实的SSH、Telnet、RESTCONF客户端（不使用mock）
+"""
+
+import socket
+import time
+import pytest
+from app import create_app, db
+from app.models import Device
+from app.communication.ssh_client import SSHClient, SSHService
+from app.communication.telnet_client import TelnetClient
+from app.communication.restconf_client import RESTCONFClient, RESTCONFService
+from app.simulator import SimulatorFarm, DeviceProfile, CLISession
+from app.simulator.device import INVALID_INPUT, MORE_PROMPT
+
+@pytest.fixture(scope='module')
+def farm():
+    """每种协议一台模拟设备，整个模块共用"""
+    with SimulatorFarm(ssh=1, telnet=1, restconf=1) as farm:
+        yield farm
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def add_device(simulated, **overrides):
+    """把模拟设备保存为设备记录"""
+    device = simulated.to_device()
+    for key, value in overrides.items():
+        setattr(device, key, value)
+    db.session.add(device)
+    db.session.commit()
+    return device
+
+def read_until(sock, marker, timeout=5):
+    """从socket读取直到出现 marker"""
+    sock.settimeout(timeout)
+    data = b''
+    while marker not in data:
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+class TestCLISession:
+    """命令行行为测试"""
+    
+    def test_abbreviations_and_invalid_input(self):
+        session = CLISession(DeviceProfile(hostname='R1'))
+        assert session.execute('sh ver').startswith('Cisco IOS Software')
+        assert 'GigabitEthernet1/0/1' in session.execute('sh ip int br')
+        assert session.execute('show flux-capacitor') == INVALID_INPUT
+        assert session.prompt == 'R1#'
+    
+    def test_config_mode_updates_running_config(self):
+        profile = DeviceProfile(hostname='R1')
+        session = CLISession(profile)
+        session.execute('configure terminal')
+        assert session.prompt == 'R1(config)#'
+        session.execute('interface Loopback0')
+        assert session.prompt == 'R1(config-if)#'
+        session.execute('description uplink')
+        session.execute('end')
+        
+        assert session.prompt == 'R1#'
+        assert 'interface Loopback0\n description uplink' in CLISession(profile).execute('show running-config')
+    
+    def test_paging_follows_terminal_length(self):
+        session = CLISession(DeviceProfile(interfaces=10, page_length=5))
+        output = session.execute('show ip interface brief')
+        assert [len(page) for page in session.pages(output)] == [5, 5, 1]
+        
+        session.execute('terminal length 0')
+        assert len(session.pages(output)) == 1
+    
+    def test_responses_override_and_auth_failure_rate(self):
+        profile = DeviceProfile(responses={'show inventory': 'NAME: "1"'}, auth_failure_rate=1.0)
+        assert CLISession(profile).execute('show inventory') == 'NAME: "1"'
+        assert profile.authenticate('admin', 'admin') is False
+        assert DeviceProfile().authenticate('admin', 'wrong') is False
+    
+    def test_latency(self):
+        session = CLISession(DeviceProfile(latency=0.1, jitter=0.05, seed=1))
+        start = time.monotonic()
+        session.execute('show clock')
+        assert 0.1 <= time.monotonic() - start < 0.5
+
+class TestSSHSimulator:
+    """SSH模拟器测试（Netmiko）"""
+    
+    def test_execute_command(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('ssh')[0])
+            result = SSHService.execute_command(device, 'show version', timeout=10)
+            
+            assert result['success'] is True
+            assert 'Cisco IOS Software' in result['output']
+    
+    def test_send_config(self, app, farm):
+        with app.app_context():
+            simulated = farm.by_protocol('ssh')[0]
+            device = add_device(simulated)
+            result = SSHService.send_config(device, ['interface Vlan100', 'description mgmt'], timeout=10)
+            
+            assert result['success'] is True
+            assert ' description mgmt' in simulated.profile.config_lines
+    
+    def test_authentication_failure(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('ssh')[0])
+            device.set_password('wrong')
+            result = SSHClient(device, timeout=10).connect()
+            
+            assert result['success'] is False
+            assert '认证失败' in result['error']
+
+class TestTelnetSimulator:
+    """Telnet模拟器测试"""
+    
+    def test_login_and_paging(self, farm):
+        simulated = farm.by_protocol('telnet')[0]
+        with socket.create_connection((simulated.host, simulated.port), timeout=5) as sock:
+            read_until(sock, b'Username:')
+            sock.sendall(b'admin\r\n')
+            read_until(sock, b'Password:')
+            sock.sendall(b'admin\r\n')
+            assert read_until(sock, b'#').endswith(b'SIM-TELNET-2#')
+            
+            sock.sendall(b'show running-config\r\n')
+            assert read_until(sock, MORE_PROMPT.encode()).endswith(MORE_PROMPT.encode())
+            sock.sendall(b'q')
+            assert read_until(sock, b'#').endswith(b'SIM-TELNET-2#')
+    
+    def test_failed_login_disconnects(self, farm):
+        simulated = farm.by_protocol('telnet')[0]
+        with socket.create_connection((simulated.host, simulated.port), timeout=5) as sock:
+            read_until(sock, b'Username:')
+            for attempt in range(3):
+                sock.sendall(b'admin\r\n')
+                read_until(sock, b'Password:')
+                sock.sendall(b'wrong\r\n')
+                marker = b'Username:' if attempt < 2 else b'% Authentication failed'
+                assert b'% Authentication failed' in read_until(sock, marker)
+            
+            # 第三次失败后服务端断开连接
+            try:
+                while sock.recv(4096):
+                    pass
+            except ConnectionResetError:
+                pass
+    
+    def test_telnet_client(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('telnet')[0])
+            client = TelnetClient(device, timeout=10)
+            try:
+                assert client.connect()['success'] is True
+                result = client.execute_command('show version', wait_time=0.3)
+            finally:
+                client.disconnect()
+            
+            assert result['success'] is True
+            assert 'Cisco IOS Software' in result['output']
+
+class TestRESTCONFSimulator:
+    """RESTCONF模拟器测试"""
+    
+    def test_get_interfaces(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('restconf')[0])
+            result = RESTCONFService.get_interfaces(device, timeout=10)
+            
+            assert result['success'] is True
+            assert len(result['data']['ietf-interfaces:interfaces']['interface']) == 24
+    
+    def test_write_and_read_back(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('restconf')[0])
+            with RESTCONFClient(device, timeout=10) as client:
+                path = 'data/Cisco-IOS-XE-native:native/banner'
+                assert client.put(path, {'banner': 'sim'})['success'] is True
+                assert client.get(path)['data'] == {'banner': 'sim'}
+                assert client.delete(path)['success'] is True
+                assert client.get(path)['status_code'] == 404
+    
+    def test_wrong_credentials(self, app, farm):
+        with app.app_context():
+            device = add_device(farm.by_protocol('restconf')[0])
+            device.set_password('wrong')
+            result = RESTCONFService.test_connection(device, timeout=10)
+            
+            assert result['success'] is False
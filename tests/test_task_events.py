@@ -0,0 +1,324 @@
+"""
+任务事件推送测试
+使用进程内广播，测试事件发布/订阅、数据库提交触发的事件和SSE接口
+"""
+
+import json
+import pytest
+from unittest.mock import patch
+from app import create_app, db, events
+from app.models import User, Role, Device, DeviceType, ConnectionType, Task, TaskResult, TaskStatus, TaskType
+from app.progress import celery_reporter
+from app.tasks.fanout import device_entry, finalize_batch_task, fail_batch_task
+from app.tasks.network_tasks import execute_device_command
+
+@pytest.fixture
+def app():
+    """创建测试应用（不使用Redis）"""
+    app = create_app('testing')
+    app.config['REDIS_URL'] = None
+    app.config['PROGRESS_INTERVAL_MS'] = 0
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    events._LocalBroker.clear()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_data(app):
+    """创建测试用户、设备和一个执行中的任务"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        role.add_permission(Role.PERMISSION_VIEW | Role.PERMISSION_EXECUTE)
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        device = Device(
+            name='events-switch',
+            ip_address='192.168.1.20',
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType.SSH,
+            username='admin'
+        )
+        task = Task(name='events_task', task_type=TaskType.COMMAND, command='show version',
+                    status=TaskStatus.RUNNING, user=user)
+        db.session.add_all([role, user, device, task])
+        db.session.commit()
+        return {'task_id': task.id, 'device_id': device.id}
+
+def drain(subscription):
+    """取出订阅中已有的全部事件"""
+    messages = []
+    while True:
+        message = subscription.get(timeout=0)
+        if message is None:
+            return messages
+        messages.append(message)
+
+class FakeCeleryTask:
+    """记录 update_state 调用的Celery任务"""
+    
+    def __init__(self):
+        self.states = []
+    
+    def update_state(self, state, meta):
+        self.states.append((state, meta))
+
+class TestEventBus:
+    """进程内发布/订阅测试"""
+    
+    def test_publish_to_subscribers_of_task(self, app):
+        """测试事件只发送给该任务的订阅者"""
+        with app.app_context():
+            first = events.subscribe(1)
+            second = events.subscribe(2)
+            
+            events.publish(1, events.EVENT_PROGRESS, {'progress': 10})
+            
+            assert drain(first) == [{'event': 'progress', 'data': {'progress': 10}}]
+            assert drain(second) == []
+            first.close()
+            second.close()
+    
+    def test_closed_subscription_receives_nothing(self, app):
+        """测试取消订阅后不再接收事件"""
+        with app.app_context():
+            subscription = events.subscribe(1)
+            subscription.close()
+            
+            events.publish(1, events.EVENT_PROGRESS, {'progress': 10})
+            
+            assert drain(subscription) == []
+            assert events.channel(1) not in events._LocalBroker._subscriptions
+    
+    def test_slow_subscriber_keeps_latest_events(self, app, monkeypatch):
+        """测试订阅者缓存已满时丢弃最早的事件"""
+        monkeypatch.setattr(events, 'LOCAL_QUEUE_SIZE', 3)
+        with app.app_context():
+            subscription = events.subscribe(1)
+            for progress in range(5):
+                events.publish(1, events.EVENT_PROGRESS, {'progress': progress})
+            
+            assert [m['data']['progress'] for m in drain(subscription)] == [2, 3, 4]
+            subscription.close()
+    
+    def test_publish_failure_is_swallowed(self, app, monkeypatch):
+        """测试发布失败不影响调用方"""
+        def broken(name, message):
+            raise ConnectionError('redis down')
+        monkeypatch.setattr(events._LocalBroker, 'publish', broken)
+        
+        with app.app_context():
+            events.publish(1, events.EVENT_PROGRESS, {'progress': 10})
+
+class TestCommitEvents:
+    """数据库提交触发的事件测试"""
+    
+    def test_task_result_published_after_commit(self, app, sample_data):
+        """测试新任务结果在提交后发布"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            db.session.add(TaskResult(
+                task_id=sample_data['task_id'], device_id=sample_data['device_id'],
+                device_name='events-switch', device_ip='192.168.1.20',
+                command='show version', output='Cisco IOS'
+            ))
+            db.session.flush()
+            assert drain(subscription) == []
+            
+            db.session.commit()
+            
+            messages = drain(subscription)
+            assert [m['event'] for m in messages] == ['result']
+            assert messages[0]['data']['output'] == 'Cisco IOS'
+            assert messages[0]['data']['device_id'] == sample_data['device_id']
+            subscription.close()
+    
+    def test_status_change_published(self, app, sample_data):
+        """测试任务状态变化发布status事件"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            task = db.session.get(Task, sample_data['task_id'])
+            
+            task.complete(True, '执行成功')
+            
+            messages = drain(subscription)
+            assert [m['event'] for m in messages] == ['status']
+            assert messages[0]['data']['status'] == 'success'
+            assert messages[0]['data']['result_message'] == '执行成功'
+            subscription.close()
+    
+    def test_other_changes_not_published(self, app, sample_data):
+        """测试状态未变化的任务更新不发布事件"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            task = db.session.get(Task, sample_data['task_id'])
+            task.description = '新的描述'
+            db.session.commit()
+            
+            assert drain(subscription) == []
+            subscription.close()
+    
+    def test_rollback_discards_events(self, app, sample_data):
+        """测试回滚的修改不发布事件"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            task = db.session.get(Task, sample_data['task_id'])
+            task.status = TaskStatus.FAILED
+            db.session.flush()
+            db.session.rollback()
+            db.session.commit()
+            
+            assert drain(subscription) == []
+            subscription.close()
+
+class TestTaskPublishers:
+    """任务进度和设备结果发布测试"""
+    
+    def test_celery_reporter_publishes_progress(self, app):
+        """测试进度同时写入结果后端和事件频道，最终进度只发布事件"""
+        with app.app_context():
+            subscription = events.subscribe(7)
+            celery_task = FakeCeleryTask()
+            reporter = celery_reporter(celery_task, 7)
+            
+            reporter.update(10, '连接设备中...')
+            reporter.finish()
+            
+            assert celery_task.states == [('PROGRESS', {'progress': 10, 'status': '连接设备中...'})]
+            assert [m['data']['progress'] for m in drain(subscription)] == [10, 100]
+            subscription.close()
+    
+    def test_device_entry_publishes_to_parent(self, app, sample_data):
+        """测试批量子任务的单设备结果发布到父任务频道"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            device = db.session.get(Device, sample_data['device_id'])
+            
+            entry = device_entry(device, {'success': True}, sample_data['task_id'])
+            
+            assert drain(subscription) == [{'event': 'device', 'data': entry}]
+            subscription.close()
+    
+    @patch('app.tasks.network_tasks.SSHService.execute_command',
+           return_value={'success': True, 'output': 'Cisco IOS', 'execution_time': 0.1})
+    def test_single_device_task_finishes_progress(self, mock_execute, app, sample_data):
+        """测试单设备任务结束时发布最终进度"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            
+            execute_device_command.apply(args=(sample_data['task_id'], sample_data['device_id'], 'show version'))
+            
+            progress = [m['data']['progress'] for m in drain(subscription) if m['event'] == events.EVENT_PROGRESS]
+            assert progress[-1] == 100
+            subscription.close()
+    
+    def test_finalize_batch_task_finishes_progress(self, app, sample_data):
+        """测试批量任务汇总后发布最终进度和结果消息"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            entry = {'device_id': sample_data['device_id'], 'result': {'success': True}}
+            
+            finalize_batch_task.apply(args=([entry], sample_data['task_id'], 'batch_test',
+                                            '{success_count}/{total_devices}', {}))
+            
+            progress = [m['data'] for m in drain(subscription) if m['event'] == events.EVENT_PROGRESS]
+            assert progress == [{'progress': 100, 'status': '1/1'}]
+            subscription.close()
+    
+    def test_fail_batch_task_finishes_progress(self, app, sample_data):
+        """测试批量子任务失败时父任务标记为失败并发布最终进度"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            
+            fail_batch_task.apply(args=(None, RuntimeError('worker lost'), None, sample_data['task_id']))
+            
+            progress = [m['data'] for m in drain(subscription) if m['event'] == events.EVENT_PROGRESS]
+            assert progress == [{'progress': 100, 'status': '批量子任务执行失败: worker lost'}]
+            assert db.session.get(Task, sample_data['task_id']).status == TaskStatus.FAILED
+            subscription.close()
+
+class TestEventStream:
+    """SSE接口测试"""
+    
+    def _login(self, client):
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+    
+    @staticmethod
+    def parse(chunk):
+        """解析一条SSE消息，返回 (事件类型, 数据)"""
+        fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+        return fields['event'], json.loads(fields['data'])
+    
+    def test_finished_task_sends_snapshot_only(self, app, client, sample_data):
+        """测试已结束的任务只发送状态快照"""
+        with app.app_context():
+            db.session.get(Task, sample_data['task_id']).complete(True, '执行成功')
+        self._login(client)
+        
+        response = client.get(f"/tasks/api/task/{sample_data['task_id']}/events")
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert response.headers['Cache-Control'] == 'no-cache'
+        chunks = [c for c in response.get_data(as_text=True).split('\n\n') if c]
+        assert len(chunks) == 1
+        event_type, data = self.parse(chunks[0])
+        assert event_type == 'status'
+        assert data['status'] == 'success'
+        assert data['results_count'] == 0
+        assert events.channel(sample_data['task_id']) not in events._LocalBroker._subscriptions
+    
+    def test_stream_pushes_events_until_finished(self, app, client, sample_data):
+        """测试推送进度和设备结果，任务结束后关闭连接"""
+        self._login(client)
+        task_id = sample_data['task_id']
+        
+        response = client.get(f'/tasks/api/task/{task_id}/events', buffered=False)
+        stream = response.response
+        
+        assert self.parse(next(stream).decode())[1]['status'] == 'running'
+        
+        with app.app_context():
+            events.publish(task_id, events.EVENT_PROGRESS, {'progress': 50, 'status': '执行中'})
+            db.session.get(Task, task_id).complete(False, error='连接超时')
+        
+        assert self.parse(next(stream).decode()) == ('progress', {'progress': 50, 'status': '执行中'})
+        event_type, data = self.parse(next(stream).decode())
+        assert (event_type, data['status'], data['error_message']) == ('status', 'failed', '连接超时')
+        with pytest.raises(StopIteration):
+            next(stream)
+        response.close()
+        assert events.channel(task_id) not in events._LocalBroker._subscriptions
+    
+    def test_heartbeat_when_idle(self, app, sample_data):
+        """测试无事件时发送心跳注释"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            stream = events.iter_sse(subscription, {'status': 'running'}, heartbeat=0.01)
+            
+            assert next(stream).startswith('event: status')
+            assert next(stream) == ': keep-alive\n\n'
+            stream.close()
+            assert events.channel(sample_data['task_id']) not in events._LocalBroker._subscriptions
+    
+    def test_stream_closes_after_max_duration(self, app, sample_data):
+        """测试连接达到最长时间后关闭并取消订阅（浏览器自动重连）"""
+        with app.app_context():
+            subscription = events.subscribe(sample_data['task_id'])
+            stream = events.iter_sse(subscription, {'status': 'running'}, heartbeat=0.01, max_duration=0.05)
+            
+            messages = list(stream)
+            
+            assert messages[0].startswith('event: status')
+            assert all(message == ': keep-alive\n\n' for message in messages[1:])
+            assert events.channel(sample_data['task_id']) not in events._LocalBroker._subscriptions
@@ -0,0 +1,143 @@
+"""
+批量任务扇出测试
+Celery以eager模式运行，chord的子任务和回调在当前进程内依次执行
+"""
+
+import pytest
+from unittest.mock import patch
+from celery import group
+from app import create_app, db
+from app.models import (
+    User, Role, Device, DeviceType, ConnectionType, ConfigBackup,
+    Task, TaskResult, TaskStatus, TaskType
+)
+from app.tasks.celery_app import celery
+from app.tasks.fanout import build_header, flatten_results
+from app.tasks import network_tasks, backup_tasks
+from app.tasks.backup_tasks import batch_backup_configs
+from app.tasks.routing import QUEUE_BULK, QUEUE_BACKUP
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    celery.conf.task_always_eager = True
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def fleet(app):
+    """创建用户、5台SSH设备和一个批量任务，返回 (任务ID, 设备ID列表)"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        devices = [
+            Device(
+                name=f'fanout_device_{i}',
+                ip_address=f'10.5.0.{i + 1}',
+                device_type=DeviceType.CISCO_SWITCH,
+                connection_type=ConnectionType.SSH,
+                username='admin'
+            )
+            for i in range(5)
+        ]
+        task = Task(name='fanout_task', task_type=TaskType.BACKUP_CONFIG, user=user)
+        db.session.add_all([role, user, task] + devices)
+        db.session.commit()
+        return task.id, [device.id for device in devices]
+
+def fake_test_connection(device, timeout=30):
+    """ip以.1结尾的设备连接失败"""
+    if device.ip_address.endswith('.1'):
+        return {'success': False, 'error': '连接超时'}
+    return {'success': True, 'message': '连接成功'}
+
+class TestFanoutHelpers:
+    """扇出辅助函数测试"""
+    
+    def test_small_fleet_uses_group(self, app):
+        with app.app_context():
+            header = build_header(network_tasks.test_connection_for_batch, [(i, 30) for i in range(3)])
+            assert isinstance(header, group)
+            assert len(header.tasks) == 3
+    
+    def test_large_fleet_uses_chunks(self, app):
+        app.config['TASK_FANOUT_CHUNK_THRESHOLD'] = 10
+        app.config['TASK_FANOUT_CHUNK_SIZE'] = 4
+        with app.app_context():
+            header = build_header(network_tasks.test_connection_for_batch, [(i, 30) for i in range(11)])
+            assert isinstance(header, group)
+            assert len(header.tasks) == 3
+    
+    @pytest.mark.parametrize('subtask, queue', [
+        (network_tasks.test_connection_for_batch, QUEUE_BULK),
+        (backup_tasks.backup_config_for_batch, QUEUE_BACKUP),
+    ])
+    def test_chunks_use_subtask_queue(self, app, subtask, queue):
+        """测试分块（celery.starmap）发送到子任务所在的队列，而不是默认的交互队列"""
+        app.config['TASK_FANOUT_CHUNK_THRESHOLD'] = 10
+        app.config['TASK_FANOUT_CHUNK_SIZE'] = 4
+        with app.app_context():
+            header = build_header(subtask, [(i, 30) for i in range(11)])
+            assert {chunk.task for chunk in header.tasks} == {'celery.starmap'}
+            assert {chunk.options['queue'] for chunk in header.tasks} == {queue}
+    
+    def test_flatten_results(self):
+        assert flatten_results([[1, 2], 3, [4]]) == [1, 2, 3, 4]
+
+class TestBatchFanout:
+    """批量任务并行分发测试"""
+    
+    @patch('app.tasks.network_tasks.SSHService.test_connection', side_effect=fake_test_connection)
+    def test_batch_test_connections_aggregates(self, mock_test, app, fleet):
+        """测试各设备结果由回调汇总到父任务"""
+        task_id, device_ids = fleet
+        with app.app_context():
+            result = network_tasks.batch_test_connections.apply(args=(task_id, device_ids)).get()
+            assert result['success'] is True
+            assert result['dispatched'] == 5
+            assert mock_test.call_count == 5
+            
+            task = Task.query.get(task_id)
+            assert task.status == TaskStatus.SUCCESS
+            assert task.result_message == '成功测试 4/5 个设备'
+    
+    @patch('app.tasks.network_tasks.SSHService.test_connection', side_effect=fake_test_connection)
+    def test_chunked_fanout_aggregates(self, mock_test, app, fleet):
+        """测试分块执行时结果同样被完整汇总"""
+        app.config['TASK_FANOUT_CHUNK_THRESHOLD'] = 2
+        app.config['TASK_FANOUT_CHUNK_SIZE'] = 2
+        task_id, device_ids = fleet
+        with app.app_context():
+            network_tasks.batch_test_connections.apply(args=(task_id, device_ids)).get()
+            
+            task = Task.query.get(task_id)
+            assert task.status == TaskStatus.SUCCESS
+            assert task.result_message == '成功测试 4/5 个设备'
+    
+    @patch('app.tasks.backup_tasks.SSHService.execute_command')
+    def test_batch_backup_creates_records(self, mock_execute, app, fleet):
+        """测试每台设备的子任务各自创建备份和任务结果记录"""
+        mock_execute.return_value = {'success': True, 'output': 'hostname switch', 'execution_time': 0.1}
+        task_id, device_ids = fleet
+        with app.app_context():
+            batch_backup_configs.apply(args=(task_id, device_ids, 'nightly')).get()
+            
+            task = Task.query.get(task_id)
+            assert task.status == TaskStatus.SUCCESS
+            assert task.result_message == '成功备份 5/5 个设备的配置'
+            assert TaskResult.query.filter_by(task_id=task_id).count() == 5
+            assert ConfigBackup.query.filter(ConfigBackup.name.like('nightly_%')).count() == 5
+    
+    def test_no_devices_fails_task(self, app, fleet):
+        """测试没有有效设备时直接失败，不分发子任务"""
+        task_id, _ = fleet
+        with app.app_context():
+            result = network_tasks.batch_test_connections.apply(args=(task_id, [9999])).get()
+            assert result['success'] is False
+            assert Task.query.get(task_id).status == TaskStatus.FAILED
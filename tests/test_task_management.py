@@ -0,0 +1,202 @@
+"""
+任务重置、删除、结果下载，设备状态批量检查和页面测试
+"""
+
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch, Mock
+from app import db
+from app.models import (
+    Device, DeviceGroup, DeviceType, ConnectionType, DeviceStatus,
+    ConfigTemplate, Task, TaskResult, TaskStatus, TaskType, AuditLog
+)
+
+@pytest.fixture
+def sample_data(app, admin_user):
+    """创建设备组、两台启用和一台停用的设备、模板，以及一个已失败（有两条结果）和一个执行中的任务"""
+    with app.app_context():
+        user = db.session.merge(admin_user)
+        group = DeviceGroup(name='edge', description='边缘路由器')
+        devices = [
+            Device(
+                name=f'edge_router_{i}',
+                ip_address=f'10.9.0.{i + 1}',
+                device_type=DeviceType.CISCO_ROUTER,
+                connection_type=ConnectionType.SSH,
+                username='admin',
+                group=group,
+                is_active=i < 2
+            )
+            for i in range(3)
+        ]
+        template = ConfigTemplate(name='hostname', category='basic', template_content='hostname {{ name }}')
+        failed = Task(
+            name='show_version', task_type=TaskType.COMMAND, command='show version',
+            status=TaskStatus.FAILED, user=user, device=devices[0],
+            started_at=datetime(2024, 1, 1, 8, 0, 0), completed_at=datetime(2024, 1, 1, 8, 0, 5),
+            duration=5, result_message='1/2 台设备执行成功', error_message='命令执行失败'
+        )
+        running = Task(name='backup', task_type=TaskType.BACKUP_CONFIG, status=TaskStatus.RUNNING, user=user)
+        db.session.add_all([group, template, failed, running] + devices)
+        db.session.flush()
+        for device in devices[:2]:
+            db.session.add(TaskResult(
+                task=failed, device=device, device_name=device.name, device_ip=device.ip_address,
+                command='show version', output='Cisco IOS 名称', execution_time=0.5
+            ))
+        db.session.add(AuditLog(action='create_task', resource_type='task', resource_id=failed.id,
+                                resource_name=failed.name, user=user, task=failed))
+        db.session.commit()
+        return {
+            'failed_id': failed.id,
+            'running_id': running.id,
+            'template_id': template.id,
+            'device_ids': [device.id for device in devices]
+        }
+
+class TestTaskActions:
+    """任务重置、删除和结果下载测试"""
+    
+    def test_reset_task(self, app, client, login, sample_data):
+        """测试重置任务：恢复为待执行并清空执行结果，不计入重试次数"""
+        login()
+        response = client.post(f'/tasks/{sample_data["failed_id"]}/reset')
+        
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.get_json()['success'] is True
+        with app.app_context():
+            task = db.session.get(Task, sample_data['failed_id'])
+            assert task.status == TaskStatus.PENDING
+            assert task.started_at is None and task.completed_at is None and task.duration is None
+            assert task.error_message is None
+            assert task.retry_count == 0
+            assert task.results.count() == 0
+            assert AuditLog.query.filter_by(action='reset_task', task_id=task.id).count() == 1
+    
+    def test_running_task_cannot_be_reset_or_deleted(self, app, client, login, sample_data):
+        """测试执行中的任务不能重置或删除"""
+        login()
+        
+        assert client.post(f'/tasks/{sample_data["running_id"]}/reset').status_code == 400
+        assert client.delete(f'/tasks/api/task/{sample_data["running_id"]}').status_code == 400
+        with app.app_context():
+            assert db.session.get(Task, sample_data['running_id']).status == TaskStatus.RUNNING
+    
+    def test_delete_task_keeps_logs(self, app, client, login, sample_data):
+        """测试删除任务时删除执行结果，任务日志保留"""
+        login()
+        response = client.delete(f'/tasks/api/task/{sample_data["failed_id"]}')
+        
+        assert response.status_code == 200, response.get_data(as_text=True)
+        with app.app_context():
+            assert db.session.get(Task, sample_data['failed_id']) is None
+            assert TaskResult.query.count() == 0
+            created = AuditLog.query.filter_by(action='create_task').one()
+            assert created.task_id is None
+            deleted = AuditLog.query.filter_by(action='delete_task').one()
+            assert deleted.resource_id == sample_data['failed_id']
+            assert deleted.resource_name == 'show_version'
+    
+    def test_download_task_result(self, client, login, sample_data):
+        """测试下载任务结果：任务信息和各设备结果"""
+        login()
+        response = client.get(f'/tasks/api/task/{sample_data["failed_id"]}/download')
+        
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.mimetype == 'application/json'
+        assert response.headers['Content-Disposition'].startswith(f'attachment; filename="task_{sample_data["failed_id"]}_')
+        data = json.loads(response.get_data(as_text=True))
+        assert data['task']['name'] == 'show_version'
+        assert data['task']['error_message'] == '命令执行失败'
+        assert [result['device_name'] for result in data['results']] == ['edge_router_0', 'edge_router_1']
+        assert data['results'][0]['output'] == 'Cisco IOS 名称'
+    
+    def test_status_reads_celery_progress(self, app, client, login, sample_data):
+        """测试执行中的任务按元数据中的Celery任务ID读取进度"""
+        with app.app_context():
+            task = db.session.get(Task, sample_data['running_id'])
+            task.set_metadata({'celery_task_id': 'celery-id'})
+            db.session.commit()
+        
+        login()
+        celery_result = Mock(state='PROGRESS', info={'progress': 40, 'status': '备份中...'})
+        with patch('app.tasks.celery_app.celery.AsyncResult', return_value=celery_result) as mock_result:
+            response = client.get(f'/tasks/api/task/{sample_data["running_id"]}/status')
+        
+        mock_result.assert_called_once_with('celery-id')
+        assert response.get_json()['celery_status'] == {'state': 'PROGRESS', 'progress': 40, 'status': '备份中...'}
+    
+    def test_download_without_result(self, client, login, sample_data):
+        """测试尚无执行结果的任务返回404"""
+        login()
+        assert client.get(f'/tasks/api/task/{sample_data["running_id"]}/download').status_code == 404
+
+class TestCheckAllDevices:
+    """设备状态批量检查测试"""
+    
+    @patch('app.devices.services.DeviceConnectionService.test_tcp_port', return_value={'success': True})
+    @patch('app.devices.services.DeviceConnectionService.test_ping', return_value={'success': True})
+    def test_checks_active_devices(self, mock_ping, mock_port, app, client, login, sample_data):
+        """测试提交后台任务只检查启用的设备并更新状态"""
+        login()
+        response = client.post('/devices/api/devices/status/check-all')
+        
+        assert response.status_code == 202, response.get_data(as_text=True)
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['celery_task_id']
+        assert sorted(data['device_ids']) == sample_data['device_ids'][:2]
+        assert mock_ping.call_count == 2
+        with app.app_context():
+            assert db.session.get(Device, sample_data['device_ids'][0]).status == DeviceStatus.ONLINE
+            assert db.session.get(Device, sample_data['device_ids'][2]).status != DeviceStatus.ONLINE
+
+class TestPages:
+    """页面测试"""
+    
+    def test_system_logs(self, client, login, sample_data):
+        """测试系统日志页面显示当前用户的操作记录"""
+        login()
+        response = client.get('/logs')
+        
+        assert response.status_code == 200, response.get_data(as_text=True)
+        html = response.get_data(as_text=True)
+        assert 'create_task' in html
+        assert 'show_version' in html
+    
+    @pytest.mark.parametrize('url', [
+        '/dashboard',
+        '/devices/add',
+        '/devices/{device_id}/edit',
+        '/devices/groups',
+        '/devices/groups/add',
+        '/tasks/create',
+        '/tasks/{task_id}',
+        '/templates/',
+        '/templates/add',
+        '/templates/{template_id}',
+        '/templates/{template_id}/edit'
+    ])
+    def test_page_renders(self, client, login, sample_data, url):
+        """测试页面正常渲染"""
+        login()
+        response = client.get(url.format(
+            device_id=sample_data['device_ids'][0],
+            task_id=sample_data['failed_id'],
+            template_id=sample_data['template_id']
+        ))
+        assert response.status_code == 200, response.get_data(as_text=True)
+    
+    def test_add_group_form(self, app, client, login, sample_data):
+        """测试通过页面表单添加设备组"""
+        login()
+        response = client.post('/devices/groups/add', data={
+            'name': 'branch',
+            'description': '分支机构',
+            'color': '#28a745'
+        })
+        
+        assert response.status_code == 302
+        with app.app_context():
+            assert DeviceGroup.query.filter_by(name='branch').one().color == '#28a745'
@@ -0,0 +1,205 @@
+"""
+任务队列路由与优先级测试
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch, Mock
+from celery import Celery
+from app import create_app, db
+from app.models import User, Role, Device, DeviceType, ConnectionType, Task
+from app.tasks.routing import (
+    TASK_QUEUES, TASK_ROUTES, QUEUE_INTERACTIVE, QUEUE_BULK, QUEUE_BACKUP,
+    normalize_priority, broker_priority, worker_concurrency
+)
+
+@pytest.fixture
+def app():
+    """创建测试应用"""
+    app = create_app('testing')
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_data(app):
+    """创建测试用户和设备"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        role.add_permission(Role.PERMISSION_VIEW | Role.PERMISSION_EXECUTE | Role.PERMISSION_CONFIGURE | Role.PERMISSION_ADMIN)
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        device = Device(
+            name='routing-switch',
+            ip_address='192.168.1.20',
+            device_type=DeviceType.CISCO_SWITCH,
+            connection_type=ConnectionType.SSH,
+            username='admin'
+        )
+        db.session.add_all([role, user, device])
+        db.session.commit()
+        return {'device_id': device.id}
+
+@pytest.fixture
+def router():
+    """仅加载路由配置的Celery路由器"""
+    celery = Celery('routing_test')
+    celery.conf.update(task_queues=TASK_QUEUES, task_routes=TASK_ROUTES, task_default_queue=QUEUE_INTERACTIVE)
+    return celery.amqp.router
+
+def queue_of(router, name):
+    return router.route({}, name)['queue'].name
+
+class TestTaskRoutes:
+    """任务名称到队列的路由测试"""
+    
+    @pytest.mark.parametrize('name, queue', [
+        ('app.tasks.network_tasks.execute_device_command', QUEUE_INTERACTIVE),
+        ('app.tasks.template_tasks.render_and_apply_template', QUEUE_INTERACTIVE),
+        ('app.tasks.backup_tasks.restore_device_config', QUEUE_INTERACTIVE),
+        ('app.tasks.backup_tasks.backup_device_config', QUEUE_BACKUP),
+        ('app.tasks.backup_tasks.batch_backup_configs', QUEUE_BACKUP),
+        ('app.tasks.backup_tasks.backup_config_for_batch', QUEUE_BACKUP),
+        ('app.tasks.network_tasks.batch_test_connections', QUEUE_BULK),
+        ('app.tasks.network_tasks.test_connection_for_batch', QUEUE_BULK),
+        ('app.tasks.network_tasks.batch_execute_commands', QUEUE_BULK),
+        ('app.tasks.network_tasks.execute_commands_for_batch', QUEUE_BULK),
+        ('app.tasks.template_tasks.apply_config_for_batch', QUEUE_BULK),
+        ('app.tasks.fanout.finalize_batch_task', QUEUE_BULK),
+        ('app.tasks.maintenance_tasks.maintain_partitions', QUEUE_BULK),
+        ('app.tasks.inventory_tasks.collect_device_inventory', QUEUE_INTERACTIVE),
+        ('app.tasks.inventory_tasks.batch_collect_inventory', QUEUE_BULK),
+        ('app.tasks.inventory_tasks.collect_inventory_for_batch', QUEUE_BULK),
+        ('app.tasks.inventory_tasks.refresh_device_facts', QUEUE_INTERACTIVE),
+        ('app.tasks.inventory_tasks.batch_refresh_facts', QUEUE_BULK),
+        ('app.tasks.inventory_tasks.refresh_facts_for_batch', QUEUE_BULK),
+    ])
+    def test_route(self, router, name, queue):
+        assert queue_of(router, name) == queue
+
+class TestPriority:
+    """优先级换算测试"""
+    
+    def test_normalize_priority(self):
+        assert normalize_priority(None, 'restore_config') == 8
+        assert normalize_priority(None, 'backup_config') == 2
+        assert normalize_priority('7') == 7
+        assert normalize_priority(99) == 9
+        assert normalize_priority(-3) == 0
+        with pytest.raises(ValueError):
+            normalize_priority('high')
+        with pytest.raises(ValueError):
+            normalize_priority([5])
+    
+    def test_redis_priority_is_reversed(self):
+        assert broker_priority(9, 'redis://localhost:6379/0') == 0
+        assert broker_priority(0, 'redis://localhost:6379/0') == 9
+        assert broker_priority(9, 'amqp://guest@localhost//') == 9
+    
+    def test_worker_concurrency(self):
+        config = {'CELERY_QUEUE_CONCURRENCY': {'interactive': 8}}
+        assert worker_concurrency(['interactive'], config) == 8
+        assert worker_concurrency('bulk,backup', config) == 6
+        assert worker_concurrency(None, config) is None
+
+def run_script(script):
+    """在新的子进程中执行（导入时的副作用不受本进程已导入模块影响）"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, FLASK_ENV='testing')
+    subprocess.run([sys.executable, '-c', script], cwd=root, env=env, check=True)
+
+class TestCeleryApp:
+    """Celery与Flask应用的绑定测试"""
+    
+    def test_import_does_not_create_app(self):
+        """测试导入Celery模块不创建应用，worker加载Celery配置时才创建"""
+        run_script(
+            'import app.tasks.celery_app as celery_app\n'
+            'assert celery_app._flask_app is None\n'
+            'celery_app.celery.conf.task_default_queue\n'
+            'assert celery_app._flask_app is not None\n'
+        )
+    
+    def test_web_app_is_not_replaced(self):
+        """测试Web进程使用Web应用的配置，不再创建worker应用"""
+        run_script(
+            'from app import create_app\n'
+            'import app.tasks.celery_app as celery_app\n'
+            'app = create_app("testing")\n'
+            'celery_app.celery.conf.task_default_queue\n'
+            'assert celery_app.flask_app() is app\n'
+            'assert celery_app.celery.conf.broker_url == app.config.get("CELERY_BROKER_URL")\n'
+        )
+
+class TestCreateTaskPriority:
+    """创建任务接口的优先级测试"""
+    
+    def _login(self, client):
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+    
+    @patch('app.tasks.routes.restore_device_config')
+    def test_create_sets_priority(self, mock_task, app, client, sample_data):
+        """测试请求中的优先级写入任务并作为消息优先级提交"""
+        app.config['CELERY_BROKER_URL'] = 'redis://localhost:6379/0'
+        mock_task.apply_async.return_value = Mock(id='test-task-id')
+        self._login(client)
+        
+        response = client.post('/tasks/create', json={
+            'name': 'urgent rollback',
+            'task_type': 'restore_config',
+            'device_id': sample_data['device_id'],
+            'backup_id': 1,
+            'priority': 9
+        })
+        assert response.get_json()['success'] is True
+        
+        with app.app_context():
+            task = Task.query.filter_by(name='urgent rollback').first()
+            assert task.priority == 9
+        assert mock_task.apply_async.call_args.kwargs['priority'] == 0
+    
+    @patch('app.tasks.routes.backup_device_config')
+    def test_create_uses_type_default(self, mock_task, app, client, sample_data):
+        """测试未指定优先级时按任务类型取默认值"""
+        mock_task.apply_async.return_value = Mock(id='test-task-id')
+        self._login(client)
+        
+        client.post('/tasks/create', json={
+            'name': 'nightly backup',
+            'task_type': 'backup_config',
+            'device_id': sample_data['device_id']
+        })
+        
+        with app.app_context():
+            assert Task.query.filter_by(name='nightly backup').first().priority == 2
+    
+    @patch('app.tasks.routes.backup_device_config')
+    def test_create_rejects_invalid_priority(self, mock_task, app, client, sample_data):
+        """测试优先级不是整数时返回400，不创建任务"""
+        self._login(client)
+        
+        response = client.post('/tasks/create', json={
+            'name': 'bad priority',
+            'task_type': 'backup_config',
+            'device_id': sample_data['device_id'],
+            'priority': 'high'
+        })
+        
+        assert response.status_code == 400
+        assert '优先级' in response.get_json()['error']
+        mock_task.apply_async.assert_not_called()
+        with app.app_context():
+            assert Task.query.filter_by(name='bad priority').first() is None
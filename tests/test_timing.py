@@ -0,0 +1,168 @@
+"""
+任务结果分阶段耗时测试
+使用本机SSH模拟设备执行真实的命令任务（不使用mock）
+"""
+
+import json
+import time
+import pytest
+from app import create_app, db
+from app.models import User, Role, Device, DeviceGroup, DeviceType, ConnectionType, Task, TaskResult, TaskStatus, TaskType
+from app.timing import PhaseTimings, collect_phases, phase, record_phase
+from app.tasks.celery_app import celery
+from app.tasks.services import TaskTimingService
+from app.tasks import network_tasks
+from app.simulator import SimulatorFarm
+
+@pytest.fixture
+def app():
+    """创建测试应用（不使用Redis）"""
+    app = create_app('testing')
+    app.config['REDIS_URL'] = None
+    celery.conf.task_always_eager = True
+    
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    """创建测试客户端"""
+    return app.test_client()
+
+@pytest.fixture
+def sample_data(app):
+    """创建用户、两个分组的三台设备和一个已完成的任务，每台设备两条带分阶段耗时的结果"""
+    with app.app_context():
+        role = Role(name='admin', description='管理员')
+        user = User(username='admin', email='admin@example.com', role=role)
+        user.password = 'admin123'
+        core = DeviceGroup(name='core')
+        access = DeviceGroup(name='access')
+        devices = [
+            Device(name=f'timing_device_{i}', ip_address=f'10.8.0.{i + 1}', device_type=DeviceType.CISCO_SWITCH,
+                   connection_type=ConnectionType.SSH, username='admin', group=core if i == 0 else access)
+            for i in range(3)
+        ]
+        task = Task(name='timing_task', task_type=TaskType.BACKUP_CONFIG, status=TaskStatus.SUCCESS, user=user)
+        db.session.add_all([role, user, core, access, task] + devices)
+        db.session.flush()
+        
+        for i, device in enumerate(devices):
+            for command_time in (1.0, 3.0):
+                result = TaskResult(device_name=device.name, device_ip=device.ip_address, command='show running-config',
+                                    output='', exit_code=0, task=task, device=device)
+                # 第一台设备认证慢
+                result.set_phase_timings({'auth': 5.0 if i == 0 else 0.5, 'command': command_time})
+                db.session.add(result)
+        db.session.commit()
+        return {'device_ids': [device.id for device in devices], 'core_id': core.id}
+
+class TestPhaseTimings:
+    """分阶段计时测试"""
+    
+    def test_phases_accumulate_in_order(self):
+        with collect_phases() as timings:
+            with phase('command'):
+                time.sleep(0.01)
+            with phase('command'):
+                pass
+            record_phase('dns', 0.002)
+            record_phase('custom', 1)
+        
+        data = timings.to_dict()
+        assert list(data) == ['dns', 'command', 'custom']
+        assert data['command'] >= 0.01
+    
+    def test_phase_without_scope_is_noop(self):
+        with phase('command'):
+            record_phase('dns', 1.0)
+    
+    def test_db_time_excludes_other_phases(self, app):
+        with app.app_context():
+            with collect_phases() as timings:
+                with phase('session_wait'):
+                    Task.query.count()
+                assert 'db' not in timings.durations
+                Task.query.count()
+            
+            assert timings.durations['db'] > 0
+    
+    def test_result_serialization(self):
+        result = TaskResult()
+        timings = PhaseTimings()
+        timings.add('auth', 0.123456)
+        result.set_phase_timings(timings)
+        
+        assert json.loads(result.phase_timings) == {'auth': 0.1235}
+        assert result.get_phase_timings() == {'auth': 0.1235}
+        
+        result.set_phase_timings(PhaseTimings())
+        assert result.phase_timings is None
+
+class TestTaskPhaseTimings:
+    """任务记录分阶段耗时测试"""
+    
+    def test_command_task_records_phases(self, app):
+        with SimulatorFarm(ssh=1) as farm, app.app_context():
+            role = Role(name='admin', description='管理员')
+            user = User(username='admin', email='admin@example.com', role=role)
+            user.password = 'admin123'
+            device = farm.devices[0].to_device()
+            task = Task(name='command_task', task_type=TaskType.COMMAND, status=TaskStatus.PENDING, user=user)
+            db.session.add_all([role, user, device, task])
+            db.session.commit()
+            
+            result = network_tasks.execute_device_command.apply(args=(task.id, device.id, 'show version', 10)).get()
+            
+            assert result['success'] is True
+            timings = TaskResult.query.filter_by(task_id=task.id).one().get_phase_timings()
+            assert {'session_wait', 'dns', 'auth', 'prompt', 'command', 'db'} <= set(timings)
+            assert timings['auth'] > 0 and timings['command'] > 0
+
+class TestTimingAggregation:
+    """耗时汇总测试"""
+    
+    def _login(self, client):
+        client.post('/auth/login', data={
+            'username': 'admin',
+            'password': 'admin123'
+        })
+    
+    def test_aggregate_by_device(self, app, sample_data):
+        with app.app_context():
+            data = TaskTimingService.aggregate(group_by='device')
+            
+            assert data['rows'] == 6
+            slowest = data['items'][0]
+            assert slowest['device_id'] == sample_data['device_ids'][0]
+            assert slowest['results'] == 2
+            assert slowest['avg_total'] == 7.0
+            assert slowest['phases']['command'] == {'count': 2, 'avg': 2.0, 'p95': 3.0, 'max': 3.0}
+    
+    def test_aggregate_by_group(self, app, sample_data):
+        with app.app_context():
+            data = TaskTimingService.aggregate(group_by='group')
+            
+            assert [item['group_name'] for item in data['items']] == ['core', 'access']
+            assert data['items'][1]['results'] == 4
+    
+    def test_api_filters(self, client, sample_data):
+        self._login(client)
+        
+        response = client.get(f"/tasks/api/results/timings?group_id={sample_data['core_id']}&task_type=backup_config")
+        assert response.status_code == 200
+        items = response.get_json()['items']
+        assert [item['device_name'] for item in items] == ['timing_device_0']
+        
+        response = client.get('/tasks/api/results/timings?task_type=command')
+        assert response.get_json()['items'] == []
+    
+    def test_api_rejects_invalid_parameters(self, client, sample_data):
+        self._login(client)
+        
+        assert client.get('/tasks/api/results/timings?group_by=vendor').status_code == 400
+        assert client.get('/tasks/api/results/timings?days=0').status_code == 400
+        assert client.get('/tasks/api/results/timings?task_type=nope').status_code == 400
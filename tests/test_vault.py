@@ -0,0 +1,148 @@
+"""
+设备凭据加解密测试
+"""
+
+import pytest
+from cryptography.fernet import Fernet
+from app import create_app, db, credential_vault
+from app.models import Device, DeviceType, ConnectionType
+from app.vault import DecryptedCache, derive_key
+
+@pytest.fixture
+def app(app):
+    """测试应用（减少密钥派生的迭代次数）"""
+    app.config['CREDENTIAL_KDF_ITERATIONS'] = 1000
+    return app
+
+def make_device(name, password='admin123', enable_password=None):
+    device = Device(
+        name=name,
+        ip_address='10.4.0.1',
+        device_type=DeviceType.CISCO_SWITCH,
+        connection_type=ConnectionType.SSH,
+        username='admin'
+    )
+    device.set_password(password)
+    if enable_password:
+        device.set_enable_password(enable_password)
+    return device
+
+class TestCredentialVault:
+    """凭据加解密测试"""
+    
+    def test_round_trip_across_cipher_rebuild(self, app):
+        """测试密文可被重新构建的加密器解密（密钥由SECRET_KEY确定）"""
+        with app.app_context():
+            device = make_device('vault_device', enable_password='enable123')
+            db.session.add(device)
+            db.session.commit()
+            
+            credential_vault.init_app(app)
+            credential_vault.cache.clear()
+            assert device.get_password() == 'admin123'
+            assert device.get_enable_password() == 'enable123'
+            assert device.to_dict(include_credentials=True)['password'] == 'admin123'
+    
+    def test_uses_current_app_config(self, app):
+        """测试之后创建的应用（如worker应用）不影响当前应用的密钥配置"""
+        other = create_app('testing')
+        other.config['SECRET_KEY'] = 'other-secret-key'
+        
+        with app.app_context():
+            device = make_device('current_app_device')
+            db.session.add(device)
+            db.session.commit()
+            credential_vault.cache.clear()
+            assert device.get_password() == 'admin123'
+            
+            salt = app.config.get('CREDENTIAL_KDF_SALT', 'netmanagerx-credential-vault')
+            own_key = Fernet(derive_key(app.config['SECRET_KEY'], salt, 1000))
+            assert own_key.decrypt(device.password_encrypted.encode()) == b'admin123'
+    
+    def test_cipher_built_once(self, app):
+        """测试加密器在进程内复用"""
+        with app.app_context():
+            assert credential_vault.cipher is credential_vault.cipher
+    
+    def test_decrypt_is_cached(self, app, monkeypatch):
+        """测试重复解密命中缓存"""
+        with app.app_context():
+            device = make_device('cached_device')
+            db.session.add(device)
+            db.session.commit()
+            assert device.get_password() == 'admin123'
+            
+            def fail(*args, **kwargs):
+                raise AssertionError('不应再次解密')
+            monkeypatch.setattr(credential_vault.cipher, 'decrypt', fail)
+            assert device.get_password() == 'admin123'
+            
+            # 密码更新后密文变化，不会命中旧缓存
+            monkeypatch.undo()
+            device.set_password('newpassword')
+            assert device.get_password() == 'newpassword'
+    
+    def test_invalid_token_returns_none(self, app):
+        """测试无法解密的密文返回None"""
+        with app.app_context():
+            token = Fernet(Fernet.generate_key()).encrypt(b'admin123').decode()
+            assert credential_vault.decrypt(token, 1) is None
+            assert credential_vault.decrypt(None, 1) is None
+    
+    def test_rotate_all(self, app):
+        """测试更换SECRET_KEY后旧密文可解密，轮换后仅需新密钥"""
+        with app.app_context():
+            for i in range(5):
+                db.session.add(make_device(f'rotate_device_{i}', enable_password='enable123'))
+            db.session.add(Device(
+                name='no_credentials', ip_address='10.4.0.9',
+                device_type=DeviceType.CISCO_SWITCH, connection_type=ConnectionType.SSH, username='admin'
+            ))
+            db.session.commit()
+            
+            old_key = app.config['SECRET_KEY']
+            app.config['SECRET_KEY'] = 'rotated-secret-key'
+            app.config['CREDENTIAL_PREVIOUS_KEYS'] = [old_key]
+            credential_vault.init_app(app)
+            assert Device.query.filter_by(name='rotate_device_0').first().get_password() == 'admin123'
+            
+            result = credential_vault.rotate_all(batch_size=2)
+            assert result == {'rotated': 5, 'failed': 0}
+            
+            app.config['CREDENTIAL_PREVIOUS_KEYS'] = []
+            credential_vault.init_app(app)
+            db.session.expire_all()
+            for device in Device.query.filter(Device.name.like('rotate_device_%')):
+                assert device.get_password() == 'admin123'
+                assert device.get_enable_password() == 'enable123'
+
+class TestDecryptedCache:
+    """解密缓存测试"""
+    
+    def test_size_bound_evicts_least_recent(self):
+        cache = DecryptedCache(ttl=60, max_size=2)
+        cache.set((1, b'a'), 'a')
+        cache.set((2, b'b'), 'b')
+        assert cache.get((1, b'a')) == 'a'
+        cache.set((3, b'c'), 'c')
+        assert cache.get((2, b'b')) is None
+        assert len(cache) == 2
+    
+    def test_ttl_expiry(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr('app.vault.time.monotonic', lambda: now[0])
+        cache = DecryptedCache(ttl=10, max_size=10)
+        cache.set((1, b'a'), 'a')
+        now[0] += 11
+        assert cache.get((1, b'a')) is None
+    
+    def test_invalidate_device(self):
+        cache = DecryptedCache(ttl=60, max_size=10)
+        cache.set((1, b'a'), 'a')
+        cache.set((1, b'b'), 'b')
+        cache.set((2, b'c'), 'c')
+        cache.invalidate(1)
+        assert len(cache) == 1
+    
+    def test_derive_key_is_valid_fernet_key(self):
+        Fernet(derive_key('secret', 'salt', 1000))